@@ -14,6 +14,7 @@
 #    under the License.
 #
 
+import json
 import requests
 import time
 
@@ -108,9 +109,54 @@ class NfvbenchClient(object):
         elapsed = 0
         while True:
             time.sleep(poll_interval)
-            result = self.http_get('status', config)
+            result = self.http_get('status/' + res['request_id'], config)
             if result['status'] != 'PENDING':
                 return result
             elapsed += poll_interval
             if elapsed >= timeout:
                 raise TimeOutException()
+
+    def get_events(self, request_id, last_event_id=None, timeout=None):
+        """Get the progress events of a run as they are streamed by the nfvbench server.
+
+        Events are streamed from the submission of the run until it completes: state changes
+        (queued, running, done, failed, cancelled), chains staging, ARP and end to end
+        connectivity checks, NDR/PDR search trials and interval stats.
+
+        Args:
+            request_id: the request_id returned by the server when the run was submitted
+            last_event_id: ID of the last event already received to only get newer events
+            timeout: maximum time in seconds to wait for data from the server or None to wait
+                     forever (the server sends keep alive data every 15 seconds)
+
+        Returns:
+            A generator of events, each event is a dict with the following keys:
+            id: sequence number of the event
+            event: type of event (state, staging, instances, arp, e2e, trial, interval, cancel)
+            data: dict of event properties
+            The generator ends when the run is completed.
+
+        Raises:
+            NfvbenchException: there is no event for this request_id
+        """
+        headers = {'Accept': 'text/event-stream'}
+        if last_event_id is not None:
+            headers['Last-Event-ID'] = str(last_event_id)
+        url = self.url + '/runs/' + request_id + '/events'
+        with requests.get(url, headers=headers, stream=True, timeout=timeout) as res:
+            res.raise_for_status()
+            if not res.headers.get('Content-Type', '').startswith('text/event-stream'):
+                raise NfvbenchException(res.json()['error_message'])
+            event = {}
+            for line in res.iter_lines(decode_unicode=True):
+                if not line:
+                    # end of event
+                    if 'data' in event:
+                        yield event
+                    event = {}
+                elif line.startswith('id:'):
+                    event['id'] = int(line[3:].strip())
+                elif line.startswith('event:'):
+                    event['event'] = line[6:].strip()
+                elif line.startswith('data:'):
+                    event['data'] = json.loads(line[5:].strip())
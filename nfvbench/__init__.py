@@ -15,4 +15,11 @@
 
 import pbr.version
 
-__version__ = pbr.version.VersionInfo('nfvbench').version_string_with_vcs()
+
+def __getattr__(name):
+    # the version is only computed when needed as it is slow to get
+    if name == '__version__':
+        version = pbr.version.VersionInfo('nfvbench').version_string_with_vcs()
+        globals()['__version__'] = version
+        return version
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
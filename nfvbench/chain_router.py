@@ -66,10 +66,9 @@ class ChainRouter(object):
 
     def _setup(self):
         # Lookup if there is a matching router with same name
-        routers = self.manager.neutron_client.list_routers(name=self.name)
+        router = self.manager.inventory.get_router(self.name)
 
-        if routers['routers']:
-            router = routers['routers'][0]
+        if router:
             # a router of same name already exists, we need to verify it has the same
             # characteristics
             if self.subnets:
@@ -79,7 +78,7 @@ class ChainRouter(object):
                                              "router '{router}'.Router has no subnet id '{sub_id}'."
                                              .format(router=self.name,
                                                      sub_id=subnet.network['subnets'][0]))
-                interfaces = self.manager.neutron_client.list_ports(device_id=router['id'])['ports']
+                interfaces = self.manager.inventory.get_device_ports(router['id'])
                 # This string filters nfvbench networks in case when some other specific networks
                 # created and attached to the test nfvebnch router manually or automatically
                 # like in case of HA when neutron router virtually present on several network nodes
@@ -124,12 +123,14 @@ class ChainRouter(object):
         }
         router = self.manager.neutron_client.create_router(body)['router']
         router_id = router['id']
+        self.manager.inventory.add_router(router)
 
         if self.subnets:
             for subnet in self.subnets:
                 router_interface = {'subnet_id': subnet.network['subnets'][0]}
                 self.manager.neutron_client.add_interface_router(router_id, router_interface)
-            interfaces = self.manager.neutron_client.list_ports(device_id=router_id)['ports']
+            # the router interface ports are created by neutron
+            interfaces = self.manager.inventory.refresh_device_ports(router_id)
             interfaces = [x for x in interfaces if x['fixed_ips'][0]['subnet_id'] in
                           [s.network['subnets'][0] for s in self.subnets]]
             for interface in interfaces:
@@ -161,7 +162,7 @@ class ChainRouter(object):
         return self.router['id']
 
     def get_router_interface(self, router_id, subnet_id):
-        interfaces = self.manager.neutron_client.list_ports(device_id=router_id)['ports']
+        interfaces = self.manager.inventory.get_device_ports(router_id)
         matching_interface = None
         for interface in interfaces:
             if interface['fixed_ips'][0]['subnet_id'] == subnet_id:
@@ -178,6 +179,7 @@ class ChainRouter(object):
             while retry < self.manager.config.generic_retry_count:
                 try:
                     self.manager.neutron_client.delete_router(self.router['id'])
+                    self.manager.inventory.remove_router(self.router['id'])
                     LOG.info("Deleted router: %s", self.name)
                     return
                 except Exception:
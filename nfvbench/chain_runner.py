@@ -23,6 +23,7 @@ The ChainRunner class is in charge of coordinating:
 
 from collections import OrderedDict
 
+from .chaining import CHAIN_POOL
 from .chaining import ChainManager
 from .log import LOG
 from .specs import ChainType
@@ -61,8 +62,8 @@ class ChainRunner(object):
             # Start the traffic generator server
             self.traffic_client.start_traffic_generator()
 
-        # get an instance of a chain manager
-        self.chain_manager = ChainManager(self)
+        # get an instance of a chain manager, reuse the chains kept by the previous run if possible
+        self.chain_manager = CHAIN_POOL.take(self) or ChainManager(self)
 
         # at this point all resources are setup/discovered
         # we need to program the traffic dest MAC and VLANs
@@ -130,7 +131,11 @@ class ChainRunner(object):
                     self.config.vxlan or self.config.l3_router or self.config.loop_vm_arp)\
                     and not self.config.no_arp:
                 self.traffic_client.ensure_arp_successful()
-            self.traffic_client.ensure_end_to_end()
+            if self.config.stateful.enabled:
+                # the end to end check requires stateless streams
+                LOG.info('Skipping end to end connectivity check in stateful mode')
+            else:
+                self.traffic_client.ensure_end_to_end()
 
     def __get_result_per_frame_size(self, frame_size, bidirectional):
         traffic_result = {
@@ -141,7 +146,12 @@ class ChainRunner(object):
             self.traffic_client.set_traffic(frame_size, bidirectional)
 
             if self.config.single_run:
-                result = self.stats_manager.run_fixed_rate()
+                if self.config.traffic_pattern.burst_search:
+                    result = self.stats_manager.run_burst_search()
+                    if 'warning' in result:
+                        traffic_result['warning'] = result['warning']
+                else:
+                    result = self.stats_manager.run_fixed_rate()
             else:
                 results = self.traffic_client.get_ndr_and_pdr()
 
@@ -168,9 +178,14 @@ class ChainRunner(object):
 
     def __get_chain_result(self):
         result = OrderedDict()
-        for fs in self.config.frame_sizes:
-            result.update(self.__get_result_per_frame_size(fs,
-                                                           self.config.traffic.bidirectional))
+        if self.config.stateful.enabled:
+            result['stateful'] = self.traffic_client.get_stateful_max()
+            if 'warning' in result['stateful']:
+                result['warning'] = result['stateful']['warning']
+        else:
+            for fs in self.config.frame_sizes:
+                result.update(self.__get_result_per_frame_size(fs,
+                                                               self.config.traffic.bidirectional))
         chain_result = {
             'flow_count': self.config.flow_count,
             'service_chain_count': self.config.service_chain_count,
@@ -179,6 +194,9 @@ class ChainRunner(object):
             'compute_nodes': self.stats_manager.get_compute_nodes_bios(),
             'result': result
         }
+        staging_times = self.chain_manager.get_staging_times()
+        if staging_times:
+            chain_result['staging'] = staging_times
         return chain_result
 
     def run(self):
@@ -206,8 +224,8 @@ class ChainRunner(object):
         """Close this instance of chain runner and delete resources if applicable."""
         try:
             if not self.config.no_cleanup:
-                LOG.info('Cleaning up...')
-                if self.chain_manager:
+                if self.chain_manager and not CHAIN_POOL.park(self.chain_manager):
+                    LOG.info('Cleaning up...')
                     self.chain_manager.delete()
             else:
                 LOG.info('Clean up skipped.')
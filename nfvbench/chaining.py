@@ -45,8 +45,12 @@ Configuration parameters that will influence how these resources are staged/rela
 
 There is not traffic generation involved in this module.
 """
+from collections import OrderedDict
+import concurrent.futures
+import json
 import os
 import re
+import threading
 import time
 
 import glanceclient
@@ -55,9 +59,12 @@ from novaclient.client import Client
 
 from attrdict import AttrDict
 from .chain_router import ChainRouter
+from .cleanup import CleanupEngine
 from . import compute
+from .inventory import ResourceInventory
 from .log import LOG
 from .specs import ChainType
+from . import utils
 # Left and right index for network and port lists
 LEFT = 0
 RIGHT = 1
@@ -164,6 +171,7 @@ class ChainVnfPort(object):
 
             port = self.manager.neutron_client.create_port(body)
             self.port = port['port']
+            self.manager.inventory.add_port(self.port)
             LOG.info('Created port %s', name)
             try:
                 self.manager.neutron_client.update_port(self.port['id'], {
@@ -207,6 +215,7 @@ class ChainVnfPort(object):
         for _ in range(0, self.manager.config.generic_retry_count):
             try:
                 self.manager.neutron_client.delete_port(self.port['id'])
+                self.manager.inventory.remove_port(self.port['id'])
                 LOG.info("Deleted port %s", self.name)
                 if self.floating_ip:
                     self.manager.neutron_client.delete_floatingip(self.floating_ip['id'])
@@ -292,9 +301,13 @@ class ChainNetwork(object):
 
     def _setup(self, network_config, lookup_only):
         # Lookup if there is a matching network with same name
-        networks = self.manager.neutron_client.list_networks(name=self.name)
-        if networks['networks']:
-            network = networks['networks'][0]
+        if lookup_only:
+            # external networks are not managed by nfvbench, always get their latest state
+            networks = self.manager.neutron_client.list_networks(name=self.name)['networks']
+            network = networks[0] if networks else None
+        else:
+            network = self.manager.inventory.get_network(self.name)
+        if network:
             # a network of same name already exists, we need to verify it has the same
             # characteristics
             if self.segmentation_id:
@@ -347,6 +360,7 @@ class ChainNetwork(object):
             subnet = self.manager.neutron_client.create_subnet(body)['subnet']
             # add subnet id to the network dict since it has just been added
             self.network['subnets'] = [subnet['id']]
+            self.manager.inventory.add_network(self.network)
             LOG.info('Created network: %s', self.name)
 
     def get_uuid(self):
@@ -403,6 +417,7 @@ class ChainNetwork(object):
             for retry in range(0, self.manager.config.generic_retry_count):
                 try:
                     self.manager.neutron_client.delete_network(self.network['id'])
+                    self.manager.inventory.remove_network(self.network['id'])
                     LOG.info("Deleted network: %s", self.name)
                     return
                 except Exception:
@@ -612,35 +627,35 @@ class ChainVnf(object):
     def _setup(self, networks):
         flavor_id = self.manager.flavor.flavor.id
         # Check if we can reuse an instance with same name
-        for instance in self.manager.existing_instances:
-            if instance.name == self.name:
-                instance_left = LEFT
-                instance_right = RIGHT
-                # In case of L3 traffic instance use edge networks
-                if self.manager.config.l3_router:
-                    instance_left = EDGE_LEFT
-                    instance_right = EDGE_RIGHT
-                # Verify that other instance characteristics match
-                if instance.flavor['id'] != flavor_id:
-                    self._reuse_exception('Flavor mismatch')
-                if instance.status != "ACTIVE":
-                    self._reuse_exception('Matching instance is not in ACTIVE state')
-                # The 2 networks for this instance must also be reused
-                if not networks[instance_left].reuse:
-                    self._reuse_exception('network %s is new' % networks[instance_left].name)
-                if not networks[instance_right].reuse:
-                    self._reuse_exception('network %s is new' % networks[instance_right].name)
-                # instance.networks have the network names as keys:
-                # {'nfvbench-rnet0': ['192.168.2.10'], 'nfvbench-lnet0': ['192.168.1.8']}
-                if networks[instance_left].name not in instance.networks:
-                    self._reuse_exception('Left network mismatch')
-                if networks[instance_right].name not in instance.networks:
-                    self._reuse_exception('Right network mismatch')
-
-                self.reuse = True
-                self.instance = instance
-                LOG.info('Reusing existing instance %s on %s',
-                         self.name, self.get_hypervisor_name())
+        instance = self.manager.inventory.get_server(self.name)
+        if instance:
+            instance_left = LEFT
+            instance_right = RIGHT
+            # In case of L3 traffic instance use edge networks
+            if self.manager.config.l3_router:
+                instance_left = EDGE_LEFT
+                instance_right = EDGE_RIGHT
+            # Verify that other instance characteristics match
+            if instance.flavor['id'] != flavor_id:
+                self._reuse_exception('Flavor mismatch')
+            if instance.status != "ACTIVE":
+                self._reuse_exception('Matching instance is not in ACTIVE state')
+            # The 2 networks for this instance must also be reused
+            if not networks[instance_left].reuse:
+                self._reuse_exception('network %s is new' % networks[instance_left].name)
+            if not networks[instance_right].reuse:
+                self._reuse_exception('network %s is new' % networks[instance_right].name)
+            # instance.networks have the network names as keys:
+            # {'nfvbench-rnet0': ['192.168.2.10'], 'nfvbench-lnet0': ['192.168.1.8']}
+            if networks[instance_left].name not in instance.networks:
+                self._reuse_exception('Left network mismatch')
+            if networks[instance_right].name not in instance.networks:
+                self._reuse_exception('Right network mismatch')
+
+            self.reuse = True
+            self.instance = instance
+            LOG.info('Reusing existing instance %s on %s',
+                     self.name, self.get_hypervisor_name())
         # create management port if needed
         if self.manager.config.use_management_port:
             self.management_port = ChainVnfPort(self.name + '-mgmt', self,
@@ -725,6 +740,7 @@ class ChainVnf(object):
                                                      files={NFVBENCH_CFG_VM_PATHNAME: vm_config})
             if server:
                 self.instance = server
+                self.manager.inventory.add_server(server)
                 if self.manager.placer.is_resolved():
                     LOG.info('Created instance %s on %s', self.name, az)
                 else:
@@ -763,10 +779,17 @@ class ChainVnf(object):
     def _reuse_exception(self, reason):
         raise ChainException('Instance %s cannot be reused (%s)' % (self.name, reason))
 
-    def get_status(self):
-        """Get the statis of this instance."""
+    def get_status(self, servers=None):
+        """Get the status of this instance.
+
+        servers: an optional dict of freshly polled servers indexed by id,
+                 the instance is polled individually if not in that dict
+        """
         if self.instance.status != 'ACTIVE':
-            self.instance = self.manager.comp.poll_server(self.instance)
+            if servers and self.instance.id in servers:
+                self.instance = servers[self.instance.id]
+            else:
+                self.instance = self.manager.comp.poll_server(self.instance)
         return self.instance.status
 
     def get_hostname(self):
@@ -807,22 +830,32 @@ class ChainVnf(object):
         """Get the uuid for this instance."""
         return self.instance.id
 
-    def delete(self, forced=False):
-        """Delete this VNF instance."""
+    def _delete_instance(self):
+        utils.delete_server(self.manager.nova_client, self.instance)
+        self.manager.inventory.remove_server(self.instance)
+
+    def schedule_delete(self, engine):
+        """Schedule the deletion of this VNF instance, its ports and idle networks.
+
+        engine: the CleanupEngine that will delete the resources
+        """
         if self.reuse:
             LOG.info("Instance %s not deleted (reused)", self.name)
-        else:
-            if self.instance:
-                self.manager.comp.delete_server(self.instance)
-                LOG.info("Deleted instance %s", self.name)
-            if self.manager.config.use_management_port:
-                self.management_port.delete()
-            for port in self.ports:
-                port.delete()
-            for port in self.idle_ports:
-                port.delete()
-            for network in self.idle_networks:
-                network.delete()
+            return
+        if self.instance:
+            engine.add('instances', self.name, self._delete_instance, server=self.instance)
+        if self.manager.config.use_management_port and self.management_port:
+            engine.add('ports', self.management_port.name, self.management_port.delete)
+        for port in self.ports + self.idle_ports:
+            engine.add('ports', port.name, port.delete)
+        for network in self.idle_networks:
+            engine.add('networks', network.name, network.delete)
+
+    def delete(self, forced=False):
+        """Delete this VNF instance."""
+        engine = self.manager.get_cleanup_engine()
+        self.schedule_delete(engine)
+        engine.run()
 
 
 class Chain(object):
@@ -842,11 +875,16 @@ class Chain(object):
         self.encaps = manager.encaps
         self.networks = []
         self.instances = []
+        # time spent in each staging step of this chain in seconds
+        self.staging_times = OrderedDict()
         try:
+            start_time = time.time()
             self.networks = manager.get_networks(chain_id)
+            self.staging_times['networks_sec'] = time.time() - start_time
             # For external chain VNFs can only be discovered from their MAC addresses
             # either from config or from ARP
             if manager.config.service_chain != ChainType.EXT:
+                start_time = time.time()
                 for chain_instance_index in range(self.get_length()):
                     self.instances.append(ChainVnf(self,
                                                    chain_instance_index,
@@ -854,13 +892,16 @@ class Chain(object):
                 # at this point new VNFs are not created yet but
                 # verify that all discovered VNFs are on the same hypervisor
                 self._check_hypervisors()
+                self.staging_times['ports_sec'] = time.time() - start_time
                 # now that all VNF ports are created we need to calculate the
                 # left/right remote MAC for each VNF in the chain
                 # before actually creating the VNF itself
+                start_time = time.time()
                 rem_mac_pairs = self._get_remote_mac_pairs()
                 for instance in self.instances:
                     rem_mac_pair = rem_mac_pairs.pop(0)
                     instance.create_vnf(rem_mac_pair)
+                self.staging_times['instances_sec'] = time.time() - start_time
         except Exception:
             self.delete()
             raise
@@ -914,11 +955,11 @@ class Chain(object):
         The series pattern is pretty clear: [[n, n+3],... ] where n is multiple of 2
         """
         # line up all mac from left to right
-        mac_seq = [self.manager.generator_config.devices[LEFT].mac]
+        mac_seq = [self.manager.generator_config.devices[LEFT].get_mac(self.chain_id)]
         for instance in self.instances:
             mac_seq.append(instance.ports[0].get_mac())
             mac_seq.append(instance.ports[1].get_mac())
-        mac_seq.append(self.manager.generator_config.devices[RIGHT].mac)
+        mac_seq.append(self.manager.generator_config.devices[RIGHT].get_mac(self.chain_id))
         base = 0
         rem_mac_pairs = []
         for _ in self.instances:
@@ -1010,14 +1051,23 @@ class Chain(object):
         # compute node name(s) for the first chain
         return [vnf.get_hypervisor_name() for vnf in self.instances]
 
-    def delete(self):
-        """Delete this chain."""
+    def schedule_delete(self, engine):
+        """Schedule the deletion of all resources of this chain.
+
+        engine: the CleanupEngine that will delete the resources
+        """
         for instance in self.instances:
-            instance.delete()
+            instance.schedule_delete(engine)
         # only delete if these are chain private networks (not shared)
         if not self.manager.config.service_chain_shared_net:
             for network in self.networks:
-                network.delete()
+                engine.add('networks', network.name, network.delete)
+
+    def delete(self):
+        """Delete this chain."""
+        engine = self.manager.get_cleanup_engine()
+        self.schedule_delete(engine)
+        engine.run()
 
 
 class InstancePlacer(object):
@@ -1105,6 +1155,9 @@ class ChainManager(object):
     Supports EXT, PVP and PVVP chains.
     """
 
+    # initial interval between 2 polls of the instances status
+    ACTIVE_POLL_MIN_SEC = 0.5
+
     def __init__(self, chain_runner):
         """Create a chain manager to take care of discovering or bringing up the requested chains.
 
@@ -1126,9 +1179,10 @@ class ChainManager(object):
         self.nova_client = None
         self.neutron_client = None
         self.glance_client = None
-        self.existing_instances = []
-        # existing ports keyed by the network uuid they belong to
-        self._existing_ports = {}
+        # indexed view of existing networks, ports, instances and routers
+        self.inventory = None
+        # time spent in each staging step in seconds (see get_staging_times())
+        self.staging_times = OrderedDict()
         config = self.config
         self.openstack = (chain_runner.cred is not None) and not config.l2_loopback
         self.chain_count = config.service_chain_count
@@ -1143,13 +1197,13 @@ class ChainManager(object):
             self.comp = compute.Compute(self.nova_client,
                                         self.glance_client,
                                         config)
+            self.inventory = ResourceInventory(self.neutron_client, self.comp)
             try:
+                start_time = time.time()
                 if config.service_chain != ChainType.EXT:
                     self.placer = InstancePlacer(config.availability_zone, config.compute_nodes)
                     self._setup_image()
                     self.flavor = ChainFlavor(config.flavor_type, config.flavor, self.comp)
-                    # Get list of all existing instances to check if some instances can be reused
-                    self.existing_instances = self.comp.get_server_list()
                     # If management port is requested for VMs, create management network (shared)
                     if self.config.use_management_port:
                         self.management_network = ChainNetwork(self, self.config.management_network,
@@ -1169,16 +1223,20 @@ class ChainManager(object):
                 # If networks are shared across chains, get the list of networks
                 if config.service_chain_shared_net:
                     self.networks = self.get_networks()
+                self.staging_times['setup_sec'] = time.time() - start_time
                 # Reuse/create chains
-                for chain_id in range(self.chain_count):
-                    self.chains.append(Chain(chain_id, self))
+                start_time = time.time()
+                self._stage_chains(range(self.chain_count))
+                self.staging_times['chains_sec'] = time.time() - start_time
                 if config.service_chain == ChainType.EXT:
                     # if EXT and no ARP or VxLAN we need to read dest MACs from config
                     if config.no_arp or config.vxlan:
                         self._get_dest_macs_from_config()
                 else:
                     # Make sure all instances are active before proceeding
+                    start_time = time.time()
                     self._ensure_instances_active()
+                    self.staging_times['active_wait_sec'] = time.time() - start_time
                 # network API call do not show VLANS ID if not admin read from config
                 if not self.is_admin and config.vlan_tagging:
                     self._get_config_vlans()
@@ -1198,6 +1256,119 @@ class ChainManager(object):
             if config.vxlan:
                 raise ChainException('VxLAN is only supported with OpenStack')
 
+    def _get_staging_worker_count(self, chain_count):
+        """Get the number of chains that can be staged concurrently."""
+        return max(1, min(int(self.config.chain_staging_workers or 1), chain_count))
+
+    def _stage_chains(self, chain_ids):
+        """Reuse or create chains using a bounded pool of staging threads.
+
+        Each chain creates its own networks (if not shared), ports and instances.
+        When the instance placement is not resolved, the first chain is staged alone
+        as its first instance decides where all other instances will be placed.
+        All successfully staged chains are stored in self.chains (ordered by chain id)
+        even if the staging of another chain fails, so that delete() can roll them back.
+
+        chain_ids: the ids of the chains to stage (in increasing order)
+        """
+        chain_ids = list(chain_ids)
+        first_staged = len(self.chains)
+        chain_count = first_staged + len(chain_ids)
+        workers = self._get_staging_worker_count(len(chain_ids))
+        self.staging_times['workers'] = workers
+        if chain_ids and self.config.service_chain != ChainType.EXT and \
+                not self.placer.is_resolved():
+            self.chains.append(Chain(chain_ids.pop(0), self))
+            self._notify('staging', chain_id=self.chains[-1].chain_id, staged=len(self.chains),
+                         chain_count=chain_count)
+        if workers == 1:
+            for chain_id in chain_ids:
+                self.chains.append(Chain(chain_id, self))
+                self._notify('staging', chain_id=chain_id, staged=len(self.chains),
+                             chain_count=chain_count)
+        elif chain_ids:
+            LOG.info('Staging %d chains with %d workers...', len(chain_ids), workers)
+            staged = {}
+            error = None
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(Chain, chain_id, self): chain_id
+                           for chain_id in chain_ids}
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        staged[futures[future]] = future.result()
+                        self._notify('staging', chain_id=futures[future],
+                                     staged=len(self.chains) + len(staged),
+                                     chain_count=chain_count)
+                    except concurrent.futures.CancelledError:
+                        pass
+                    except Exception as exc:
+                        if error is None:
+                            error = exc
+                            LOG.error('Failed to stage chain %d: %s', futures[future], exc)
+                            # do not start the staging of any more chain
+                            for pending in futures:
+                                pending.cancel()
+            self.chains.extend(staged[chain_id] for chain_id in sorted(staged))
+            if error is not None:
+                raise error
+        for chain in self.chains[first_staged:]:
+            self.staging_times.setdefault('chains', []).append(chain.staging_times)
+
+    def _notify(self, event, **data):
+        """Publish a run progress event if the chain runner has a notifier."""
+        notifier = self.chain_runner.notifier
+        if notifier:
+            notifier.send(event, **data)
+
+    def get_staging_times(self):
+        """Get the time spent staging the chains.
+
+        return: a dict with the duration in seconds of the setup (image, flavor and shared
+                networks), of the chains staging and of the wait for all instances to be active
+                and a list of per chain breakdowns (networks, ports and instances),
+                an empty dict if there is no chain to stage (no openstack)
+        """
+        return self.staging_times
+
+    def reuse(self, chain_runner):
+        """Reuse the chains of this chain manager for a new run.
+
+        Chains are added or deleted to match the chain count of the new run config,
+        the other chains are reused as is without any discovery.
+        On error all chains are deleted.
+
+        chain_runner: the chain runner of the new run
+        """
+        self.chain_runner = chain_runner
+        self.config = chain_runner.config
+        self.generator_config = chain_runner.traffic_client.generator_config
+        self.staging_times = OrderedDict()
+        # the resources may have changed since the previous run
+        if self.inventory:
+            self.inventory.clear()
+        chain_count = self.config.service_chain_count
+        try:
+            start_time = time.time()
+            if chain_count < self.chain_count:
+                LOG.info('Deleting %d chains...', self.chain_count - chain_count)
+                engine = self.get_cleanup_engine()
+                for chain in self.chains[chain_count:]:
+                    chain.schedule_delete(engine)
+                engine.run()
+                del self.chains[chain_count:]
+            elif chain_count > self.chain_count:
+                self._stage_chains(range(self.chain_count, chain_count))
+            self.chain_count = chain_count
+            self.staging_times['chains_sec'] = time.time() - start_time
+            start_time = time.time()
+            self._ensure_instances_active()
+            self.staging_times['active_wait_sec'] = time.time() - start_time
+            if not self.is_admin and self.config.vlan_tagging:
+                self._get_config_vlans()
+        except Exception:
+            self.delete()
+            raise
+
     def _check_extnet(self, side, name):
         if not name:
             raise ChainException('external_networks.%s must contain a valid network'
@@ -1273,8 +1444,21 @@ class ChainManager(object):
                         break
                 else:
                     raise ChainException('Cannot find any built-in VM image file.')
-            if self.image_name:
+            # an image with the same content is reused whatever its name
+            checksums = None
+            if os.path.isfile(self.config.vm_image_file):
+                checksums = utils.get_file_checksums(self.config.vm_image_file)
+                self.image_instance = self.comp.find_image_by_checksums(checksums)
+                if self.image_instance:
+                    LOG.info('Reusing image %s (same content as %s)',
+                             self.image_instance.name, self.config.vm_image_file)
+                    self.image_name = self.image_instance.name
+            if not self.image_instance and self.image_name:
                 self.image_instance = self.comp.find_image(self.image_name)
+                if self.image_instance and checksums and \
+                        self.image_instance.get('checksum') not in (None, checksums['md5']):
+                    LOG.warning('Reusing image %s which content differs from %s',
+                                self.image_name, self.config.vm_image_file)
             if not self.image_instance:
                 LOG.info('Uploading %s', self.image_name)
                 res = self.comp.upload_image_via_url(self.image_name,
@@ -1291,17 +1475,27 @@ class ChainManager(object):
         self.comp.image_set_multiqueue(self.image_instance, self.config.vif_multiqueue_size > 1)
 
     def _ensure_instances_active(self):
+        """Wait until all instances are active.
+
+        The status of all instances is retrieved with a single nova request per poll cycle.
+        The poll interval starts small and grows up to generic_poll_sec since most instances
+        are often already active by the time this is called.
+        """
         instances = []
         for chain in self.chains:
             instances.extend(chain.get_instances())
         initial_instance_count = len(instances)
-        max_retries = (self.config.check_traffic_time_sec + (initial_instance_count - 1) * 10 +
-                       self.config.generic_poll_sec - 1) / self.config.generic_poll_sec
+        timeout_sec = self.config.check_traffic_time_sec + (initial_instance_count - 1) * 10
+        deadline = time.time() + timeout_sec
+        poll_sec = min(self.ACTIVE_POLL_MIN_SEC, self.config.generic_poll_sec)
         retry = 0
         while instances:
+            servers = None
+            if any(instance.instance.status != 'ACTIVE' for instance in instances):
+                servers = self.comp.poll_servers(self.config.loop_vm_name)
             remaining_instances = []
             for instance in instances:
-                status = instance.get_status()
+                status = instance.get_status(servers)
                 if status == 'ACTIVE':
                     LOG.info('Instance %s is ACTIVE on %s',
                              instance.name, instance.get_hypervisor_name())
@@ -1314,16 +1508,38 @@ class ChainManager(object):
             if not remaining_instances:
                 break
             retry += 1
-            if retry >= max_retries:
+            if time.time() + poll_sec > deadline:
                 raise ChainException('Time-out: %d/%d instances still not active' %
                                      (len(remaining_instances), initial_instance_count))
-            LOG.info('Waiting for %d/%d instance to become active (retry %d/%d)...',
-                     len(remaining_instances), initial_instance_count,
-                     retry, max_retries)
+            LOG.info('Waiting for %d/%d instance to become active (retry %d, next poll in '
+                     '%.1f sec)...', len(remaining_instances), initial_instance_count,
+                     retry, poll_sec)
+            self._notify('instances', active=initial_instance_count - len(remaining_instances),
+                         instance_count=initial_instance_count)
             instances = remaining_instances
-            time.sleep(self.config.generic_poll_sec)
+            time.sleep(poll_sec)
+            poll_sec = min(poll_sec * 2, self.config.generic_poll_sec)
         if initial_instance_count:
             LOG.info('All instances are active')
+            self._notify('instances', active=initial_instance_count,
+                         instance_count=initial_instance_count)
+            self._refresh_ports()
+
+    def _refresh_ports(self):
+        """Reload the ports created for the instances now that the instances use them.
+
+        The device_id and binding:host_id of a port are only set once its instance is active.
+        """
+        vnf_ports = {}
+        for chain in self.chains:
+            for instance in chain.get_instances():
+                for vnf_port in instance.ports + [instance.management_port]:
+                    if vnf_port and vnf_port.port and not vnf_port.port.get('device_id'):
+                        vnf_ports[vnf_port.port['id']] = vnf_port
+        if vnf_ports:
+            for port in self.inventory.refresh_ports(list(vnf_ports)):
+                if port['id'] in vnf_ports:
+                    vnf_ports[port['id']].port = port
 
     def get_networks(self, chain_id=None):
         """Get the networks for given EXT, PVP or PVVP chain.
@@ -1369,47 +1585,6 @@ class ChainManager(object):
             raise
         return networks
 
-    def get_existing_ports(self):
-        """Get the list of existing ports.
-
-        Lazy retrieval of ports as this can be costly if there are lots of ports and
-        is only needed when VM and network are being reused.
-
-        return: a dict of list of neutron ports indexed by the network uuid they are attached to
-
-        Each port is a dict with fields such as below:
-        {'allowed_address_pairs': [], 'extra_dhcp_opts': [],
-         'updated_at': '2018-10-06T07:15:35Z', 'device_owner': 'compute:nova',
-         'revision_number': 10, 'port_security_enabled': False, 'binding:profile': {},
-         'fixed_ips': [{'subnet_id': '6903a3b3-49a1-4ba4-8259-4a90e7a44b21',
-         'ip_address': '192.168.1.4'}], 'id': '3dcb9cfa-d82a-4dd1-85a1-fd8284b52d72',
-         'security_groups': [],
-         'binding:vif_details': {'vhostuser_socket': '/tmp/3dcb9cfa-d82a-4dd1-85a1-fd8284b52d72',
-                                 'vhostuser_mode': 'server'},
-         'binding:vif_type': 'vhostuser',
-         'mac_address': 'fa:16:3e:3c:63:04',
-         'project_id': '977ac76a63d7492f927fa80e86baff4c',
-         'status': 'ACTIVE',
-         'binding:host_id': 'a20-champagne-compute-1',
-         'description': '',
-         'device_id': 'a98e2ad2-5371-4aa5-a356-8264a970ce4b',
-         'name': 'nfvbench-loop-vm0-0', 'admin_state_up': True,
-         'network_id': '3ea5fd88-278f-4d9d-b24d-1e443791a055',
-         'tenant_id': '977ac76a63d7492f927fa80e86baff4c',
-         'created_at': '2018-10-06T07:15:10Z',
-         'binding:vnic_type': 'normal'}
-        """
-        if not self._existing_ports:
-            LOG.info('Loading list of all ports...')
-            existing_ports = self.neutron_client.list_ports()['ports']
-            # place all ports in the dict keyed by the port network uuid
-            for port in existing_ports:
-                port_list = self._existing_ports.setdefault(port['network_id'], [])
-                port_list.append(port)
-            LOG.info("Loaded %d ports attached to %d networks",
-                     len(existing_ports), len(self._existing_ports))
-        return self._existing_ports
-
     def get_ports_from_network(self, chain_network):
         """Get the list of existing ports that belong to a network.
 
@@ -1419,7 +1594,7 @@ class ChainManager(object):
         chain_network: a ChainNetwork instance for which attached ports neeed to be retrieved
         return: list of neutron ports attached to requested network
         """
-        return self.get_existing_ports().get(chain_network.get_uuid(), None)
+        return self.inventory.get_network_ports(chain_network.get_uuid())
 
     def get_hypervisor_from_mac(self, mac):
         """Get the hypervisor that hosts a VM MAC.
@@ -1427,15 +1602,9 @@ class ChainManager(object):
         mac: MAC address to look for
         return: the hypervisor where the matching port runs or None if not found
         """
-        # _existing_ports is a dict of list of ports indexed by network id
-        for port_list in list(self.get_existing_ports().values()):
-            for port in port_list:
-                try:
-                    if port['mac_address'] == mac:
-                        host_id = port['binding:host_id']
-                        return self.comp.get_hypervisor(host_id)
-                except KeyError:
-                    pass
+        port = self.inventory.get_port_by_mac(mac)
+        if port and 'binding:host_id' in port:
+            return self.comp.get_hypervisor(port['binding:host_id'])
         return None
 
     def get_host_ip_from_mac(self, mac):
@@ -1545,15 +1714,138 @@ class ChainManager(object):
         # no openstack = no chains
         return []
 
+    def get_cleanup_engine(self):
+        """Get a new engine to delete chain resources in dependency order."""
+        return CleanupEngine(self.config.cleanup_workers, self.nova_client)
+
     def delete(self):
         """Delete resources for all chains."""
+        engine = self.get_cleanup_engine()
         for chain in self.chains:
-            chain.delete()
+            chain.schedule_delete(engine)
         for network in self.networks:
-            network.delete()
+            engine.add('networks', network.name, network.delete)
         if self.config.use_management_port and hasattr(self, 'management_network'):
-            self.management_network.delete()
+            engine.add('networks', self.management_network.name, self.management_network.delete)
         if self.config.use_floating_ip and hasattr(self, 'floating_ip_network'):
-            self.floating_ip_network.delete()
+            engine.add('networks', self.floating_ip_network.name,
+                       self.floating_ip_network.delete)
         if self.flavor:
-            self.flavor.delete()
+            engine.add('flavors', self.flavor.name, self.flavor.delete)
+        engine.run()
+
+
+class ChainPool(object):
+    """Staged chains kept alive between runs in REST server mode.
+
+    A run that requires the same chain setup as the previous run (same chain type, networks,
+    flavor, image and traffic generator addresses) reuses the kept chains without staging or
+    discovery, only adding or deleting chains if the chain count is different.
+    At most one chain manager is kept since all chain managers use the same resource names.
+    Kept chains are deleted when not reused within chain_pool_idle_sec seconds.
+    """
+
+    # config properties that determine how chains are staged (the chain count excepted)
+    KEY_PROPERTIES = ['openrc_file', 'clouds_detail', 'vm_forwarder', 'vm_image_file',
+                      'flavor_type', 'flavor', 'vif_multiqueue_size', 'num_mbufs',
+                      'availability_zone', 'compute_nodes', 'hypervisor_hostname',
+                      'service_chain', 'service_chain_shared_net', 'sriov', 'use_sriov_middle_net',
+                      'generator_profile', 'traffic_generator', 'loop_vm_name', 'loop_vm_arp',
+                      'internal_networks', 'edge_networks', 'l3_router', 'idle_interfaces_per_vm',
+                      'idle_networks', 'use_management_port', 'management_network',
+                      'use_floating_ip', 'floating_network', 'vlan_tagging', 'vxlan', 'mpls']
+
+    def __init__(self):
+        """Create an empty chain pool."""
+        # held for the whole take, park and evict operations (including the deletion of
+        # the kept chains) so that a run never stages chains while kept chains are deleted
+        self.lock = threading.RLock()
+        self.chain_manager = None
+        self.key = None
+        self.timer = None
+        # incremented by each park to ignore the expiry of a cancelled timer
+        self.generation = 0
+
+    @staticmethod
+    def get_key(config):
+        """Get the key of the chain setup required by a config."""
+        return json.dumps({name: config.get(name) for name in ChainPool.KEY_PROPERTIES},
+                          sort_keys=True, default=str)
+
+    @staticmethod
+    def is_enabled(config):
+        """Check if chains staged with a given config can be kept."""
+        return bool(config.chain_pool_idle_sec) and not config.no_cleanup and \
+            config.service_chain != ChainType.EXT and not config.l2_loopback
+
+    def __pop(self):
+        if self.timer:
+            self.timer.cancel()
+        chain_manager, key = self.chain_manager, self.key
+        self.chain_manager = self.key = self.timer = None
+        return chain_manager, key
+
+    def take(self, chain_runner):
+        """Get the kept chains for a new run.
+
+        Kept chains that cannot be reused are deleted since their resources would
+        conflict with the ones of the new run.
+        Waits for the completion of a concurrent eviction.
+        chain_runner: the chain runner of the new run
+        return: the chain manager adjusted to the new run config, None if no chains were kept
+        """
+        with self.lock:
+            chain_manager, key = self.__pop()
+            if chain_manager is None:
+                return None
+            config = chain_runner.config
+            if chain_runner.cred is None or not self.is_enabled(config) or \
+                    key != self.get_key(config):
+                LOG.info('Deleting kept chains (chain setup changed)...')
+                chain_manager.delete()
+                return None
+            LOG.info('Reusing %d kept chains', chain_manager.chain_count)
+            chain_manager.reuse(chain_runner)
+            return chain_manager
+
+    def park(self, chain_manager):
+        """Keep the chains of a run for the next run.
+
+        chain_manager: the chain manager to keep
+        return: True if kept, False if the chains are not kept and must be deleted
+        """
+        config = chain_manager.config
+        if not chain_manager.openstack or not self.is_enabled(config):
+            return False
+        with self.lock:
+            old_chain_manager, _ = self.__pop()
+            if old_chain_manager and old_chain_manager is not chain_manager:
+                old_chain_manager.delete()
+            self.chain_manager = chain_manager
+            self.key = self.get_key(config)
+            self.generation += 1
+            self.timer = threading.Timer(config.chain_pool_idle_sec, self.evict,
+                                         args=[self.generation])
+            self.timer.daemon = True
+            self.timer.start()
+        LOG.info('Keeping %d chains for the next run (deleted after %d idle seconds)',
+                 chain_manager.chain_count, config.chain_pool_idle_sec)
+        return True
+
+    def evict(self, generation=None):
+        """Delete the kept chains.
+
+        generation: only delete the chains kept by this park (used by the idle timer),
+                    None to delete any kept chains
+        """
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            chain_manager, _ = self.__pop()
+            if chain_manager:
+                LOG.info('Deleting %d kept chains...', chain_manager.chain_count)
+                chain_manager.delete()
+
+
+# chains kept between runs (REST server mode)
+CHAIN_POOL = ChainPool()
@@ -14,7 +14,11 @@
 #    under the License.
 #
 
+from collections import OrderedDict
+import concurrent.futures
+from functools import partial
 import sys
+import time
 
 from neutronclient.neutron import client as nclient
 from novaclient.client import Client
@@ -26,6 +30,88 @@ from .log import LOG
 from . import utils
 
 
+class CleanupEngine(object):
+    """Delete resources level by level following their dependencies.
+
+    Resources of a level are deleted only when all resources of the previous levels are:
+    instances -> floating ips -> ports -> router routes -> router interfaces -> routers
+              -> networks -> flavors
+    All resources of a same level are deleted concurrently by a bounded pool of workers.
+    A failed deletion is logged and does not prevent the deletion of the other resources.
+    """
+
+    LEVELS = ('instances', 'floating_ips', 'ports', 'router_routes', 'router_interfaces',
+              'routers', 'networks', 'flavors')
+
+    def __init__(self, workers, nova_client=None):
+        """Create an empty cleanup engine.
+
+        workers: maximum number of concurrent deletions
+        nova_client: the nova client to verify that instances are deleted
+        """
+        self.workers = max(1, int(workers or 1))
+        self.nova_client = nova_client
+        self.resources = OrderedDict((level, []) for level in self.LEVELS)
+        # per resource deletion timing: list of dict with level, name, sec and status
+        self.timings = []
+
+    def add(self, level, name, delete_fn, server=None):
+        """Schedule the deletion of a resource.
+
+        level: one of LEVELS
+        name: name of the resource (for logging)
+        delete_fn: function to call to delete the resource
+        server: the nova server to wait for if the resource is an instance
+        """
+        self.resources[level].append((name, delete_fn, server))
+
+    def is_empty(self):
+        """Check if there is no resource to delete."""
+        return not any(self.resources.values())
+
+    def __delete(self, level, name, delete_fn):
+        start_time = time.time()
+        status = 'deleted'
+        try:
+            delete_fn()
+        except Exception:
+            LOG.exception('Failed to delete %s %s', level, name)
+            status = 'failed'
+        return OrderedDict([('level', level),
+                            ('name', name),
+                            ('sec', round(time.time() - start_time, 3)),
+                            ('status', status)])
+
+    def run(self):
+        """Delete all scheduled resources.
+
+        return: the list of per resource timings
+        """
+        summary = [['Level', 'Count', 'Failed', 'Time (sec)']]
+        for level, resources in self.resources.items():
+            if not resources:
+                continue
+            start_time = time.time()
+            workers = min(self.workers, len(resources))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                timings = list(executor.map(lambda res: self.__delete(level, res[0], res[1]),
+                                            resources))
+            servers = [res[2] for res in resources if res[2] is not None]
+            if servers:
+                utils.waiting_servers_deletion(self.nova_client, servers)
+            for timing in timings:
+                LOG.debug('%s %s %s in %.3f sec', timing['level'], timing['name'],
+                          timing['status'], timing['sec'])
+            self.timings.extend(timings)
+            summary.append([level, len(resources),
+                            len([timing for timing in timings if timing['status'] == 'failed']),
+                            round(time.time() - start_time, 1)])
+            self.resources[level] = []
+        if len(summary) > 1:
+            LOG.info('Cleanup summary:\n%s', tabulate(summary, headers="firstrow", tablefmt="psql"))
+        return self.timings
+
+
 class ComputeCleaner(object):
     """A cleaner for compute resources."""
 
@@ -48,12 +134,11 @@ class ComputeCleaner(object):
         code = self.get_cleaner_code()
         return code[0] in clean_options
 
-    def clean(self, clean_options):
+    def clean(self, clean_options, engine):
         if self.clean_needed(clean_options):
-            if self.servers:
-                for server in self.servers:
-                    utils.delete_server(self.nova_client, server)
-                utils.waiting_servers_deletion(self.nova_client, self.servers)
+            for server in self.servers:
+                engine.add('instances', server.name,
+                           partial(utils.delete_server, self.nova_client, server), server=server)
 
 
 class NetworkCleaner(object):
@@ -75,7 +160,9 @@ class NetworkCleaner(object):
         if net_ids:
             LOG.info('Discovering ports...')
             all_ports = self.neutron_client.list_ports()['ports']
-            self.ports = [port for port in all_ports if port['network_id'] in net_ids]
+            # router interfaces can only be removed from their router (see RouterCleaner)
+            self.ports = [port for port in all_ports if port['network_id'] in net_ids and
+                          port.get('device_owner') != 'network:router_interface']
             LOG.info('Discovering floating ips...')
             all_floating_ips = self.neutron_client.list_floatingips()['floatingips']
             self.floating_ips = [floating_ip for floating_ip in all_floating_ips if
@@ -102,27 +189,18 @@ class NetworkCleaner(object):
         code = self.get_cleaner_code()
         return code[0] in clean_options
 
-    def clean(self, clean_options):
+    def clean(self, clean_options, engine):
         if self.clean_needed(clean_options):
             for port in self.ports:
-                LOG.info("Deleting port %s...", port['id'])
-                try:
-                    self.neutron_client.delete_port(port['id'])
-                except Exception:
-                    LOG.exception("Port deletion failed")
+                engine.add('ports', port['name'] or port['id'],
+                           partial(self.neutron_client.delete_port, port['id']))
             for floating_ip in self.floating_ips:
-                LOG.info("Deleting floating ip %s...", floating_ip['id'])
-                try:
-                    self.neutron_client.delete_floatingip(floating_ip['id'])
-                except Exception:
-                    LOG.exception("Floating IP deletion failed")
+                engine.add('floating_ips', floating_ip['id'],
+                           partial(self.neutron_client.delete_floatingip, floating_ip['id']))
             # associated subnets are automatically deleted by neutron
             for net in self.networks:
-                LOG.info("Deleting network %s...", net['name'])
-                try:
-                    self.neutron_client.delete_network(net['id'])
-                except Exception:
-                    LOG.exception("Network deletion failed")
+                engine.add('networks', net['name'],
+                           partial(self.neutron_client.delete_network, net['id']))
 
 
 class RouterCleaner(object):
@@ -133,7 +211,8 @@ class RouterCleaner(object):
         LOG.info('Discovering routers...')
         all_routers = self.neutron_client.list_routers()['routers']
         self.routers = []
-        self.ports = []
+        # router interface ports indexed by router id
+        self.ports = {}
         self.routes = []
         rtr_ids = []
         for rtr in all_routers:
@@ -150,7 +229,8 @@ class RouterCleaner(object):
                                  route['nexthop'])
 
                     LOG.info('Discovering router ports for router %s...', rtr['name'])
-                    self.ports.extend(self.neutron_client.list_ports(device_id=rtr['id'])['ports'])
+                    self.ports[rtr['id']] = \
+                        self.neutron_client.list_ports(device_id=rtr['id'])['ports']
                     break
 
     def get_resource_list(self):
@@ -166,34 +246,19 @@ class RouterCleaner(object):
         code = self.get_cleaner_code()
         return code[0] in clean_options
 
-    def clean(self, clean_options):
+    def clean(self, clean_options, engine):
         if self.clean_needed(clean_options):
             # associated routes needs to be deleted before deleting routers
             for rtr in self.routers:
-                LOG.info("Deleting routes for %s...", rtr['name'])
-                try:
-                    body = {
-                        'router': {
-                            'routes': []
-                        }
-                    }
-                    self.neutron_client.update_router(rtr['id'], body)
-                except Exception:
-                    LOG.exception("Router routes deletion failed")
-                LOG.info("Deleting ports for %s...", rtr['name'])
-                try:
-                    for port in self.ports:
-                        body = {
-                            'port_id': port['id']
-                        }
-                        self.neutron_client.remove_interface_router(rtr['id'], body)
-                except Exception:
-                    LOG.exception("Router ports deletion failed")
-                LOG.info("Deleting router %s...", rtr['name'])
-                try:
-                    self.neutron_client.delete_router(rtr['id'])
-                except Exception:
-                    LOG.exception("Router deletion failed")
+                engine.add('router_routes', rtr['name'],
+                           partial(self.neutron_client.update_router, rtr['id'],
+                                   {'router': {'routes': []}}))
+                for port in self.ports[rtr['id']]:
+                    engine.add('router_interfaces', rtr['name'] + ' ' + port['id'],
+                               partial(self.neutron_client.remove_interface_router, rtr['id'],
+                                       {'port_id': port['id']}))
+                engine.add('routers', rtr['name'],
+                           partial(self.neutron_client.delete_router, rtr['id']))
 
 
 class FlavorCleaner(object):
@@ -221,14 +286,10 @@ class FlavorCleaner(object):
         code = self.get_cleaner_code()
         return code[0] in clean_options
 
-    def clean(self, clean_options):
+    def clean(self, clean_options, engine):
         if self.clean_needed(clean_options):
             if self.flavor:
-                LOG.info("Deleting flavor %s...", self.flavor.name)
-                try:
-                    self.flavor.delete()
-                except Exception:
-                    LOG.exception("Flavor deletion failed")
+                engine.add('flavors', self.name, self.flavor.delete)
 
 
 class Cleaner(object):
@@ -239,6 +300,7 @@ class Cleaner(object):
         session = cred.get_session()
         self.neutron_client = nclient.Client('2.0', session=session)
         self.nova_client = Client(2, session=session)
+        self.workers = config.cleanup_workers
         network_names = [inet['name'] for inet in config.internal_networks.values()]
         network_names.extend([inet['name'] for inet in config.edge_networks.values()])
         network_names.append(config.management_network['name'])
@@ -301,5 +363,7 @@ class Cleaner(object):
                 else:
                     LOG.info("Exiting without deleting any resource")
                     sys.exit(0)
+        engine = CleanupEngine(self.workers, self.nova_client)
         for cleaner in self.cleaners:
-            cleaner.clean(clean_options)
+            cleaner.clean(clean_options, engine)
+        engine.run()
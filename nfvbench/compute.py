@@ -13,6 +13,8 @@
 #    under the License.
 """Module to interface with nova and glance."""
 
+import os
+import re
 import time
 import traceback
 
@@ -47,6 +49,27 @@ class Compute(object):
             pass
         return None
 
+    def find_image_by_checksums(self, checksums):
+        """Find an active image with a given content.
+
+        checksums: a dict with the md5 and sha512 checksums of the image content
+                   (see utils.get_file_checksums())
+        return: the first matching image or None if not found
+        """
+        try:
+            for image in self.glance_client.images.list(filters={'checksum': checksums['md5']}):
+                if image.status != 'active' or image.get('checksum') != checksums['md5']:
+                    continue
+                # the multihash is only available with recent glance versions
+                if image.get('os_hash_algo') == 'sha512' and \
+                        image.get('os_hash_value') != checksums['sha512']:
+                    continue
+                return image
+        except (novaclient.exceptions.NotFound, keystoneauth1.exceptions.http.NotFound,
+                GlanceImageNotFound):
+            pass
+        return None
+
     def upload_image_via_url(self, final_image_name, image_file, retry_count=60):
         """Directly upload image to Nova via URL if image is not present."""
         retry = 0
@@ -57,7 +80,11 @@ class Compute(object):
                                                        disk_format="qcow2",
                                                        container_format="bare",
                                                        visibility="public")
-                self.glance_client.images.upload(img.id, image_data=f_image)
+                image_size = os.fstat(f_image.fileno()).st_size
+                reader = utils.FileProgressReader(f_image, image_size,
+                                                  'Uploading ' + str(final_image_name))
+                self.glance_client.images.upload(img.id, image_data=reader,
+                                                 image_size=image_size)
             # Check for the image in glance
             while img.status in ['queued', 'saving'] and retry < retry_count:
                 img = self.glance_client.images.get(img.id)
@@ -149,6 +176,15 @@ class Compute(object):
         servers_list = self.novaclient.servers.list()
         return servers_list
 
+    def poll_servers(self, name_prefix):
+        """Poll all servers with a name starting with a given prefix in a single request.
+
+        name_prefix: the prefix of the server names to poll
+        return: a dict of servers indexed by their id
+        """
+        servers = self.novaclient.servers.list(search_opts={'name': '^' + re.escape(name_prefix)})
+        return {server.id: server for server in servers}
+
     def instance_exists(self, server):
         try:
             self.novaclient.servers.get(server)
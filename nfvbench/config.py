@@ -31,10 +31,7 @@ def config_load(file_name, from_cfg=None, whitelist_keys=None):
                         .format(file_name)) from IOError
 
     if from_cfg:
-        if not whitelist_keys:
-            whitelist_keys = []
-        _validate_config(cfg, from_cfg, whitelist_keys)
-        cfg = from_cfg + cfg
+        cfg = ConfigSchema(from_cfg, whitelist_keys).merge(from_cfg, cfg)
 
     return cfg
 
@@ -54,35 +51,123 @@ def config_loads(cfg_text, from_cfg=None, whitelist_keys=None):
                   "verify it is visible to container if you run nfvbench in container.", cfg_text)
         raise Exception(e) from e
     if from_cfg:
-        if not whitelist_keys:
-            whitelist_keys = []
-        _validate_config(cfg, from_cfg, whitelist_keys)
-        return from_cfg + cfg
+        return ConfigSchema(from_cfg, whitelist_keys).merge(from_cfg, cfg)
     return cfg
 
 
-def _validate_config(subset, superset, whitelist_keys):
-    def get_err_config(subset, superset):
-        result = {}
-        for k, v in list(subset.items()):
-            if k not in whitelist_keys:
-                if k not in superset:
-                    result.update({k: v})
-                elif v is not None and superset[k] is not None:
-                    if not isinstance(v, type(superset[k])):
-                        result.update({k: v})
-                        continue
-                if isinstance(v, dict):
-                    res = get_err_config(v, superset[k])
-                    if res:
-                        result.update({k: res})
-        if not result:
-            return None
-        return result
-
-    err_cfg = get_err_config(subset, superset)
-    if err_cfg:
-        err_msg = 'The provided configuration has unknown options or values with invalid type: '\
-                  + str(err_cfg)
-        LOG.error(err_msg)
-        raise Exception(err_msg)
+def copy_config(value):
+    """Copy a config or part of a config.
+
+    Much faster than copy.deepcopy() as a config only has dicts, lists and scalar values.
+    """
+    if isinstance(value, dict):
+        return {key: copy_config(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_config(item) for item in value]
+    return value
+
+
+class ConfigException(Exception):
+    pass
+
+
+class ConfigSchema(object):
+    """Schema of a config compiled from a reference config (usually the default config).
+
+    The schema has the type of every option of the reference config and the options allowed
+    in every section (dict). It is compiled once and then validates and merges configs in a
+    single pass over the overriding config.
+    Options that are None in the reference config and whitelisted options (e.g. extra_specs)
+    accept any value, whitelisted options are accepted in any section even if they are not
+    in the reference config.
+    """
+
+    def __init__(self, reference, whitelist_keys=None):
+        self.whitelist_keys = set(whitelist_keys or [])
+        self.options = self._compile(reference)
+
+    def _compile(self, section):
+        # every option is mapped to its type and the options of its section (None if not
+        # a section), or to None if the option accepts any value
+        options = {}
+        for key, value in section.items():
+            if key in self.whitelist_keys or value is None:
+                options[key] = None
+            else:
+                options[key] = (type(value),
+                                self._compile(value) if isinstance(value, dict) else None)
+        return options
+
+    def _merge(self, options, base, cfg, path, lenient, errors):
+        """Merge cfg into base, return the merged section and the invalid values of cfg.
+
+        options: the options of the section, None if the section accepts anything
+        path: path of the section in the config (used in error messages)
+        errors: list where to append the error messages
+        """
+        merged = {key: copy_config(value) for key, value in base.items() if key not in cfg}
+        err_cfg = {}
+        for key, value in cfg.items():
+            key_path = path + str(key)
+            option = None
+            if options is not None:
+                if key in options:
+                    option = options[key]
+                elif key in self.whitelist_keys:
+                    # whitelisted options are accepted even if not in the reference config
+                    pass
+                elif path or not lenient:
+                    errors.append(key_path + ': unknown option')
+                    err_cfg[key] = value
+                    continue
+            if option and value is not None and not isinstance(value, option[0]) and \
+                    (not lenient or option[1] is not None or isinstance(value, dict)):
+                errors.append('%s: invalid type %s (expected %s)' %
+                              (key_path, type(value).__name__, option[0].__name__))
+                err_cfg[key] = value
+                continue
+            base_value = base.get(key)
+            section = option[1] if option else None
+            if isinstance(value, dict) and (section is not None or isinstance(base_value, dict)):
+                if not isinstance(base_value, dict):
+                    base_value = {}
+                merged[key], section_err_cfg = self._merge(section, base_value, value,
+                                                           key_path + '.', lenient, errors)
+                if section_err_cfg:
+                    err_cfg[key] = section_err_cfg
+            else:
+                merged[key] = copy_config(value)
+        return merged, err_cfg
+
+    def _run(self, base, cfg, lenient):
+        errors = []
+        merged, err_cfg = self._merge(self.options, base, cfg, '', lenient, errors)
+        if errors:
+            err_msg = 'The provided configuration has unknown options or values with invalid ' \
+                      'type: %s (%s)' % (err_cfg, ', '.join(errors))
+            LOG.error(err_msg)
+            raise ConfigException(err_msg)
+        return AttrDict(merged)
+
+    def validate(self, cfg, lenient=False):
+        """Check a config against the schema.
+
+        lenient: if True, accept the options that are not in the reference config at the top
+                 level (run options such as frame_sizes) and values of another type than in
+                 the reference config (converted when the run config is prepared, e.g. a
+                 flow_count of '100k'), the options of sections are still checked and sections
+                 can still only be set to a dict
+        raise ConfigException with the path of every invalid option if the config is not valid
+        """
+        self._run({}, cfg, lenient)
+
+    def merge(self, base, cfg, lenient=False):
+        """Validate a config and merge it into a base config.
+
+        base: the config to override (with the same options as the reference config)
+        cfg: the overriding config (values in cfg take precedence)
+        lenient: see validate()
+        return: the merged config as an AttrDict, it shares no dict or list with base or cfg
+        raise ConfigException with the path of every invalid option if cfg is not valid
+        """
+        return self._run(base, cfg, lenient)
@@ -0,0 +1,163 @@
+# Copyright 2018 Cisco Systems, Inc.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""In-process event bus used to stream the progress of runs to REST clients.
+
+The runner publishes events through the notifier of the run (see RunNotifier), which is
+passed down to the chain manager, the traffic client and the stats collectors.
+Each run has its own channel of events that keeps the events already published, so that
+clients that subscribe late (or reconnect) get the whole history of the run.
+"""
+
+from collections import OrderedDict
+import json
+from threading import Condition
+import time
+
+
+class EventChannel(object):
+    """The events of one run."""
+
+    def __init__(self, max_events):
+        self.events = []
+        self.max_events = max_events
+        # sequence number of the next event (events are numbered from 1)
+        self.seq = 1
+        self.closed = False
+
+    def add(self, event, data):
+        self.events.append({'id': self.seq, 'event': event, 'time': time.time(), 'data': data})
+        self.seq += 1
+        if len(self.events) > self.max_events:
+            # drop the oldest interval stats first as they are the least useful
+            for index, old_event in enumerate(self.events):
+                if old_event['event'] == 'interval':
+                    del self.events[index]
+                    break
+            else:
+                del self.events[0]
+
+    def get_after(self, last_id):
+        return [event for event in self.events if event['id'] > last_id]
+
+
+class EventBus(object):
+    """Channels of events indexed by run ID.
+
+    All methods are thread safe: events are published by the thread running the benchmark
+    and consumed by the REST server threads.
+    """
+
+    def __init__(self, max_channels=20, max_events=1000):
+        """Create an event bus.
+
+        max_channels: maximum number of channels kept (the oldest closed channels are removed)
+        max_events: maximum number of events kept per channel
+        """
+        self.max_channels = max_channels
+        self.max_events = max_events
+        self.cond = Condition()
+        self.channels = OrderedDict()
+
+    def open(self, run_id):
+        """Create the channel of a run if it does not exist yet."""
+        with self.cond:
+            if run_id not in self.channels:
+                self.channels[run_id] = EventChannel(self.max_events)
+                closed = [cid for cid, channel in self.channels.items() if channel.closed]
+                for cid in closed[:max(0, len(self.channels) - self.max_channels)]:
+                    del self.channels[cid]
+
+    def has_channel(self, run_id):
+        with self.cond:
+            return run_id in self.channels
+
+    def publish(self, run_id, event, data=None):
+        """Publish an event to the channel of a run.
+
+        run_id: ID of the run (the channel is created if needed)
+        event: type of event
+        data: a JSON serializable dict
+        """
+        self.open(run_id)
+        with self.cond:
+            channel = self.channels.get(run_id)
+            if channel and not channel.closed:
+                channel.add(event, data or {})
+                self.cond.notify_all()
+
+    def close(self, run_id):
+        """Close the channel of a run: subscribers stop once they got all its events."""
+        with self.cond:
+            channel = self.channels.get(run_id)
+            if channel:
+                channel.closed = True
+                self.cond.notify_all()
+
+    def remove(self, run_id):
+        """Remove the channel of a run."""
+        with self.cond:
+            self.channels.pop(run_id, None)
+            self.cond.notify_all()
+
+    def subscribe(self, run_id, last_id=0, timeout=None):
+        """Get the events of a run as they are published.
+
+        run_id: ID of the run
+        last_id: ID of the last event already received (0 to get all events)
+        timeout: if not None, maximum time to wait for an event in seconds, None is
+                 yielded when no event is published within that time
+        return: a generator of events, each event is a dict with the keys id, event, time
+                and data, the generator ends when the channel is closed or removed
+        """
+        while True:
+            with self.cond:
+                channel = self.channels.get(run_id)
+                events = channel.get_after(last_id) if channel else []
+                if not events and channel and not channel.closed:
+                    self.cond.wait(timeout)
+                    channel = self.channels.get(run_id)
+                    events = channel.get_after(last_id) if channel else []
+                closed = channel is None or channel.closed
+            for event in events:
+                last_id = event['id']
+                yield event
+            if not events:
+                if closed:
+                    return
+                if timeout is not None:
+                    yield None
+
+
+def format_sse(event):
+    """Format an event as a server-sent event (or a keep alive comment if event is None)."""
+    if event is None:
+        return ': keep alive\n\n'
+    return 'id: %d\nevent: %s\ndata: %s\n\n' % (event['id'], event['event'],
+                                                 json.dumps(event['data'], sort_keys=True))
+
+
+class RunNotifier(object):
+    """The notifier of a run, publishes the events of the run to an event bus."""
+
+    def __init__(self, bus, run_id):
+        self.bus = bus
+        self.run_id = run_id
+
+    def send(self, event, **data):
+        """Publish an event of the run.
+
+        event: type of event (e.g. 'staging', 'arp', 'e2e', 'trial', 'interval')
+        data: the properties of the event (JSON serializable values)
+        """
+        self.bus.publish(self.run_id, event, data)
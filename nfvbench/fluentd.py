@@ -12,13 +12,196 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import deque
 import logging
+import socket
+from threading import Condition
+from threading import current_thread
+from threading import Thread
+import time
 
 from datetime import datetime
-from fluent import sender
+import msgpack
 import pytz
 
 
+class FluentShipper(object):
+    '''Ship records to a fluentd server from a background thread
+
+    Records are queued in a bounded in-memory queue so that the callers (the run thread
+    logging messages or sending results) never wait for the network. A background thread
+    sends the queued records in batches using the fluentd forward mode (one message per tag
+    with all the entries of the batch).
+    When the queue is full, new records are dropped (overflow policy 'drop') or the caller
+    waits up to block_timeout_sec for some room in the queue before dropping the record
+    (overflow policy 'block').
+    A batch that could not be sent is retried every retry_interval_sec until it is sent or
+    the shipper is closed, records queued meanwhile are subject to the overflow policy.
+    A record that cannot be serialized is replaced by an error record (as fluent-logger does)
+    and counted as an error.
+    '''
+
+    def __init__(self, host, port, queue_size=10000, batch_size=100, overflow='drop',
+                 block_timeout_sec=1.0, timeout_sec=3.0, retry_interval_sec=1.0):
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.overflow = overflow
+        self.block_timeout_sec = block_timeout_sec
+        self.timeout_sec = timeout_sec
+        self.retry_interval_sec = retry_interval_sec
+        self.cond = Condition()
+        self.queue = deque()
+        # number of records being sent by the background thread
+        self.in_flight = 0
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+        self.closing = False
+        self.thread = None
+        self.socket = None
+
+    def put(self, tag, record):
+        '''Queue a record for a tag, return False if the record was dropped
+        '''
+        with self.cond:
+            if self.closing:
+                self.dropped += 1
+                return False
+            if len(self.queue) >= self.queue_size and self.overflow == 'block' and \
+                    self.thread is not current_thread():
+                deadline = time.time() + self.block_timeout_sec
+                while len(self.queue) >= self.queue_size and not self.closing:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+            if len(self.queue) >= self.queue_size or self.closing:
+                self.dropped += 1
+                return False
+            self.queue.append((tag, int(time.time()), record))
+            if self.thread is None:
+                self.thread = Thread(target=self.__run, name='fluentd-%s:%d' % (self.host,
+                                                                                  self.port))
+                self.thread.daemon = True
+                self.thread.start()
+            self.cond.notify_all()
+            return True
+
+    def flush(self, timeout_sec):
+        '''Wait until all queued records are sent, return True if all records were sent
+        '''
+        deadline = time.time() + timeout_sec
+        with self.cond:
+            while self.queue or self.in_flight:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def close(self, timeout_sec):
+        '''Flush the queued records and stop the background thread
+        '''
+        self.flush(timeout_sec)
+        with self.cond:
+            self.closing = True
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join(self.timeout_sec)
+
+    def get_stats(self):
+        with self.cond:
+            return {'sent': self.sent,
+                    'dropped': self.dropped,
+                    'errors': self.errors,
+                    'pending': len(self.queue) + self.in_flight}
+
+    @staticmethod
+    def pack(batch):
+        '''Pack a batch of (tag, timestamp, record) in forward mode messages
+
+        Values of unsupported types are packed as strings and a record that still cannot be
+        packed (e.g. a recursive structure) is replaced by an error record.
+        return: the packed messages and the number of records that could not be packed
+        '''
+        packer = msgpack.Packer(default=str)
+        entries = {}
+        errors = 0
+        for tag, timestamp, record in batch:
+            try:
+                entry = packer.pack([timestamp, record])
+            except Exception as exc:
+                errors += 1
+                packer = msgpack.Packer(default=str)
+                entry = packer.pack([timestamp, {'level': 'CRITICAL',
+                                                 'message': "Can't output to log",
+                                                 'error': repr(exc)}])
+            entries.setdefault(tag, []).append(entry)
+        return b''.join(packer.pack_array_header(2) + packer.pack(tag) +
+                        packer.pack_array_header(len(tag_entries)) + b''.join(tag_entries)
+                        for tag, tag_entries in entries.items()), errors
+
+    def __send(self, data):
+        # reconnect once if the connection was closed by the server since the last batch
+        for attempt in range(2):
+            try:
+                if self.socket is None:
+                    self.socket = socket.create_connection((self.host, self.port),
+                                                           self.timeout_sec)
+                self.socket.sendall(data)
+                return True
+            except OSError:
+                self.__close_socket()
+                if attempt:
+                    return False
+        return False
+
+    def __close_socket(self):
+        if self.socket:
+            try:
+                self.socket.close()
+            except OSError:
+                pass
+            self.socket = None
+
+    def __run(self):
+        while True:
+            with self.cond:
+                while not self.queue and not self.closing:
+                    self.cond.wait()
+                if not self.queue:
+                    break
+                batch = [self.queue.popleft()
+                         for _ in range(min(self.batch_size, len(self.queue)))]
+                self.in_flight = len(batch)
+                # some room was made for blocked callers
+                self.cond.notify_all()
+            data, errors = self.pack(batch)
+            if errors:
+                with self.cond:
+                    self.errors += errors
+            while not self.__send(data):
+                with self.cond:
+                    self.errors += 1
+                    if not self.closing:
+                        self.cond.wait(self.retry_interval_sec)
+                    if self.closing:
+                        # give up on the records that cannot be sent
+                        self.dropped += self.in_flight + len(self.queue)
+                        self.queue.clear()
+                        self.in_flight = 0
+                        self.cond.notify_all()
+                        break
+            else:
+                with self.cond:
+                    self.sent += self.in_flight
+                    self.in_flight = 0
+                    self.cond.notify_all()
+        self.__close_socket()
+
+
 class FluentLogHandler(logging.Handler):
     '''This is a minimalist log handler for use with Fluentd
 
@@ -27,27 +210,38 @@ class FluentLogHandler(logging.Handler):
     - the formatted message (no timestamp and no level)
     - the level name
     - the runlogdate (to tie multiple run-related logs together)
-    The timestamp is retrieved by the fluentd library.
+    The timestamp is set when the record is queued.
+    Records are shipped asynchronously by one FluentShipper per fluentd server (see
+    fluentd_shipper in the default config) and flushed at the end of each run.
     There will be only one instance of FluentLogHandler running.
     '''
 
-    def __init__(self, fluentd_configs):
+    def __init__(self, fluentd_configs, shipper_config=None):
         logging.Handler.__init__(self)
         self.log_senders = []
         self.result_senders = []
+        self.shippers = {}
         self.runlogdate = "1970-01-01T00:00:00.000000+0000"
         self.formatter = logging.Formatter('%(message)s')
+        shipper_config = shipper_config or {}
+        self.flush_timeout_sec = shipper_config.get('flush_timeout_sec', 5)
+        shipper_args = {key: shipper_config[key]
+                        for key in ['queue_size', 'batch_size', 'overflow', 'block_timeout_sec']
+                        if shipper_config.get(key) is not None}
         for fluentd_config in fluentd_configs:
+            if fluentd_config.logging_tag or fluentd_config.result_tag:
+                key = (fluentd_config.ip, fluentd_config.port)
+                if key not in self.shippers:
+                    self.shippers[key] = FluentShipper(fluentd_config.ip, fluentd_config.port,
+                                                       **shipper_args)
             if fluentd_config.logging_tag:
-                self.log_senders.append(
-                    sender.FluentSender(fluentd_config.logging_tag, host=fluentd_config.ip,
-                                        port=fluentd_config.port))
+                self.log_senders.append((self.shippers[key], fluentd_config.logging_tag))
             if fluentd_config.result_tag:
-                self.result_senders.append(
-                    sender.FluentSender(fluentd_config.result_tag, host=fluentd_config.ip,
-                                        port=fluentd_config.port))
+                self.result_senders.append((self.shippers[key], fluentd_config.result_tag))
         self.__warning_counter = 0
         self.__error_counter = 0
+        # records dropped before the current run
+        self.__dropped_before_run = 0
 
     def start_new_run(self):
         '''Delimitate a new run in the stream of records with a new timestamp
@@ -55,6 +249,7 @@ class FluentLogHandler(logging.Handler):
         # reset counters
         self.__warning_counter = 0
         self.__error_counter = 0
+        self.__dropped_before_run = self.get_stats()['dropped']
         self.runlogdate = self.__get_timestamp()
         # send start record
         self.__send_start_record()
@@ -71,13 +266,38 @@ class FluentLogHandler(logging.Handler):
             data["runlogdate"] = self.runlogdate
 
         self.__update_stats(record.levelno)
-        for log_sender in self.log_senders:
-            log_sender.emit(None, data)
+        self.__send(self.log_senders, data)
 
     # this function is called by summarizer, and used for sending results
     def record_send(self, record):
-        for result_sender in self.result_senders:
-            result_sender.emit(None, record)
+        self.__send(self.result_senders, record)
+
+    @staticmethod
+    def __send(senders, record):
+        for shipper, tag in senders:
+            shipper.put(tag, record)
+
+    def flush(self):
+        '''Wait until all queued records are sent (up to flush_timeout_sec)
+        '''
+        deadline = time.time() + self.flush_timeout_sec
+        for shipper in self.shippers.values():
+            shipper.flush(max(0, deadline - time.time()))
+
+    def close(self):
+        deadline = time.time() + self.flush_timeout_sec
+        for shipper in self.shippers.values():
+            shipper.close(max(0, deadline - time.time()))
+        logging.Handler.close(self)
+
+    def get_stats(self):
+        '''Get the counters of records sent, dropped, failed batches and pending records
+        '''
+        stats = {'sent': 0, 'dropped': 0, 'errors': 0, 'pending': 0}
+        for shipper in self.shippers.values():
+            for key, value in shipper.get_stats().items():
+                stats[key] += value
+        return stats
 
     # send START log record for each run
     def __send_start_record(self):
@@ -90,26 +310,28 @@ class FluentLogHandler(logging.Handler):
             "numwarnings": 0,
             "@timestamp": self.__get_timestamp()
         }
-        for log_sender in self.log_senders:
-            log_sender.emit(None, data)
+        self.__send(self.log_senders, data)
 
     # send stats related to the current run and reset state for a new run
+    # all the records of the run are flushed to the fluentd servers
     def send_run_summary(self, run_summary_required):
         if run_summary_required or self.__get_highest_level() == logging.ERROR:
+            self.flush()
             data = {
                 "loglevel": "RUN_SUMMARY",
                 "message": self.__get_highest_level_desc(),
                 "numloglevel": self.__get_highest_level(),
                 "numerrors": self.__error_counter,
                 "numwarnings": self.__warning_counter,
+                "numdropped": self.get_stats()['dropped'] - self.__dropped_before_run,
                 "@timestamp": self.__get_timestamp()
             }
             # if runlogdate is Jan 1st 1970, it's a log from server (not an nfvbench run)
             # so don't send runlogdate
             if self.runlogdate != "1970-01-01T00:00:00.000000+0000":
                 data["runlogdate"] = self.runlogdate
-            for log_sender in self.log_senders:
-                log_sender.emit(None, data)
+            self.__send(self.log_senders, data)
+        self.flush()
 
     def __get_highest_level(self):
         if self.__error_counter > 0:
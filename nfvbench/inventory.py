@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# Copyright 2018 Cisco Systems, Inc.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+"""Indexed inventory of the OpenStack resources used to discover and reuse chains.
+
+Each kind of resource (networks, ports, servers, routers) is retrieved with a single
+list request the first time it is looked up and is then indexed in memory so that
+every lookup is a dict access.
+Resources created or deleted by nfvbench must be registered with the add/remove methods
+so that the inventory remains accurate without reloading.
+"""
+
+import threading
+
+from .log import LOG
+
+
+class ResourceInventory(object):
+    """A lazily loaded and indexed view of the neutron and nova resources.
+
+    All methods are thread safe since chains are staged concurrently.
+    """
+
+    def __init__(self, neutron_client, comp):
+        """Create an empty inventory.
+
+        neutron_client: the neutron client to load networks, ports and routers
+        comp: the Compute instance to load servers
+        """
+        self.neutron_client = neutron_client
+        self.comp = comp
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        """Forget all the loaded resources so that they are reloaded by the next lookup.
+
+        Needed when the inventory is kept across runs since other clients may have
+        changed the resources in between.
+        """
+        with self.lock:
+            self.networks = None
+            self.networks_by_name = {}
+            self.ports = None
+            self.ports_by_network = {}
+            self.ports_by_mac = {}
+            self.ports_by_device = {}
+            self.servers = None
+            self.servers_by_name = {}
+            self.routers = None
+            self.routers_by_name = {}
+
+    @staticmethod
+    def _index(index, key, resource_id, resource):
+        index.setdefault(key, {})[resource_id] = resource
+
+    @staticmethod
+    def _unindex(index, key, resource_id):
+        resources = index.get(key)
+        if resources is not None:
+            resources.pop(resource_id, None)
+            if not resources:
+                del index[key]
+
+    @staticmethod
+    def _first(index, key):
+        # when several resources share the same key, the first one loaded wins,
+        # as with a neutron lookup by name
+        return next(iter(index.get(key, {}).values()), None)
+
+    def _add_named(self, by_id, by_name, resource):
+        by_id[resource['id']] = resource
+        self._index(by_name, resource.get('name'), resource['id'], resource)
+
+    def _remove_named(self, by_id, by_name, resource_id):
+        resource = by_id.pop(resource_id, None)
+        if resource:
+            self._unindex(by_name, resource.get('name'), resource_id)
+
+    def _load_networks(self):
+        if self.networks is None:
+            self.networks = {}
+            for network in self.neutron_client.list_networks()['networks'] or []:
+                self._add_named(self.networks, self.networks_by_name, network)
+            LOG.info('Loaded %d networks', len(self.networks))
+
+    def get_network(self, name):
+        """Get the network with a given name.
+
+        return: the neutron network dict or None if not found
+        """
+        with self.lock:
+            self._load_networks()
+            return self._first(self.networks_by_name, name)
+
+    def add_network(self, network):
+        """Register a network created by nfvbench."""
+        with self.lock:
+            if self.networks is not None:
+                self._add_named(self.networks, self.networks_by_name, network)
+
+    def remove_network(self, network_id):
+        """Unregister a network deleted by nfvbench."""
+        with self.lock:
+            if self.networks is not None:
+                self._remove_named(self.networks, self.networks_by_name, network_id)
+
+    def _index_port(self, port):
+        port_id = port['id']
+        self.ports[port_id] = port
+        self._index(self.ports_by_network, port['network_id'], port_id, port)
+        if port.get('device_id'):
+            self._index(self.ports_by_device, port['device_id'], port_id, port)
+        self._index(self.ports_by_mac, port['mac_address'], port_id, port)
+
+    def _unindex_port(self, port_id):
+        port = self.ports.pop(port_id, None)
+        if port:
+            self._unindex(self.ports_by_network, port['network_id'], port_id)
+            self._unindex(self.ports_by_device, port.get('device_id'), port_id)
+            self._unindex(self.ports_by_mac, port['mac_address'], port_id)
+
+    def _load_ports(self):
+        """Load all ports.
+
+        Each port is a dict with fields such as below:
+        {'allowed_address_pairs': [], 'extra_dhcp_opts': [],
+         'updated_at': '2018-10-06T07:15:35Z', 'device_owner': 'compute:nova',
+         'revision_number': 10, 'port_security_enabled': False, 'binding:profile': {},
+         'fixed_ips': [{'subnet_id': '6903a3b3-49a1-4ba4-8259-4a90e7a44b21',
+         'ip_address': '192.168.1.4'}], 'id': '3dcb9cfa-d82a-4dd1-85a1-fd8284b52d72',
+         'security_groups': [],
+         'binding:vif_details': {'vhostuser_socket': '/tmp/3dcb9cfa-d82a-4dd1-85a1-fd8284b52d72',
+                                 'vhostuser_mode': 'server'},
+         'binding:vif_type': 'vhostuser',
+         'mac_address': 'fa:16:3e:3c:63:04',
+         'project_id': '977ac76a63d7492f927fa80e86baff4c',
+         'status': 'ACTIVE',
+         'binding:host_id': 'a20-champagne-compute-1',
+         'description': '',
+         'device_id': 'a98e2ad2-5371-4aa5-a356-8264a970ce4b',
+         'name': 'nfvbench-loop-vm0-0', 'admin_state_up': True,
+         'network_id': '3ea5fd88-278f-4d9d-b24d-1e443791a055',
+         'tenant_id': '977ac76a63d7492f927fa80e86baff4c',
+         'created_at': '2018-10-06T07:15:10Z',
+         'binding:vnic_type': 'normal'}
+        """
+        if self.ports is None:
+            LOG.info('Loading list of all ports...')
+            self.ports = {}
+            for port in self.neutron_client.list_ports()['ports']:
+                self._index_port(port)
+            LOG.info("Loaded %d ports attached to %d networks",
+                     len(self.ports), len(self.ports_by_network))
+
+    def get_network_ports(self, network_id):
+        """Get the list of ports attached to a network."""
+        with self.lock:
+            self._load_ports()
+            return list(self.ports_by_network.get(network_id, {}).values())
+
+    def get_device_ports(self, device_id):
+        """Get the list of ports owned by a device (instance or router)."""
+        with self.lock:
+            self._load_ports()
+            return list(self.ports_by_device.get(device_id, {}).values())
+
+    def get_port_by_mac(self, mac):
+        """Get the port that has a given MAC address or None if not found."""
+        with self.lock:
+            self._load_ports()
+            return self._first(self.ports_by_mac, mac)
+
+    def add_port(self, port):
+        """Register a port created by nfvbench."""
+        with self.lock:
+            if self.ports is not None:
+                self._index_port(port)
+
+    def remove_port(self, port_id):
+        """Unregister a port deleted by nfvbench."""
+        with self.lock:
+            if self.ports is not None:
+                self._unindex_port(port_id)
+
+    def refresh_device_ports(self, device_id):
+        """Reload the ports of one device.
+
+        Needed when neutron creates ports on behalf of nfvbench (e.g. router interfaces).
+        return: the list of ports owned by the device
+        """
+        ports = self.neutron_client.list_ports(device_id=device_id)['ports']
+        with self.lock:
+            if self.ports is not None:
+                for port_id in list(self.ports_by_device.get(device_id, {})):
+                    self._unindex_port(port_id)
+                for port in ports:
+                    self._index_port(port)
+        return ports
+
+    def refresh_ports(self, port_ids):
+        """Reload some ports.
+
+        Needed for the ports created by nfvbench since their device_id and binding:host_id
+        are only set once the instance that uses them is active.
+        return: the list of reloaded ports
+        """
+        ports = []
+        # stay below the maximum URL length of the neutron API
+        for index in range(0, len(port_ids), 100):
+            ports.extend(self.neutron_client.list_ports(id=port_ids[index:index + 100])['ports'])
+        with self.lock:
+            if self.ports is not None:
+                for port in ports:
+                    self._unindex_port(port['id'])
+                    self._index_port(port)
+        return ports
+
+    def _load_servers(self):
+        if self.servers is None:
+            self.servers = {}
+            for server in self.comp.get_server_list():
+                self.servers[server.id] = server
+                self._index(self.servers_by_name, server.name, server.id, server)
+            LOG.info('Loaded %d instances', len(self.servers))
+
+    def get_server(self, name):
+        """Get the nova server with a given name or None if not found."""
+        with self.lock:
+            self._load_servers()
+            return self._first(self.servers_by_name, name)
+
+    def add_server(self, server):
+        """Register a server created by nfvbench."""
+        with self.lock:
+            if self.servers is not None:
+                self.servers[server.id] = server
+                self._index(self.servers_by_name, server.name, server.id, server)
+
+    def remove_server(self, server):
+        """Unregister a server deleted by nfvbench."""
+        with self.lock:
+            if self.servers is not None:
+                self.servers.pop(server.id, None)
+                self._unindex(self.servers_by_name, server.name, server.id)
+
+    def _load_routers(self):
+        if self.routers is None:
+            self.routers = {}
+            for router in self.neutron_client.list_routers()['routers']:
+                self._add_named(self.routers, self.routers_by_name, router)
+            LOG.info('Loaded %d routers', len(self.routers))
+
+    def get_router(self, name):
+        """Get the router with a given name or None if not found."""
+        with self.lock:
+            self._load_routers()
+            return self._first(self.routers_by_name, name)
+
+    def add_router(self, router):
+        """Register a router created by nfvbench."""
+        with self.lock:
+            if self.routers is not None:
+                self._add_named(self.routers, self.routers_by_name, router)
+
+    def remove_router(self, router_id):
+        """Unregister a router deleted by nfvbench."""
+        with self.lock:
+            if self.routers is not None:
+                self._remove_named(self.routers, self.routers_by_name, router_id)
+            if self.ports is not None:
+                for port_id in list(self.ports_by_device.get(router_id, {})):
+                    self._unindex_port(port_id)
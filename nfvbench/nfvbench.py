@@ -20,31 +20,45 @@ import datetime
 import importlib
 import json
 import os
+import sqlite3
 import sys
 import traceback
+from urllib.parse import parse_qsl
 
 from attrdict import AttrDict
 from logging import FileHandler
 import pbr.version
-from pkg_resources import resource_string
 
-from .__init__ import __version__
-from .chain_runner import ChainRunner
-from .cleanup import Cleaner
 from .config import config_load
 from .config import config_loads
-from . import credentials
+from .config import ConfigSchema
 from .fluentd import FluentLogHandler
 from . import log
 from .log import LOG
-from .nfvbenchd import WebServer
+from .regression import RegressionAnalyzer
+from .result_store import ResultStore
 from .specs import ChainType
 from .specs import Specs
-from .summarizer import NFVBenchSummarizer
+from .traffic_gen.traffic_utils import PCAP_L2_FRAME_SIZE
+from .traffic_server import TREX_LOG_PATH
 from . import utils
 
+# these modules import the openstack clients, the TRex client, scapy or flask which take
+# seconds to load: they are only loaded when first used so that the commands that do not
+# need them (--version, --summary, --show-default-config...) start quickly
+chain_runner = utils.lazy_import('nfvbench.chain_runner')
+chaining = utils.lazy_import('nfvbench.chaining')
+credentials = utils.lazy_import('nfvbench.credentials')
+nfvbenchd = utils.lazy_import('nfvbench.nfvbenchd')
+summarizer = utils.lazy_import('nfvbench.summarizer')
+traffic_client = utils.lazy_import('nfvbench.traffic_client')
+
 fluent_logger = None
 
+# do not check extra_specs in flavor as it can contain any key/value pairs
+# the same principle applies also to the optional user_info open property
+WHITELIST_KEYS = ['extra_specs', 'user_info']
+
 
 class NFVBench(object):
     """Main class of NFV benchmarking tool."""
@@ -55,6 +69,8 @@ class NFVBench(object):
     def __init__(self, config, openstack_spec, config_plugin, factory, notifier=None):
         # the base config never changes for a given NFVbench instance
         self.base_config = config
+        # compiled once to validate and merge the options of every run
+        self.config_schema = ConfigSchema(config, WHITELIST_KEYS)
         # this is the running config, updated at every run()
         self.config = None
         self.config_plugin = config_plugin
@@ -62,7 +78,12 @@ class NFVBench(object):
         self.notifier = notifier
         self.cred = credentials.Credentials(config.openrc_file, config.clouds_detail, None, False) \
             if config.openrc_file or config.clouds_detail else None
+        self.result_store = ResultStore(config.result_store) if config.result_store else None
+        self.regression_analyzer = RegressionAnalyzer(config.regression, self.result_store) \
+            if config.regression.enabled else None
         self.chain_runner = None
+        # set to cancel the current run (REST server mode)
+        self.cancel_requested = False
         self.specs = Specs()
         self.specs.set_openstack_spec(openstack_spec)
         self.vni_ports = []
@@ -71,6 +92,17 @@ class NFVBench(object):
     def set_notifier(self, notifier):
         self.notifier = notifier
 
+    def cancel(self):
+        """Cancel the current run.
+
+        Can be called from any thread: the traffic is stopped and the run aborted by the
+        thread that runs the traffic at the next stats interval.
+        """
+        self.cancel_requested = True
+        runner = self.chain_runner
+        if runner:
+            runner.traffic_client.request_cancel()
+
     def run(self, opts, args, dry_run=False):
         """This run() method is called for every NFVbench benchmark request.
 
@@ -86,12 +118,18 @@ class NFVBench(object):
             # so that all subsequent logs can relate to this run
             fluent_logger.start_new_run()
         LOG.info(args)
+        # make sure the chain runner of a previous run is not closed again if this run fails early
+        self.chain_runner = None
         try:
             # recalc the running config based on the base config and options for this run
             self._update_config(opts)
 
             if dry_run:
-                print((json.dumps(self.config, sort_keys=True, indent=4)))
+                if opts.get('show_flow_plan'):
+                    flow_plans = traffic_client.GeneratorConfig(self.config).get_flow_plans()
+                    print((json.dumps(flow_plans, indent=4)))
+                else:
+                    print((json.dumps(self.config, sort_keys=True, indent=4)))
                 sys.exit(0)
 
             # check that an empty openrc file (no OpenStack) is only allowed
@@ -103,11 +141,13 @@ class NFVBench(object):
 
             self.specs.set_run_spec(self.config_plugin.get_run_spec(self.config,
                                                                     self.specs.openstack))
-            self.chain_runner = ChainRunner(self.config,
-                                            self.cred,
-                                            self.specs,
-                                            self.factory,
-                                            self.notifier)
+            self.chain_runner = chain_runner.ChainRunner(self.config,
+                                                         self.cred,
+                                                         self.specs,
+                                                         self.factory,
+                                                         self.notifier)
+            if self.cancel_requested:
+                self.chain_runner.traffic_client.request_cancel()
             new_frame_sizes = []
             # make sure that the min frame size is 64
             min_packet_size = 64
@@ -122,6 +162,7 @@ class NFVBench(object):
                 except ValueError:
                     new_frame_sizes.append(frame_size.upper())
             self.config.frame_sizes = new_frame_sizes
+            from . import __version__
             result = {
                 "date": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 "nfvbench_version": __version__,
@@ -137,6 +178,8 @@ class NFVBench(object):
                 result['openstack_spec'] = {"vswitch": self.specs.openstack.vswitch,
                                             "encaps": self.specs.openstack.encaps}
             result['benchmarks']['network']['versions'].update(self.config_plugin.get_version())
+            if self.regression_analyzer:
+                result['regression'] = self.regression_analyzer.analyze(result)
         except Exception:
             status = NFVBench.STATUS_ERROR
             message = traceback.format_exc()
@@ -161,11 +204,14 @@ class NFVBench(object):
     def prepare_summary(self, result):
         """Prepare summary of the result to print and send it to logger (eg: fluentd)."""
         global fluent_logger
-        summary = NFVBenchSummarizer(result, fluent_logger)
+        summary = summarizer.NFVBenchSummarizer(result, fluent_logger)
         LOG.info(str(summary))
 
-    def save(self, result):
-        """Save results in json format file."""
+    def save(self, result, request_id=None):
+        """Save results in json format file and in the result store.
+
+        request_id: the request_id of the run in REST server mode
+        """
         utils.save_json_result(result,
                                self.config.json_file,
                                self.config.std_json_path,
@@ -175,13 +221,19 @@ class NFVBench(object):
                                self.config.frame_sizes,
                                self.config.user_id,
                                self.config.group_id)
+        if self.result_store:
+            try:
+                self.result_store.add(result, request_id)
+            except sqlite3.Error as exc:
+                LOG.error('Cannot store result in %s: %s', self.result_store.pathname, exc)
 
     def _update_config(self, opts):
         """Recalculate the running config based on the base config and opts.
 
         Sanity check on the config is done here as well.
         """
-        self.config = AttrDict(dict(self.base_config))
+        # the running config is a new copy of the base config, runs can modify it freely
+        self.config = self.config_schema.merge(self.base_config, opts, lenient=True)
         # Update log file handler if needed after a config update (REST mode)
         if 'log_file' in opts:
             if opts['log_file']:
@@ -201,7 +253,6 @@ class NFVBench(object):
                             log.getLogger().removeHandler(h)
                             log.add_file_logger(opts['log_file'])
 
-        self.config.update(opts)
         config = self.config
 
         config.service_chain = config.service_chain.upper()
@@ -268,6 +319,15 @@ class NFVBench(object):
                           'pdr' in config.rate.strip().lower().split('_'))
         config.single_run = (not config.no_traffic and
                              not (config.ndr_run or config.pdr_run))
+        if config.stateful.enabled:
+            # the stateful search replaces the NDR/PDR and single rate runs
+            config.ndr_run = False
+            config.pdr_run = False
+            config.single_run = False
+        if config.traffic_pattern.burst_search and \
+                (not config.single_run or config.traffic_pattern.type != 'burst'):
+            raise Exception('traffic_pattern.burst_search requires a fixed rate and the burst '
+                            'traffic pattern type')
 
         config.json_file = config.json if config.json else None
         if config.json_file:
@@ -282,6 +342,13 @@ class NFVBench(object):
                 raise Exception('Please provide existing path for storing results in JSON file. '
                                 'Path used: {path}'.format(path=config.std_json_path))
 
+        if not 1 <= config.latency_stream_count <= 16:
+            raise Exception('latency_stream_count (%d) must be in [1..16]' %
+                            config.latency_stream_count)
+        if config.latency_pps < config.latency_stream_count:
+            raise Exception('latency_pps (%d) must be at least 1 pps per latency stream' %
+                            config.latency_pps)
+
         # Check that multiqueue is between 1 and 8 (8 is the max allowed by libvirt/qemu)
         if config.vif_multiqueue_size < 1 or config.vif_multiqueue_size > 8:
             raise Exception('vif_multiqueue_size (%d) must be in [1..8]' %
@@ -366,6 +433,12 @@ def _parse_opts_from_cli():
                         help='Specify rate in pps, bps or %% as total for all directions',
                         metavar='<rate>')
 
+    parser.add_argument('--stateful', dest='stateful',
+                        default=None,
+                        action='store_true',
+                        help='Run a stateful TCP benchmark (max connections per second '
+                             'using TRex ASTF) instead of NDR/PDR or single rate runs')
+
     parser.add_argument('--duration', dest='duration_sec',
                         action='store',
                         help='Set duration to run traffic generator (in seconds)',
@@ -476,6 +549,25 @@ def _parse_opts_from_cli():
                              '-<packet-sizes>.json',
                         metavar='<path>')
 
+    parser.add_argument('--result-store', dest='result_store',
+                        action='store',
+                        help='store results in a SQLite database to query them with --query',
+                        metavar='<path>/<filename>')
+
+    parser.add_argument('--query', dest='query',
+                        action='store',
+                        help='print the results from the result store matching a query in json '
+                             'format (e.g. "service_chain=PVP&frame_size=64&type=ndr" or '
+                             '"frame_size=64&group_by=day&metric=rate_pps")',
+                        metavar='<query>')
+
+    parser.add_argument('--check-regression', dest='check_regression',
+                        action='store',
+                        help='check a result json file for regressions against the previous '
+                             'comparable results (see regression in the config) and print '
+                             'its summary',
+                        metavar='<json_result_file>')
+
     parser.add_argument('--show-default-config', dest='show_default_config',
                         default=None,
                         action='store_true',
@@ -491,6 +583,12 @@ def _parse_opts_from_cli():
                         action='store_true',
                         help='print the running config in json format (final)')
 
+    parser.add_argument('--show-flow-plan', dest='show_flow_plan',
+                        default=None,
+                        action='store_true',
+                        help='print the IP and UDP ranges of all chains in json format '
+                             '(without running any traffic)')
+
     parser.add_argument('-ss', '--show-summary', dest='summary',
                         action='store',
                         help='Show summary from nfvbench json file',
@@ -504,7 +602,13 @@ def _parse_opts_from_cli():
     parser.add_argument('-fs', '--frame-size', dest='frame_sizes',
                         action='append',
                         help='Override traffic profile frame sizes',
-                        metavar='<frame_size_bytes or IMIX>')
+                        metavar='<frame_size_bytes, IMIX or PCAP>')
+
+    parser.add_argument('--pcap', dest='pcap_file',
+                        action='store',
+                        help='Replay the frames of a pcap file (frame size PCAP), '
+                             'implies --frame-size PCAP if no frame size is given',
+                        metavar='<pcap_file>')
 
     parser.add_argument('--unidir', dest='unidir',
                         action='store_true',
@@ -602,6 +706,22 @@ def _parse_opts_from_cli():
                         default=None,
                         help='Disable latency measurements (no streams)')
 
+    parser.add_argument('--latency-pps', dest='latency_pps',
+                        type=int_arg,
+                        metavar='<pps>',
+                        action='store',
+                        default=None,
+                        help='Total rate of the latency streams per chain and direction '
+                             '(default: 1000)')
+
+    parser.add_argument('--latency-streams', dest='latency_stream_count',
+                        type=int_arg,
+                        metavar='<count>',
+                        action='store',
+                        default=None,
+                        help='Number of latency streams per chain and direction, spread across '
+                             'the flows of the chain (default: 1)')
+
     parser.add_argument('--user-id', dest='user_id',
                         type=int_arg,
                         metavar='<uid>',
@@ -636,7 +756,8 @@ def _parse_opts_from_cli():
 
 
 def load_default_config():
-    default_cfg = resource_string(__name__, "cfg.default.yaml")
+    with open(os.path.join(os.path.dirname(__file__), "cfg.default.yaml"), 'rb') as cfg_file:
+        default_cfg = cfg_file.read()
     config = config_loads(default_cfg)
     config.name = '(built-in default config)'
     return config, default_cfg
@@ -682,6 +803,7 @@ def status_cleanup(config, cleanup, force_cleanup):
         ret_code = 1
     # check nfvbench resources
     if config.openrc_file and config.service_chain != ChainType.EXT:
+        from .cleanup import Cleaner
         cleaner = Cleaner(config)
         count = cleaner.show_resources()
         if count and (cleanup or force_cleanup):
@@ -723,9 +845,11 @@ def main():
         if opts.summary:
             with open(opts.summary, encoding="utf-8") as json_data:
                 result = json.load(json_data)
+                # the summarizer needs attribute access to the config
+                result['config'] = AttrDict(result['config'])
                 if opts.user_label:
                     result['config']['user_label'] = opts.user_label
-                print((NFVBenchSummarizer(result, fluent_logger)))
+                print((summarizer.NFVBenchSummarizer(result, fluent_logger)))
             sys.exit(0)
 
         # show default config in text/yaml format
@@ -736,30 +860,27 @@ def main():
         # dump the contents of the trex log file
         if opts.show_trex_log:
             try:
-                with open('/tmp/trex.log', encoding="utf-8") as trex_log_file:
+                with open(TREX_LOG_PATH, encoding="utf-8") as trex_log_file:
                     print(trex_log_file.read(), end="")
             except FileNotFoundError:
                 print("No TRex log file found!")
             sys.exit(0)
 
         # mask info logging in case of further config dump
-        if opts.show_config or opts.show_pre_config:
+        if opts.show_config or opts.show_pre_config or opts.show_flow_plan:
             LOG.setLevel(log.logging.WARNING)
 
         config.name = ''
         if opts.config:
-            # do not check extra_specs in flavor as it can contain any key/value pairs
-            # the same principle applies also to the optional user_info open property
-            whitelist_keys = ['extra_specs', 'user_info']
             # override default config options with start config at path parsed from CLI
             # check if it is an inline yaml/json config or a file name
             if os.path.isfile(opts.config):
                 LOG.info('Loading configuration file: %s', opts.config)
-                config = config_load(opts.config, config, whitelist_keys)
+                config = config_load(opts.config, config, WHITELIST_KEYS)
                 config.name = os.path.basename(opts.config)
             else:
                 LOG.info('Loading configuration string: %s', opts.config)
-                config = config_loads(opts.config, config, whitelist_keys)
+                config = config_loads(opts.config, config, WHITELIST_KEYS)
 
         # show current config in json format (before CLI overriding)
         if opts.show_pre_config:
@@ -770,11 +891,13 @@ def main():
         # if there is any logging or result tag is set then initialize the fluent logger
         for fluentd in config.fluentd:
             if fluentd.logging_tag or fluentd.result_tag:
-                fluent_logger = FluentLogHandler(config.fluentd)
+                fluent_logger = FluentLogHandler(config.fluentd, config.fluentd_shipper)
                 LOG.addHandler(fluent_logger)
                 break
 
         # traffic profile override options
+        if opts.pcap_file is not None and opts.frame_sizes is None:
+            opts.frame_sizes = [PCAP_L2_FRAME_SIZE]
         override_custom_traffic(config, opts.frame_sizes, opts.unidir)
 
         # Copy over some of the cli options that are used in config.
@@ -791,9 +914,15 @@ def main():
         if opts.sriov is not None:
             config.sriov = True
             opts.sriov = None
+        if opts.stateful is not None:
+            config.stateful = dict(config.stateful, enabled=True)
+            opts.stateful = None
         if opts.log_file is not None:
             config.log_file = opts.log_file
             opts.log_file = None
+        if opts.result_store is not None:
+            config.result_store = opts.result_store
+            opts.result_store = None
         if opts.user_id is not None:
             config.user_id = opts.user_id
             opts.user_id = None
@@ -911,6 +1040,23 @@ def main():
         if opts.status or opts.cleanup or opts.force_cleanup:
             status_cleanup(config, opts.cleanup, opts.force_cleanup)
 
+        if opts.query is not None:
+            if not config.result_store or not os.path.isfile(config.result_store):
+                raise Exception('--query requires an existing result store (see --result-store)')
+            result_store = ResultStore(config.result_store)
+            print(json.dumps(result_store.query(dict(parse_qsl(opts.query))), indent=4))
+            sys.exit(0)
+
+        if opts.check_regression:
+            with open(opts.check_regression, encoding="utf-8") as json_data:
+                result = json.load(json_data)
+            result['config'] = AttrDict(result['config'])
+            result_store = ResultStore(config.result_store) if config.result_store else None
+            result['regression'] = RegressionAnalyzer(config.regression,
+                                                      result_store).analyze(result)
+            print((summarizer.NFVBenchSummarizer(result, fluent_logger)))
+            sys.exit(1 if result['regression']['regressions'] else 0)
+
         # add file log if requested
         if config.log_file:
             log.add_file_logger(config.log_file)
@@ -925,19 +1071,28 @@ def main():
         openstack_spec = config_plugin.get_openstack_spec() if config.openrc_file \
             else None
 
+        # a single run is done in CLI mode, no need to keep TRex or the chains warm
+        if not opts.server:
+            config.trex_keep_warm = False
+            config.chain_pool_idle_sec = 0
+
         nfvbench_instance = NFVBench(config, openstack_spec, config_plugin, factory)
 
         if opts.server:
-            server = WebServer(nfvbench_instance, fluent_logger)
+            server = nfvbenchd.WebServer(nfvbench_instance, fluent_logger)
             try:
-                port = int(opts.port)
-            except ValueError:
-                server.run(host=opts.host)
-            else:
-                server.run(host=opts.host, port=port)
-            # server.run() should never return
+                try:
+                    port = int(opts.port)
+                except ValueError:
+                    server.run(host=opts.host)
+                else:
+                    server.run(host=opts.host, port=port)
+                # server.run() should never return
+            finally:
+                # delete the chains kept for the next run
+                chaining.CHAIN_POOL.evict()
         else:
-            dry_run = opts.show_config
+            dry_run = opts.show_config or opts.show_flow_plan
             with utils.RunLock():
                 run_summary_required = True
                 if unknown_opts:
@@ -15,14 +15,23 @@
 #
 
 import json
-import queue
+import os
+from threading import Condition
 from threading import Thread
+import time
 import uuid
 
 from flask import Flask
 from flask import jsonify
 from flask import request
-
+from flask import Response
+
+from .chaining import ChainPool
+from .config import ConfigException
+from .events import EventBus
+from .events import format_sse
+from .events import RunNotifier
+from .result_store import ResultStoreException
 from .summarizer import NFVBenchSummarizer
 
 from .log import LOG
@@ -54,74 +63,305 @@ def get_uuid():
     return uuid.uuid4().hex
 
 
-class Ctx(object):
-    MAXLEN = 5
-    run_queue = queue.Queue()
-    busy = False
-    result = None
-    results = {}
-    ids = []
-    current_id = None
-
-    @staticmethod
-    def enqueue(config, request_id):
-        Ctx.busy = True
-        config['request_id'] = request_id
-        Ctx.run_queue.put(config)
-
-        if len(Ctx.ids) >= Ctx.MAXLEN:
-            try:
-                del Ctx.results[Ctx.ids.pop(0)]
-            except KeyError:
-                pass
-        Ctx.ids.append(request_id)
-
-    @staticmethod
-    def dequeue():
-        config = Ctx.run_queue.get()
-        Ctx.current_id = config['request_id']
-        return config
+class JobQueueException(Exception):
+    """Exception for job queue requests that cannot be satisfied."""
+
+
+class Job(object):
+    """A run request submitted to the REST server."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    COMPLETED_STATES = [DONE, FAILED, CANCELLED]
+
+    def __init__(self, job_id, config, priority=0, seq=0):
+        """Create a queued job.
+
+        job_id: unique ID of the job (also the request_id of the run result)
+        config: the config overrides of the run
+        priority: jobs with a higher priority are run first
+        seq: submission order of the job
+        """
+        self.id = job_id
+        self.config = config
+        self.priority = priority
+        self.seq = seq
+        self.state = Job.QUEUED
+        self.submitted = time.time()
+        self.started = None
+        self.ended = None
+        self.cancel_requested = False
+        self.result = None
+        # jobs with the same key can reuse the chains of each other (set by the job queue)
+        self.staging_key = None
+
+    def is_completed(self):
+        return self.state in Job.COMPLETED_STATES
+
+    def get_summary(self):
+        """Get the job properties returned by the jobs REST requests."""
+        return {'request_id': self.id,
+                'state': self.state,
+                'priority': self.priority,
+                'submitted': self.submitted,
+                'started': self.started,
+                'ended': self.ended}
+
+    def to_dict(self):
+        job = self.get_summary()
+        job.update({'seq': self.seq, 'config': self.config, 'result': self.result})
+        return job
 
     @staticmethod
-    def release():
-        Ctx.current_id = None
-        Ctx.busy = False
+    def from_dict(job_dict):
+        job = Job(job_dict['request_id'], job_dict['config'], job_dict['priority'],
+                  job_dict['seq'])
+        for name in ['state', 'submitted', 'started', 'ended', 'result']:
+            setattr(job, name, job_dict[name])
+        return job
+
+
+class JobQueue(object):
+    """A bounded priority queue of run requests with the state of the recent jobs.
+
+    Queued jobs are run by order of priority then submission, except that among the
+    jobs of the highest priority, the ones requiring the same chain setup as the last
+    run job are run first so that they can reuse its chains.
+    Completed jobs (done, failed or cancelled) are kept with their result until the
+    retention count is reached.
+    If a file is configured, the jobs are saved to that file at every change and reloaded
+    when the queue is created: jobs that were running when the server stopped are queued again.
+    If an event bus is provided, every job has a channel of events where the changes of state
+    of the job are published, the channel is closed when the job completes.
+    """
 
-    @staticmethod
-    def set_result(res):
-        res['request_id'] = Ctx.current_id
-        Ctx.results[Ctx.current_id] = res
-        Ctx.result = res
+    def __init__(self, max_queued, retention, pathname=None, events=None, get_staging_key=None):
+        """Create a job queue.
+
+        max_queued: maximum number of queued jobs
+        retention: maximum number of completed jobs kept
+        pathname: pathname of the file where jobs are saved or None
+        events: the EventBus where job events are published or None
+        get_staging_key: function that returns the chain setup key of the config overrides
+                         of a job, by default the key of the overrides (see ChainPool.get_key())
+        """
+        self.max_queued = max_queued
+        self.retention = retention
+        self.pathname = pathname
+        self.events = events
+        self.get_staging_key = get_staging_key or ChainPool.get_key
+        self.cond = Condition()
+        # all jobs indexed by ID, in submission order
+        self.jobs = {}
+        self.seq = 0
+        self.running = None
+        self.last_staging_key = None
+        # the last completed job, if its result was not fetched yet
+        self.unfetched = None
+        # called with the job as argument to cancel a running job
+        self.cancel_running = None
+        self._load()
+
+    def _load(self):
+        if not self.pathname or not os.path.isfile(self.pathname):
+            return
+        try:
+            with open(self.pathname, encoding="utf-8") as jobs_file:
+                jobs = [Job.from_dict(job) for job in json.load(jobs_file)]
+        except (IOError, ValueError, KeyError) as exc:
+            LOG.warning('Ignoring invalid job queue file %s: %s', self.pathname, exc)
+            return
+        for job in sorted(jobs, key=lambda job: job.seq):
+            if job.state == Job.RUNNING:
+                job.state = Job.QUEUED
+                job.started = None
+            job.staging_key = self.get_staging_key(job.config)
+            self.jobs[job.id] = job
+            self.seq = max(self.seq, job.seq + 1)
+            if not job.is_completed():
+                self._publish(job)
+        LOG.info('Loaded %d queued jobs from %s', len(self.get_queued()), self.pathname)
+
+    def _publish(self, job, event='state', **data):
+        if self.events:
+            if event == 'state':
+                data['state'] = job.state
+            self.events.publish(job.id, event, data)
+            if job.is_completed():
+                self.events.close(job.id)
+
+    def _save(self):
+        if not self.pathname:
+            return
+        tmp_pathname = self.pathname + '.tmp'
+        try:
+            with open(tmp_pathname, 'w', encoding="utf-8") as jobs_file:
+                json.dump([job.to_dict() for job in self.jobs.values()], jobs_file)
+            os.rename(tmp_pathname, self.pathname)
+        except IOError as exc:
+            LOG.error('Cannot save job queue to %s: %s', self.pathname, exc)
+
+    def get_queued(self):
+        """Get the queued jobs by order of submission."""
+        return [job for job in self.jobs.values() if job.state == Job.QUEUED]
 
     @staticmethod
-    def get_result(request_id=None):
-        if request_id:
-            try:
-                res = Ctx.results[request_id]
-            except KeyError:
+    def _get_next(queued, last_staging_key):
+        if not queued:
+            return None
+        priority = max(job.priority for job in queued)
+        candidates = [job for job in queued if job.priority == priority]
+        for job in candidates:
+            if job.staging_key == last_staging_key:
+                return job
+        return candidates[0]
+
+    def _purge(self):
+        completed = sorted([job for job in self.jobs.values() if job.is_completed()],
+                           key=lambda job: job.ended)
+        for job in completed[:max(0, len(completed) - self.retention)]:
+            del self.jobs[job.id]
+            if job is self.unfetched:
+                self.unfetched = None
+            if self.events:
+                self.events.remove(job.id)
+
+    def submit(self, config, priority=0):
+        """Queue a new job.
+
+        config: the config overrides of the run
+        priority: priority of the job (higher runs first)
+        return: the queued job
+        raise: JobQueueException if the queue is full
+        """
+        with self.cond:
+            if len(self.get_queued()) >= self.max_queued:
+                raise JobQueueException('the run queue is full (%d jobs)' % self.max_queued)
+            job = Job(get_uuid(), config, priority, self.seq)
+            job.staging_key = self.get_staging_key(config)
+            self.seq += 1
+            self.jobs[job.id] = job
+            self._publish(job, priority=priority)
+            self._save()
+            self.cond.notify()
+        LOG.info('Queued job %s (priority %d)', job.id, priority)
+        return job
+
+    def get(self):
+        """Wait for the next job to run and mark it as running.
+
+        return: the job to run
+        """
+        with self.cond:
+            job = self._get_next(self.get_queued(), self.last_staging_key)
+            while job is None:
+                self.cond.wait()
+                job = self._get_next(self.get_queued(), self.last_staging_key)
+            job.state = Job.RUNNING
+            job.started = time.time()
+            self.running = job
+            self.last_staging_key = job.staging_key
+            self._publish(job)
+            self._save()
+        return job
+
+    def complete(self, job, result):
+        """Record the result of a job that has run.
+
+        job: the job returned by get()
+        result: the result returned by the runner
+        """
+        with self.cond:
+            if job.cancel_requested:
+                job.state = Job.CANCELLED
+            elif result.get('status') == STATUS_OK:
+                job.state = Job.DONE
+            else:
+                job.state = Job.FAILED
+            result['request_id'] = job.id
+            job.result = result
+            job.ended = time.time()
+            self.running = None
+            self.unfetched = job
+            self._publish(job, status=result.get('status'),
+                          error_message=result.get('error_message'))
+            self._purge()
+            self._save()
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job.
+
+        A running job is cancelled asynchronously: its state changes when the run ends.
+        job_id: ID of the job to cancel
+        return: the cancelled job or None if not found
+        raise: JobQueueException if the job is already completed
+        """
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None:
                 return None
-            # pylint: disable=unsubscriptable-object
-            if Ctx.result and request_id == Ctx.result['request_id']:
-                Ctx.result = None
-            return res
-            # pylint: enable=unsubscriptable-object
-        res = Ctx.result
-        if res:
-            Ctx.result = None
-        return res
-
-    @staticmethod
-    def is_busy():
-        return Ctx.busy
-
-    @staticmethod
-    def get_current_request_id():
-        return Ctx.current_id
-
-
-def setup_flask():
+            if job.is_completed():
+                raise JobQueueException('job %s is already %s' % (job_id, job.state))
+            job.cancel_requested = True
+            if job.state == Job.QUEUED:
+                job.state = Job.CANCELLED
+                job.ended = time.time()
+                job.result = result_json(STATUS_ERROR, 'run cancelled', job_id)
+                self._publish(job)
+                self._purge()
+                self._save()
+            else:
+                self._publish(job, 'cancel')
+                if self.cancel_running:
+                    self.cancel_running(job)
+        LOG.info('Cancelled job %s', job_id)
+        return job
+
+    def get_job(self, job_id):
+        """Get a job by ID or None if not found."""
+        with self.cond:
+            return self.jobs.get(job_id)
+
+    def get_jobs(self):
+        """Get the summary of all jobs: running job first, then queued jobs in run order,
+        then completed jobs from the most recent."""
+        with self.cond:
+            jobs = [self.running] if self.running else []
+            queued = self.get_queued()
+            staging_key = self.last_staging_key
+            while queued:
+                # each job is picked as if the previous one had been run
+                job = self._get_next(queued, staging_key)
+                jobs.append(job)
+                queued.remove(job)
+                staging_key = job.staging_key
+            completed = [job for job in self.jobs.values() if job.is_completed()]
+            jobs.extend(sorted(completed, key=lambda job: job.ended, reverse=True))
+            return [job.get_summary() for job in jobs]
+
+    def fetch_result(self, job_id=None):
+        """Get the result of a completed job.
+
+        job_id: ID of the job or None to get the last unfetched result
+        return: the result or None if not available
+        """
+        with self.cond:
+            if job_id is None:
+                job = self.unfetched
+            else:
+                job = self.jobs.get(job_id)
+                if job is None or not job.is_completed():
+                    return None
+            if job is self.unfetched:
+                self.unfetched = None
+            return job.result if job else None
+
+
+def setup_flask(jobs, keep_alive_sec=15, result_store=None, config_schema=None):
     app = Flask(__name__)
-    busy_json = result_json(STATUS_ERROR, 'there is already an NFVbench request running')
     not_busy_json = result_json(STATUS_ERROR, 'no pending NFVbench run')
     not_found_msg = 'results not found'
     pending_msg = 'NFVbench run still pending'
@@ -137,37 +377,80 @@ def setup_flask():
         config = load_json(request.json)
         if not config:
             config = {}
-        if Ctx.is_busy():
-            return jsonify(busy_json)
-        request_id = get_uuid()
-        Ctx.enqueue(config, request_id)
-        return jsonify(result_json(STATUS_PENDING, pending_msg, request_id))
+        try:
+            if config_schema:
+                # reject invalid configs now rather than when the run starts
+                config_schema.validate(config, lenient=True)
+            priority = int(request.args.get('priority', 0))
+            job = jobs.submit(config, priority)
+        except ValueError:
+            return jsonify(result_json(STATUS_ERROR, 'priority must be an integer'))
+        except (ConfigException, JobQueueException) as exc:
+            return jsonify(result_json(STATUS_ERROR, str(exc)))
+        return jsonify(result_json(STATUS_PENDING, pending_msg, job.id))
 
     @app.route('/status', defaults={'request_id': None}, methods=['GET'])
     @app.route('/status/<request_id>', methods=['GET'])
     def _get_status(request_id):
         if request_id:
-            if Ctx.is_busy() and request_id == Ctx.get_current_request_id():
-                # task with request_id still pending
+            job = jobs.get_job(request_id)
+            if job and not job.is_completed():
+                # task with request_id still queued or running
                 return jsonify(result_json(STATUS_PENDING, pending_msg, request_id))
 
-            res = Ctx.get_result(request_id)
+            res = jobs.fetch_result(request_id)
             if res:
                 # found result for given request_id
                 return jsonify(res)
             # result for given request_id not found
             return jsonify(result_json(STATUS_NOT_FOUND, not_found_msg, request_id))
-        if Ctx.is_busy():
+        job = jobs.running
+        if job:
             # task still pending, return with request_id
-            return jsonify(result_json(STATUS_PENDING,
-                                       pending_msg,
-                                       Ctx.get_current_request_id()))
+            return jsonify(result_json(STATUS_PENDING, pending_msg, job.id))
 
-        res = Ctx.get_result()
+        res = jobs.fetch_result()
         if res:
             return jsonify(res)
         return jsonify(not_busy_json)
 
+    @app.route('/runs/<request_id>/events', methods=['GET'])
+    def _get_events(request_id):
+        if not jobs.events or not jobs.events.has_channel(request_id):
+            return jsonify(result_json(STATUS_NOT_FOUND, 'events not found', request_id))
+        # a reconnecting client only gets the events it has not received yet
+        try:
+            last_id = int(request.headers.get('Last-Event-ID', 0))
+        except ValueError:
+            last_id = 0
+        events = jobs.events.subscribe(request_id, last_id, timeout=keep_alive_sec)
+        return Response((format_sse(event) for event in events),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+
+    @app.route('/results', methods=['GET'])
+    def _get_results():
+        if result_store is None:
+            return jsonify(result_json(STATUS_ERROR, 'no result store configured'))
+        try:
+            return jsonify(result_store.query(request.args.to_dict()))
+        except ResultStoreException as exc:
+            return jsonify(result_json(STATUS_ERROR, str(exc)))
+
+    @app.route('/jobs', methods=['GET'])
+    def _get_jobs():
+        return jsonify(jobs.get_jobs())
+
+    @app.route('/jobs/<request_id>', methods=['DELETE'])
+    def _cancel_job(request_id):
+        try:
+            job = jobs.cancel(request_id)
+        except JobQueueException as exc:
+            return jsonify(result_json(STATUS_ERROR, str(exc), request_id))
+        if job is None:
+            return jsonify(result_json(STATUS_NOT_FOUND, 'job not found', request_id))
+        return jsonify(job.get_summary())
+
     return app
 
 class WebServer(object):
@@ -177,9 +460,29 @@ class WebServer(object):
 
     def __init__(self, runner, fluent_logger):
         self.nfvbench_runner = runner
-        self.app = setup_flask()
+        queue_config = runner.base_config.job_queue
+        self.events = EventBus(max_channels=queue_config.retention + queue_config.max_queued)
+        self.jobs = JobQueue(queue_config.max_queued, queue_config.retention,
+                             queue_config.file, self.events, self._get_staging_key)
+        self.jobs.cancel_running = self._cancel_running
+        self.app = setup_flask(self.jobs, result_store=runner.result_store,
+                               config_schema=runner.config_schema)
         self.fluent_logger = fluent_logger
 
+    def _get_staging_key(self, config):
+        # the chain setup depends on the run config, not on how the overrides are written
+        runner = self.nfvbench_runner
+        try:
+            config = runner.config_schema.merge(runner.base_config, config, lenient=True)
+        except ConfigException:
+            # invalid overrides: the run fails anyway
+            pass
+        return ChainPool.get_key(config)
+
+    def _cancel_running(self, _job):
+        # called from a flask thread, the traffic is stopped by the main thread
+        self.nfvbench_runner.cancel()
+
     def run(self, host, port):
 
         # app.run will not return so we need to run it in a background thread so that
@@ -189,14 +492,15 @@ class WebServer(object):
         # wait for run requests
         # the runner must be executed from the main thread (Trex client library requirement)
         while True:
-
-            # print 'main thread waiting for requests...'
-            config = Ctx.dequeue()
-            # print 'main thread processing request...'
-            # print config
+            job = self.jobs.get()
+            with self.jobs.cond:
+                # a job cancelled while being dequeued must still be cancelled
+                self.nfvbench_runner.cancel_requested = job.cancel_requested
+            LOG.info('Running job %s', job.id)
+            self.nfvbench_runner.set_notifier(RunNotifier(self.events, job.id))
             try:
                 # remove unfilled values as we do not want them to override default values with None
-                config = {k: v for k, v in list(config.items()) if v is not None}
+                config = {k: v for k, v in list(job.config.items()) if v is not None}
                 with RunLock():
                     if self.fluent_logger:
                         self.fluent_logger.start_new_run()
@@ -205,19 +509,17 @@ class WebServer(object):
                 results = result_json(STATUS_ERROR, str(exc))
                 LOG.exception('NFVbench runner exception:')
 
-            # this might overwrite a previously unfetched result
-            Ctx.set_result(results)
+            self.jobs.complete(job, results)
             try:
                 summary = NFVBenchSummarizer(results['result'], self.fluent_logger)
                 LOG.info(str(summary))
-                if 'json' in config and 'result' in results and results['status']:
-                    self.nfvbench_runner.save(results['result'])
+                if results['status'] == STATUS_OK:
+                    self.nfvbench_runner.save(results['result'], job.id)
             except KeyError:
                 # in case of error, 'result' might be missing
                 if 'error_message' in results:
                     LOG.error(results['error_message'])
                 else:
                     LOG.error('REST request completed without results or error message')
-            Ctx.release()
             if self.fluent_logger:
                 self.fluent_logger.send_run_summary(True)
@@ -0,0 +1,159 @@
+# Copyright 2018 Cisco Systems, Inc.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Detection of performance regressions against the results of previous comparable runs.
+
+Previous runs are comparable if they have the same config fingerprint (see
+result_store.get_fingerprint()). For every measurement (frame size and ndr, pdr or single_run)
+and metric, the baseline is the median of the metric over the most recent comparable runs
+and its spread the median absolute deviation (MAD), which are not skewed by a few outliers.
+A metric regresses if it is worse than the median by more than max_deviation times the
+MAD based standard deviation and by more than min_change_percent of the median.
+"""
+
+import json
+import os
+import statistics
+
+from .log import LOG
+from .result_store import get_fingerprint
+from .result_store import get_measurements
+
+# MAD to standard deviation ratio for a normal distribution
+MAD_SCALE = 1.4826
+
+
+class RegressionAnalyzer(object):
+    """Compare the results of new runs with the results of previous comparable runs."""
+
+    # metrics checked for every measurement and whether higher values are better
+    METRICS = {'rate_pps': True, 'avg_delay_usec': False}
+
+    def __init__(self, regression_config, result_store=None):
+        """Create an analyzer.
+
+        regression_config: the regression config (see regression in the default config)
+        result_store: the ResultStore with the previous results, if None the previous
+                      results are loaded from the JSON files of regression_config.history_dir
+        """
+        self.history_count = regression_config.history
+        self.min_runs = regression_config.min_runs
+        self.max_deviation = regression_config.max_deviation
+        self.min_change_percent = regression_config.min_change_percent
+        self.history_dir = regression_config.history_dir
+        self.result_store = result_store
+
+    def _load_history_dir(self, fingerprint):
+        """Get the measurements of the most recent comparable results in the history dir."""
+        results = []
+        for filename in os.listdir(self.history_dir):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.history_dir, filename), encoding="utf-8") as jfp:
+                    result = json.load(jfp)
+                if get_fingerprint(result) == fingerprint:
+                    results.append((result['date'], get_measurements(result)))
+            except (IOError, ValueError, KeyError, AttributeError, TypeError):
+                LOG.debug('Ignoring %s which is not an nfvbench result', filename)
+        results.sort(key=lambda result: result[0], reverse=True)
+        history = []
+        for date, measurements in results[:self.history_count]:
+            for measurement in measurements:
+                measurement['date'] = date
+                history.append(measurement)
+        return history
+
+    def get_history(self, fingerprint):
+        """Get the measurements of the most recent runs with a given config fingerprint."""
+        if self.result_store:
+            return self.result_store.get_history(fingerprint, self.history_count)
+        if self.history_dir and os.path.isdir(self.history_dir):
+            return self._load_history_dir(fingerprint)
+        return []
+
+    @staticmethod
+    def _get_metric_values(measurement):
+        values = {metric: measurement.get(metric) for metric in RegressionAnalyzer.METRICS}
+        for percentile, value in measurement['lat_percentile'].items():
+            # percentiles are 'n/a' when the histogram is not available
+            if isinstance(value, (int, float)):
+                values['lat_percentile_' + percentile] = value
+        return values
+
+    def _check(self, metric, value, history_values):
+        median = statistics.median(history_values)
+        mad = statistics.median([abs(history_value - median) for history_value in history_values])
+        higher_is_better = self.METRICS.get(metric, False)
+        change = value - median
+        change_percent = 100.0 * change / median if median else 0.0
+        deviation = change / (mad * MAD_SCALE) if mad else None
+        worse = change < 0 if higher_is_better else change > 0
+        regression = worse and abs(change_percent) > self.min_change_percent and \
+            (deviation is None or abs(deviation) > self.max_deviation)
+        return {'metric': metric,
+                'value': value,
+                'baseline': median,
+                'mad': mad,
+                'change_percent': round(change_percent, 2),
+                'deviation': round(deviation, 2) if deviation is not None else None,
+                'regression': regression}
+
+    def analyze(self, result):
+        """Check the result of a run against the previous comparable runs.
+
+        result: the result of the run
+        return: a dict with the following keys:
+            fingerprint: the config fingerprint of the run
+            run_count: number of comparable previous runs
+            checks: list of the metric checks, each check is a dict with the frame_size,
+                type, metric, value, baseline (median), mad, change_percent, deviation
+                (change in robust standard deviations) and regression (True if regressed)
+            regressions: the checks that regressed
+            the checks are empty if there are less than min_runs comparable runs
+        """
+        fingerprint = get_fingerprint(result)
+        # the result itself may already be in the history when checked again later
+        history = [measurement for measurement in self.get_history(fingerprint)
+                   if measurement['date'] != result['date']]
+        run_count = len({measurement['date'] for measurement in history})
+        report = {'fingerprint': fingerprint, 'run_count': run_count, 'checks': [],
+                  'regressions': []}
+        if run_count < self.min_runs:
+            LOG.info('Regression check skipped: %d comparable runs found (%d required)',
+                     run_count, self.min_runs)
+            return report
+        history_values = {}
+        for measurement in history:
+            key = (measurement['frame_size'], measurement['type'])
+            for metric, value in self._get_metric_values(measurement).items():
+                if value is not None:
+                    history_values.setdefault(key + (metric,), []).append(value)
+        for measurement in get_measurements(result):
+            key = (measurement['frame_size'], measurement['type'])
+            for metric, value in self._get_metric_values(measurement).items():
+                values = history_values.get(key + (metric,))
+                if value is None or not values or len(values) < self.min_runs:
+                    continue
+                check = self._check(metric, value, values)
+                check.update({'frame_size': measurement['frame_size'],
+                              'type': measurement['type']})
+                report['checks'].append(check)
+                if check['regression']:
+                    report['regressions'].append(check)
+                    LOG.warning('Regression of %s %s %s: %s (baseline %s, %+.1f%%)',
+                                measurement['frame_size'], measurement['type'], metric,
+                                value, check['baseline'], check['change_percent'])
+        LOG.info('Regression check: %d regressions found in %d checks against %d runs',
+                 len(report['regressions']), len(report['checks']), run_count)
+        return report
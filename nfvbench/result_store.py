@@ -0,0 +1,478 @@
+# Copyright 2018 Cisco Systems, Inc.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Persistent store of the results of all runs, indexed for queries.
+
+Results are stored in a SQLite database (see result_store in the default config):
+- the runs table has one row per run with the run dimensions (date, chain type, chain count,
+  flow count, user label, nfvbench version), the config fingerprint (see get_fingerprint())
+  and the complete result as JSON
+- the run_versions table has one row per run and component (e.g. the traffic generator)
+  with the version of the component
+- the measurements table has one row per run, frame size and measurement type
+  (ndr, pdr or single_run) with the rate, drop rate and latency of the measurement
+- the percentiles table has one row per measurement and latency percentile with the latency
+  of the percentile
+
+Queries use the same parameters for the REST API (GET /results) and the CLI (--query), for
+example "service_chain=PVP&frame_size=64&type=ndr&group_by=day&metric=rate_pps" or
+"type=pdr&percentile=99&max_lat_percentile_usec=100".
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+
+from .log import LOG
+
+# config properties that must be identical for the results of 2 runs to be comparable
+FINGERPRINT_PROPERTIES = ['service_chain', 'service_chain_count', 'flow_count', 'traffic',
+                          'measurement', 'traffic_pattern', 'stateful', 'generator_profile',
+                          'vm_forwarder', 'flavor', 'vif_multiqueue_size', 'num_mbufs', 'sriov',
+                          'use_sriov_middle_net', 'l2_loopback', 'l3_router', 'vlan_tagging',
+                          'vxlan', 'mpls', 'ipv6', 'pcap_file', 'intf_speed', 'cores',
+                          'service_chain_shared_net']
+
+
+class ResultStoreException(Exception):
+    """Exception for invalid result store queries."""
+
+
+def get_percentile_key(percentile):
+    """Get the key of a latency percentile in the lat_percentile dict of a measurement.
+
+    percentile: a percentile as configured (e.g. 99 or 99.9) or as stored (e.g. 99.0)
+    return: the shortest string representation of the percentile (e.g. '99' or '99.9')
+    """
+    return '%g' % float(percentile)
+
+
+def get_component_version(version):
+    """Get the version of a component as stored (versions can be dicts of details)."""
+    return version if isinstance(version, str) else json.dumps(version, sort_keys=True)
+
+
+def get_fingerprint(result):
+    """Get the fingerprint of the config of a result.
+
+    Runs with the same fingerprint use the same benchmark config (chain type and count,
+    flow count, traffic profile, measurement drop limits, flavor, encapsulation...) and can be
+    compared. Versions, dates and labels are not part of the fingerprint.
+    return: a hex digest string
+    """
+    config = result.get('config', {})
+    properties = {name: config.get(name) for name in FINGERPRINT_PROPERTIES}
+    properties['openstack_spec'] = result.get('openstack_spec')
+    return hashlib.sha1(json.dumps(properties, sort_keys=True, default=str)
+                        .encode('utf-8')).hexdigest()
+
+
+def get_measurements(result):
+    """Get the measurements of a result.
+
+    return: a list of dict with the frame_size, type (ndr, pdr or single_run), rate_pps,
+            rate_bps, drop_percentage, avg_delay_usec, min_delay_usec, max_delay_usec and
+            lat_percentile (dict of latency indexed by percentile) of every measurement
+    """
+    measurements = []
+    for chain in result['benchmarks']['network']['service_chain'].values():
+        for frame_size, analysis in chain['result']['result'].items():
+            if frame_size in ['warning', 'stateful'] or not isinstance(analysis, dict):
+                continue
+            for tag in ['ndr', 'pdr']:
+                if tag in analysis:
+                    overall = analysis[tag]['stats']['overall']
+                    measurements.append((frame_size, tag, analysis[tag].get('rate_pps'),
+                                         analysis[tag].get('rate_bps'),
+                                         overall.get('drop_percentage'), overall))
+            if 'stats' in analysis:
+                overall = analysis['stats']['overall']
+                rates = analysis.get('run_config', {}).get('direction-total', {}).get('tx', {})
+                measurements.append((frame_size, 'single_run', rates.get('rate_pps'),
+                                     rates.get('rate_bps'), overall.get('drop_rate_percent'),
+                                     overall.get('rx', {})))
+    return [{'frame_size': frame_size, 'type': tag, 'rate_pps': rate_pps, 'rate_bps': rate_bps,
+             'drop_percentage': drop_percentage,
+             'avg_delay_usec': latency.get('avg_delay_usec'),
+             'min_delay_usec': latency.get('min_delay_usec'),
+             'max_delay_usec': latency.get('max_delay_usec'),
+             # percentiles are float keys in results and string keys once loaded from JSON
+             'lat_percentile': {get_percentile_key(percentile): value for percentile, value
+                                in (latency.get('lat_percentile') or {}).items()}}
+            for frame_size, tag, rate_pps, rate_bps, drop_percentage, latency in measurements]
+
+
+class ResultStore(object):
+    """An indexed store of run results backed by a SQLite database.
+
+    A single connection is shared by all threads (the runner stores results while the
+    REST server threads query them), so all accesses are serialized by a lock.
+    """
+
+    SCHEMA = [
+        '''CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            request_id TEXT,
+            date TEXT NOT NULL,
+            service_chain TEXT,
+            service_chain_count INTEGER,
+            flow_count INTEGER,
+            user_label TEXT,
+            version TEXT,
+            fingerprint TEXT,
+            result TEXT NOT NULL)''',
+        '''CREATE TABLE IF NOT EXISTS run_versions (
+            run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+            component TEXT NOT NULL,
+            version TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS measurements (
+            run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+            frame_size TEXT NOT NULL,
+            type TEXT NOT NULL,
+            rate_pps REAL,
+            rate_bps REAL,
+            drop_percentage REAL,
+            avg_delay_usec REAL,
+            min_delay_usec REAL,
+            max_delay_usec REAL)''',
+        '''CREATE TABLE IF NOT EXISTS percentiles (
+            run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+            frame_size TEXT NOT NULL,
+            type TEXT NOT NULL,
+            percentile REAL NOT NULL,
+            value REAL NOT NULL)''']
+    # columns added to the runs table of existing stores
+    UPGRADES = {'fingerprint': 'ALTER TABLE runs ADD COLUMN fingerprint TEXT'}
+    INDEXES = [
+        'CREATE INDEX IF NOT EXISTS runs_date ON runs(date)',
+        'CREATE INDEX IF NOT EXISTS runs_chain ON runs(service_chain, service_chain_count, '
+        'flow_count)',
+        'CREATE INDEX IF NOT EXISTS runs_user_label ON runs(user_label)',
+        'CREATE INDEX IF NOT EXISTS runs_request_id ON runs(request_id)',
+        'CREATE INDEX IF NOT EXISTS runs_fingerprint ON runs(fingerprint, date)',
+        'CREATE INDEX IF NOT EXISTS run_versions_run ON run_versions(run_id)',
+        'CREATE INDEX IF NOT EXISTS run_versions_component ON run_versions(component, version)',
+        'CREATE INDEX IF NOT EXISTS measurements_run ON measurements(run_id)',
+        'CREATE INDEX IF NOT EXISTS measurements_frame_size ON measurements(frame_size, type)',
+        'CREATE INDEX IF NOT EXISTS measurements_rate ON measurements(type, rate_pps)',
+        'CREATE INDEX IF NOT EXISTS percentiles_measurement ON percentiles(run_id, frame_size, '
+        'type)',
+        'CREATE INDEX IF NOT EXISTS percentiles_value ON percentiles(percentile, value)'
+    ]
+
+    # query parameter name: SQL column and type of the value
+    FILTERS = {
+        'request_id': ('runs.request_id', str),
+        'fingerprint': ('runs.fingerprint', str),
+        'service_chain': ('runs.service_chain', str),
+        'service_chain_count': ('runs.service_chain_count', int),
+        'flow_count': ('runs.flow_count', int),
+        'user_label': ('runs.user_label', str),
+        'version': ('runs.version', str),
+        'component': ('run_versions.component', str),
+        'component_version': ('run_versions.version', str),
+        'frame_size': ('measurements.frame_size', str),
+        'type': ('measurements.type', str),
+        'percentile': ('percentiles.percentile', float)
+    }
+    # dimensions that aggregated series can be grouped by
+    GROUPS = {
+        'date': 'runs.date',
+        'day': 'substr(runs.date, 1, 10)',
+        'service_chain': 'runs.service_chain',
+        'service_chain_count': 'runs.service_chain_count',
+        'flow_count': 'runs.flow_count',
+        'user_label': 'runs.user_label',
+        'version': 'runs.version',
+        'component_version': 'run_versions.version',
+        'frame_size': 'measurements.frame_size',
+        'type': 'measurements.type',
+        'percentile': 'percentiles.percentile'
+    }
+    # values of a measurement row
+    MEASUREMENT_METRICS = ['rate_pps', 'rate_bps', 'drop_percentage', 'avg_delay_usec',
+                           'min_delay_usec', 'max_delay_usec']
+    # metric name: SQL column, all metrics can also be filtered with min_<metric>=<value>
+    # and max_<metric>=<value>
+    METRICS = dict([(metric, 'measurements.' + metric) for metric in MEASUREMENT_METRICS] +
+                   [('lat_percentile_usec', 'percentiles.value')])
+    COLUMNS = ['run_id', 'request_id', 'date', 'service_chain', 'service_chain_count',
+               'flow_count', 'user_label', 'version', 'fingerprint', 'frame_size', 'type'] + \
+        MEASUREMENT_METRICS
+    # tables joined to the runs and measurements tables when a query uses them
+    JOINS = {
+        'run_versions': ' JOIN run_versions ON run_versions.run_id = runs.id',
+        'percentiles': ' JOIN percentiles ON percentiles.run_id = measurements.run_id AND '
+                       'percentiles.frame_size = measurements.frame_size AND '
+                       'percentiles.type = measurements.type'
+    }
+    DEFAULT_LIMIT = 100
+
+    def __init__(self, pathname):
+        """Open (or create) a result store.
+
+        pathname: pathname of the SQLite database file (':memory:' for a transient store)
+        """
+        self.pathname = pathname
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(pathname, check_same_thread=False)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        with self.conn:
+            tables = [row[0] for row in
+                      self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            for statement in self.SCHEMA:
+                self.conn.execute(statement)
+            columns = [row[1] for row in self.conn.execute('PRAGMA table_info(runs)')]
+            for column, statement in self.UPGRADES.items():
+                if column not in columns:
+                    self.conn.execute(statement)
+            if 'runs' in tables and 'percentiles' not in tables:
+                self._upgrade_child_tables(columns)
+            for statement in self.INDEXES:
+                self.conn.execute(statement)
+
+    def _upgrade_child_tables(self, run_columns):
+        """Move the versions and percentiles stored as JSON by older stores to their tables."""
+        if 'versions' in run_columns:
+            for run_id, versions in self.conn.execute('SELECT id, versions FROM runs').fetchall():
+                self._add_versions(run_id, json.loads(versions or '{}'))
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(measurements)')]
+        if 'lat_percentile' in columns:
+            for row in self.conn.execute('SELECT run_id, frame_size, type, lat_percentile '
+                                         'FROM measurements').fetchall():
+                self._add_percentiles(row[0], [{'frame_size': row[1], 'type': row[2],
+                                                'lat_percentile': json.loads(row[3] or '{}')}])
+        LOG.info('Upgraded result store %s', self.pathname)
+
+    def _add_versions(self, run_id, versions):
+        self.conn.executemany(
+            'INSERT INTO run_versions (run_id, component, version) VALUES (?, ?, ?)',
+            [(run_id, component, get_component_version(version))
+             for component, version in versions.items()])
+
+    def _add_percentiles(self, run_id, measurements):
+        # percentiles are 'n/a' when the latency histogram is not available
+        self.conn.executemany(
+            'INSERT INTO percentiles (run_id, frame_size, type, percentile, value) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(run_id, measurement['frame_size'], measurement['type'], float(percentile), value)
+             for measurement in measurements
+             for percentile, value in measurement['lat_percentile'].items()
+             if isinstance(value, (int, float))])
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def add(self, result, request_id=None):
+        """Store the result of a run.
+
+        result: the result of the run (as returned by NFVBench.run() in 'result')
+        request_id: the request_id of the run in REST server mode
+        return: the ID of the run in the store
+        """
+        network = result['benchmarks']['network']
+        chains = list(network['service_chain'].items())
+        chain_name, chain = chains[0] if chains else (None, {'result': {}})
+        chain_result = chain['result']
+        run = (request_id, result['date'], chain_name,
+               chain_result.get('service_chain_count'), chain_result.get('flow_count'),
+               result.get('config', {}).get('user_label'), result.get('nfvbench_version'),
+               get_fingerprint(result), json.dumps(result, sort_keys=True, default=str))
+        measurements = get_measurements(result)
+        with self.lock, self.conn:
+            run_id = self.conn.execute(
+                'INSERT INTO runs (request_id, date, service_chain, service_chain_count, '
+                'flow_count, user_label, version, fingerprint, result) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', run).lastrowid
+            self._add_versions(run_id, network.get('versions') or {})
+            self.conn.executemany(
+                'INSERT INTO measurements (run_id, frame_size, type, ' +
+                ', '.join(self.MEASUREMENT_METRICS) + ') VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(run_id, measurement['frame_size'], measurement['type']) +
+                 tuple(measurement[metric] for metric in self.MEASUREMENT_METRICS)
+                 for measurement in measurements])
+            self._add_percentiles(run_id, measurements)
+        LOG.info('Stored result in %s (%d measurements)', self.pathname, len(measurements))
+        return run_id
+
+    def _get_percentiles(self, keys):
+        """Get the lat_percentile dicts of measurements.
+
+        keys: list of (run_id, frame_size, type) of the measurements
+        return: a dict of lat_percentile dicts indexed by (run_id, frame_size, type)
+        """
+        run_ids = sorted(set(key[0] for key in keys))
+        lat_percentiles = {key: {} for key in keys}
+        # stay below the maximum number of SQL variables of older SQLite versions
+        for index in range(0, len(run_ids), 500):
+            chunk = run_ids[index:index + 500]
+            rows = self.conn.execute(
+                'SELECT run_id, frame_size, type, percentile, value FROM percentiles '
+                'WHERE run_id IN (%s) ORDER BY percentile' % ', '.join('?' * len(chunk)),
+                chunk).fetchall()
+            for run_id, frame_size, tag, percentile, value in rows:
+                lat_percentile = lat_percentiles.get((run_id, frame_size, tag))
+                if lat_percentile is not None:
+                    lat_percentile[get_percentile_key(percentile)] = value
+        return lat_percentiles
+
+    def _get_where(self, params):
+        conditions = []
+        values = []
+        for name, value in params.items():
+            if name in self.FILTERS:
+                column, value_type = self.FILTERS[name]
+                operator = '='
+            elif name[:4] in ['min_', 'max_'] and name[4:] in self.METRICS:
+                column, value_type = self.METRICS[name[4:]], float
+                operator = '>=' if name.startswith('min_') else '<='
+            elif name in ['since', 'until']:
+                conditions.append('runs.date %s ?' % ('>=' if name == 'since' else '<'))
+                values.append(value)
+                continue
+            else:
+                continue
+            try:
+                values.append(value_type(value))
+            except ValueError:
+                raise ResultStoreException('Invalid value for %s: %s' % (name, value)) \
+                    from None
+            conditions.append('%s %s ?' % (column, operator))
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        return where, values
+
+    def _get_sql(self, params):
+        """Get the SQL query of query parameters (see query()).
+
+        return: a tuple with the SQL statement, the values of its parameters and the names
+                of the columns of the returned rows
+        """
+        range_filters = set('%s_%s' % (bound, metric) for bound in ['min', 'max']
+                            for metric in self.METRICS)
+        unknown = set(params) - set(self.FILTERS) - range_filters - \
+            {'since', 'until', 'group_by', 'metric', 'limit', 'include_result'}
+        if unknown:
+            raise ResultStoreException('Unknown query parameters: ' + ', '.join(sorted(unknown)))
+        where, values = self._get_where(params)
+        group_by = params.get('group_by')
+        metric = params.get('metric', 'rate_pps')
+        if group_by:
+            if group_by not in self.GROUPS or metric not in self.METRICS:
+                raise ResultStoreException('Invalid group_by %s or metric %s (must be one of %s '
+                                           'and %s)' % (group_by, metric, ', '.join(self.GROUPS),
+                                                        ', '.join(self.METRICS)))
+        # only join the child tables used by the query
+        used = where + (' %s %s' % (self.GROUPS[group_by], self.METRICS[metric])
+                        if group_by else '')
+        joins = [table for table in self.JOINS if table + '.' in used]
+        # latencies of different percentiles or versions of different components
+        # cannot be aggregated or filtered together
+        if 'percentiles' in joins and 'percentile' not in params and group_by != 'percentile':
+            raise ResultStoreException('Latency percentile queries require a percentile or '
+                                       'group_by=percentile')
+        if group_by == 'component_version' and 'component' not in params:
+            raise ResultStoreException('group_by=component_version requires a component')
+        from_clause = ' FROM measurements JOIN runs ON runs.id = measurements.run_id' + \
+            ''.join(self.JOINS[table] for table in joins)
+        if group_by:
+            group = self.GROUPS[group_by]
+            column = self.METRICS[metric]
+            sql = 'SELECT %s, COUNT(%s), AVG(%s), MIN(%s), MAX(%s)' % \
+                (group, column, column, column, column) + from_clause + where + \
+                ' GROUP BY %s ORDER BY %s' % (group, group)
+            return sql, values, [group_by, 'count', 'avg', 'min', 'max']
+        try:
+            limit = int(params.get('limit', self.DEFAULT_LIMIT))
+        except ValueError:
+            raise ResultStoreException('Invalid limit: %s' % params['limit']) from None
+        include_result = str(params.get('include_result', '')).lower() in ['1', 'true', 'yes']
+        columns = self.COLUMNS + (['result'] if include_result else [])
+        # a measurement matches once whatever the number of matching component versions
+        sql = 'SELECT %smeasurements.run_id, runs.request_id, runs.date, ' \
+            % ('DISTINCT ' if joins else '') + \
+            'runs.service_chain, runs.service_chain_count, runs.flow_count, runs.user_label, ' \
+            'runs.version, runs.fingerprint, measurements.frame_size, measurements.type, ' + \
+            ', '.join('measurements.' + metric for metric in self.MEASUREMENT_METRICS) + \
+            (', runs.result' if include_result else '') + \
+            from_clause + where + ' ORDER BY runs.date DESC, runs.id DESC LIMIT ?'
+        return sql, values + [limit], columns
+
+    def query(self, params):
+        """Query the stored measurements or aggregated series of measurements.
+
+        params: a dict of query parameters (all optional):
+            request_id, service_chain, service_chain_count, flow_count, user_label,
+            version (nfvbench version), component and component_version (version of a
+            component such as the traffic generator), fingerprint, frame_size,
+            type (ndr, pdr or single_run), percentile (latency percentile):
+                only select the measurements with these values
+            min_<metric>, max_<metric>: only select the measurements with a metric value
+                in this range (e.g. min_rate_pps=1000000), latency percentile metrics require
+                a percentile (e.g. percentile=99&max_lat_percentile_usec=50)
+            since, until: only select the runs at or after since and before until
+                (dates formatted as 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS')
+            group_by: aggregate the measurements by date, day, service_chain,
+                service_chain_count, flow_count, user_label, version, component_version,
+                frame_size, type or percentile
+            metric: the measurement to aggregate (rate_pps by default, or rate_bps,
+                drop_percentage, avg_delay_usec, min_delay_usec, max_delay_usec or
+                lat_percentile_usec)
+            limit: maximum number of measurements returned (100 by default)
+            include_result: if true (1), add the complete result of the run to each measurement
+        return: a list of measurements (dicts with the run dimensions, measurement values and
+                lat_percentile dict, most recent first) or, if group_by is set, a list of dicts
+                with the group value and the count, avg, min and max of the metric (in the order
+                of the group values)
+        """
+        sql, values, columns = self._get_sql(params)
+        group_by = params.get('group_by')
+        with self.lock:
+            rows = self.conn.execute(sql, values).fetchall()
+            if group_by:
+                metric = params.get('metric', 'rate_pps')
+                return [{group_by: row[0], 'metric': metric, 'count': row[1], 'avg': row[2],
+                         'min': row[3], 'max': row[4]} for row in rows]
+            lat_percentiles = self._get_percentiles([row[:1] + row[9:11] for row in rows])
+        measurements = []
+        for row in rows:
+            measurement = dict(zip(columns, row))
+            measurement['lat_percentile'] = lat_percentiles[row[:1] + row[9:11]]
+            if 'result' in measurement:
+                measurement['result'] = json.loads(measurement['result'])
+            measurements.append(measurement)
+        return measurements
+
+    def get_history(self, fingerprint, run_count):
+        """Get the measurements of the most recent runs with a given config fingerprint.
+
+        fingerprint: the config fingerprint of the runs (see get_fingerprint())
+        run_count: maximum number of runs
+        return: a list of measurements (see get_measurements()) with the date of their run,
+                most recent first
+        """
+        sql = 'SELECT runs.date, measurements.frame_size, measurements.type, ' + \
+            ', '.join('measurements.' + metric for metric in self.MEASUREMENT_METRICS) + \
+            ', measurements.run_id FROM measurements JOIN ' \
+            '(SELECT id, date FROM runs WHERE fingerprint = ? ORDER BY date DESC, id DESC ' \
+            'LIMIT ?) AS runs ON runs.id = measurements.run_id ORDER BY runs.date DESC'
+        with self.lock:
+            rows = self.conn.execute(sql, (fingerprint, run_count)).fetchall()
+            lat_percentiles = self._get_percentiles([(row[-1],) + row[1:3] for row in rows])
+        history = []
+        for row in rows:
+            measurement = dict(zip(['date', 'frame_size', 'type'] + self.MEASUREMENT_METRICS, row))
+            measurement['lat_percentile'] = lat_percentiles[(row[-1],) + row[1:3]]
+            history.append(measurement)
+        return history
@@ -56,7 +56,29 @@ class IntervalCollector(StatsCollector):
         self.notifier = notifier
 
     def add(self, stats):
-        pass
+        if self.notifier:
+            self.notifier.send('interval', **self.__compute_tx_rx_diff(stats))
+
+    def __compute_tx_rx_diff(self, stats):
+        current_time = self._get_current_time_diff()
+        tx_pkts = stats['overall']['tx']['total_pkts']
+        rx_pkts = stats['overall']['rx']['total_pkts']
+        tx_diff = tx_pkts - self.last_tx_pkts
+        rx_diff = rx_pkts - self.last_rx_pkts
+        interval_sec = (current_time - self.last_time) / 1000.0
+        drop_percentage = self._get_drop_percentage(tx_diff - rx_diff, tx_diff) \
+            if tx_diff > 0 else 0.0
+        self.last_tx_pkts = tx_pkts
+        self.last_rx_pkts = rx_pkts
+        self.last_time = current_time
+        return {
+            'time_ms': current_time,
+            'tx_pkts': tx_pkts,
+            'rx_pkts': rx_pkts,
+            'tx_pps': int(tx_diff / interval_sec) if interval_sec > 0 else 0,
+            'rx_pps': int(rx_diff / interval_sec) if interval_sec > 0 else 0,
+            'drop_percentage': drop_percentage
+        }
 
     def reset(self):
         # don't reset time!
@@ -93,6 +93,59 @@ class StatsManager(object):
         result['packet_path_stats'] = self.pps_mgr.get_results()
         return result
 
+    def run_burst_search(self):
+        """Search the largest burst size with no packet drop at the requested fixed rate.
+
+        Each iteration is a fixed rate run with the burst traffic pattern, the burst size
+        is searched between 1 and traffic_pattern.max_burst_size packets.
+        return: the result of the fixed rate run at the largest burst size found
+                (or at the smallest burst size if all burst sizes have drops) with the
+                max_burst_size and burst_iterations extra keys
+        """
+        pattern = self.traffic_client.traffic_pattern
+        start_time = time.time()
+        iterations = []
+
+        def run(burst_size):
+            if iterations and not self.traffic_client.skip_sleep():
+                time.sleep(self.config.pause_sec)
+            pattern.burst_size = burst_size
+            result = self.run_fixed_rate()
+            dropped_pkts = result['stats']['overall']['rx']['dropped_pkts']
+            LOG.info('Burst size %d: %d dropped packets', burst_size, dropped_pkts)
+            iterations.append({'burst_size': burst_size, 'dropped_pkts': dropped_pkts})
+            return dropped_pkts <= 0, result
+
+        low, high = 1, pattern.max_burst_size
+        passed, result = run(high)
+        if passed:
+            best = (high, result)
+        else:
+            passed, result = run(low)
+            best = (low, result) if passed else None
+            # low always passes and high always fails
+            while passed and high - low > 1:
+                middle = (low + high) // 2
+                middle_passed, middle_result = run(middle)
+                if middle_passed:
+                    low = middle
+                    best = (middle, middle_result)
+                else:
+                    high = middle
+        if best:
+            max_burst_size, result = best
+            LOG.info('Max burst size with no drop: %d packets', max_burst_size)
+        else:
+            max_burst_size = 0
+            result['warning'] = 'Packets are dropped with any burst size at this rate'
+            LOG.warning(result['warning'])
+        # the run config reports the burst size of the returned result
+        pattern.burst_size = max(max_burst_size, 1)
+        result['max_burst_size'] = max_burst_size
+        result['burst_iterations'] = iterations
+        result['burst_search_duration_sec'] = time.time() - start_time
+        return result
+
     def get_compute_nodes_bios(self):
         return self.worker.get_compute_nodes_bios() if self.worker else {}
 
@@ -250,6 +250,16 @@ class NFVBenchSummarizer(Summarizer):
             ('Max Latency (usec)', Formatter.standard)
         ]
 
+        self.stateful_header = [
+            ('Requested CPS', Formatter.standard),
+            ('Max CPS', Formatter.standard),
+            ('Max Concurrent Flows', Formatter.standard),
+            ('Failed Connections', Formatter.suffix('%')),
+            ('Avg Latency (usec)', Formatter.standard),
+            ('Min Latency (usec)', Formatter.standard),
+            ('Max Latency (usec)', Formatter.standard)
+        ]
+
         self.config_header = [
             ('Direction', Formatter.standard),
             ('Requested TX Rate (bps)', Formatter.bits),
@@ -323,6 +333,50 @@ class NFVBenchSummarizer(Summarizer):
                 for result in list(network_benchmark['service_chain'].items()):
                     with self._create_block():
                         self.__chain_summarize(*result)
+        if self.result.get('regression'):
+            self.__regression_summarize(self.result['regression'])
+
+    def __regression_summarize(self, regression):
+        self._put()
+        if not regression['checks']:
+            self._put('Regression check:', 'skipped (%d comparable runs found)' %
+                      regression['run_count'])
+            return
+        self._put('Regression check:', '%d regressions found in %d checks against %d runs' %
+                  (len(regression['regressions']), len(regression['checks']),
+                   regression['run_count']))
+        if regression['regressions']:
+            with self._create_block(False):
+                self._put_table(self.__get_regression_table(regression['regressions']))
+        for check in regression['regressions']:
+            self.__regression_record_send(check)
+
+    @staticmethod
+    def __get_regression_table(regressions):
+        table = Table([('L2 Frame Size', Formatter.standard),
+                       ('Measurement', Formatter.standard),
+                       ('Metric', Formatter.standard),
+                       ('Value', Formatter.standard),
+                       ('Baseline', Formatter.standard),
+                       ('Change', Formatter.suffix('%')),
+                       ('Deviation', Formatter.standard)])
+        for check in regressions:
+            table.add_row([check['frame_size'], check['type'].upper(), check['metric'],
+                           check['value'], check['baseline'], check['change_percent'],
+                           check['deviation'] if check['deviation'] is not None else 'n/a'])
+        return table
+
+    def __regression_record_send(self, check):
+        if self.sender:
+            record = {
+                "runlogdate": self.sender.runlogdate,
+                "user_label": self.config['user_label'],
+                "type": "regression",
+                "@timestamp": datetime.utcnow().replace(
+                    tzinfo=pytz.utc).strftime("%Y-%m-%dT%H:%M:%S.%f%z")
+            }
+            record.update(check)
+            self.sender.record_send(record)
 
     def __chain_summarize(self, chain_name, chain_benchmark):
         self._put(chain_name + ':')
@@ -338,6 +392,10 @@ class NFVBenchSummarizer(Summarizer):
         self._put('Flow count:', traffic_benchmark['flow_count'])
         self._put('Service chains count:', traffic_benchmark['service_chain_count'])
         self._put('Compute nodes:', list(traffic_benchmark['compute_nodes'].keys()))
+        if 'staging' in traffic_benchmark:
+            staging = traffic_benchmark['staging']
+            self._put('Chains staging time:', '%.1f sec (%d workers)' %
+                      (staging.get('chains_sec', 0), staging.get('workers', 1)))
 
         self.__record_header_put('profile', traffic_benchmark['profile'])
         self.__record_header_put('bidirectional', traffic_benchmark['bidirectional'])
@@ -360,6 +418,9 @@ class NFVBenchSummarizer(Summarizer):
             for entry in list(traffic_benchmark['result'].items()):
                 if 'warning' in entry:
                     continue
+                if entry[0] == 'stateful':
+                    self.__stateful_analysis_summarize(entry[1])
+                    continue
                 self.__chain_analysis_summarize(*entry)
             self.__record_send()
 
@@ -378,6 +439,13 @@ class NFVBenchSummarizer(Summarizer):
                 analysis['pdr']['time_taken_sec'])})
         self._put()
 
+        if 'max_burst_size' in analysis:
+            self._put('Max burst size with no drop:', analysis['max_burst_size'], 'packets')
+            self._put('Burst search duration:',
+                      Formatter.float(0)(analysis['burst_search_duration_sec']), 'seconds')
+            self.__record_data_put(frame_size, {'max_burst_size': analysis['max_burst_size']})
+            self._put()
+
         if not self.config['no_traffic'] and self.config['single_run']:
             self._put('Run Config:')
             self._put()
@@ -396,7 +464,43 @@ class NFVBenchSummarizer(Summarizer):
                     self._put_table(self._get_chain_table(analysis['packet_path_stats'][dir]))
                     self._put()
 
+    def __stateful_analysis_summarize(self, analysis):
+        self._put()
+        self._put('Stateful search duration:', Formatter.float(0)(analysis['time_taken_sec']),
+                  'seconds')
+        self._put('Stateful iterations:', len(analysis['iteration_stats']))
+        self.__record_data_put('stateful', {'stateful_search_duration': Formatter.float(0)(
+            analysis['time_taken_sec'])})
+
+    def __get_stateful_table(self, analysis):
+        summary_table = Table(self.stateful_header)
+        stats = analysis['stats']
+        if not stats:
+            return summary_table
+        summary_table.add_row([
+            analysis['requested_cps'],
+            analysis['max_cps'],
+            analysis['max_concurrent_flows'],
+            stats['failed_percentage'],
+            stats['avg_delay_usec'],
+            stats['min_delay_usec'],
+            stats['max_delay_usec']
+        ])
+        self.__record_data_put('stateful', {'stateful': {
+            'type': 'stateful',
+            'requested_cps': analysis['requested_cps'],
+            'max_cps': analysis['max_cps'],
+            'max_concurrent_flows': analysis['max_concurrent_flows'],
+            'failed_percentage': stats['failed_percentage'],
+            'avg_delay_usec': stats['avg_delay_usec'],
+            'min_delay_usec': stats['min_delay_usec'],
+            'max_delay_usec': stats['max_delay_usec']
+        }})
+        return summary_table
+
     def __get_summary_table(self, traffic_result):
+        if 'stateful' in traffic_result:
+            return self.__get_stateful_table(traffic_result['stateful'])
         if self.config['single_run']:
             summary_table = Table(self.single_run_header)
         else:
@@ -633,6 +737,9 @@ class NFVBenchSummarizer(Summarizer):
                     run_specific_data['pdr'] = data['pdr']
                     run_specific_data['pdr']['drop_limit'] = self.config['measurement']['PDR']
                     del data['pdr']
+                if 'stateful' in data:
+                    run_specific_data['stateful'] = data['stateful']
+                    del data['stateful']
                 for data_value in run_specific_data.values():
                     data_to_send = data.copy()
                     data_to_send.update(data_value)
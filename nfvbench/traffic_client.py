@@ -23,12 +23,7 @@ import bitmath
 from hdrh.histogram import HdrHistogram
 from netaddr import IPNetwork
 # pylint: disable=import-error
-from trex.stl.api import Ether
 from trex.stl.api import STLError
-from trex.stl.api import UDP
-# pylint: disable=wrong-import-order
-from scapy.contrib.mpls import MPLS  # flake8: noqa
-# pylint: enable=wrong-import-order
 # pylint: enable=import-error
 
 from .log import LOG
@@ -37,11 +32,33 @@ from .packet_stats import PacketPathStats
 from .stats_collector import IntervalCollector
 from .stats_collector import IterationCollector
 from .traffic_gen import traffic_utils as utils
-from .utils import cast_integer, find_max_size, find_tuples_equal_to_lcm_value, get_divisors, lcm
+from .traffic_gen.traffic_base import TrafficPattern
+from .utils import cast_integer, DivisorSet, find_max_lcm_tuple, find_max_size, lcm
 
 class TrafficClientException(Exception):
     """Generic traffic client exception."""
 
+# ethertypes and IP protocol used to parse the captured packets
+ETH_TYPE_IPV4 = 0x0800
+ETH_TYPE_IPV6 = 0x86dd
+ETH_TYPE_MPLS = (0x8847, 0x8848)
+ETH_TYPE_VLAN = (0x8100, 0x88a8)
+IP_PROTO_UDP = 17
+
+def get_l3_header(binary):
+    """Find the L3 header of an Ethernet frame, skipping any VLAN tag.
+
+    binary: raw bytes of the frame
+    return: a tuple (ethertype, offset of the L3 header) or (None, None) if truncated
+    """
+    offset = 12
+    while len(binary) >= offset + 2:
+        eth_type = (binary[offset] << 8) | binary[offset + 1]
+        if eth_type not in ETH_TYPE_VLAN:
+            return eth_type, offset + 2
+        offset += 4
+    return None, None
+
 class TrafficRunner(object):
     """Serialize various steps required to run traffic."""
 
@@ -118,6 +135,7 @@ class IpBlock(object):
 
     def __init__(self, base_ip, step_ip, count_ip):
         """Create an IP block."""
+        self.version = 6 if ':' in base_ip else 4
         self.base_ip_int = Device.ip_to_int(base_ip)
         if step_ip == 'random':
             step_ip = '0.0.0.1'
@@ -129,13 +147,13 @@ class IpBlock(object):
         """Return the IP address at given index."""
         if index < 0 or index >= self.max_available:
             raise IndexError('Index out of bounds: %d (max=%d)' % (index, self.max_available))
-        return Device.int_to_ip(self.base_ip_int + index * self.step)
+        return Device.int_to_ip(self.base_ip_int + index * self.step, self.version)
 
     def get_ip_from_chain_first_ip(self, first_ip, index=0):
         """Return the IP address at given index starting from chain first ip."""
         if index < 0 or index >= self.max_available:
             raise IndexError('Index out of bounds: %d (max=%d)' % (index, self.max_available))
-        return Device.int_to_ip(first_ip + index * self.step)
+        return Device.int_to_ip(first_ip + index * self.step, self.version)
 
     def reserve_ip_range(self, count):
         """Reserve a range of count consecutive IP addresses spaced by step.
@@ -176,11 +194,46 @@ class UdpPorts(object):
         return int(self.dst_min) + index * int(self.step)
 
 
+class FlowPlan(object):
+    """IP and UDP ranges of all the chains of a device.
+
+    The plan only depends on the generator config and is computed once, the ranges of
+    each chain are stored as a tuple of FIELDS values.
+    """
+
+    FIELDS = ('count', 'ip_src_addr', 'ip_src_addr_max', 'ip_src_count',
+              'ip_dst_addr', 'ip_dst_addr_max', 'ip_dst_count', 'ip_addrs_step',
+              'udp_src_port', 'udp_src_port_max', 'udp_src_count',
+              'udp_dst_port', 'udp_dst_port_max', 'udp_dst_count', 'udp_port_step')
+
+    def __init__(self, port):
+        """Create an empty flow plan for a given port."""
+        self.port = port
+        self.chains = []
+        self.build_time_sec = 0
+
+    def add_chain(self, *values):
+        """Add the ranges of the next chain (in FIELDS order)."""
+        self.chains.append(values)
+
+    def get_ranges(self, chain_idx):
+        """Get the ranges of a chain as a dict indexed by FIELDS."""
+        return dict(zip(self.FIELDS, self.chains[chain_idx]))
+
+    def to_json(self):
+        """Get json form to display the plan."""
+        return {'port': self.port,
+                'build_time_msec': round(self.build_time_sec * 1000.0, 3),
+                'chains': [self.get_ranges(chain_idx) for chain_idx in range(len(self.chains))]}
+
+
 class Device(object):
     """Represent a port device and all information associated to it.
 
     In the curent version we only support 2 port devices for the traffic generator
     identified as port 0 or port 1.
+    When the traffic generator has more than 1 port pair, each device represents all the
+    ports on the same side (even ports for port 0, odd ports for port 1).
     """
 
     def __init__(self, port, generator_config):
@@ -202,6 +255,7 @@ class Device(object):
         self.outer_labels = None
         self.pci = generator_config.interfaces[port].pci
         self.mac = None
+        self.macs = []
         self.dest_macs = None
         self.vtep_dst_mac = None
         self.vtep_dst_ip = None
@@ -211,6 +265,9 @@ class Device(object):
             self.vtep_src_ip = generator_config.vteps[port]
         self.vnis = None
         self.vlans = None
+        # computed on first use (see get_flow_plan and get_stream_configs)
+        self.flow_plan = None
+        self.stream_configs = None
         self.ip_addrs = generator_config.ip_addrs[port]
         self.ip_src_static = generator_config.ip_src_static
         self.ip_addrs_step = generator_config.ip_addrs_step
@@ -219,13 +276,14 @@ class Device(object):
             step = '0.0.0.1'
         else:
             step = self.ip_addrs_step
-        self.ip_size = self.check_range_size(IPNetwork(self.ip_addrs).size, Device.ip_to_int(step))
+        self.ip_version = IPNetwork(self.ip_addrs).version
+        self.ip_size = self.get_ip_range_size(self.ip_addrs, step)
         self.ip = str(IPNetwork(self.ip_addrs).network)
         ip_addrs_left = generator_config.ip_addrs[0]
         ip_addrs_right = generator_config.ip_addrs[1]
         self.ip_addrs_size = {
-            'left': self.check_range_size(IPNetwork(ip_addrs_left).size, Device.ip_to_int(step)),
-            'right': self.check_range_size(IPNetwork(ip_addrs_right).size, Device.ip_to_int(step))}
+            'left': self.get_ip_range_size(ip_addrs_left, step),
+            'right': self.get_ip_range_size(ip_addrs_right, step)}
         udp_src_port = generator_config.gen_config.udp_src_port
         if udp_src_port is None:
             udp_src_port = 53
@@ -275,72 +333,70 @@ class Device(object):
             src_ip_size = 1
         else:
             src_ip_size = self.ip_size
-        ip_src_divisors = list(get_divisors(src_ip_size))
-        ip_dst_divisors = list(get_divisors(peer_ip_size))
-        udp_src_divisors = list(get_divisors(self.udp_ports.udp_src_size))
-        udp_dst_divisors = list(get_divisors(self.udp_ports.udp_dst_size))
+        # the divisors are never enumerated: the solver only checks the divisors
+        # of the flow count (see find_max_lcm_tuple)
+        ip_src_divisors = DivisorSet(src_ip_size)
+        ip_dst_divisors = DivisorSet(peer_ip_size)
+        udp_src_divisors = DivisorSet(self.udp_ports.udp_src_size)
+        udp_dst_divisors = DivisorSet(self.udp_ports.udp_dst_size)
         fc = int(cur_chain_flow_count)
-        tuples_ip = list(find_tuples_equal_to_lcm_value(ip_src_divisors, ip_dst_divisors, fc))
-        tuples_udp = list(find_tuples_equal_to_lcm_value(udp_src_divisors, udp_dst_divisors, fc))
+        tuple_ip = find_max_lcm_tuple(ip_src_divisors, ip_dst_divisors, fc)
+        tuple_udp = find_max_lcm_tuple(udp_src_divisors, udp_dst_divisors, fc)
 
-        if tuples_ip:
-            new_src_ip_size = tuples_ip[-1][0]
-            new_peer_ip_size = tuples_ip[-1][1]
+        if tuple_ip:
+            new_src_ip_size, new_peer_ip_size = tuple_ip
 
-        if tuples_udp:
-            new_src_udp_size = tuples_udp[-1][0]
-            new_dst_udp_size = tuples_udp[-1][1]
+        if tuple_udp:
+            new_src_udp_size, new_dst_udp_size = tuple_udp
 
-        tuples_src = []
-        tuples_dst = []
-        if not tuples_ip and not tuples_udp:
+        tuple_src = None
+        tuple_dst = None
+        if not tuple_ip and not tuple_udp:
             # in case of not divisors in common matching LCM value (i.e. requested flow count)
             # try to find an accurate UDP range to fit requested flow count
             udp_src_int = range(self.udp_ports.src_min, self.udp_ports.src_max)
             udp_dst_int = range(self.udp_ports.dst_min, self.udp_ports.dst_max)
-            tuples_src = list(find_tuples_equal_to_lcm_value(ip_src_divisors, udp_src_int, fc))
-            tuples_dst = list(find_tuples_equal_to_lcm_value(ip_dst_divisors, udp_dst_int, fc))
+            tuple_src = find_max_lcm_tuple(ip_src_divisors, udp_src_int, fc)
+            tuple_dst = find_max_lcm_tuple(ip_dst_divisors, udp_dst_int, fc)
 
-            if not tuples_src and not tuples_dst:
+            if not tuple_src and not tuple_dst:
                 # iterate IP and UDP ranges to find a tuple that match flow count values
-                src_ip_range = range(1,src_ip_size)
+                src_ip_range = range(1, src_ip_size)
                 dst_ip_range = range(1, peer_ip_size)
-                tuples_src = list(find_tuples_equal_to_lcm_value(src_ip_range, udp_src_int, fc))
-                tuples_dst = list(find_tuples_equal_to_lcm_value(dst_ip_range, udp_dst_int, fc))
-
-        if tuples_src or tuples_dst:
-            if tuples_src:
-                new_src_ip_size = tuples_src[-1][0]
-                new_src_udp_size = tuples_src[-1][1]
-            if tuples_dst:
-                new_peer_ip_size = tuples_dst[-1][0]
-                new_dst_udp_size = tuples_dst[-1][1]
+                tuple_src = find_max_lcm_tuple(src_ip_range, udp_src_int, fc)
+                tuple_dst = find_max_lcm_tuple(dst_ip_range, udp_dst_int, fc)
+
+        if tuple_src or tuple_dst:
+            if tuple_src:
+                new_src_ip_size, new_src_udp_size = tuple_src
+            if tuple_dst:
+                new_peer_ip_size, new_dst_udp_size = tuple_dst
         else:
-            if not tuples_ip:
+            if not tuple_ip:
                 if src_ip_size != 1:
                     if src_ip_size > fc:
                         new_src_ip_size = fc
                     else:
-                        new_src_ip_size = find_max_size(src_ip_size, tuples_udp, fc)
+                        new_src_ip_size = find_max_size(src_ip_size, tuple_udp, fc)
                 if peer_ip_size != 1:
                     if peer_ip_size > fc:
                         new_peer_ip_size = fc
                     else:
-                        new_peer_ip_size = find_max_size(peer_ip_size, tuples_udp, fc)
+                        new_peer_ip_size = find_max_size(peer_ip_size, tuple_udp, fc)
 
-            if not tuples_udp:
+            if not tuple_udp:
                 if self.udp_ports.udp_src_size != 1:
                     if self.udp_ports.udp_src_size > fc:
                         new_src_udp_size = fc
                     else:
                         new_src_udp_size = find_max_size(self.udp_ports.udp_src_size,
-                                                         tuples_ip, fc)
+                                                         tuple_ip, fc)
                 if self.udp_ports.udp_dst_size != 1:
                     if self.udp_ports.udp_dst_size > fc:
                         new_dst_udp_size = fc
                     else:
                         new_dst_udp_size = find_max_size(self.udp_ports.udp_dst_size,
-                                                         tuples_ip, fc)
+                                                         tuple_ip, fc)
         max_possible_flows = lcm(lcm(new_src_ip_size, new_peer_ip_size),
                                  lcm(new_src_udp_size, new_dst_udp_size))
 
@@ -392,6 +448,24 @@ class Device(object):
         return max, min
 
 
+    def get_ip_range_size(self, ip_addrs, step):
+        """Get the number of IP addresses available in a network, considering the step.
+
+        Only the low 32 bits of IPv6 addresses are varied by the traffic generator, so an IPv6
+        range is limited to 2^32 addresses. It is further limited to the number of addresses
+        that can actually be used by the flows of all chains, which keeps the flow range
+        computations (see limit_ip_udp_ranges) tractable for large IPv6 networks.
+        """
+        network = IPNetwork(ip_addrs)
+        step = Device.ip_to_int(step)
+        size = self.check_range_size(network.size, step)
+        if network.version == 6:
+            if step >= 2 ** 32:
+                raise TrafficClientException('IPv6 ip_addrs_step must be lower than 2^32 (%s)' %
+                                             self.ip_addrs_step)
+            size = min(size, 2 ** 32 // step, int(self.flow_count) + self.chain_count)
+        return size
+
     @staticmethod
     def check_range_size(range_size, step):
         """Check and set the available IPs or UDP ports, considering the step."""
@@ -406,9 +480,26 @@ class Device(object):
 
     def set_mac(self, mac):
         """Set the local MAC for this port device."""
-        if mac is None:
+        self.set_macs([mac])
+
+    def set_macs(self, macs):
+        """Set the local MACs for this port device.
+
+        macs: a list of MAC addresses indexed by the port pair index
+        """
+        if not macs or None in macs:
             raise TrafficClientException('Trying to set traffic generator MAC address as None')
-        self.mac = mac
+        self.macs = list(macs)
+        self.mac = self.macs[0]
+        # the peer device sends to these MACs in l2-loopback mode
+        for device in self.generator_config.devices:
+            device.invalidate_stream_configs()
+
+    def get_mac(self, chain_idx=0):
+        """Get the local MAC used to send the traffic of a given chain."""
+        if not self.macs:
+            return self.mac
+        return self.macs[self.generator_config.get_pair_index(chain_idx) % len(self.macs)]
 
     def get_peer_device(self):
         """Get the peer device (device 0 -> device 1, or device 1 -> device 0)."""
@@ -421,6 +512,7 @@ class Device(object):
         - VM macs discovered using openstack API
         - dest MACs provisioned in config file
         """
+        self.invalidate_stream_configs()
         self.vtep_dst_mac = list(map(str, dest_macs))
 
     def set_dest_macs(self, dest_macs):
@@ -430,6 +522,7 @@ class Device(object):
         - VM macs discovered using openstack API
         - dest MACs provisioned in config file
         """
+        self.invalidate_stream_configs()
         self.dest_macs = list(map(str, dest_macs))
 
     def get_dest_macs(self):
@@ -441,27 +534,32 @@ class Device(object):
         if self.dest_macs:
             return self.dest_macs
         # assume this is l2-loopback
-        return [self.get_peer_device().mac] * self.chain_count
+        peer = self.get_peer_device()
+        return [peer.get_mac(chain_idx) for chain_idx in range(self.chain_count)]
 
     def set_vlans(self, vlans):
         """Set the list of vlans to use indexed by the chain id."""
+        self.invalidate_stream_configs()
         self.vlans = vlans
         LOG.info("Port %d: VLANs %s", self.port, self.vlans)
 
     def set_vtep_vlan(self, vlan):
         """Set the vtep vlan to use indexed by specific port."""
+        self.invalidate_stream_configs()
         self.vtep_vlan = vlan
         self.vxlan = True
         self.vlan_tagging = None
         LOG.info("Port %d: VTEP VLANs %s", self.port, self.vtep_vlan)
 
     def set_vxlan_endpoints(self, src_ip, dst_ip):
+        self.invalidate_stream_configs()
         self.vtep_dst_ip = dst_ip
         self.vtep_src_ip = src_ip
         LOG.info("Port %d: src_vtep %s, dst_vtep %s", self.port,
                  self.vtep_src_ip, self.vtep_dst_ip)
 
     def set_mpls_peers(self, src_ip, dst_ip):
+        self.invalidate_stream_configs()
         self.mpls = True
         self.vtep_dst_ip = dst_ip
         self.vtep_src_ip = src_ip
@@ -469,18 +567,22 @@ class Device(object):
                  self.vtep_src_ip, self.vtep_dst_ip)
 
     def set_vxlans(self, vnis):
+        self.invalidate_stream_configs()
         self.vnis = vnis
         LOG.info("Port %d: VNIs %s", self.port, self.vnis)
 
     def set_mpls_inner_labels(self, labels):
+        self.invalidate_stream_configs()
         self.inner_labels = labels
         LOG.info("Port %d: MPLS Inner Labels %s", self.port, self.inner_labels)
 
     def set_mpls_outer_labels(self, labels):
+        self.invalidate_stream_configs()
         self.outer_labels = labels
         LOG.info("Port %d: MPLS Outer Labels %s", self.port, self.outer_labels)
 
     def set_gw_ip(self, gateway_ip):
+        self.invalidate_stream_configs()
         self.gw_ip_block = IpBlock(gateway_ip,
                                    self.generator_config.gateway_ip_addrs_step,
                                    self.chain_count)
@@ -489,13 +591,19 @@ class Device(object):
         """Retrieve the IP address assigned for the gateway of a given chain."""
         return self.gw_ip_block.get_ip(chain_index)
 
-    def get_stream_configs(self):
-        """Get the stream config for a given chain on this device.
+    def invalidate_stream_configs(self):
+        """Discard the cached stream configs after a change of MACs, VLANs, VNIs..."""
+        self.stream_configs = None
 
-        Called by the traffic generator driver to program the traffic generator properly
-        before generating traffic
-        """
-        configs = []
+    def get_flow_plan(self):
+        """Get the IP and UDP ranges of all chains, computed once for this config."""
+        if self.flow_plan is None:
+            self.flow_plan = self.__build_flow_plan()
+        return self.flow_plan
+
+    def __build_flow_plan(self):
+        start_time = time.time()
+        plan = FlowPlan(self.port)
         # exact flow count for each chain is calculated as follows:
         # - all chains except the first will have the same flow count
         #   calculated as (total_flows + chain_count - 1) / chain_count
@@ -507,7 +615,6 @@ class Device(object):
         peer = self.get_peer_device()
         self.ip_block.reset_reservation()
         peer.ip_block.reset_reservation()
-        dest_macs = self.get_dest_macs()
 
         # limit ranges of UDP ports and IP to avoid overflow of the number of flows
         peer_size = peer.ip_size // self.chain_count
@@ -540,32 +647,48 @@ class Device(object):
             LOG.info("Port %d, chain %d: UDP dst range [%s,%s]", self.port, chain_idx,
                      self.udp_ports.dst_min, self.udp_ports.dst_max)
 
-            configs.append({
-                'count': cur_chain_flow_count,
-                'mac_src': self.mac,
+            plan.add_chain(cur_chain_flow_count,
+                           src_ip_first, src_ip_last, src_ip_size,
+                           dst_ip_first, dst_ip_last, peer_ip_size, self.ip_addrs_step,
+                           self.udp_ports.src_min, self.udp_ports.src_max,
+                           self.udp_ports.udp_src_size,
+                           self.udp_ports.dst_min, self.udp_ports.dst_max,
+                           self.udp_ports.udp_dst_size, self.udp_ports.step)
+            # after first chain, fall back to the flow count for all other chains
+            cur_chain_flow_count = flows_per_chain
+        plan.build_time_sec = time.time() - start_time
+        LOG.info("Port %d: flow plan of %d chains built in %.3f msec", self.port,
+                 self.chain_count, plan.build_time_sec * 1000.0)
+        return plan
+
+    def get_stream_configs(self):
+        """Get the stream config for a given chain on this device.
+
+        Called by the traffic generator driver to program the traffic generator properly
+        before generating traffic.
+        The stream configs are built from the flow plan and are cached until the MACs,
+        VLANs, VNIs... of the device are changed.
+        """
+        if self.stream_configs is not None:
+            return self.stream_configs
+        plan = self.get_flow_plan()
+        peer = self.get_peer_device()
+        dest_macs = self.get_dest_macs()
+        configs = []
+        for chain_idx in range(self.chain_count):
+            stream_cfg = plan.get_ranges(chain_idx)
+            stream_cfg.update({
+                'mac_src': self.get_mac(chain_idx),
                 'mac_dst': dest_macs[chain_idx],
-                'ip_src_addr': src_ip_first,
-                'ip_src_addr_max': src_ip_last,
-                'ip_src_count': src_ip_size,
-                'ip_dst_addr': dst_ip_first,
-                'ip_dst_addr_max': dst_ip_last,
-                'ip_dst_count': peer_ip_size,
-                'ip_addrs_step': self.ip_addrs_step,
+                'ip_version': self.ip_version,
                 'ip_src_static': self.ip_src_static,
-                'udp_src_port': self.udp_ports.src_min,
-                'udp_src_port_max': self.udp_ports.src_max,
-                'udp_src_count': self.udp_ports.udp_src_size,
-                'udp_dst_port': self.udp_ports.dst_min,
-                'udp_dst_port_max': self.udp_ports.dst_max,
-                'udp_dst_count': self.udp_ports.udp_dst_size,
-                'udp_port_step': self.udp_ports.step,
                 'mac_discovery_gw': self.get_gw_ip(chain_idx),
                 'ip_src_tg_gw': self.tg_gw_ip_block.get_ip(chain_idx),
                 'ip_dst_tg_gw': peer.tg_gw_ip_block.get_ip(chain_idx),
                 'vlan_tag': self.vlans[chain_idx] if self.vlans else None,
                 'vxlan': self.vxlan,
                 'vtep_vlan': self.vtep_vlan if self.vtep_vlan else None,
-                'vtep_src_mac': self.mac if (self.vxlan or self.mpls) else None,
+                'vtep_src_mac': self.get_mac(chain_idx) if (self.vxlan or self.mpls) else None,
                 'vtep_dst_mac': self.vtep_dst_mac if (self.vxlan or self.mpls) else None,
                 'vtep_dst_ip': self.vtep_dst_ip if self.vxlan is True else None,
                 'vtep_src_ip': self.vtep_src_ip if self.vxlan is True else None,
@@ -573,21 +696,27 @@ class Device(object):
                 'mpls': self.mpls,
                 'mpls_outer_label': self.outer_labels[chain_idx] if self.mpls is True else None,
                 'mpls_inner_label': self.inner_labels[chain_idx] if self.mpls is True else None
-
             })
-            # after first chain, fall back to the flow count for all other chains
-            cur_chain_flow_count = flows_per_chain
+            configs.append(stream_cfg)
+        self.stream_configs = configs
         return configs
 
     @staticmethod
     def ip_to_int(addr):
-        """Convert an IP address from string to numeric."""
+        """Convert an IPv4 or IPv6 address from string to numeric."""
+        if ':' in addr:
+            high, low = struct.unpack("!QQ", socket.inet_pton(socket.AF_INET6, addr))
+            return (high << 64) | low
         return struct.unpack("!I", socket.inet_aton(addr))[0]
 
     @staticmethod
-    def int_to_ip(nvalue):
-        """Convert an IP address from numeric to string."""
-        return socket.inet_ntoa(struct.pack("!I", int(nvalue)))
+    def int_to_ip(nvalue, version=4):
+        """Convert an IPv4 or IPv6 address from numeric to string."""
+        nvalue = int(nvalue)
+        if version == 6:
+            return socket.inet_ntop(socket.AF_INET6,
+                                    struct.pack("!QQ", nvalue >> 64, nvalue & (2 ** 64 - 1)))
+        return socket.inet_ntoa(struct.pack("!I", nvalue))
 
 
 class GeneratorConfig(object):
@@ -606,6 +735,22 @@ class GeneratorConfig(object):
         # pick up the profile dict based on the name
         gen_config = self.__match_generator_profile(config.traffic_generator,
                                                     config.generator_profile)
+        # a distributed generator profile aggregates the interfaces of several other
+        # generator profiles (normally 1 per traffic generator host) in the listed order
+        if gen_config.tool.lower() == 'distributed':
+            self.hosts = [self.__match_generator_profile(config.traffic_generator, name)
+                          for name in gen_config.generators]
+            interfaces = []
+            for host in self.hosts:
+                if host.tool.lower() == 'distributed':
+                    raise TrafficClientException('Distributed generator profile %s cannot '
+                                                 'refer to another distributed profile' %
+                                                 gen_config.name)
+                for tgif in host.interfaces:
+                    interfaces.append(AttrDict(dict(tgif, port=len(interfaces))))
+            gen_config.interfaces = interfaces
+        else:
+            self.hosts = [gen_config]
         self.gen_config = gen_config
         # copy over fields from the dict
         self.tool = gen_config.tool
@@ -639,8 +784,27 @@ class GeneratorConfig(object):
         self.limit_memory = gen_config.get('limit_memory', 1024)
         self.software_mode = gen_config.get('software_mode', False)
         self.interfaces = gen_config.interfaces
-        if self.interfaces[0].port != 0 or self.interfaces[1].port != 1:
-            raise TrafficClientException('Invalid port order/id in generator_profile.interfaces')
+        # interfaces are grouped in port pairs: (0, 1), (2, 3)...
+        # even ports belong to the left side, odd ports to the right side
+        if len(self.interfaces) < 2 or len(self.interfaces) % 2:
+            raise TrafficClientException('generator_profile.interfaces must have an even number '
+                                         'of interfaces (1 or more port pairs)')
+        for index, tgif in enumerate(self.interfaces):
+            if tgif.port != index:
+                raise TrafficClientException(
+                    'Invalid port order/id in generator_profile.interfaces')
+        self.port_pair_count = len(self.interfaces) // 2
+        if self.port_pair_count > 1:
+            if config.service_chain_count < self.port_pair_count:
+                raise TrafficClientException(
+                    'Service chain count (%d) must be at least the number of port pairs (%d)' %
+                    (config.service_chain_count, self.port_pair_count))
+            if config.service_chain_count % self.port_pair_count:
+                LOG.warning('Service chain count (%d) is not a multiple of the number of port '
+                            'pairs (%d): some port pairs will carry more traffic than others',
+                            config.service_chain_count, self.port_pair_count)
+            # the line rate of each logical port is the aggregate of all its physical ports
+            self.intf_speed *= self.port_pair_count
         self.service_chain = config.service_chain
         self.service_chain_count = config.service_chain_count
         self.flow_count = config.flow_count
@@ -654,15 +818,18 @@ class GeneratorConfig(object):
         self.gateway_ip_addrs_step = gen_config.gateway_ip_addrs_step or self.DEFAULT_IP_STEP
         self.gateway_ips = gen_config.gateway_ip_addrs
         self.ip_src_static = gen_config.ip_src_static
+        self.ip_version = self.__get_ip_version(config, gen_config)
         self.vteps = gen_config.get('vteps')
         self.devices = [Device(port, self) for port in [0, 1]]
         # This should normally always be [0, 1]
         self.ports = [device.port for device in self.devices]
+        # all the traffic generator ports, from all port pairs
+        self.all_ports = [tgif.port for tgif in self.interfaces]
 
         # check that pci is not empty
-        if not gen_config.interfaces[0].get('pci', None) or \
-           not gen_config.interfaces[1].get('pci', None):
-            raise TrafficClientException("configuration interfaces pci fields cannot be empty")
+        for tgif in gen_config.interfaces:
+            if not tgif.get('pci', None):
+                raise TrafficClientException("configuration interfaces pci fields cannot be empty")
 
         self.pcis = [tgif['pci'] for tgif in gen_config.interfaces]
         self.vlan_tagging = config.vlan_tagging
@@ -675,6 +842,57 @@ class GeneratorConfig(object):
         """Get json form to display the content into the overall result dict."""
         return dict(self.gen_config)
 
+    def get_flow_plans(self):
+        """Get json form of the flow plans of all devices (indexed by port)."""
+        return [device.get_flow_plan().to_json() for device in self.devices]
+
+    @staticmethod
+    def __get_ip_version(config, gen_config):
+        """Get the IP version (4 or 6) of the traffic and check the IP addresses are consistent."""
+        ip_version = IPNetwork(gen_config.ip_addrs[0]).version
+        addrs = list(gen_config.ip_addrs) + list(gen_config.tg_gateway_ip_addrs)
+        if gen_config.gateway_ip_addrs:
+            addrs += list(gen_config.gateway_ip_addrs)
+        for addr in addrs:
+            if IPNetwork(addr).version != ip_version:
+                raise TrafficClientException('ip_addrs, tg_gateway_ip_addrs and gateway_ip_addrs '
+                                             'must be all IPv4 or all IPv6 (%s)' % addr)
+        if ip_version == 6:
+            if config.vxlan or config.mpls:
+                raise TrafficClientException('IPv6 traffic is not supported with VxLAN or MPLS')
+            if config.periodic_gratuitous_arp:
+                raise TrafficClientException('IPv6 traffic is not supported with '
+                                             'periodic_gratuitous_arp')
+        return ip_version
+
+    def get_chains(self):
+        """Get the list of chain indexes handled by this generator config."""
+        return list(range(self.service_chain_count))
+
+    def get_pair_index(self, chain_idx):
+        """Get the index of the port pair that carries the traffic of a given chain.
+
+        Chains are distributed in round robin over all port pairs.
+        """
+        return chain_idx % self.port_pair_count
+
+    def get_pair_chains(self, pair_index):
+        """Get the list of chain indexes carried by a given port pair."""
+        return list(range(pair_index, self.service_chain_count, self.port_pair_count))
+
+    def get_pair_port(self, port, pair_index):
+        """Get the traffic generator port for a given logical port and port pair.
+
+        port: logical port (0 for left side, 1 for right side)
+        pair_index: port pair index
+        return: the actual traffic generator port number
+        """
+        return self.all_ports[pair_index * 2 + port]
+
+    def get_chain_port(self, port, chain_idx):
+        """Get the traffic generator port to use for a given logical port and chain."""
+        return self.get_pair_port(port, self.get_pair_index(chain_idx))
+
     def set_dest_macs(self, port_index, dest_macs):
         """Set the list of dest MACs indexed by the chain id on given port.
 
@@ -774,10 +992,83 @@ class GeneratorConfig(object):
         return gen_config
 
 
+class HostGeneratorConfig(object):
+    """View of a generator config restricted to the port pairs of one generator host.
+
+    Used by the distributed traffic generator to drive each traffic generator host with its
+    own driver: chain indexes remain global (so that stream configs, packet group IDs and
+    stats are the same as with a single generator) while port numbers and port pairs are
+    local to the host.
+    All other attributes are read from the global generator config.
+    """
+
+    def __init__(self, generator_config, host_index):
+        """Create a view of a generator config for a given host."""
+        self.generator_config = generator_config
+        self.host_index = host_index
+        gen_config = generator_config.hosts[host_index]
+        self.gen_config = gen_config
+        self.tool = gen_config.tool
+        self.ip = gen_config.ip
+        self.name = gen_config.name
+        self.cores = generator_config.config.cores or gen_config.get('cores', 1)
+        self.zmq_pub_port = gen_config.get('zmq_pub_port', 4500)
+        self.zmq_rpc_port = gen_config.get('zmq_rpc_port', 4501)
+        self.limit_memory = gen_config.get('limit_memory', 1024)
+        self.software_mode = gen_config.get('software_mode', False)
+        self.interfaces = gen_config.interfaces
+        if len(self.interfaces) < 2 or len(self.interfaces) % 2:
+            raise TrafficClientException('generator_profile.interfaces must have an even number '
+                                         'of interfaces (1 or more port pairs)')
+        self.all_ports = [tgif.port for tgif in self.interfaces]
+        self.pcis = [tgif['pci'] for tgif in self.interfaces]
+        self.port_pair_count = len(self.interfaces) // 2
+        # index of the first global port pair of this host
+        self.pair_offset = sum([len(host.interfaces) // 2
+                                for host in generator_config.hosts[:host_index]])
+        self.service_chain_count = len(self.get_chains())
+
+    def __getattr__(self, attr):
+        return getattr(self.generator_config, attr)
+
+    @property
+    def intf_speed(self):
+        """Line rate of all the ports of this host on the same side (in bps)."""
+        return self.generator_config.intf_speed * self.port_pair_count / \
+            self.generator_config.port_pair_count
+
+    def get_chains(self):
+        """Get the list of chain indexes handled by this host."""
+        chains = []
+        for pair in range(self.port_pair_count):
+            chains.extend(self.get_pair_chains(pair))
+        return sorted(chains)
+
+    def get_pair_index(self, chain_idx):
+        """Get the local index of the port pair that carries the traffic of a given chain."""
+        return self.generator_config.get_pair_index(chain_idx) - self.pair_offset
+
+    def get_pair_chains(self, pair_index):
+        """Get the list of chain indexes carried by a given local port pair."""
+        return self.generator_config.get_pair_chains(self.pair_offset + pair_index)
+
+    def get_pair_port(self, port, pair_index):
+        """Get the local traffic generator port for a given logical port and local port pair."""
+        return self.all_ports[pair_index * 2 + port]
+
+    def get_chain_port(self, port, chain_idx):
+        """Get the local traffic generator port to use for a given logical port and chain."""
+        return self.get_pair_port(port, self.get_pair_index(chain_idx))
+
+
 class TrafficClient(object):
     """Traffic generator client with NDR/PDR binary seearch."""
 
     PORTS = [0, 1]
+    # interval in seconds between 2 fetches of the packets captured by the end to end check
+    E2E_CAPTURE_POLL_SEC = 0.2
+    # smallest L2 frame (including FCS) that can carry an IPv6 UDP packet without VLAN tag
+    IPV6_MIN_L2_FRAME_SIZE = 66
 
     def __init__(self, config, notifier=None):
         """Create a new TrafficClient instance.
@@ -790,12 +1081,15 @@ class TrafficClient(object):
         self.config = config
         self.generator_config = GeneratorConfig(config)
         self.tool = self.generator_config.tool
+        self.traffic_pattern = TrafficPattern(config.traffic_pattern)
         self.gen = self._get_generator()
         self.notifier = notifier
         self.interval_collector = None
         self.iteration_collector = None
         self.runner = TrafficRunner(self, self.config.duration_sec, self.config.interval_sec,
                                     self.config.service_mode)
+        # set by request_cancel() to abort the run
+        self.cancel_requested = False
         self.config.frame_sizes = self._get_frame_sizes()
         self.run_config = {
             'l2frame_size': None,
@@ -815,11 +1109,17 @@ class TrafficClient(object):
     def _get_generator(self):
         tool = self.tool.lower()
         if tool == 'trex':
+            if self.config.stateful.enabled:
+                from .traffic_gen import trex_astf
+                return trex_astf.TRexASTF(self)
             from .traffic_gen import trex_gen
             return trex_gen.TRex(self)
         if tool == 'dummy':
             from .traffic_gen import dummy
             return dummy.DummyTG(self)
+        if tool == 'distributed':
+            from .traffic_gen import distributed
+            return distributed.DistributedTG(self)
         raise TrafficClientException('Unsupported generator tool name:' + self.tool)
 
     def skip_sleep(self):
@@ -844,16 +1144,19 @@ class TrafficClient(object):
         """Start the traffic generator process (traffic not started yet)."""
         self.gen.connect()
         # pick up the interface speed if it is not set from config
+        # with multiple port pairs, the speed of a logical port is the aggregate speed
+        # of all the ports on the same side
         intf_speeds = self.gen.get_port_speed_gbps()
+        tg_speed_gbps = sum(intf_speeds[0::2])
         # convert Gbps unit into bps
-        tg_if_speed = bitmath.parse_string(str(intf_speeds[0]) + 'Gb').bits
+        tg_if_speed = bitmath.parse_string(str(tg_speed_gbps) + 'Gb').bits
         if self.intf_speed:
             # interface speed is overriden from config
             if self.intf_speed != tg_if_speed:
                 # Warn the user if the speed in the config is different
                 LOG.warning(
                     'Interface speed provided (%g Gbps) is different from actual speed (%d Gbps)',
-                    self.intf_speed / 1000000000.0, intf_speeds[0])
+                    self.intf_speed / 1000000000.0, tg_speed_gbps)
         else:
             # interface speed not provisioned by config
             self.intf_speed = tg_if_speed
@@ -863,9 +1166,10 @@ class TrafficClient(object):
         self.config.intf_speed_detected = tg_if_speed
         self.config.intf_speed_used = self.intf_speed
 
-        # Save the traffic generator local MAC
-        for mac, device in zip(self.gen.get_macs(), self.generator_config.devices):
-            device.set_mac(mac)
+        # Save the traffic generator local MACs (1 per port pair on each side)
+        macs = self.gen.get_macs()
+        for device in self.generator_config.devices:
+            device.set_macs(macs[device.port::2])
 
     def setup(self):
         """Set up the traffic client."""
@@ -907,21 +1211,40 @@ class TrafficClient(object):
         # because there can be flooding in the case of shared net
         # we must verify that packets from the right VMs are received
         # and not just count unique src MAC
-        # create a dict of (port, chain) tuples indexed by dest mac
-        mac_map = {}
-        for port, dest_macs in enumerate(self.generator_config.get_dest_macs()):
-            for chain, mac in enumerate(dest_macs):
-                mac_map[mac] = (port, chain)
+        def get_mac_map():
+            # create a dict of (port, chain) tuples indexed by binary dest mac
+            # so that captured packets can be matched without any formatting
+            macs = {}
+            for port, dest_macs in enumerate(self.generator_config.get_dest_macs()):
+                for chain, mac in enumerate(dest_macs):
+                    macs[bytes.fromhex(str(mac).replace(':', '').replace('-', ''))] = (port, chain)
+            return macs
+        mac_map = get_mac_map()
         unique_src_mac_count = len(mac_map)
         if self.config.vxlan and self.config.traffic_generator.vtep_vlan:
-            get_mac_id = lambda packet: packet['binary'][60:66]
+            mac_offset = 60
         elif self.config.vxlan:
-            get_mac_id = lambda packet: packet['binary'][56:62]
+            mac_offset = 56
         elif self.config.mpls:
-            get_mac_id = lambda packet: packet['binary'][24:30]
-            # mpls_transport_label = lambda packet: packet['binary'][14:18]
+            mac_offset = 24
+            # mpls_transport_label = packet['binary'][14:18]
         else:
-            get_mac_id = lambda packet: packet['binary'][6:12]
+            mac_offset = 6
+        is_return_packet = self.is_mpls if self.config.mpls else self.is_udp
+        proto = 'mpls' if self.config.mpls else 'udp'
+
+        def check_packets():
+            # return True as soon as all expected src MAC have been seen
+            for packet in self.gen.packet_list:
+                mac_id = bytes(packet['binary'][mac_offset:mac_offset + 6])
+                if mac_id in mac_map and is_return_packet(packet):
+                    port, chain = mac_map.pop(mac_id)
+                    LOG.info('Received %s packet from mac: %s (chain=%d, port=%d)',
+                             proto, ':'.join('%02x' % x for x in mac_id), chain, port)
+                    if not mac_map:
+                        return True
+            return False
+
         for it in range(retry_count):
             self.gen.clear_stats()
             self.gen.start_traffic()
@@ -929,49 +1252,64 @@ class TrafficClient(object):
             LOG.info('Captured unique src mac %d/%d, capturing return packets (retry %d/%d)...',
                      unique_src_mac_count - len(mac_map), unique_src_mac_count,
                      it + 1, retry_count)
-            if not self.skip_sleep():
-                time.sleep(self.config.generic_poll_sec)
+            self._notify('e2e', status='checking', received=unique_src_mac_count - len(mac_map),
+                         expected=unique_src_mac_count, retry=it + 1, retry_count=retry_count)
+            # fetch the captured packets at short intervals to stop as soon as
+            # all the chains have replied instead of waiting the whole poll cycle
+            deadline = time.time() + self.config.generic_poll_sec
+            while True:
+                if not self.skip_sleep():
+                    time.sleep(max(0, min(self.E2E_CAPTURE_POLL_SEC, deadline - time.time())))
+                self.gen.fetch_capture_packets()
+                if check_packets() or self.skip_sleep() or time.time() >= deadline:
+                    break
             self.gen.stop_traffic()
-            self.gen.fetch_capture_packets()
             self.gen.stop_capture()
-            for packet in self.gen.packet_list:
-                mac_id = get_mac_id(packet).decode('latin-1')
-                src_mac = ':'.join(["%02x" % ord(x) for x in mac_id])
-                if self.config.mpls:
-                    if src_mac in mac_map and self.is_mpls(packet):
-                        port, chain = mac_map[src_mac]
-                        LOG.info('Received mpls packet from mac: %s (chain=%d, port=%d)',
-                                 src_mac, chain, port)
-                        mac_map.pop(src_mac, None)
-                else:
-                    if src_mac in mac_map and self.is_udp(packet):
-                        port, chain = mac_map[src_mac]
-                        LOG.info('Received udp packet from mac: %s (chain=%d, port=%d)',
-                                 src_mac, chain, port)
-                        mac_map.pop(src_mac, None)
-
-                if not mac_map:
-                    LOG.info('End-to-end connectivity established')
-                    return
+            if not mac_map:
+                LOG.info('End-to-end connectivity established')
+                self._notify('e2e', status='ok', received=unique_src_mac_count,
+                             expected=unique_src_mac_count)
+                return
             if self.config.l3_router and not self.config.no_arp:
                 # In case of L3 traffic mode, routers are not able to route traffic
                 # until VM interfaces are up and ARP requests are done
                 LOG.info('Waiting for loopback service completely started...')
                 LOG.info('Sending ARP request to assure end-to-end connectivity established')
-                self.ensure_arp_successful()
+                self.ensure_arp_successful(refresh=True)
+            elif self.gen.arp_cached:
+                # the dest MACs reused from previous runs may be stale (e.g. the router or VNF
+                # was replaced since), resolve them again before retrying
+                LOG.info('Refreshing the ARP results reused from previous runs')
+                self.ensure_arp_successful(refresh=True)
+                self.gen.create_traffic('64', [rate_pps, rate_pps], bidirectional=True,
+                                        latency=False, e2e=True)
+                mac_map = get_mac_map()
+                unique_src_mac_count = len(mac_map)
+        self._notify('e2e', status='failed', received=unique_src_mac_count - len(mac_map),
+                     expected=unique_src_mac_count)
         raise TrafficClientException('End-to-end connectivity cannot be ensured')
 
     def is_udp(self, packet):
-        pkt = Ether(packet['binary'])
-        return UDP in pkt
+        """Check if a captured packet is UDP over IPv4 or IPv6 (outer header only)."""
+        binary = packet['binary']
+        eth_type, offset = get_l3_header(binary)
+        if eth_type == ETH_TYPE_IPV4:
+            return len(binary) > offset + 9 and binary[offset + 9] == IP_PROTO_UDP
+        if eth_type == ETH_TYPE_IPV6:
+            return len(binary) > offset + 6 and binary[offset + 6] == IP_PROTO_UDP
+        return False
 
     def is_mpls(self, packet):
-        pkt = Ether(packet['binary'])
-        return MPLS in pkt
+        """Check if a captured packet is MPLS."""
+        return get_l3_header(packet['binary'])[0] in ETH_TYPE_MPLS
+
+    def ensure_arp_successful(self, refresh=False):
+        """Resolve all IP using ARP and throw an exception in case of failure.
 
-    def ensure_arp_successful(self):
-        """Resolve all IP using ARP and throw an exception in case of failure."""
-        dest_macs = self.gen.resolve_arp()
+        refresh: if True, do not use the MAC addresses cached by previous runs
+        """
+        dest_macs = self.gen.resolve_arp(refresh=refresh)
+        self._notify('arp', status='ok' if dest_macs else 'failed', cached=self.gen.arp_cached)
         if dest_macs:
             # all dest macs are discovered, saved them into the generator config
             if self.config.vxlan or self.config.mpls:
@@ -985,6 +1323,25 @@ class TrafficClient(object):
 
     def set_traffic(self, frame_size, bidirectional):
         """Reconfigure the traffic generator for a new frame size."""
+        if frame_size == utils.PCAP_L2_FRAME_SIZE:
+            if self.config.vxlan or self.config.mpls:
+                raise TrafficClientException('Frame size %s is not supported with VxLAN or MPLS'
+                                             % frame_size)
+            pcap = utils.load_pcap(self.config.pcap_file)
+            if pcap.ip_versions != [self.generator_config.ip_version]:
+                raise TrafficClientException('pcap file %s must only contain IPv%d frames' %
+                                             (self.config.pcap_file,
+                                              self.generator_config.ip_version))
+            LOG.info('Replaying %d frames from %s (average frame size %.1f bytes, %d non IP '
+                     'frames ignored)', len(pcap.frames), self.config.pcap_file,
+                     pcap.avg_l2_frame_size, pcap.skipped_count)
+        elif self.generator_config.ip_version == 6 and str(frame_size).upper() != 'IMIX':
+            min_frame_size = self.IPV6_MIN_L2_FRAME_SIZE
+            if self.config.vlan_tagging:
+                min_frame_size += 4
+            if int(frame_size) < min_frame_size:
+                raise TrafficClientException('Frame size %s is too small for IPv6 traffic '
+                                             '(min %d)' % (frame_size, min_frame_size))
         self.run_config['bidirectional'] = bidirectional
         self.run_config['l2frame_size'] = frame_size
         self.run_config['rates'] = [self.get_per_direction_rate()]
@@ -1039,6 +1396,8 @@ class TrafficClient(object):
         results['iteration_stats'] = {
             'ndr_pdr': self.iteration_collector.get()
         }
+        for tag in targets:
+            results[tag]['traffic_pattern'] = self.traffic_pattern.get_params()
 
         if self.config.ndr_run:
             LOG.info('NDR load: %s', results['ndr']['rate_percent'])
@@ -1054,6 +1413,79 @@ class TrafficClient(object):
                 results['pdr']['timestamp_sec'] - self.run_config['start_time']
         return results
 
+    def get_stateful_max(self):
+        """Search the max rate of TCP connections per second that meets the stateful targets.
+
+        The workload is run for duration_sec at each rate of a binary search between
+        stateful.min_cps and stateful.max_cps. A rate passes if the percentage of connections
+        that could not be established is within stateful.max_failed_percentage and the average
+        latency is within stateful.max_latency_usec (if not 0).
+        """
+        stateful = self.config.stateful
+        LOG.info('*** Searching max connections per second (request=%d bytes, '
+                 'response=%d bytes, hold=%s sec)...',
+                 stateful.request_size, stateful.response_size, stateful.hold_sec)
+        start_time = time.time()
+        self.gen.create_stateful_traffic()
+        iterations = []
+
+        def run(cps):
+            if iterations and not self.skip_sleep():
+                time.sleep(self.config.pause_sec)
+            stats = self.gen.run_stateful_traffic(cps)
+            attempted = stats['connections_attempted']
+            failed = attempted - stats['connections_established']
+            stats['failed_percentage'] = float(failed) / attempted * 100 if attempted else 100.0
+            passed = stats['failed_percentage'] <= stateful.max_failed_percentage
+            if stateful.max_latency_usec and stats['avg_delay_usec'] > stateful.max_latency_usec:
+                passed = False
+            LOG.info('Stateful run at %d cps: %d connections, %.4f%% failed, %d max active flows, '
+                     'avg latency %s usec -> %s', cps, attempted, stats['failed_percentage'],
+                     stats['max_active_flows'], stats['avg_delay_usec'],
+                     'passed' if passed else 'failed')
+            iterations.append({'requested_cps': cps, 'passed': passed, 'stats': stats})
+            return passed
+
+        left = float(stateful.min_cps)
+        right = float(stateful.max_cps)
+        best_cps = None
+        if run(right):
+            best_cps = right
+        elif run(left):
+            best_cps = left
+            while (right - left) * 100 > right * stateful.precision_percentage:
+                middle = (left + right) / 2
+                if run(middle):
+                    left = best_cps = middle
+                else:
+                    right = middle
+
+        result = {
+            'requested_cps': 0,
+            'max_cps': 0,
+            'max_concurrent_flows': 0,
+            'stats': {},
+            'time_taken_sec': time.time() - start_time,
+            'iteration_stats': iterations,
+            'run_config': dict(stateful, duration_sec=self.config.duration_sec)
+        }
+        if best_cps is None:
+            LOG.warning('No connection rate meets the stateful targets (min_cps=%s)',
+                        stateful.min_cps)
+            result['warning'] = 'WARNING: no connection rate meets the stateful targets'
+            return result
+        stats = [it['stats'] for it in iterations if it['requested_cps'] == best_cps][-1]
+        result.update({
+            'requested_cps': int(best_cps),
+            # actual rate of connections that were established
+            'max_cps': int(stats['connections_established'] / self.config.duration_sec),
+            'max_concurrent_flows': stats['max_active_flows'],
+            'stats': stats
+        })
+        LOG.info('Max connections per second: %d, max concurrent flows: %d',
+                 result['max_cps'], result['max_concurrent_flows'])
+        return result
+
     def __get_dropped_rate(self, result):
         dropped_pkts = result['rx']['dropped_pkts']
         total_pkts = result['tx']['total_pkts']
@@ -1140,7 +1572,8 @@ class TrafficClient(object):
     def __convert_rates(self, rate):
         return utils.convert_rates(self.run_config['l2frame_size'],
                                    rate,
-                                   self.intf_speed)
+                                   self.intf_speed,
+                                   self.config.pcap_file)
 
     def __ndr_pdr_found(self, tag, load):
         rates = self.__convert_rates({'rate_percent': load})
@@ -1295,6 +1728,14 @@ class TrafficClient(object):
         # save reliable stats from whole iteration
         self.iteration_collector.add(stats, current_traffic_config['direction-total']['rate_pps'])
         LOG.info('Average drop rate: %f', stats['overall']['drop_rate_percent'])
+        overall_rx = stats['overall']['rx']
+        self._notify('trial', l2frame_size=self.run_config['l2frame_size'], load_percent=rate,
+                     tx_pps=current_traffic_config['direction-total']['rate_pps'],
+                     total_tx_rate=stats['total_tx_rate'],
+                     drop_rate_percent=stats['overall']['drop_rate_percent'],
+                     avg_delay_usec=overall_rx.get('avg_delay_usec'),
+                     min_delay_usec=overall_rx.get('min_delay_usec'),
+                     max_delay_usec=overall_rx.get('max_delay_usec'))
         return stats, current_traffic_config['direction-total']
 
     def log_stats(self, stats):
@@ -1320,12 +1761,14 @@ class TrafficClient(object):
 
     def run_traffic(self):
         """Start traffic and return intermediate stats for each interval."""
+        self.__check_cancel()
         stats = self.runner.run()
         self.prev_tx = 0
         self.prev_rx = 0
         while self.runner.is_running:
             self.log_stats(stats)
             yield stats
+            self.__check_cancel()
             stats = self.runner.poll_stats()
             if stats is None:
                 return
@@ -1333,10 +1776,28 @@ class TrafficClient(object):
         LOG.info('Drop rate: %f', stats['overall']['drop_rate_percent'])
         yield stats
 
+    def _notify(self, event, **data):
+        """Publish a run progress event if a notifier is attached."""
+        if self.notifier:
+            self.notifier.send(event, **data)
+
     def cancel_traffic(self):
         """Stop traffic."""
         self.runner.stop()
 
+    def request_cancel(self):
+        """Request to stop the traffic and abort the run.
+
+        Can be called from any thread since the traffic generator is only accessed
+        by the thread that runs the traffic, at the next stats interval.
+        """
+        self.cancel_requested = True
+
+    def __check_cancel(self):
+        if self.cancel_requested:
+            self.cancel_traffic()
+            raise TrafficClientException('Run cancelled')
+
     def _get_traffic_config(self):
         config = {}
         load_total = 0.0
@@ -1396,6 +1857,7 @@ class TrafficClient(object):
                 total[direction][unit] = sum([float(x[direction][unit]) for x in list(r.values())])
 
         r['direction-total'] = total
+        r['traffic_pattern'] = self.traffic_pattern.get_params()
 
         return r
 
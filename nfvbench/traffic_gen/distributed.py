@@ -0,0 +1,264 @@
+# Copyright 2016 Cisco Systems, Inc.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Driver module for a traffic generator distributed over multiple hosts."""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+import time
+
+from hdrh.histogram import HdrHistogram
+
+from nfvbench.log import LOG
+from nfvbench.traffic_client import HostGeneratorConfig
+from .traffic_base import AbstractTrafficGenerator
+from .traffic_base import TrafficGeneratorException
+from . import traffic_utils as utils
+
+
+class _HostTrafficClient(object):
+    """Traffic client as seen by the driver of one generator host.
+
+    The generator config is restricted to the port pairs of that host,
+    everything else is read from the actual traffic client.
+    """
+
+    def __init__(self, traffic_client, host_index):
+        self.traffic_client = traffic_client
+        self.config = traffic_client.config
+        self.generator_config = HostGeneratorConfig(traffic_client.generator_config, host_index)
+
+    def __getattr__(self, attr):
+        return getattr(self.traffic_client, attr)
+
+
+class DistributedTG(AbstractTrafficGenerator):
+    """Traffic generator made of several traffic generator hosts driven as one.
+
+    Each generator host is driven by its own driver (TRex or dummy) and carries the chains
+    of its port pairs. Streams are programmed on all hosts in parallel, traffic is started
+    on all hosts at a common timestamp and the counters and latency histograms of all hosts
+    are merged so that the results look like they come from a single traffic generator.
+    """
+
+    # delay to add to the current time to get the common start time of all hosts
+    DEFAULT_START_DELAY_SEC = 0.1
+
+    def __init__(self, traffic_client):
+        AbstractTrafficGenerator.__init__(self, traffic_client)
+        self.generators = []
+        for host_index in range(len(self.generator_config.hosts)):
+            host_client = _HostTrafficClient(traffic_client, host_index)
+            self.generators.append(self.__get_host_generator(host_client))
+        self.start_delay_sec = self.generator_config.gen_config.get('start_delay_sec',
+                                                                    self.DEFAULT_START_DELAY_SEC)
+        self.port_handle = []
+        self.rates = []
+        self.l2_frame_size = 0
+        self.packet_list = []
+
+    @staticmethod
+    def __get_host_generator(host_client):
+        tool = host_client.generator_config.tool.lower()
+        if tool == 'trex':
+            from .trex_gen import TRex
+            return TRex(host_client)
+        if tool == 'dummy':
+            from .dummy import DummyTG
+            return DummyTG(host_client)
+        raise TrafficGeneratorException('Unsupported generator tool name for distributed '
+                                        'generator: ' + host_client.generator_config.tool)
+
+    def _run_all(self, func):
+        """Run a function on the driver of all generator hosts in parallel.
+
+        func: a function taking a generator host driver as argument
+        return: the list of results indexed by host index
+        """
+        with ThreadPoolExecutor(max_workers=len(self.generators)) as executor:
+            return list(executor.map(func, self.generators))
+
+    def __get_chain_host(self, chain_idx):
+        """Get the index of the generator host that carries the traffic of a given chain."""
+        for host_index, gen in enumerate(self.generators):
+            if chain_idx in gen.generator_config.get_chains():
+                return host_index
+        raise TrafficGeneratorException('No generator host found for chain %d' % chain_idx)
+
+    def get_host_rate(self, rate, host_index):
+        """Get the share of a logical port rate to apply to a given generator host.
+
+        rate: rate string for the logical port (e.g. '1000pps', '10Gbps', '50%')
+        host_index: index of the generator host
+        return: a rate dict for that host
+
+        The rate is split in proportion of the number of chains carried by the host.
+        A load in % is relative to the aggregate line rate of all hosts so it must be converted
+        to a load relative to the line rate of the host.
+        """
+        host_config = self.generators[host_index].generator_config
+        share = host_config.service_chain_count / float(self.generator_config.service_chain_count)
+        if rate.endswith('%'):
+            share *= self.generator_config.port_pair_count / float(host_config.port_pair_count)
+        return utils.divide_rate(utils.parse_rate_str(rate), 1 / share)
+
+    def get_version(self):
+        return {gen.generator_config.name: gen.get_version() for gen in self.generators}
+
+    def connect(self):
+        """Connect to all generator hosts."""
+        LOG.info('Connecting to %d traffic generator hosts...', len(self.generators))
+        self._run_all(lambda gen: gen.connect())
+        self.port_handle = list(self.generator_config.all_ports)
+
+    def create_traffic(self, l2frame_size, rates, bidirectional, latency=True, e2e=False):
+        """Program all the streams on all generator hosts in parallel."""
+        self.rates = [utils.to_rate_str(rate) for rate in rates]
+        self.l2_frame_size = l2frame_size
+
+        def create(host_index):
+            host_rates = [self.get_host_rate(rate, host_index) for rate in self.rates]
+            self.generators[host_index].create_traffic(l2frame_size, host_rates, bidirectional,
+                                                       latency=latency, e2e=e2e)
+        with ThreadPoolExecutor(max_workers=len(self.generators)) as executor:
+            list(executor.map(create, range(len(self.generators))))
+
+    def clear_streamblock(self):
+        self.rates = []
+        self._run_all(lambda gen: gen.clear_streamblock())
+
+    def get_stats(self, ifstats=None):
+        """Get the stats of all generator hosts merged as if from a single generator."""
+        host_stats = self._run_all(lambda gen: gen.get_stats(ifstats))
+        result = {}
+        for port in self.generator_config.ports:
+            result[port] = {}
+            for direction in ['tx', 'rx']:
+                port_stats = [stats[port][direction] for stats in host_stats]
+                result[port][direction] = {}
+                for key in port_stats[0]:
+                    if not key.endswith('_delay_usec'):
+                        result[port][direction][key] = sum([ps[key] for ps in port_stats])
+            rx_stats = [stats[port]['rx'] for stats in host_stats]
+            result[port]['rx']['min_delay_usec'] = min([rx['min_delay_usec'] for rx in rx_stats])
+            result[port]['rx']['max_delay_usec'] = max([rx['max_delay_usec'] for rx in rx_stats])
+            result[port]['rx']['avg_delay_usec'] = utils.weighted_avg(
+                [rx['total_pkts'] for rx in rx_stats],
+                [rx['avg_delay_usec'] for rx in rx_stats])
+        for key in ['total_tx_rate', 'offered_tx_rate_bps', 'garp_total_tx_rate']:
+            if key in host_stats[0]:
+                result[key] = sum([stats[key] for stats in host_stats])
+        avg_packet_size = utils.get_average_packet_size(self.l2_frame_size,
+                                                      self.config.pcap_file)
+        result.update(self.get_theoretical_rates(avg_packet_size))
+
+        # Merge HDRHistogram of all hosts to have an overall value
+        hdrh_list = [HdrHistogram.decode(stats['overall_hdrh'])
+                     for stats in host_stats if 'overall_hdrh' in stats]
+        if hdrh_list:
+            def add_hdrh(x, y):
+                x.add(y)
+                return x
+            decoded_hdrh = reduce(add_hdrh, hdrh_list)
+            result['overall_hdrh'] = HdrHistogram.encode(decoded_hdrh).decode('utf-8')
+        # keep the stats of each host to extract the per chain stats
+        result['host_stats'] = host_stats
+        return result
+
+    def get_stream_stats(self, tg_stats, if_stats, latencies, chain_idx):
+        """Extract the aggregated stats for a given chain from the generator host of that chain."""
+        host_index = self.__get_chain_host(chain_idx)
+        self.generators[host_index].get_stream_stats(tg_stats['host_stats'][host_index],
+                                                     if_stats, latencies, chain_idx)
+
+    def get_macs(self):
+        """Return the local MAC addresses of all hosts indexed by the port#."""
+        macs = []
+        for gen in self.generators:
+            macs.extend(gen.get_macs())
+        return macs
+
+    def get_port_speed_gbps(self):
+        """Return the local port speeds of all hosts indexed by the port#."""
+        speeds = []
+        for gen in self.generators:
+            speeds.extend(gen.get_port_speed_gbps())
+        return speeds
+
+    def clear_stats(self):
+        self._run_all(lambda gen: gen.clear_stats())
+
+    def start_traffic(self):
+        """Start generating traffic on all generator hosts at the same time.
+
+        Each host is started from its own thread at a common timestamp set slightly in the
+        future, so that the start requests are not serialized behind each other.
+        """
+        for host_index, gen in enumerate(self.generators):
+            gen.rates = [utils.to_rate_str(self.get_host_rate(rate, host_index))
+                         for rate in self.rates]
+        start_time = time.time() + self.start_delay_sec
+
+        def start(gen):
+            delay = start_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            started = time.time()
+            gen.start_traffic()
+            return started
+        start_times = self._run_all(start)
+        LOG.debug('Traffic started on %d generator hosts (start skew: %.3f ms)',
+                  len(start_times), (max(start_times) - min(start_times)) * 1000)
+
+    def stop_traffic(self):
+        self._run_all(lambda gen: gen.stop_traffic())
+
+    def start_capture(self):
+        self._run_all(lambda gen: gen.start_capture())
+
+    def fetch_capture_packets(self):
+        self._run_all(lambda gen: gen.fetch_capture_packets())
+        self.packet_list = []
+        for gen in self.generators:
+            self.packet_list.extend(gen.packet_list or [])
+
+    def stop_capture(self):
+        self._run_all(lambda gen: gen.stop_capture())
+
+    def cleanup(self):
+        self._run_all(lambda gen: gen.cleanup())
+
+    def set_service_mode(self, enabled=True):
+        self._run_all(lambda gen: gen.set_service_mode(enabled=enabled))
+
+    def resolve_arp(self, refresh=False):
+        """Resolve all configured remote IP addresses on all generator hosts.
+
+        refresh: if True, ignore the cached MAC addresses and resolve all IP addresses again
+        return: None if ARP failed to resolve for all IP addresses
+                else a dict of list of dest macs indexed by port#
+                the dest macs in the list are indexed by the chain id
+        """
+        host_macs = self._run_all(lambda gen: gen.resolve_arp(refresh=refresh))
+        self.arp_cached = any(gen.arp_cached for gen in self.generators)
+        if None in host_macs:
+            return None
+        arp_dest_macs = {}
+        for port in self.generator_config.ports:
+            dst_macs = [None] * self.generator_config.service_chain_count
+            for macs in host_macs:
+                for chain_id, mac in enumerate(macs[port]):
+                    if mac:
+                        dst_macs[chain_id] = mac
+            arp_dest_macs[port] = dst_macs
+        return arp_dest_macs
@@ -32,6 +32,8 @@ class DummyTG(AbstractTrafficGenerator):
         self.duration_sec = traffic_client.config.duration_sec
         self.intf_speed = traffic_client.generator_config.intf_speed
         self.set_response_curve()
+        self.set_stateful_response()
+        self.set_burst_response()
         self.packet_list = None
 
     def get_version(self):
@@ -46,7 +48,8 @@ class DummyTG(AbstractTrafficGenerator):
         """
         dr, tx = self.__get_dr_actual_tx(tx_rate)
         actual_tx_bps = utils.load_to_bps(tx, self.intf_speed)
-        avg_packet_size = utils.get_average_packet_size(self.l2_frame_size)
+        avg_packet_size = utils.get_average_packet_size(self.l2_frame_size,
+                                                      self.config.pcap_file)
         tx_packets = utils.bps_to_pps(actual_tx_bps, avg_packet_size)
 
         dropped = tx_packets * dr / 100
@@ -75,6 +78,24 @@ class DummyTG(AbstractTrafficGenerator):
         else:
             self.tx_slope = 0
 
+    def set_stateful_response(self, max_cps=100000, avg_delay_usec=50):
+        """Set traffic gen response characteristics in stateful mode.
+
+        :param int max_cps: highest rate of new connections that can be established
+        :param int avg_delay_usec: average latency reported at any rate
+        """
+        self.max_cps = max_cps
+        self.avg_delay_usec = avg_delay_usec
+
+    def set_burst_response(self, max_burst_size=None, burst_dr=1):
+        """Set traffic gen response characteristics with the burst traffic pattern.
+
+        :param int max_burst_size: largest burst size without drop (None for no limit)
+        :param float burst_dr: drop rate (in %, 0..100) added when bursts are larger
+        """
+        self.max_burst_size = max_burst_size
+        self.burst_dr = burst_dr
+
     def __get_dr_actual_tx(self, requested_tx_rate):
         """Get drop rate at given requested tx rate.
 
@@ -89,6 +110,9 @@ class DummyTG(AbstractTrafficGenerator):
             dr = 0.0
         else:
             dr = (actual_tx - self.target_ndr) * self.dr_slope
+        if self.traffic_pattern.type == 'burst' and self.max_burst_size is not None and \
+                self.traffic_pattern.burst_size > self.max_burst_size:
+            dr += self.burst_dr
         return dr, actual_tx
 
     def connect(self):
@@ -102,6 +126,27 @@ class DummyTG(AbstractTrafficGenerator):
     def clear_streamblock(self):
         pass
 
+    def create_stateful_traffic(self):
+        pass
+
+    def run_stateful_traffic(self, cps):
+        """Pretend to run connections at given rate, all connections above max_cps fail."""
+        established_cps = min(cps, self.max_cps)
+        # a connection exchanges about 10 packets and lasts hold_sec + 1 msec
+        pps = established_cps * 10
+        return {
+            'connections_attempted': int(cps * self.duration_sec),
+            'connections_established': int(established_cps * self.duration_sec),
+            'max_active_flows': int(established_cps * (self.config.stateful.hold_sec + 0.001)),
+            'tx_pps': pps,
+            'rx_pps': pps,
+            'tx_bps': pps * 4000,
+            'rx_bps': pps * 4000,
+            'avg_delay_usec': self.avg_delay_usec,
+            'min_delay_usec': 1,
+            'max_delay_usec': self.avg_delay_usec * 2
+        }
+
     def get_stats(self, ifstats=None):
         """Get stats from current run.
 
@@ -148,7 +193,8 @@ class DummyTG(AbstractTrafficGenerator):
         # actual total tx rate in pps
         result['total_tx_rate'] = total_tx_pps
         # actual offered tx rate in bps
-        avg_packet_size = utils.get_average_packet_size(self.l2_frame_size)
+        avg_packet_size = utils.get_average_packet_size(self.l2_frame_size,
+                                                      self.config.pcap_file)
         total_tx_bps = utils.pps_to_bps(total_tx_pps, avg_packet_size)
         result['offered_tx_rate_bps'] = total_tx_bps
 
@@ -164,14 +210,15 @@ class DummyTG(AbstractTrafficGenerator):
             latencies[port].avg_usec = 50
 
     def get_macs(self):
-        return ['00:00:00:00:00:01', '00:00:00:00:00:02']
+        return ['00:00:00:00:00:%02x' % (port + 1)
+                for port in self.traffic_client.generator_config.all_ports]
 
     def get_port_speed_gbps(self):
         """Return the local port speeds.
 
         return: a list of speed in Gbps indexed by the port#
         """
-        return [10, 10]
+        return [10] * len(self.traffic_client.generator_config.all_ports)
 
     def clear_stats(self):
         pass
@@ -210,11 +257,15 @@ class DummyTG(AbstractTrafficGenerator):
     def set_service_mode(self, enabled=True):
         pass
 
-    def resolve_arp(self):
+    def resolve_arp(self, refresh=False):
         """Resolve ARP sucessfully."""
+        # only the chains handled by this generator are resolved
+        chains = self.traffic_client.generator_config.get_chains()
+
         def get_macs(port, scc):
-            return ['00:00:00:00:%02x:%02x' % (port, chain) for chain in range(scc)]
-        scc = self.traffic_client.generator_config.service_chain_count
+            return ['00:00:00:00:%02x:%02x' % (port, chain) if chain in chains else None
+                    for chain in range(scc)]
+        scc = self.traffic_client.config.service_chain_count
         res = [get_macs(port, scc) for port in range(2)]
         LOG.info('Dummy TG ARP: %s', str(res))
         return res
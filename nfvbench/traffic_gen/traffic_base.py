@@ -13,6 +13,7 @@
 #    under the License.
 
 import abc
+import math
 import sys
 
 from nfvbench.log import LOG
@@ -65,12 +66,143 @@ class Latency(object):
 class TrafficGeneratorException(Exception):
     """Exception for traffic generator."""
 
+class TrafficPattern(object):
+    """Traffic pattern of the data streams (see traffic_pattern in the default config).
+
+    All the methods take the average rate to achieve and return the parameters
+    of the TX modes that achieve that average rate with the pattern.
+    """
+
+    TYPES = ['cont', 'burst', 'on_off', 'schedule']
+
+    def __init__(self, pattern_config):
+        self.type = pattern_config.type
+        if self.type not in self.TYPES:
+            raise TrafficGeneratorException('Invalid traffic pattern type %s (must be one of %s)'
+                                            % (self.type, ', '.join(self.TYPES)))
+        self.burst_size = int(pattern_config.burst_size)
+        self.max_burst_size = int(pattern_config.max_burst_size)
+        if self.burst_size < 1 or self.max_burst_size < 1:
+            raise TrafficGeneratorException('Traffic pattern burst sizes must be at least 1')
+        self.inter_burst_gap_usec = pattern_config.inter_burst_gap_usec
+        if self.inter_burst_gap_usec is not None and self.inter_burst_gap_usec < 0:
+            raise TrafficGeneratorException('Traffic pattern inter_burst_gap_usec must not be '
+                                            'negative')
+        self.on_sec = pattern_config.on_sec
+        self.off_sec = pattern_config.off_sec
+        if self.on_sec <= 0 or self.off_sec < 0:
+            raise TrafficGeneratorException('Traffic pattern on_sec must be positive and off_sec '
+                                            'must not be negative')
+        self.schedule = pattern_config.schedule
+        self.schedule_period_sec = pattern_config.schedule_period_sec
+        self.schedule_steps = int(pattern_config.schedule_steps)
+        self.sine_amplitude_percent = pattern_config.sine_amplitude_percent
+        if self.type == 'schedule':
+            self.factors = self.__get_schedule_factors()
+
+    def __get_schedule_factors(self):
+        """Get the rate of each step of the schedule relative to the average rate.
+
+        The factors have an average of 1 and are all positive.
+        """
+        if self.schedule_period_sec <= 0:
+            raise TrafficGeneratorException('Traffic pattern schedule_period_sec must be positive')
+        if self.schedule == 'sine':
+            if self.schedule_steps < 2 or not 0 <= self.sine_amplitude_percent < 100:
+                raise TrafficGeneratorException('Sine schedule requires at least 2 steps and an '
+                                                'amplitude between 0 and 100 (excluded)')
+            amplitude = self.sine_amplitude_percent / 100.0
+            # sample each step in its middle so that the factors average to 1
+            return [1 + amplitude * math.sin(2 * math.pi * (step + 0.5) / self.schedule_steps)
+                    for step in range(self.schedule_steps)]
+        if isinstance(self.schedule, str) or not self.schedule or \
+                min(self.schedule) <= 0:
+            raise TrafficGeneratorException('Traffic pattern schedule must be "sine" or a list '
+                                            'of positive relative rates')
+        total = float(sum(self.schedule))
+        return [value * len(self.schedule) / total for value in self.schedule]
+
+    def is_continuous(self):
+        """Return True if the data streams must be sent continuously."""
+        return self.type == 'cont'
+
+    def get_multi_burst(self, avg_pps, line_pps, duration_sec):
+        """Get the multi-burst parameters of the burst and on_off patterns.
+
+        avg_pps: average rate of the stream in pps
+        line_pps: line rate of the stream in pps (rate of the packets inside a burst)
+        duration_sec: duration of the traffic
+        return: a dict with the following keys:
+            pps: rate of the packets inside a burst
+            pkts_per_burst: number of packets per burst
+            ibg: gap between 2 bursts in usec
+            count: number of bursts
+        """
+        if self.type == 'on_off':
+            period_sec = float(self.on_sec + self.off_sec)
+            pps = avg_pps * period_sec / self.on_sec
+            return {'pps': pps,
+                    'pkts_per_burst': max(1, int(round(pps * self.on_sec))),
+                    'ibg': self.off_sec * 1000000.0,
+                    'count': max(1, int(math.ceil(duration_sec / period_sec)))}
+        # time between the start of 2 consecutive bursts
+        period_sec = self.burst_size / float(avg_pps)
+        if self.inter_burst_gap_usec is None:
+            pps = max(line_pps, avg_pps)
+            ibg = (period_sec - self.burst_size / float(pps)) * 1000000.0
+        else:
+            ibg = float(self.inter_burst_gap_usec)
+            if period_sec <= ibg / 1000000.0:
+                raise TrafficGeneratorException(
+                    'Inter burst gap of %d usec is too large for bursts of %d packets at %d pps'
+                    % (ibg, self.burst_size, avg_pps))
+            pps = self.burst_size / (period_sec - ibg / 1000000.0)
+        return {'pps': pps,
+                'pkts_per_burst': self.burst_size,
+                'ibg': ibg,
+                'count': max(1, int(math.ceil(duration_sec / period_sec)))}
+
+    def get_schedule_steps(self, avg_pps):
+        """Get the single burst parameters of each step of the schedule pattern.
+
+        avg_pps: average rate of the stream in pps
+        return: a list of dict with the following keys:
+            pps: rate of the step
+            total_pkts: number of packets sent during the step
+        """
+        step_sec = float(self.schedule_period_sec) / len(self.factors)
+        steps = []
+        for factor in self.factors:
+            pps = avg_pps * factor
+            steps.append({'pps': pps,
+                          'total_pkts': max(1, int(round(pps * step_sec)))})
+        return steps
+
+    def get_params(self):
+        """Get the parameters of the pattern to report in the results."""
+        params = {'type': self.type}
+        if self.type == 'burst':
+            params['burst_size'] = self.burst_size
+            params['inter_burst_gap_usec'] = self.inter_burst_gap_usec
+        elif self.type == 'on_off':
+            params['on_sec'] = self.on_sec
+            params['off_sec'] = self.off_sec
+        elif self.type == 'schedule':
+            params['schedule'] = self.schedule if isinstance(self.schedule, str) \
+                else list(self.schedule)
+            params['schedule_period_sec'] = self.schedule_period_sec
+            params['relative_rates'] = [round(factor, 3) for factor in self.factors]
+        return params
+
 class AbstractTrafficGenerator(object):
 
     def __init__(self, traffic_client):
         self.traffic_client = traffic_client
         self.generator_config = traffic_client.generator_config
         self.config = traffic_client.config
+        self.traffic_pattern = traffic_client.traffic_pattern
+        # True if some dest MAC addresses of the last ARP resolution come from a cache
+        self.arp_cached = False
 
     @abc.abstractmethod
     def get_version(self):
@@ -121,6 +253,22 @@ class AbstractTrafficGenerator(object):
     def clear_streamblock(self):
         """Clear all streams from the traffic generator."""
 
+    def create_stateful_traffic(self):
+        """Program the TCP connection workload of the stateful mode."""
+        raise TrafficGeneratorException('Stateful traffic is not supported by the %s '
+                                        'traffic generator' % self.generator_config.tool)
+
+    def run_stateful_traffic(self, cps):
+        """Run the TCP connection workload at a given rate for the configured duration.
+
+        cps: rate of new connections per second
+        return: a dict of stats with the following keys:
+            connections_attempted, connections_established, max_active_flows,
+            tx_pps, rx_pps, tx_bps, rx_bps, avg_delay_usec, min_delay_usec, max_delay_usec
+        """
+        raise TrafficGeneratorException('Stateful traffic is not supported by the %s '
+                                        'traffic generator' % self.generator_config.tool)
+
     @abc.abstractmethod
     def resolve_arp(self):
         """Resolve all configured remote IP addresses.
@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import struct
 
 import bitmath
 
@@ -22,22 +23,36 @@ IMIX_RATIOS = [7, 4, 1]
 IMIX_AVG_L2_FRAME_SIZE = sum(
     [1.0 * imix[0] * imix[1] for imix in zip(IMIX_L2_SIZES, IMIX_RATIOS)]) / sum(IMIX_RATIOS)
 
+# frame size value to replay the frames of a pcap file (see pcap_file in the config)
+PCAP_L2_FRAME_SIZE = 'PCAP'
+# Ethernet header size (without VLAN tag) + 4-byte FCS of a replayed pcap frame
+PCAP_L2_OVERHEAD = 18
+
+# pcap file magic numbers (microsecond and nanosecond resolution) in both byte orders
+_PCAP_MAGICS = {b'\xd4\xc3\xb2\xa1': '<', b'\x4d\x3c\xb2\xa1': '<',
+                b'\xa1\xb2\xc3\xd4': '>', b'\xa1\xb2\x3c\x4d': '>'}
+_ETH_TYPE_IP = {0x0800: 4, 0x86DD: 6}
+_ETH_TYPE_VLAN = (0x8100, 0x88A8)
+# parsed pcap files indexed by file name
+_pcap_cache = {}
+
 multiplier_map = {
     'K': 1000,
     'M': 1000000,
     'G': 1000000000
 }
 
-def convert_rates(l2frame_size, rate, intf_speed):
+def convert_rates(l2frame_size, rate, intf_speed, pcap_file=None):
     """Convert a given rate unit into the other rate units.
 
-    l2frame_size: size of the L2 frame in bytes (includes 32-bit FCS) or 'IMIX'
+    l2frame_size: size of the L2 frame in bytes (includes 32-bit FCS), 'IMIX' or 'PCAP'
     rate: a dict that has at least one of the following key:
           'rate_pps', 'rate_bps', 'rate_percent'
           with the corresponding input value
     intf_speed: the line rate speed in bits per second
+    pcap_file: the pcap file to replay if l2frame_size is 'PCAP'
     """
-    avg_packet_size = get_average_packet_size(l2frame_size)
+    avg_packet_size = get_average_packet_size(l2frame_size, pcap_file)
     if 'rate_pps' in rate:
         # input = packets/sec
         initial_rate_type = 'rate_pps'
@@ -66,17 +81,96 @@ def convert_rates(l2frame_size, rate, intf_speed):
     }
 
 
-def get_average_packet_size(l2frame_size):
+def get_average_packet_size(l2frame_size, pcap_file=None):
     """Retrieve the average L2 frame size
 
-    l2frame_size: an L2 frame size in bytes (including FCS) or 'IMIX'
+    l2frame_size: an L2 frame size in bytes (including FCS), 'IMIX' or 'PCAP'
+    pcap_file: the pcap file to replay if l2frame_size is 'PCAP'
     return: average l2 frame size inlcuding the 32-bit FCS
     """
     if l2frame_size.upper() == 'IMIX':
         return IMIX_AVG_L2_FRAME_SIZE
+    if l2frame_size.upper() == PCAP_L2_FRAME_SIZE:
+        return load_pcap(pcap_file).avg_l2_frame_size
     return float(l2frame_size)
 
 
+class PcapFrames(object):
+    """IP frames of a pcap file to replay.
+
+    Only the L3 part of each frame is kept (from the IP header to the end of the frame)
+    since the L2 header (MAC addresses, VLAN) is rewritten for each chain.
+    Frames that are not IPv4 or IPv6 are ignored.
+    """
+
+    def __init__(self, pcap_file):
+        self.pcap_file = pcap_file
+        # list of (ip_version, l3_frame) in the pcap order
+        self.frames = []
+        self.skipped_count = 0
+        for frame in self.__read_frames(pcap_file):
+            ip_frame = self.__get_ip_frame(frame)
+            if ip_frame:
+                self.frames.append(ip_frame)
+            else:
+                self.skipped_count += 1
+        if not self.frames:
+            raise Exception('No IPv4 or IPv6 frame found in pcap file %s' % pcap_file)
+        self.ip_versions = sorted(set(version for version, _ in self.frames))
+        # size of the replayed frames without VLAN tag including the 32-bit FCS
+        self.avg_l2_frame_size = PCAP_L2_OVERHEAD + \
+            sum(len(l3_frame) for _, l3_frame in self.frames) / float(len(self.frames))
+
+    @staticmethod
+    def __read_frames(pcap_file):
+        with open(pcap_file, 'rb') as pcap:
+            data = pcap.read()
+        try:
+            endian = _PCAP_MAGICS[data[:4]]
+        except KeyError:
+            raise Exception('%s is not a pcap file (pcapng is not supported)' % pcap_file)
+        link_type = struct.unpack_from(endian + 'I', data, 20)[0]
+        if link_type != 1:
+            raise Exception('%s is not an Ethernet capture (link type %d)' % (pcap_file,
+                                                                                link_type))
+        frames = []
+        # 24-byte file header then each frame has a 16-byte header
+        offset = 24
+        while offset + 16 <= len(data):
+            captured_len = struct.unpack_from(endian + 'I', data, offset + 8)[0]
+            offset += 16
+            frames.append(data[offset:offset + captured_len])
+            offset += captured_len
+        return frames
+
+    @staticmethod
+    def __get_ip_frame(frame):
+        """Get the IP version and L3 part of an Ethernet frame or None if not IP."""
+        offset = 12
+        while offset + 2 <= len(frame):
+            eth_type = struct.unpack_from('!H', frame, offset)[0]
+            if eth_type in _ETH_TYPE_VLAN:
+                offset += 4
+                continue
+            if eth_type in _ETH_TYPE_IP:
+                return _ETH_TYPE_IP[eth_type], frame[offset + 2:]
+            break
+        return None
+
+
+def load_pcap(pcap_file):
+    """Get the frames of a pcap file.
+
+    A pcap file is only read and parsed once, the frames are then kept in memory
+    for all the frame sizes and runs that use it.
+    """
+    if not pcap_file:
+        raise Exception('Frame size %s requires a pcap file (pcap_file)' % PCAP_L2_FRAME_SIZE)
+    if pcap_file not in _pcap_cache:
+        _pcap_cache[pcap_file] = PcapFrames(pcap_file)
+    return _pcap_cache[pcap_file]
+
+
 def load_to_bps(load_percentage, intf_speed):
     return float(load_percentage) / 100.0 * intf_speed
 
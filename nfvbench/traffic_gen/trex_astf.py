@@ -0,0 +1,172 @@
+# Copyright 2016 Cisco Systems, Inc.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Driver module for TRex traffic generator in advanced stateful mode (ASTF)."""
+
+import time
+
+from netaddr import IPAddress
+from netaddr import IPNetwork
+
+from nfvbench.log import LOG
+
+# pylint: disable=import-error
+from trex.astf.api import ASTFAssociationRule
+from trex.astf.api import ASTFClient
+from trex.astf.api import ASTFIPGen
+from trex.astf.api import ASTFIPGenDist
+from trex.astf.api import ASTFIPGenGlobal
+from trex.astf.api import ASTFProfile
+from trex.astf.api import ASTFProgram
+from trex.astf.api import ASTFTCPClientTemplate
+from trex.astf.api import ASTFTCPServerTemplate
+from trex.astf.api import ASTFTemplate
+# pylint: enable=import-error
+
+from .traffic_base import TrafficGeneratorException
+from .trex_gen import TRex
+from . import traffic_utils as utils
+
+
+class TRexASTF(TRex):
+    """TRex traffic generator driver in advanced stateful mode (ASTF).
+
+    The TCP clients run on the left side ports and the TCP servers on the right side ports.
+    Each port pair carries exactly 1 chain: the dest MAC and VLAN of a port are those of its
+    chain and the client/server IP ranges of a port pair are offset by the share of the
+    ip_addrs networks of 1 chain.
+    """
+
+    # interval in seconds between 2 samples of the number of active flows
+    STATS_POLL_SEC = 1
+
+    def __init__(self, traffic_client):
+        TRex.__init__(self, traffic_client)
+        gen_config = self.generator_config
+        if gen_config.service_chain_count != gen_config.port_pair_count:
+            raise TrafficGeneratorException(
+                'Stateful mode requires 1 chain per port pair (%d chains, %d port pairs)' %
+                (gen_config.service_chain_count, gen_config.port_pair_count))
+        if self.config.vxlan or self.config.mpls or gen_config.ip_version != 4:
+            raise TrafficGeneratorException('Stateful mode is not supported with VxLAN, MPLS '
+                                            'or IPv6')
+        self.stateful = self.config.stateful
+
+    def _create_client(self):
+        """Create the TRex client (advanced stateful mode)."""
+        return ASTFClient(server=self.generator_config.ip,
+                          sync_port=self.generator_config.zmq_rpc_port,
+                          async_port=self.generator_config.zmq_pub_port)
+
+    def _reset_client(self):
+        """Reset all the ports (the ASTF client always owns all the ports)."""
+        self.client.reset()
+
+    def create_traffic(self, l2frame_size, rates, bidirectional, latency=True, e2e=False):
+        raise TrafficGeneratorException('Stateless traffic is not supported in stateful mode')
+
+    def __get_ip_range(self, port, count):
+        """Get the first and last IP addresses of the first chain on a given side."""
+        network = IPNetwork(self.generator_config.ip_addrs[port])
+        count = max(1, min(count, network.size // self.chain_count))
+        return [str(network.network), str(network.network + count - 1)]
+
+    def __get_ip_offset(self):
+        """Get the offset between the IP ranges of 2 consecutive port pairs (i.e. chains)."""
+        size = min(IPNetwork(ip_addrs).size for ip_addrs in self.generator_config.ip_addrs)
+        return str(IPAddress(size // self.chain_count))
+
+    def __get_profile(self):
+        """Build the ASTF profile: 1 request/response exchange per TCP connection."""
+        stateful = self.stateful
+        client_program = ASTFProgram()
+        client_program.send('x' * stateful.request_size)
+        client_program.recv(stateful.response_size)
+        server_program = ASTFProgram()
+        server_program.recv(stateful.request_size)
+        server_program.send('y' * stateful.response_size)
+        if stateful.hold_sec:
+            # keep the connection open, the client closes it
+            client_program.delay(int(stateful.hold_sec * 1000000))
+            server_program.wait_for_peer_close()
+        ip_gen = ASTFIPGen(glob=ASTFIPGenGlobal(ip_offset=self.__get_ip_offset()),
+                           dist_client=ASTFIPGenDist(
+                               ip_range=self.__get_ip_range(0, stateful.client_ip_count),
+                               distribution='seq'),
+                           dist_server=ASTFIPGenDist(
+                               ip_range=self.__get_ip_range(1, stateful.server_ip_count),
+                               distribution='seq'))
+        # the template rate is 1 connection per second, the actual rate is set with the
+        # multiplier when starting the traffic
+        client_template = ASTFTCPClientTemplate(program=client_program, ip_gen=ip_gen,
+                                                port=stateful.server_port, cps=1)
+        server_template = ASTFTCPServerTemplate(
+            program=server_program, assoc=ASTFAssociationRule(port=stateful.server_port))
+        template = ASTFTemplate(client_template=client_template, server_template=server_template)
+        return ASTFProfile(default_ip_gen=ip_gen, templates=template)
+
+    def create_stateful_traffic(self):
+        """Set the L2 settings of all ports and load the TCP connection profile."""
+        gen_config = self.generator_config
+        self._reset_client()
+        for port, device in zip(gen_config.ports, gen_config.devices):
+            dest_macs = device.get_dest_macs()
+            for chain_idx in gen_config.get_chains():
+                tg_port = gen_config.get_chain_port(port, chain_idx)
+                self.client.set_l2_mode(tg_port, dst_mac=dest_macs[chain_idx])
+                if device.vlans:
+                    self.client.set_vlan(ports=tg_port, vlan=device.vlans[chain_idx])
+        self.client.load_profile(self.__get_profile())
+        LOG.info('Loaded stateful profile: %d client IPs, %d server IPs, server port %d',
+                 self.stateful.client_ip_count, self.stateful.server_ip_count,
+                 self.stateful.server_port)
+
+    def run_stateful_traffic(self, cps):
+        """Run the TCP connections at a given rate for the configured duration."""
+        self.client.clear_stats()
+        self.client.start(mult=cps, duration=self.config.duration_sec,
+                          latency_pps=self.stateful.latency_pps)
+        # the number of active flows is only known while the traffic is running
+        max_active_flows = 0
+        while self.client.is_traffic_active():
+            time.sleep(self.STATS_POLL_SEC)
+            client_stats = self.client.get_stats()['traffic']['client']
+            max_active_flows = max(max_active_flows, client_stats.get('m_active_flows', 0))
+        return self.extract_stateful_stats(self.client.get_stats(), max_active_flows)
+
+    def extract_stateful_stats(self, in_stats, max_active_flows):
+        """Extract the connection counters, rates and latency from the ASTF stats."""
+        duration = self.config.duration_sec
+        client_stats = in_stats['traffic']['client']
+        total = in_stats['total']
+        result = {
+            'connections_attempted': client_stats.get('tcps_connattempt', 0),
+            'connections_established': client_stats.get('tcps_connects', 0),
+            'max_active_flows': max_active_flows,
+            'tx_pps': int(total['opackets'] / duration),
+            'rx_pps': int(total['ipackets'] / duration),
+            'tx_bps': int(total['obytes'] * 8 / duration),
+            'rx_bps': int(total['ibytes'] * 8 / duration),
+            'avg_delay_usec': 0,
+            'min_delay_usec': 0,
+            'max_delay_usec': 0
+        }
+        # latency histograms of all ports that received latency probes
+        hists = [port_stats['hist'] for port_stats in in_stats.get('latency', {}).values()
+                 if isinstance(port_stats, dict) and port_stats.get('hist', {}).get('cnt')]
+        if hists:
+            result['avg_delay_usec'] = int(utils.weighted_avg([hist['cnt'] for hist in hists],
+                                                              [hist['s_avg'] for hist in hists]))
+            result['min_delay_usec'] = min(hist['min_usec'] for hist in hists)
+            result['max_delay_usec'] = max(hist['s_max'] for hist in hists)
+        return result
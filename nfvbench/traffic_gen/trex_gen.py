@@ -17,6 +17,7 @@ import math
 import os
 import sys
 import random
+import threading
 import time
 import traceback
 from functools import reduce
@@ -24,9 +25,13 @@ from functools import reduce
 from itertools import count
 # pylint: disable=import-error
 from scapy.contrib.mpls import MPLS  # flake8: noqa
+from scapy.layers.inet6 import IPv6
 # pylint: enable=import-error
+from netaddr import IPAddress
 from nfvbench.log import LOG
 from nfvbench.specs import ChainType
+from nfvbench.traffic_server import get_server_manager
+from nfvbench.traffic_server import TREX_LOG_PATH
 from nfvbench.traffic_server import TRexTrafficServer
 from nfvbench.utils import cast_integer
 from nfvbench.utils import timeout
@@ -53,12 +58,14 @@ from trex.stl.api import STLScVmRaw
 from trex.stl.api import STLStream
 from trex.stl.api import STLTXCont
 from trex.stl.api import STLTXMultiBurst
+from trex.stl.api import STLTXSingleBurst
 from trex.stl.api import STLVmFixChecksumHw
 from trex.stl.api import STLVmFixIpv4
 from trex.stl.api import STLVmFlowVar
 from trex.stl.api import STLVmFlowVarRepeatableRandom
 from trex.stl.api import STLVmTupleGen
 from trex.stl.api import STLVmWrFlowVar
+from trex.stl.api import TCP
 from trex.stl.api import ThreeBytesField
 from trex.stl.api import UDP
 from trex.stl.api import XByteField
@@ -67,10 +74,12 @@ from trex.stl.api import XByteField
 
 from .traffic_base import AbstractTrafficGenerator
 from .traffic_base import TrafficGeneratorException
+from .trex_service_nd import ServiceND
 from . import traffic_utils as utils
 from .traffic_utils import IMIX_AVG_L2_FRAME_SIZE
 from .traffic_utils import IMIX_L2_SIZES
 from .traffic_utils import IMIX_RATIOS
+from .traffic_utils import PCAP_L2_FRAME_SIZE
 
 class VXLAN(Packet):
     """VxLAN class."""
@@ -85,18 +94,63 @@ class VXLAN(Packet):
         """Summary."""
         return self.sprintf("VXLAN (vni=%VXLAN.vni%)")
 
+class ArpCache(object):
+    """Cache of the MAC addresses resolved by ARP (or ND), shared by all runs of a process.
+
+    Entries are indexed by (TRex server, port, vlan, src IP, dst IP) and expire after a TTL,
+    this avoids resolving all chains again for every run in server mode.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        # generator hosts of a distributed traffic generator resolve in parallel
+        self.lock = threading.Lock()
+
+    def get(self, key, ttl_sec):
+        """Get the MAC address of a key or None if not cached or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and time.time() - entry[1] < ttl_sec:
+            return entry[0]
+        return None
+
+    def put(self, key, mac):
+        with self.lock:
+            self.entries[key] = (mac, time.time())
+
+    def remove(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+ARP_CACHE = ArpCache()
+
+
 class TRex(AbstractTrafficGenerator):
     """TRex traffic generator driver."""
 
-    LATENCY_PPS = 1000
     CHAIN_PG_ID_MASK = 0x007F
     PORT_PG_ID_MASK = 0x0080
     LATENCY_PG_ID_MASK = 0x0100
+    LATENCY_STREAM_PG_ID_SHIFT = 9
+    # first delay between 2 ARP attempts, doubled at every attempt up to generic_poll_sec
+    ARP_MIN_RETRY_SEC = 0.25
+    # delay between 2 connection attempts used to convert generic_retry_count into the max
+    # time to wait for a starting TRex server (as the previous connection loop did)
+    CONNECT_RETRY_SEC = 1
+    # min L2 frame size (including FCS) of a latency packet (16-byte payload) without VLAN tag
+    MIN_LATENCY_L2_FRAME_SIZE = {4: 64, 6: 82}
 
     def __init__(self, traffic_client):
         """Trex driver."""
         AbstractTrafficGenerator.__init__(self, traffic_client)
         self.client = None
+        # manager of the local TRex server (None for a remote server)
+        self.server_manager = None
         self.id = count()
         self.port_handle = []
         self.chain_count = self.generator_config.service_chain_count
@@ -104,6 +158,11 @@ class TRex(AbstractTrafficGenerator):
         self.capture_id = None
         self.packet_list = []
         self.l2_frame_size = 0
+        # total rate of the latency streams of a chain in each direction
+        self.latency_pps = self.config.latency_pps
+        self.latency_stream_count = self.config.latency_stream_count
+        # arguments of the last create_traffic, used to re-program the streams
+        self.stream_args = None
 
     def get_version(self):
         """Get the Trex version."""
@@ -114,16 +173,23 @@ class TRex(AbstractTrafficGenerator):
 
         port: 0 or 1
         chain_id: identifies to which chain the pg_id is associated (0 to 255)
-        return: pg_id, lat_pg_id
+        return: pg_id, lat_pg_id (pg_id of the first latency stream)
 
-        We use a bit mask to set up the 3 fields:
+        We use a bit mask to set up the 4 fields:
         0x007F: chain ID (8 bits for a max of 128 chains)
         0x0080: port bit
         0x0100: latency bit
+        0x1E00: latency stream index (see get_latency_pg_ids)
         """
         pg_id = port * TRex.PORT_PG_ID_MASK | chain_id
         return pg_id, pg_id | TRex.LATENCY_PG_ID_MASK
 
+    def get_latency_pg_ids(self, port, chain_id):
+        """Get the packet group IDs of all the latency streams of a given port/chain_id."""
+        _, lat_pg_id = self.get_pg_id(port, chain_id)
+        return [lat_pg_id | index << TRex.LATENCY_STREAM_PG_ID_SHIFT
+                for index in range(self.latency_stream_count)]
+
     def extract_stats(self, in_stats, ifstats):
         """Extract stats from dict returned by Trex API.
 
@@ -131,11 +197,12 @@ class TRex(AbstractTrafficGenerator):
         """
         utils.nan_replace(in_stats)
         # LOG.debug(in_stats)
+        in_stats = self.__merge_port_pair_stats(in_stats)
 
         result = {}
-        # port_handles should have only 2 elements: [0, 1]
+        # logical ports are always [0, 1]
         # so (1 - ph) will be the index for the far end port
-        for ph in self.port_handle:
+        for ph in self.generator_config.ports:
             stats = in_stats[ph]
             far_end_stats = in_stats[1 - ph]
             result[ph] = {
@@ -167,11 +234,12 @@ class TRex(AbstractTrafficGenerator):
                 global_total_tx_pkts = total_tx_pkts
                 total_tx_pkts = 0
                 if ifstats:
-                    for chain_id, _ in enumerate(ifstats):
-                        for ph in self.port_handle:
-                            pg_id, lat_pg_id = self.get_pg_id(ph, chain_id)
-                            flows_tx_pkts = in_stats['flow_stats'][pg_id]['tx_pkts']['total'] + \
-                                            in_stats['flow_stats'][lat_pg_id]['tx_pkts']['total']
+                    for chain_id in self.generator_config.get_chains():
+                        for ph in self.generator_config.ports:
+                            pg_id, _ = self.get_pg_id(ph, chain_id)
+                            flows_tx_pkts = sum(in_stats['flow_stats'][pid]['tx_pkts']['total']
+                                                for pid in [pg_id] +
+                                                self.get_latency_pg_ids(ph, chain_id))
                             result[ph]['tx']['total_pkts'] = flows_tx_pkts
                             total_tx_pkts += flows_tx_pkts
                 else:
@@ -187,7 +255,8 @@ class TRex(AbstractTrafficGenerator):
 
         result["total_tx_rate"] = cast_integer(total_tx_pkts / self.config.duration_sec)
         # actual offered tx rate in bps
-        avg_packet_size = utils.get_average_packet_size(self.l2_frame_size)
+        avg_packet_size = utils.get_average_packet_size(self.l2_frame_size,
+                                                      self.config.pcap_file)
         total_tx_bps = utils.pps_to_bps(result["total_tx_rate"], avg_packet_size)
         result['offered_tx_rate_bps'] = total_tx_bps
 
@@ -202,11 +271,11 @@ class TRex(AbstractTrafficGenerator):
         try:
             hdrh_list = []
             if ifstats:
-                for chain_id, _ in enumerate(ifstats):
-                    for ph in self.port_handle:
-                        _, lat_pg_id = self.get_pg_id(ph, chain_id)
-                        hdrh_list.append(
-                            HdrHistogram.decode(in_stats['latency'][lat_pg_id]['latency']['hdrh']))
+                for chain_id in self.generator_config.get_chains():
+                    for ph in self.generator_config.ports:
+                        for lat_pg_id in self.get_latency_pg_ids(ph, chain_id):
+                            hdrh_list.append(HdrHistogram.decode(
+                                in_stats['latency'][lat_pg_id]['latency']['hdrh']))
             else:
                 for pg_id in in_stats['latency']:
                     if pg_id != 'global':
@@ -223,6 +292,25 @@ class TRex(AbstractTrafficGenerator):
 
         return result
 
+    def __merge_port_pair_stats(self, in_stats):
+        """Aggregate the port stats of all port pairs into the 2 logical ports.
+
+        With more than 1 port pair, the stats of all even ports are added up in logical port 0
+        and the stats of all odd ports are added up in logical port 1.
+        Other entries (flow_stats, latency...) are left unchanged.
+        """
+        if self.generator_config.port_pair_count == 1:
+            return in_stats
+        stats = dict(in_stats)
+        for port in self.generator_config.ports:
+            port_stats = {}
+            for phys_port in self.generator_config.all_ports[port::2]:
+                for key, value in in_stats[phys_port].items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        port_stats[key] = port_stats.get(key, 0) + value
+            stats[port] = port_stats
+        return stats
+
     def get_stream_stats(self, trex_stats, if_stats, latencies, chain_idx):
         """Extract the aggregated stats for a given chain.
 
@@ -289,6 +377,10 @@ class TRex(AbstractTrafficGenerator):
         rx_pkts_port(1-p) comes from pg_id(port=p, chain_idx)['rx_pkts'][1-p]
 
         If there are latency streams, those same counters need to be added in the same way
+        and the latency of all the latency streams of the chain on a port are merged
+
+        With more than 1 port pair, p is the logical port and the counters are read from the
+        actual traffic generator port used by the chain on that side.
         """
         def get_latency(lval):
             try:
@@ -299,26 +391,38 @@ class TRex(AbstractTrafficGenerator):
         for ifs in if_stats:
             ifs.tx = ifs.rx = 0
         for port in range(2):
-            pg_id, lat_pg_id = self.get_pg_id(port, chain_idx)
-            for pid in [pg_id, lat_pg_id]:
+            pg_id, _ = self.get_pg_id(port, chain_idx)
+            lat_pg_ids = self.get_latency_pg_ids(port, chain_idx)
+            tx_port = self.generator_config.get_chain_port(port, chain_idx)
+            rx_port = self.generator_config.get_chain_port(1 - port, chain_idx)
+            for pid in [pg_id] + lat_pg_ids:
                 try:
                     pg_stats = trex_stats['flow_stats'][pid]
-                    if_stats[port].tx += pg_stats['tx_pkts'][port]
-                    if_stats[1 - port].rx += pg_stats['rx_pkts'][1 - port]
+                    if_stats[port].tx += pg_stats['tx_pkts'][tx_port]
+                    if_stats[1 - port].rx += pg_stats['rx_pkts'][rx_port]
                 except KeyError:
                     pass
             try:
-                lat = trex_stats['latency'][lat_pg_id]['latency']
+                lats = [trex_stats['latency'][lat_pg_id]['latency'] for lat_pg_id in lat_pg_ids]
                 # dropped_pkts += lat['err_cntrs']['dropped']
-                latencies[port].max_usec = get_latency(lat['total_max'])
-                if math.isnan(lat['total_min']):
+                latencies[port].max_usec = get_latency(max(lat['total_max'] for lat in lats))
+                mins = [lat['total_min'] for lat in lats if not math.isnan(lat['total_min'])]
+                if not mins:
                     latencies[port].min_usec = 0
                     latencies[port].avg_usec = 0
                 else:
-                    latencies[port].min_usec = get_latency(lat['total_min'])
-                    latencies[port].avg_usec = get_latency(lat['average'])
+                    latencies[port].min_usec = get_latency(min(mins))
+                    # all the latency streams of a chain have the same rate
+                    latencies[port].avg_usec = get_latency(
+                        sum(lat['average'] for lat in lats) / len(lats))
                 # pick up the HDR histogram if present (otherwise will raise KeyError)
-                latencies[port].hdrh = lat['hdrh']
+                if len(lats) == 1:
+                    latencies[port].hdrh = lats[0]['hdrh']
+                else:
+                    hdrh = HdrHistogram.decode(lats[0]['hdrh'])
+                    for lat in lats[1:]:
+                        hdrh.add(HdrHistogram.decode(lat['hdrh']))
+                    latencies[port].hdrh = HdrHistogram.encode(hdrh).decode('utf-8')
             except KeyError:
                 pass
 
@@ -388,30 +492,62 @@ class TRex(AbstractTrafficGenerator):
         total_max = 0
         average = 0
         total_min = float("inf")
-        for chain_id in range(self.chain_count):
-            try:
-                _, lat_pg_id = self.get_pg_id(port_handle, chain_id)
-                lat = in_stats['latency'][lat_pg_id]['latency']
-                # dropped_pkts += lat['err_cntrs']['dropped']
-                total_max = max(lat['total_max'], total_max)
-                total_min = min(lat['total_min'], total_min)
-                average += lat['average']
-            except KeyError:
-                pass
+        for chain_id in self.generator_config.get_chains():
+            for lat_pg_id in self.get_latency_pg_ids(port_handle, chain_id):
+                try:
+                    lat = in_stats['latency'][lat_pg_id]['latency']
+                    # dropped_pkts += lat['err_cntrs']['dropped']
+                    total_max = max(lat['total_max'], total_max)
+                    total_min = min(lat['total_min'], total_min)
+                    average += lat['average']
+                except KeyError:
+                    pass
         if total_min == float("inf"):
             total_min = 0
         results['min_delay_usec'] = total_min
         results['max_delay_usec'] = total_max
-        results['avg_delay_usec'] = int(average / self.chain_count)
+        results['avg_delay_usec'] = int(average / (self.chain_count * self.latency_stream_count))
 
     def _bind_vxlan(self):
         bind_layers(UDP, VXLAN, dport=4789)
         bind_layers(VXLAN, Ether)
 
-    def _create_pkt(self, stream_cfg, l2frame_size, disable_random_latency_flow=False):
+    @staticmethod
+    def __get_flow_tuple(stream_cfg, udp_args, flow):
+        """Get the IP addresses and UDP ports of a flow in the flow range of a chain.
+
+        flow: index of the flow in the flow range of the chain
+        return: source IP, destination IP, source UDP port, destination UDP port
+        """
+        ip_step = 1 if stream_cfg['ip_addrs_step'] == 'random' \
+            else int(IPAddress(stream_cfg['ip_addrs_step']))
+        src_ip = IPAddress(stream_cfg['ip_src_addr']) + \
+            flow % stream_cfg['ip_src_count'] * ip_step
+        dst_ip = IPAddress(stream_cfg['ip_dst_addr']) + \
+            flow % stream_cfg['ip_dst_count'] * ip_step
+        src_port = udp_args['sport'] + flow % stream_cfg['udp_src_count'] * udp_args['sport_step']
+        dst_port = udp_args['dport'] + flow % stream_cfg['udp_dst_count'] * udp_args['dport_step']
+        return str(src_ip), str(dst_ip), src_port, dst_port
+
+    def __get_latency_flow(self, stream_cfg, index):
+        """Get the flow to send on a given latency stream of a chain.
+
+        index: index of the latency stream of the chain
+        return: None if the latency stream can cycle through all the flows of the chain
+                or the index of the only flow to send in the flow range of the chain
+        """
+        if self.latency_stream_count == 1 and stream_cfg['ip_addrs_step'] != 'random' and \
+                stream_cfg['udp_port_step'] != 'random':
+            return None
+        # with random steps, force each latency stream to only one flow to avoid creating flows
+        # over requested flow count, the flows of the streams are spread over the flow range
+        return index * stream_cfg['count'] // self.latency_stream_count
+
+    def _create_pkt(self, stream_cfg, l2frame_size, latency_flow=None):
         """Create a packet of given size.
 
         l2frame_size: size of the L2 frame in bytes (including the 32-bit FCS)
+        latency_flow: if not None, only send the flow of that index in the flow range
         """
         # Trex will add the FCS field, so we need to remove 4 bytes from the l2 frame size
         frame_size = int(l2frame_size) - 4
@@ -471,11 +607,31 @@ class TRex(AbstractTrafficGenerator):
             udp_args['dport_step'] = int(step)
             udp_args['dport_max'] = int(stream_cfg['udp_dst_port_max'])
 
-        pkt_base /= IP(src=stream_cfg['ip_src_addr'], dst=stream_cfg['ip_dst_addr']) / \
-                    UDP(dport=udp_args['dport'], sport=udp_args['sport'])
+        ipv6 = stream_cfg['ip_version'] == 6
+        if ipv6:
+            l3_layer = 'IPv6'
+            pkt_base /= IPv6(src=stream_cfg['ip_src_addr'], dst=stream_cfg['ip_dst_addr']) / \
+                UDP(dport=udp_args['dport'], sport=udp_args['sport'])
+            # flow variables are at most 8 bytes, only the low 32 bits of the IPv6 addresses
+            # are varied (the IP ranges of a chain never cross a 2^32 boundary)
+            ip_value = self.__get_ipv6_low_bits
+            ip_step = int(IPAddress(stream_cfg['ip_addrs_step'])) \
+                if stream_cfg['ip_addrs_step'] != 'random' else 1
+            ip_wr_args = {'offset_fixup': 12}
+        else:
+            l3_layer = 'IP'
+            pkt_base /= IP(src=stream_cfg['ip_src_addr'], dst=stream_cfg['ip_dst_addr']) / \
+                UDP(dport=udp_args['dport'], sport=udp_args['sport'])
+            ip_value = str
+            ip_step = stream_cfg['ip_addrs_step']
+            ip_wr_args = {}
 
         # STLVmTupleGen need flow count >= cores used by TRex, if FC < cores we used STLVmFlowVar
-        if stream_cfg['ip_addrs_step'] == '0.0.0.1' and stream_cfg['udp_port_step'] == '1' and \
+        # STLVmTupleGen only supports IPv4 addresses
+        if latency_flow is not None:
+            flow_tuple = self.__get_flow_tuple(stream_cfg, udp_args, latency_flow)
+        if not ipv6 and latency_flow is None and stream_cfg['ip_addrs_step'] == '0.0.0.1' and \
+                stream_cfg['udp_port_step'] == '1' and \
                 stream_cfg['count'] >= self.generator_config.cores:
             src_fv = STLVmTupleGen(ip_min=stream_cfg['ip_src_addr'],
                                    ip_max=stream_cfg['ip_src_addr_max'],
@@ -502,58 +658,58 @@ class TRex(AbstractTrafficGenerator):
                                pkt_offset="UDP:{}.dport".format(encap_level)),
             ]
         else:
-            if disable_random_latency_flow:
+            if latency_flow is not None:
                 src_fv_ip = STLVmFlowVar(
                     name="ip_src",
-                    min_value=stream_cfg['ip_src_addr'],
-                    max_value=stream_cfg['ip_src_addr'],
+                    min_value=ip_value(flow_tuple[0]),
+                    max_value=ip_value(flow_tuple[0]),
                     size=4)
                 dst_fv_ip = STLVmFlowVar(
                     name="ip_dst",
-                    min_value=stream_cfg['ip_dst_addr'],
-                    max_value=stream_cfg['ip_dst_addr'],
+                    min_value=ip_value(flow_tuple[1]),
+                    max_value=ip_value(flow_tuple[1]),
                     size=4)
             elif stream_cfg['ip_addrs_step'] == 'random':
                 src_fv_ip = STLVmFlowVarRepeatableRandom(
                     name="ip_src",
-                    min_value=stream_cfg['ip_src_addr'],
-                    max_value=stream_cfg['ip_src_addr_max'],
+                    min_value=ip_value(stream_cfg['ip_src_addr']),
+                    max_value=ip_value(stream_cfg['ip_src_addr_max']),
                     size=4,
                     seed=random.randint(0, 32767),
                     limit=stream_cfg['ip_src_count'])
                 dst_fv_ip = STLVmFlowVarRepeatableRandom(
                     name="ip_dst",
-                    min_value=stream_cfg['ip_dst_addr'],
-                    max_value=stream_cfg['ip_dst_addr_max'],
+                    min_value=ip_value(stream_cfg['ip_dst_addr']),
+                    max_value=ip_value(stream_cfg['ip_dst_addr_max']),
                     size=4,
                     seed=random.randint(0, 32767),
                     limit=stream_cfg['ip_dst_count'])
             else:
                 src_fv_ip = STLVmFlowVar(
                     name="ip_src",
-                    min_value=stream_cfg['ip_src_addr'],
-                    max_value=stream_cfg['ip_src_addr_max'],
+                    min_value=ip_value(stream_cfg['ip_src_addr']),
+                    max_value=ip_value(stream_cfg['ip_src_addr_max']),
                     size=4,
                     op="inc",
-                    step=stream_cfg['ip_addrs_step'])
+                    step=ip_step)
                 dst_fv_ip = STLVmFlowVar(
                     name="ip_dst",
-                    min_value=stream_cfg['ip_dst_addr'],
-                    max_value=stream_cfg['ip_dst_addr_max'],
+                    min_value=ip_value(stream_cfg['ip_dst_addr']),
+                    max_value=ip_value(stream_cfg['ip_dst_addr_max']),
                     size=4,
                     op="inc",
-                    step=stream_cfg['ip_addrs_step'])
+                    step=ip_step)
 
-            if disable_random_latency_flow:
+            if latency_flow is not None:
                 src_fv_port = STLVmFlowVar(
                     name="p_src",
-                    min_value=udp_args['sport'],
-                    max_value=udp_args['sport'],
+                    min_value=flow_tuple[2],
+                    max_value=flow_tuple[2],
                     size=2)
                 dst_fv_port = STLVmFlowVar(
                     name="p_dst",
-                    min_value=udp_args['dport'],
-                    max_value=udp_args['dport'],
+                    min_value=flow_tuple[3],
+                    max_value=flow_tuple[3],
                     size=2)
             elif stream_cfg['udp_port_step'] == 'random':
                 src_fv_port = STLVmFlowVarRepeatableRandom(
@@ -587,16 +743,20 @@ class TRex(AbstractTrafficGenerator):
                     step=udp_args['dport_step'])
             vm_param = [
                 src_fv_ip,
-                STLVmWrFlowVar(fv_name="ip_src", pkt_offset="IP:{}.src".format(encap_level)),
+                STLVmWrFlowVar(fv_name="ip_src",
+                               pkt_offset="{}:{}.src".format(l3_layer, encap_level),
+                               **ip_wr_args),
                 src_fv_port,
                 STLVmWrFlowVar(fv_name="p_src", pkt_offset="UDP:{}.sport".format(encap_level)),
                 dst_fv_ip,
-                STLVmWrFlowVar(fv_name="ip_dst", pkt_offset="IP:{}.dst".format(encap_level)),
+                STLVmWrFlowVar(fv_name="ip_dst",
+                               pkt_offset="{}:{}.dst".format(l3_layer, encap_level),
+                               **ip_wr_args),
                 dst_fv_port,
                 STLVmWrFlowVar(fv_name="p_dst", pkt_offset="UDP:{}.dport".format(encap_level)),
             ]
         # Use HW Offload to calculate the outter IP/UDP packet
-        vm_param.append(STLVmFixChecksumHw(l3_offset="IP:0",
+        vm_param.append(STLVmFixChecksumHw(l3_offset="{}:0".format(l3_layer),
                                            l4_offset="UDP:0",
                                            l4_type=CTRexVmInsFixHwCs.L4_TYPE_UDP))
         # Use software to fix the inner IP/UDP payload for VxLAN packets
@@ -607,6 +767,68 @@ class TRex(AbstractTrafficGenerator):
         return STLPktBuilder(pkt=pkt_base / pad,
                              vm=STLScVmRaw(vm_param, cache_size=int(self.config.cache_size)))
 
+    def _create_pcap_pkt(self, stream_cfg, l3_frame):
+        """Create a packet from the L3 part of a pcap frame rewritten for a given chain.
+
+        The MAC addresses and VLAN are those of the chain and the IP addresses vary within
+        the IP ranges of the chain, the rest of the frame is replayed as captured.
+        """
+        ipv6 = stream_cfg['ip_version'] == 6
+        pkt_base = Ether(src=stream_cfg['mac_src'], dst=stream_cfg['mac_dst'])
+        if stream_cfg['vlan_tag'] is not None:
+            pkt_base /= Dot1Q(vlan=stream_cfg['vlan_tag'])
+        if ipv6:
+            l3_layer = 'IPv6'
+            l3_pkt = IPv6(l3_frame)
+            ip_value = self.__get_ipv6_low_bits
+            ip_wr_args = {'offset_fixup': 12}
+        else:
+            l3_layer = 'IP'
+            l3_pkt = IP(l3_frame)
+            # let scapy recalculate the IP header checksum
+            del l3_pkt.chksum
+            ip_value = str
+            ip_wr_args = {}
+        l3_pkt.src = stream_cfg['ip_src_addr']
+        l3_pkt.dst = stream_cfg['ip_dst_addr']
+        if stream_cfg['ip_addrs_step'] == 'random':
+            ip_step = 1
+        elif ipv6:
+            ip_step = int(IPAddress(stream_cfg['ip_addrs_step']))
+        else:
+            ip_step = stream_cfg['ip_addrs_step']
+        vm_param = []
+        for direction in ['src', 'dst']:
+            fv_name = 'ip_' + direction
+            vm_param.append(STLVmFlowVar(
+                name=fv_name,
+                min_value=ip_value(stream_cfg['ip_{}_addr'.format(direction)]),
+                max_value=ip_value(stream_cfg['ip_{}_addr_max'.format(direction)]),
+                size=4,
+                op="inc",
+                step=ip_step))
+            vm_param.append(STLVmWrFlowVar(fv_name=fv_name,
+                                           pkt_offset="{}.{}".format(l3_layer, direction),
+                                           **ip_wr_args))
+        # the L4 checksum covers the IP addresses
+        if UDP in l3_pkt:
+            vm_param.append(STLVmFixChecksumHw(l3_offset=l3_layer,
+                                               l4_offset="UDP",
+                                               l4_type=CTRexVmInsFixHwCs.L4_TYPE_UDP))
+        elif TCP in l3_pkt:
+            vm_param.append(STLVmFixChecksumHw(l3_offset=l3_layer,
+                                               l4_offset="TCP",
+                                               l4_type=CTRexVmInsFixHwCs.L4_TYPE_TCP))
+        elif not ipv6:
+            vm_param.append(STLVmFixIpv4(offset="IP"))
+        return STLPktBuilder(pkt=pkt_base / l3_pkt,
+                             vm=STLScVmRaw(vm_param, cache_size=int(self.config.cache_size)))
+
+    @staticmethod
+    def __get_ipv6_low_bits(addr):
+        """Get the value of the low 32 bits of an IPv6 address."""
+        return int(IPAddress(addr)) & 0xFFFFFFFF
+
     def _create_gratuitous_arp_pkt(self, stream_cfg):
         """Create a GARP packet.
 
@@ -623,6 +845,57 @@ class TRex(AbstractTrafficGenerator):
 
         return STLPktBuilder(pkt=pkt_base)
 
+    def __get_chain_data_pps(self, port, latency):
+        """Get the average rate in pps of the data streams of 1 chain.
+
+        port: port where the streams originate (0 or 1)
+        latency: True if the chain also has a latency stream on that port
+        """
+        intf_speed = self.generator_config.intf_speed
+        rate = utils.parse_rate_str(self.rates[port])
+        pps = float(utils.convert_rates(self.l2_frame_size, rate, intf_speed,
+                                        self.config.pcap_file)['rate_pps']) / self.chain_count
+        if latency:
+            pps -= self.latency_pps
+        if self.config.periodic_gratuitous_arp:
+            pps -= self.config.gratuitous_arp_pps
+        return max(pps, 1)
+
+    def __get_data_streams(self, port, pkt, flow_stats, cont_mode, share, latency, e2e):
+        """Create the data streams of a chain for a given packet using the traffic pattern.
+
+        port: port where the streams originate (0 or 1)
+        pkt: packet to send
+        flow_stats: flow stats of the streams or None
+        cont_mode: TX mode to use if the traffic is continuous
+        share: share of the chain data rate carried by the packet (0..1)
+        latency: True if the chain also has a latency stream on that port
+        e2e: True if performing "end to end" connectivity check (always continuous)
+
+        Continuous streams are scaled by the multiplier when starting the traffic,
+        streams of other patterns have absolute rates derived from the current port rate.
+        """
+        pattern = self.traffic_pattern
+        if pattern.is_continuous() or e2e:
+            return [STLStream(packet=pkt, flow_stats=flow_stats, mode=cont_mode)]
+        avg_pps = self.__get_chain_data_pps(port, latency) * share
+        if pattern.type == 'schedule':
+            # 1 single burst stream per step, each step starts the next one and
+            # the last step loops back to the first step
+            names = ['pattern-%d' % next(self.id) for _ in pattern.factors]
+            steps = pattern.get_schedule_steps(avg_pps)
+            return [STLStream(packet=pkt, flow_stats=flow_stats,
+                              name=name, next=names[(index + 1) % len(names)],
+                              self_start=index == 0,
+                              mode=STLTXSingleBurst(**step))
+                    for index, (name, step) in enumerate(zip(names, steps))]
+        line_pps = float(utils.convert_rates(self.l2_frame_size, {'rate_percent': '100'},
+                                             self.generator_config.intf_speed,
+                                             self.config.pcap_file)['rate_pps'])
+        line_pps = line_pps * share / self.chain_count
+        burst = pattern.get_multi_burst(avg_pps, line_pps, self.config.duration_sec)
+        return [STLStream(packet=pkt, flow_stats=flow_stats, mode=STLTXMultiBurst(**burst))]
+
     def generate_streams(self, port, chain_id, stream_cfg, l2frame, latency=True,
                          e2e=False):
         """Create a list of streams corresponding to a given chain and stream config.
@@ -630,40 +903,56 @@ class TRex(AbstractTrafficGenerator):
         port: port where the streams originate (0 or 1)
         chain_id: the chain to which the streams are associated to
         stream_cfg: stream configuration
-        l2frame: L2 frame size (including 4-byte FCS) or 'IMIX'
-        latency: if True also create a latency stream
+        l2frame: L2 frame size (including 4-byte FCS), 'IMIX' or 'PCAP'
+        latency: if True also create the latency streams
         e2e: True if performing "end to end" connectivity check
         """
         streams = []
-        pg_id, lat_pg_id = self.get_pg_id(port, chain_id)
+        pg_id, _ = self.get_pg_id(port, chain_id)
         if l2frame == 'IMIX':
             for ratio, l2_frame_size in zip(IMIX_RATIOS, IMIX_L2_SIZES):
                 pkt = self._create_pkt(stream_cfg, l2_frame_size)
+                share = float(ratio) / sum(IMIX_RATIOS)
                 if e2e or stream_cfg['mpls']:
-                    streams.append(STLStream(packet=pkt,
-                                             mode=STLTXCont(pps=ratio)))
+                    streams.extend(self.__get_data_streams(port, pkt, None,
+                                                           STLTXCont(pps=ratio), share,
+                                                           latency, e2e))
                 else:
                     if stream_cfg['vxlan'] is True:
-                        streams.append(STLStream(packet=pkt,
-                                                 flow_stats=STLFlowStats(pg_id=pg_id,
-                                                                         vxlan=True)
-                                                    if not self.config.no_flow_stats else None,
-                                                 mode=STLTXCont(pps=ratio)))
+                        streams.extend(self.__get_data_streams(port, pkt,
+                                                               STLFlowStats(pg_id=pg_id,
+                                                                            vxlan=True)
+                                                               if not self.config.no_flow_stats
+                                                               else None,
+                                                               STLTXCont(pps=ratio), share,
+                                                               latency, e2e))
                     else:
-                        streams.append(STLStream(packet=pkt,
-                                                 flow_stats=STLFlowStats(pg_id=pg_id)
-                                                    if not self.config.no_flow_stats else None,
-                                                 mode=STLTXCont(pps=ratio)))
-
-            if latency:
-                # for IMIX, the latency packets have the average IMIX packet size
-                if stream_cfg['ip_addrs_step'] == 'random' or \
-                        stream_cfg['udp_port_step'] == 'random':
-                    # Force latency flow to only one flow to avoid creating flows
-                    # over requested flow count
-                    pkt = self._create_pkt(stream_cfg, IMIX_AVG_L2_FRAME_SIZE, True)
-                else:
-                    pkt = self._create_pkt(stream_cfg, IMIX_AVG_L2_FRAME_SIZE)
+                        streams.extend(self.__get_data_streams(port, pkt,
+                                                               STLFlowStats(pg_id=pg_id)
+                                                               if not self.config.no_flow_stats
+                                                               else None,
+                                                               STLTXCont(pps=ratio), share,
+                                                               latency, e2e))
+
+            # for IMIX, the latency packets have the average IMIX packet size
+            lat_l2frame_size = IMIX_AVG_L2_FRAME_SIZE
+
+        elif l2frame == PCAP_L2_FRAME_SIZE:
+            # each frame of the pcap is replayed at the same rate
+            pcap = utils.load_pcap(self.config.pcap_file)
+            for _, l3_frame in pcap.frames:
+                pkt = self._create_pcap_pkt(stream_cfg, l3_frame)
+                streams.extend(self.__get_data_streams(port, pkt,
+                                                       STLFlowStats(pg_id=pg_id)
+                                                       if not e2e and
+                                                       not self.config.no_flow_stats else None,
+                                                       STLTXCont(pps=1),
+                                                       1.0 / len(pcap.frames), latency, e2e))
+            # the latency packets have the average pcap frame size
+            lat_l2frame_size = max(int(pcap.avg_l2_frame_size),
+                                   self.MIN_LATENCY_L2_FRAME_SIZE[stream_cfg['ip_version']])
+            if stream_cfg['vlan_tag']:
+                lat_l2frame_size += 4
 
         else:
             l2frame_size = int(l2frame)
@@ -672,56 +961,56 @@ class TRex(AbstractTrafficGenerator):
                 requested_pps = int(utils.parse_rate_str(self.rates[0])[
                                         'rate_pps']) - self.config.gratuitous_arp_pps
                 if latency:
-                    requested_pps -= self.LATENCY_PPS
+                    requested_pps -= self.latency_pps
                 stltx_cont = STLTXCont(pps=requested_pps)
             else:
                 stltx_cont = STLTXCont()
             if e2e or stream_cfg['mpls']:
-                streams.append(STLStream(packet=pkt,
-                                         # Flow stats is disabled for MPLS now
-                                         # flow_stats=STLFlowStats(pg_id=pg_id),
-                                         mode=stltx_cont))
+                # Flow stats is disabled for MPLS now
+                # flow_stats=STLFlowStats(pg_id=pg_id),
+                streams.extend(self.__get_data_streams(port, pkt, None, stltx_cont, 1,
+                                                       latency, e2e))
             else:
                 if stream_cfg['vxlan'] is True:
-                    streams.append(STLStream(packet=pkt,
-                                             flow_stats=STLFlowStats(pg_id=pg_id,
-                                                                     vxlan=True)
-                                                if not self.config.no_flow_stats else None,
-                                             mode=stltx_cont))
+                    streams.extend(self.__get_data_streams(port, pkt,
+                                                           STLFlowStats(pg_id=pg_id,
+                                                                        vxlan=True)
+                                                           if not self.config.no_flow_stats
+                                                           else None,
+                                                           stltx_cont, 1, latency, e2e))
                 else:
-                    streams.append(STLStream(packet=pkt,
-                                             flow_stats=STLFlowStats(pg_id=pg_id)
-                                                if not self.config.no_flow_stats else None,
-                                             mode=stltx_cont))
+                    streams.extend(self.__get_data_streams(port, pkt,
+                                                           STLFlowStats(pg_id=pg_id)
+                                                           if not self.config.no_flow_stats
+                                                           else None,
+                                                           stltx_cont, 1, latency, e2e))
             # for the latency stream, the minimum payload is 16 bytes even in case of vlan tagging
-            # without vlan, the min l2 frame size is 64
-            # with vlan it is 68
+            # without vlan, the min l2 frame size is 64 (82 with IPv6)
+            # with vlan it is 68 (86 with IPv6)
             # This only applies to the latency stream
-            if latency:
-                if stream_cfg['vlan_tag'] and l2frame_size < 68:
-                    l2frame_size = 68
-                if stream_cfg['ip_addrs_step'] == 'random' or \
-                        stream_cfg['udp_port_step'] == 'random':
-                        # Force latency flow to only one flow to avoid creating flows
-                        # over requested flow count
-                    pkt = self._create_pkt(stream_cfg, l2frame_size, True)
-                else:
-                    pkt = self._create_pkt(stream_cfg, l2frame_size)
+            min_l2frame_size = self.MIN_LATENCY_L2_FRAME_SIZE[stream_cfg['ip_version']]
+            if stream_cfg['vlan_tag']:
+                min_l2frame_size += 4
+            lat_l2frame_size = max(l2frame_size, min_l2frame_size)
 
         if latency:
             if self.config.no_latency_stats:
                 LOG.info("Latency flow statistics are disabled.")
-            if stream_cfg['vxlan'] is True:
-                streams.append(STLStream(packet=pkt,
-                                         flow_stats=STLFlowLatencyStats(pg_id=lat_pg_id,
-                                                                        vxlan=True)
-                                            if not self.config.no_latency_stats else None,
-                                         mode=STLTXCont(pps=self.LATENCY_PPS)))
-            else:
-                streams.append(STLStream(packet=pkt,
-                                         flow_stats=STLFlowLatencyStats(pg_id=lat_pg_id)
-                                            if not self.config.no_latency_stats else None,
-                                         mode=STLTXCont(pps=self.LATENCY_PPS)))
+            lat_pps = float(self.latency_pps) / self.latency_stream_count
+            for index, lat_pg_id in enumerate(self.get_latency_pg_ids(port, chain_id)):
+                pkt = self._create_pkt(stream_cfg, lat_l2frame_size,
+                                       self.__get_latency_flow(stream_cfg, index))
+                if stream_cfg['vxlan'] is True:
+                    streams.append(STLStream(packet=pkt,
+                                             flow_stats=STLFlowLatencyStats(pg_id=lat_pg_id,
+                                                                            vxlan=True)
+                                                if not self.config.no_latency_stats else None,
+                                             mode=STLTXCont(pps=lat_pps)))
+                else:
+                    streams.append(STLStream(packet=pkt,
+                                             flow_stats=STLFlowLatencyStats(pg_id=lat_pg_id)
+                                                if not self.config.no_latency_stats else None,
+                                             mode=STLTXCont(pps=lat_pps)))
 
         if self.config.periodic_gratuitous_arp and (
                 self.config.l3_router or self.config.service_chain == ChainType.EXT):
@@ -736,103 +1025,45 @@ class TRex(AbstractTrafficGenerator):
                           mode=STLTXMultiBurst(pkts_per_burst=1, count=packets_count, ibg=ibg)))
         return streams
 
+    def _create_client(self):
+        """Create the TRex client (stateless mode)."""
+        return STLClient(server=self.generator_config.ip,
+                         sync_port=self.generator_config.zmq_rpc_port,
+                         async_port=self.generator_config.zmq_pub_port)
+
+    def _reset_client(self):
+        """Reset all the ports used (remove all streams and stop traffic)."""
+        self.client.reset(self.port_handle)
+
     @timeout(5)
     def __connect(self, client):
         client.connect()
 
-    def __local_server_status(self):
-        """ The TRex server may have started but failed initializing... and stopped.
-        This piece of code is especially designed to address
-        the case when a fatal failure occurs on a DPDK init call.
-        The TRex algorihm should be revised to include some missing timeouts (?)
-        status returned:
-          0: no error detected
-          1: fatal error detected - should lead to exiting the run
-          2: error detected that could be solved by starting again
-        The diagnostic is based on parsing the local trex log file (improvable)
-        """
-        status = 0
-        message = None
-        failure = None
-        exited = None
-        cause = None
-        error = None
-        before = None
-        after = None
-        last = None
-        try:
-            with open('/tmp/trex.log', 'r', encoding="utf-8") as trex_log:
-                for _line in trex_log:
-                    line = _line.strip()
-                    if line.startswith('Usage:'):
-                        break
-                    if 'ports are bound' in line:
-                        continue
-                    if 'please wait' in line:
-                        continue
-                    if 'exit' in line.lower():
-                        exited = line
-                    elif 'cause' in line.lower():
-                        cause = line
-                    elif 'fail' in line.lower():
-                        failure = line
-                    elif 'msg' in line.lower():
-                        message = line
-                    elif (error is not None) and line:
-                        after = line
-                    elif line.startswith('Error:') or line.startswith('ERROR'):
-                        error = line
-                        before = last
-                    last = line
-        except FileNotFoundError:
-            pass
-        if exited is not None:
-            status = 1
-            LOG.info("\x1b[1m%s\x1b[0m %s", 'TRex failed initializing:', exited)
-            if cause is not None:
-                LOG.info("TRex [cont'd] %s", cause)
-            if failure is not None:
-                LOG.info("TRex [cont'd] %s", failure)
-            if message is not None:
-                LOG.info("TRex [cont'd] %s", message)
-                if 'not supported yet' in message.lower():
-                    LOG.info("TRex [cont'd] Try starting again!")
-                    status = 2
-        elif error is not None:
-            status = 1
-            LOG.info("\x1b[1m%s\x1b[0m %s", 'TRex failed initializing:', error)
-            if after is not None:
-                LOG.info("TRex [cont'd] %s", after)
-            elif before is not None:
-                LOG.info("TRex [cont'd] %s", before)
+    def __connect_after_start(self):
+        # after start, TRex may take a bit of time to initialize
+        # the server manager probes its RPC port until the client can connect
+        # and captures recoverable error cases (checking status)
+        timeout_sec = self.config.generic_retry_count * self.CONNECT_RETRY_SEC
+        status = self.server_manager.wait_ready(self.client.connect, timeout_sec)
+        if status == 1:
+            LOG.info("\x1b[1m%s\x1b[0m", 'TRex failed starting!')
+            print("More information? Try the command: "
+                  + "\x1b[1mnfvbench --show-trex-log\x1b[0m")
+            sys.exit(0)
+        # with status 2 a new start will follow
         return status
 
-    def __connect_after_start(self):
-        # after start, Trex may take a bit of time to initialize
-        # so we need to retry a few times
-        # we try to capture recoverable error cases (checking status)
-        status = 0
-        for it in range(self.config.generic_retry_count):
+    def __take_warm_client(self):
+        """Get the client left connected by the previous run if the server is still alive."""
+        client = self.server_manager.take_client(self.__class__)
+        if client:
             try:
-                time.sleep(1)
-                self.client.connect()
-                break
-            except Exception as ex:
-                if it == (self.config.generic_retry_count - 1):
-                    raise
-                status = self.__local_server_status()
-                if status > 0:
-                    # No need to wait anymore, something went wrong and TRex exited
-                    if status == 1:
-                        LOG.info("\x1b[1m%s\x1b[0m", 'TRex failed starting!')
-                        print("More information? Try the command: "
-                            + "\x1b[1mnfvbench --show-trex-log\x1b[0m")
-                        sys.exit(0)
-                    if status == 2:
-                        # a new start will follow
-                        return status
-                LOG.info("Retrying connection to TRex (%s)...", ex.msg)
-        return status
+                client.get_server_version()
+                LOG.info("Reusing the connection to TRex from the previous run")
+                return client
+            except STLError as e:
+                LOG.info("Cannot reuse the connection to TRex from the previous run (%s)", e)
+        return None
 
     def connect(self):
         """Connect to the TRex server."""
@@ -840,11 +1071,14 @@ class TRex(AbstractTrafficGenerator):
         server_ip = self.generator_config.ip
         LOG.info("Connecting to TRex (%s)...", server_ip)
 
+        if server_ip == '127.0.0.1':
+            self.server_manager = get_server_manager(self.generator_config)
+            self.client = self.__take_warm_client()
         # Connect to TRex server
-        self.client = STLClient(server=server_ip, sync_port=self.generator_config.zmq_rpc_port,
-                                async_port=self.generator_config.zmq_pub_port)
         try:
-            self.__connect(self.client)
+            if not self.client:
+                self.client = self._create_client()
+                self.__connect(self.client)
             if server_ip == '127.0.0.1':
                 config_updated = self.__check_config()
                 if config_updated or self.config.restart:
@@ -862,10 +1096,11 @@ class TRex(AbstractTrafficGenerator):
             if self.__start_local_server() == 2:
                 self.__start_local_server()
 
-        ports = list(self.generator_config.ports)
+        # all ports of all port pairs
+        ports = list(self.generator_config.all_ports)
         self.port_handle = ports
         # Prepare the ports
-        self.client.reset(ports)
+        self._reset_client()
         # Read HW information from each port
         # this returns an array of dict (1 per port)
         """
@@ -887,21 +1122,21 @@ class TRex(AbstractTrafficGenerator):
             LOG.info('   Port %d: %s speed=%dGbps mac=%s pci=%s driver=%s',
                      id, port['description'], port['speed'], port['src_mac'],
                      port['pci_addr'], port['driver'])
-        # Make sure the 2 ports have the same speed
-        if self.port_info[0]['speed'] != self.port_info[1]['speed']:
-            raise TrafficGeneratorException('Traffic generator ports speed mismatch: %d/%d Gbps' %
-                                            (self.port_info[0]['speed'],
-                                             self.port_info[1]['speed']))
+        # Make sure all ports have the same speed
+        speeds = [port['speed'] for port in self.port_info]
+        if len(set(speeds)) > 1:
+            raise TrafficGeneratorException('Traffic generator ports speed mismatch: %s Gbps' %
+                                            '/'.join([str(speed) for speed in speeds]))
 
     def __start_local_server(self):
         try:
             LOG.info("Starting TRex ...")
-            self.__start_server()
+            self.server_manager.start()
             status = self.__connect_after_start()
         except (TimeoutError, STLError) as e:
             LOG.error('Cannot connect to TRex')
             LOG.error(traceback.format_exc())
-            logpath = '/tmp/trex.log'
+            logpath = TREX_LOG_PATH
             if os.path.isfile(logpath):
                 # Wait for TRex to finish writing error message
                 last_size = 0
@@ -919,10 +1154,6 @@ class TRex(AbstractTrafficGenerator):
             raise TrafficGeneratorException(message) from e
         return status
 
-    def __start_server(self):
-        server = TRexTrafficServer()
-        server.run_server(self.generator_config)
-
     def __check_config(self):
         server = TRexTrafficServer()
         return server.check_config_updated(self.generator_config)
@@ -930,12 +1161,16 @@ class TRex(AbstractTrafficGenerator):
     def __restart(self):
         LOG.info("Restarting TRex ...")
         self.__stop_server()
+        # the connections kept by previous runs do not survive the restart
+        for client in self.server_manager.drop_clients():
+            try:
+                client.disconnect()
+            except STLError:
+                pass
         # Wait for server stopped
-        for _ in range(self.config.generic_retry_count):
-            time.sleep(1)
-            if not self.client.is_connected():
-                LOG.info("TRex is stopped...")
-                break
+        timeout_sec = self.config.generic_retry_count * self.CONNECT_RETRY_SEC
+        if self.server_manager.wait_stopped(self.client.is_connected, timeout_sec):
+            LOG.info("TRex is stopped...")
         # Start and report a possible failure
         return self.__start_local_server()
 
@@ -952,79 +1187,126 @@ class TRex(AbstractTrafficGenerator):
         else:
             LOG.info('Using remote TRex. Unable to stop TRex')
 
-    def resolve_arp(self):
+    def resolve_arp(self, refresh=False):
         """Resolve all configured remote IP addresses.
 
+        IPv6 addresses are resolved using neighbor discovery instead of ARP.
+        Both ports are resolved in the same attempts and only the chains that are not resolved
+        yet are retried, with an exponential backoff between attempts.
+        MAC addresses resolved by previous runs are reused unless they are older than
+        arp_cache_ttl_sec.
+
+        refresh: if True, ignore the cached MAC addresses and resolve all IP addresses again
         return: None if ARP failed to resolve for all IP addresses
                 else a dict of list of dest macs indexed by port#
                 the dest macs in the list are indexed by the chain id
         """
-        self.client.set_service_mode(ports=self.port_handle)
-        LOG.info('Polling ARP until successful...')
+        gen_config = self.generator_config
+        if gen_config.ip_version == 6:
+            service_class = ServiceND
+            protocol = 'ND'
+        else:
+            service_class = ServiceARP
+            protocol = 'ARP'
+        # only resolve the chains handled by this traffic generator
+        chain_ids = gen_config.get_chains()
         arp_dest_macs = {}
-        for port, device in zip(self.port_handle, self.generator_config.devices):
+        # (src_ip, dst_ip, vlan) of all the chains to resolve indexed by (port, chain_id)
+        arp_args = {}
+        for port, device in zip(gen_config.ports, gen_config.devices):
             # there should be 1 stream config per chain
             stream_configs = device.get_stream_configs()
-            chain_count = len(stream_configs)
-            ctx = self.client.create_service_ctx(port=port)
             # all dest macs on this port indexed by chain ID
-            dst_macs = [None] * chain_count
-            dst_macs_count = 0
-            # the index in the list is the chain id
-            if self.config.vxlan or self.config.mpls:
-                arps = [
-                    ServiceARP(ctx,
-                               src_ip=device.vtep_src_ip,
-                               dst_ip=device.vtep_dst_ip,
-                               vlan=device.vtep_vlan)
-                    for cfg in stream_configs
-                ]
+            arp_dest_macs[port] = [None] * len(stream_configs)
+            for chain_id in chain_ids:
+                if self.config.vxlan or self.config.mpls:
+                    arp_args[port, chain_id] = (device.vtep_src_ip, device.vtep_dst_ip,
+                                                device.vtep_vlan)
+                else:
+                    arp_args[port, chain_id] = (stream_configs[chain_id]['ip_src_tg_gw'],
+                                                stream_configs[chain_id]['mac_discovery_gw'],
+                                                # will be None if no vlan tagging
+                                                stream_configs[chain_id]['vlan_tag'])
+
+        def get_cache_key(port, chain_id):
+            src_ip, dst_ip, vlan = arp_args[port, chain_id]
+            return (gen_config.ip, gen_config.get_chain_port(port, chain_id), vlan,
+                    src_ip, dst_ip)
+
+        self.arp_cached = False
+        pending = []
+        for port, chain_id in sorted(arp_args):
+            key = get_cache_key(port, chain_id)
+            mac = None if refresh else ARP_CACHE.get(key, self.config.arp_cache_ttl_sec)
+            if mac:
+                arp_dest_macs[port][chain_id] = mac
+                self.arp_cached = True
             else:
-                arps = [
-                    ServiceARP(ctx,
-                               src_ip=cfg['ip_src_tg_gw'],
-                               dst_ip=cfg['mac_discovery_gw'],
-                               # will be None if no vlan tagging
-                               vlan=cfg['vlan_tag'])
-                    for cfg in stream_configs
-                ]
-
-            for attempt in range(self.config.generic_retry_count):
-                try:
-                    ctx.run(arps)
-                except STLError:
-                    LOG.error(traceback.format_exc())
-                    continue
+                ARP_CACHE.remove(key)
+                pending.append((port, chain_id))
+        if not pending:
+            LOG.info('%s resolved from cache for all chains', protocol)
+            return arp_dest_macs
+        if self.arp_cached:
+            LOG.info('%s resolved from cache for %d chains', protocol,
+                     len(arp_args) - len(pending))
 
+        self.client.set_service_mode(ports=self.port_handle)
+        LOG.info('Polling %s until successful...', protocol)
+        # 1 service context per TRex port (all chains of a port pair share the same port)
+        ctxs = {}
+        services = {}
+        for port, chain_id in pending:
+            tg_port = gen_config.get_chain_port(port, chain_id)
+            if tg_port not in ctxs:
+                ctxs[tg_port] = self.client.create_service_ctx(port=tg_port)
+            src_ip, dst_ip, vlan = arp_args[port, chain_id]
+            # VxLAN and MPLS resolve the remote VTEP, always with ARP
+            service = ServiceARP if self.config.vxlan or self.config.mpls else service_class
+            services[port, chain_id] = service(ctxs[tg_port], src_ip=src_ip, dst_ip=dst_ip,
+                                               vlan=vlan)
+
+        retry_sec = self.ARP_MIN_RETRY_SEC
+        for attempt in range(self.config.generic_retry_count):
+            try:
+                # ARP requests of all the unresolved chains of both ports are sent in the
+                # same attempt, only one port can be polled at a time by the TRex client
+                for tg_port, ctx in ctxs.items():
+                    port_services = [services[key] for key in pending
+                                     if gen_config.get_chain_port(*key) == tg_port]
+                    if port_services:
+                        ctx.run(port_services)
+            except STLError:
+                LOG.error(traceback.format_exc())
+            else:
                 unresolved = []
-                for chain_id, mac in enumerate(dst_macs):
-                    if not mac:
-                        arp_record = arps[chain_id].get_record()
-                        if arp_record.dst_mac:
-                            dst_macs[chain_id] = arp_record.dst_mac
-                            dst_macs_count += 1
-                            LOG.info('   ARP: port=%d chain=%d src IP=%s dst IP=%s -> MAC=%s',
-                                     port, chain_id,
-                                     arp_record.src_ip,
-                                     arp_record.dst_ip, arp_record.dst_mac)
-                        else:
-                            unresolved.append(arp_record.dst_ip)
-                if dst_macs_count == chain_count:
-                    arp_dest_macs[port] = dst_macs
-                    LOG.info('ARP resolved successfully for port %s', port)
+                for port, chain_id in pending:
+                    arp_record = services[port, chain_id].get_record()
+                    if arp_record.dst_mac:
+                        arp_dest_macs[port][chain_id] = arp_record.dst_mac
+                        ARP_CACHE.put(get_cache_key(port, chain_id), arp_record.dst_mac)
+                        LOG.info('   %s: port=%d chain=%d src IP=%s dst IP=%s -> MAC=%s',
+                                 protocol, port, chain_id,
+                                 arp_record.src_ip,
+                                 arp_record.dst_ip, arp_record.dst_mac)
+                    else:
+                        unresolved.append((port, chain_id))
+                pending = unresolved
+                if not pending:
+                    LOG.info('%s resolved successfully for all ports', protocol)
                     break
-
-                retry = attempt + 1
-                LOG.info('Retrying ARP for: %s (retry %d/%d)',
-                         unresolved, retry, self.config.generic_retry_count)
-                if retry < self.config.generic_retry_count:
-                    time.sleep(self.config.generic_poll_sec)
-            else:
-                LOG.error('ARP timed out for port %s (resolved %d out of %d)',
-                          port,
-                          dst_macs_count,
-                          chain_count)
-                break
+                LOG.info('Retrying %s for: %s (retry %d/%d)', protocol,
+                         [arp_args[key][1] for key in pending], attempt + 1,
+                         self.config.generic_retry_count)
+            if attempt + 1 < self.config.generic_retry_count:
+                time.sleep(retry_sec)
+                retry_sec = min(retry_sec * 2, self.config.generic_poll_sec)
+        else:
+            for port in gen_config.ports:
+                LOG.error('%s timed out for port %s (resolved %d out of %d)',
+                          protocol, port,
+                          len(chain_ids) - len([key for key in pending if key[0] == port]),
+                          len(chain_ids))
 
         # A traffic capture may have been started (from a T-Rex console) at this time.
         # If asked so, we keep the service mode enabled here, and disable it otherwise.
@@ -1032,7 +1314,7 @@ class TRex(AbstractTrafficGenerator):
         #  | would cause the application to stop/crash with an error.
         if not self.config.service_mode:
             self.client.set_service_mode(ports=self.port_handle, enabled=False)
-        if len(arp_dest_macs) == len(self.port_handle):
+        if not pending:
             return arp_dest_macs
         return None
 
@@ -1044,21 +1326,24 @@ class TRex(AbstractTrafficGenerator):
                 mult = 2
                 total_rate = 0
                 for rate in rates:
-                    r = utils.convert_rates(l2frame_size, rate, intf_speed)
+                    r = utils.convert_rates(l2frame_size, rate, intf_speed,
+                                            self.config.pcap_file)
                     total_rate += int(r['rate_pps'])
             else:
                 mult = 1
-                r = utils.convert_rates(l2frame_size, rates[0], intf_speed)
+                r = utils.convert_rates(l2frame_size, rates[0], intf_speed,
+                                        self.config.pcap_file)
                 total_rate = int(r['rate_pps'])
             # rate must be enough for latency stream and at least 1 pps for base stream per chain
             if self.config.periodic_gratuitous_arp:
-                required_rate = (self.LATENCY_PPS + 1 + self.config.gratuitous_arp_pps) \
-                                * self.config.service_chain_count * mult
+                required_rate = (self.latency_pps + 1 + self.config.gratuitous_arp_pps) \
+                                * self.chain_count * mult
             else:
-                required_rate = (self.LATENCY_PPS + 1) * self.config.service_chain_count * mult
+                required_rate = (self.latency_pps + 1) * self.chain_count * mult
             result = utils.convert_rates(l2frame_size,
                                          {'rate_pps': required_rate},
-                                         intf_speed * mult)
+                                         intf_speed * mult,
+                                         self.config.pcap_file)
             result['result'] = total_rate >= required_rate
             return result
 
@@ -1067,7 +1352,7 @@ class TRex(AbstractTrafficGenerator):
     def create_traffic(self, l2frame_size, rates, bidirectional, latency=True, e2e=False):
         """Program all the streams in Trex server.
 
-        l2frame_size: L2 frame size or IMIX
+        l2frame_size: L2 frame size, IMIX or PCAP
         rates: a list of 2 rates to run each direction
                each rate is a dict like {'rate_pps': '10kpps'}
         bidirectional: True if bidirectional
@@ -1084,35 +1369,51 @@ class TRex(AbstractTrafficGenerator):
                         bps=r['rate_bps'],
                         load=r['rate_percent']))
         self.l2_frame_size = l2frame_size
+        if self.generator_config.ip_addrs_step == 'random' \
+                or self.generator_config.gen_config.udp_port_step == 'random':
+            LOG.warning("Using random step, the number of flows can be less than "
+                        "the requested number of flows due to repeatable multivariate random "
+                        "generation which can reproduce the same pattern of values")
+        self.rates = [utils.to_rate_str(rate) for rate in rates]
+        self.stream_args = (l2frame_size, bidirectional, latency, e2e)
+        self.__add_streams()
+
+    def __add_streams(self):
+        """Program the streams of all chains for the current rates."""
+        l2frame_size, bidirectional, latency, e2e = self.stream_args
         # a dict of list of streams indexed by port#
         # in case of fixed size, has self.chain_count * 2 * 2 streams
         # (1 normal + 1 latency stream per direction per chain)
         # for IMIX, has self.chain_count * 2 * 4 streams
         # (3 normal + 1 latency stream per direction per chain)
+        # for PCAP, has 1 normal stream per pcap IP frame + 1 latency stream
+        # per direction per chain
+        # with more than 1 port pair, the streams of each chain are programmed on the
+        # port pair carrying that chain
         streamblock = {}
         for port in self.port_handle:
             streamblock[port] = []
         stream_cfgs = [d.get_stream_configs() for d in self.generator_config.devices]
-        if self.generator_config.ip_addrs_step == 'random' \
-                or self.generator_config.gen_config.udp_port_step == 'random':
-            LOG.warning("Using random step, the number of flows can be less than "
-                        "the requested number of flows due to repeatable multivariate random "
-                        "generation which can reproduce the same pattern of values")
-        self.rates = [utils.to_rate_str(rate) for rate in rates]
-        for chain_id, (fwd_stream_cfg, rev_stream_cfg) in enumerate(zip(*stream_cfgs)):
-            streamblock[0].extend(self.generate_streams(self.port_handle[0],
-                                                        chain_id,
-                                                        fwd_stream_cfg,
-                                                        l2frame_size,
-                                                        latency=latency,
-                                                        e2e=e2e))
+        # only program the chains handled by this traffic generator
+        for chain_id in self.generator_config.get_chains():
+            fwd_stream_cfg = stream_cfgs[0][chain_id]
+            rev_stream_cfg = stream_cfgs[1][chain_id]
+            fwd_port = self.generator_config.get_chain_port(0, chain_id)
+            streamblock[fwd_port].extend(self.generate_streams(0,
+                                                               chain_id,
+                                                               fwd_stream_cfg,
+                                                               l2frame_size,
+                                                               latency=latency,
+                                                               e2e=e2e))
             if len(self.rates) > 1:
-                streamblock[1].extend(self.generate_streams(self.port_handle[1],
-                                                            chain_id,
-                                                            rev_stream_cfg,
-                                                            l2frame_size,
-                                                            latency=bidirectional and latency,
-                                                            e2e=e2e))
+                rev_port = self.generator_config.get_chain_port(1, chain_id)
+                streamblock[rev_port].extend(self.generate_streams(1,
+                                                                   chain_id,
+                                                                   rev_stream_cfg,
+                                                                   l2frame_size,
+                                                                   latency=bidirectional and
+                                                                   latency,
+                                                                   e2e=e2e))
 
         for port in self.port_handle:
             if self.config.vxlan:
@@ -1125,7 +1426,7 @@ class TRex(AbstractTrafficGenerator):
     def clear_streamblock(self):
         """Clear all streams from TRex."""
         self.rates = []
-        self.client.reset(self.port_handle)
+        self._reset_client()
         LOG.info('Cleared all existing streams')
 
     def get_stats(self, ifstats=None):
@@ -1152,23 +1453,56 @@ class TRex(AbstractTrafficGenerator):
         if self.port_handle:
             self.client.clear_stats()
 
+    def get_pair_rate(self, rate, pair):
+        """Get the share of a logical port rate to apply to the port of a given port pair.
+
+        rate: rate string for the logical port (e.g. '1000pps', '10Gbps', '50%')
+        pair: port pair index
+        return: the rate string to use for the port of that port pair
+
+        The rate is split in proportion of the number of chains carried by the port pair.
+        A load in % is relative to the aggregate line rate of all ports on the same side
+        so it must be converted to a load relative to the line rate of one port.
+        """
+        pair_count = self.generator_config.port_pair_count
+        if pair_count == 1:
+            return rate
+        share = len(self.generator_config.get_pair_chains(pair)) / float(self.chain_count)
+        if rate.endswith('%'):
+            share *= pair_count
+        return utils.to_rate_str(utils.divide_rate(utils.parse_rate_str(rate), 1 / share))
+
     def start_traffic(self):
         """Start generating traffic in all ports."""
-        for port, rate in zip(self.port_handle, self.rates):
-            self.client.start(ports=port, mult=rate, duration=self.config.duration_sec, force=True)
+        # the streams of non continuous patterns have absolute rates that must be
+        # re-programmed for the current rates (which change during NDR/PDR searches)
+        absolute_rates = not self.traffic_pattern.is_continuous() and not self.stream_args[3]
+        if absolute_rates:
+            self.client.remove_all_streams(ports=self.port_handle)
+            self.__add_streams()
+        for pair in range(self.generator_config.port_pair_count):
+            for index, rate in enumerate(self.rates):
+                port = self.generator_config.get_pair_port(index, pair)
+                self.client.start(ports=port,
+                                  mult='1' if absolute_rates else self.get_pair_rate(rate, pair),
+                                  duration=self.config.duration_sec, force=True)
 
     def stop_traffic(self):
         """Stop generating traffic."""
         self.client.stop(ports=self.port_handle)
 
     def start_capture(self):
-        """Capture all packets on both ports that are unicast to us."""
+        """Capture all return packets on both ports that are unicast to us."""
         if self.capture_id:
             self.stop_capture()
         # Need to filter out unwanted packets so we do not end up counting
         # src MACs of frames that are not unicast to us
         src_mac_list = self.get_macs()
-        bpf_filter = "ether dst %s or ether dst %s" % (src_mac_list[0], src_mac_list[1])
+        bpf_filter = " or ".join(["ether dst %s" % mac for mac in src_mac_list])
+        # only the return traffic is of interest (VxLAN is carried over UDP),
+        # the VLAN variant is needed as the "udp" and "mpls" primitives do not skip the tag
+        proto = 'mpls' if self.config.mpls else 'udp'
+        bpf_filter = "(%s) and (%s or (vlan and %s))" % (bpf_filter, proto, proto)
         # ports must be set in service in order to enable capture
         self.client.set_service_mode(ports=self.port_handle)
         self.capture_id = self.client.start_capture \
@@ -1197,8 +1531,12 @@ class TRex(AbstractTrafficGenerator):
         """Cleanup Trex driver."""
         if self.client:
             try:
-                self.client.reset(self.port_handle)
-                self.client.disconnect()
+                self._reset_client()
+                if self.server_manager and self.config.trex_keep_warm:
+                    # keep the server warm for the next run (REST server mode)
+                    self.server_manager.park_client(self.__class__, self.client)
+                else:
+                    self.client.disconnect()
             except STLError:
                 # TRex does not like a reset while in disconnected state
                 pass
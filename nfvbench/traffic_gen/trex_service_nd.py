@@ -0,0 +1,124 @@
+# Copyright 2016 Cisco Systems, Inc.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""IPv6 neighbor discovery service for TRex.
+
+This is the IPv6 counterpart of the TRex ARP service (ServiceARP): it sends a neighbor
+solicitation for a target IPv6 address and waits for the matching neighbor advertisement.
+It is run in a TRex service context exactly like ServiceARP and provides the same record
+interface (src_ip, dst_ip, dst_mac).
+"""
+
+from collections import defaultdict
+import socket
+
+# pylint: disable=import-error
+from scapy.layers.inet6 import ICMPv6ND_NA
+from scapy.layers.inet6 import ICMPv6ND_NS
+from scapy.layers.inet6 import ICMPv6NDOptDstLLAddr
+from scapy.layers.inet6 import ICMPv6NDOptSrcLLAddr
+from scapy.layers.inet6 import in6_getnsma
+from scapy.layers.inet6 import in6_getnsmac
+from scapy.layers.inet6 import IPv6
+from scapy.layers.l2 import Dot1Q
+from scapy.layers.l2 import Ether
+from trex.common.services.trex_service import Service
+from trex.common.services.trex_service import ServiceFilter
+# pylint: enable=import-error
+
+
+def _ipv6_key(addr):
+    """Get a canonical form of an IPv6 address to compare addresses."""
+    return socket.inet_pton(socket.AF_INET6, addr)
+
+
+class NDRecord(object):
+    """Result of a neighbor discovery."""
+
+    def __init__(self, src_ip, dst_ip, dst_mac=None):
+        self.src_ip = src_ip
+        self.dst_ip = dst_ip
+        # None if the neighbor could not be resolved
+        self.dst_mac = dst_mac
+
+    def __str__(self):
+        if self.dst_mac:
+            return "Received ND reply from: {0}, hw: {1}".format(self.dst_ip, self.dst_mac)
+        return "Failed to receive ND response from {0}".format(self.dst_ip)
+
+
+class ServiceFilterND(ServiceFilter):
+    """Dispatch the received neighbor advertisements to the ND services waiting for them."""
+
+    def __init__(self):
+        self.services = defaultdict(list)
+
+    def add(self, service):
+        self.services[_ipv6_key(service.dst_ip)].append(service)
+
+    def lookup(self, pkt):
+        scapy_pkt = Ether(pkt)
+        if ICMPv6ND_NA not in scapy_pkt:
+            return []
+        return self.services.get(_ipv6_key(scapy_pkt[ICMPv6ND_NA].tgt), [])
+
+    def get_bpf_filter(self):
+        return 'icmp6 or (vlan and icmp6)'
+
+
+class ServiceND(Service):
+    """Resolve the MAC address of an IPv6 neighbor."""
+
+    def __init__(self, ctx, dst_ip, src_ip, vlan=None, timeout_sec=3,
+                 verbose_level=Service.ERROR):
+        Service.__init__(self, verbose_level)
+        self.ctx = ctx
+        self.dst_ip = dst_ip
+        self.src_ip = src_ip
+        self.vlan = vlan
+        self.timeout_sec = timeout_sec
+        self.record = None
+
+    def get_filter_type(self):
+        return ServiceFilterND
+
+    def run(self, pipe):
+        """Send a neighbor solicitation and wait for the neighbor advertisement."""
+        self.log('ND: ---> who has {0} ? tell {1} '.format(self.dst_ip, self.src_ip))
+        src_mac = pipe.get_src_mac()
+        target = _ipv6_key(self.dst_ip)
+        # the solicitation is sent to the solicited-node multicast address of the target
+        pkt = Ether(src=src_mac, dst=in6_getnsmac(in6_getnsma(target)))
+        if self.vlan is not None:
+            pkt /= Dot1Q(vlan=self.vlan)
+        pkt /= IPv6(src=self.src_ip,
+                    dst=socket.inet_ntop(socket.AF_INET6, in6_getnsma(target)),
+                    hlim=255)
+        pkt /= ICMPv6ND_NS(tgt=self.dst_ip) / ICMPv6NDOptSrcLLAddr(lladdr=src_mac)
+        pipe.async_tx_pkt(pkt)
+
+        pkts = yield pipe.async_wait_for_pkt(time_sec=self.timeout_sec)
+        if not pkts:
+            self.record = NDRecord(self.src_ip, self.dst_ip)
+            return
+        response = Ether(pkts[0]['pkt'])
+        if ICMPv6NDOptDstLLAddr in response:
+            dst_mac = response[ICMPv6NDOptDstLLAddr].lladdr
+        else:
+            dst_mac = response.src
+        self.record = NDRecord(self.src_ip, self.dst_ip, dst_mac)
+        self.log('ND: <--- {0} is at {1}'.format(self.dst_ip, dst_mac))
+
+    def get_record(self):
+        """Get the result of the neighbor discovery (NDRecord)."""
+        return self.record
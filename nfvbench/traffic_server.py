@@ -13,10 +13,16 @@
 #    under the License.
 
 import os
+import socket
 import subprocess
+import threading
+import time
 import yaml
 
 from .log import LOG
+from .utils import TimeoutError
+
+TREX_LOG_PATH = '/tmp/trex.log'
 
 
 class TrafficServerException(Exception):
@@ -50,6 +56,8 @@ class TRexTrafficServer(TrafficServer):
         else:
             mbuf_opt = ""
         hdrh_opt = "--hdrh" if generator_config.hdrh else ""
+        # advanced stateful mode for TCP connection benchmarks
+        astf_opt = "--astf" if generator_config.config.stateful.enabled else ""
         # --unbind-unused-ports: for NIC that have more than 2 ports such as Intel X710
         # this will instruct trex to unbind all ports that are unused instead of
         # erroring out with an exception (i40e only)
@@ -65,12 +73,14 @@ class TRexTrafficServer(TrafficServer):
                     generator_config.config.i40e_mixed == 'unbind' else "")
         cmd = ['nohup', '/bin/bash', '-c',
                './t-rex-64 -i -c {} --iom 0 --no-scapy-server '
-               '--close-at-end {} {} {} '
-               '{} {} --cfg {} &> /tmp/trex.log & disown'.format(cores, sw_mode,
+               '--close-at-end {} {} {} {} '
+               '{} {} --cfg {} &> {} & disown'.format(cores, sw_mode,
                                                                  i40e_opt,
                                                                  vlan_opt,
+                                                                 astf_opt,
                                                                  hdrh_opt,
-                                                                 mbuf_opt, cfg)]
+                                                                 mbuf_opt, cfg,
+                                                                 TREX_LOG_PATH)]
         LOG.info(' '.join(cmd))
         with subprocess.Popen(cmd, cwd=self.trex_dir) as trex_process:
             LOG.info('TRex server is running (PID: %s)...', trex_process.pid)
@@ -102,12 +112,12 @@ class TRexTrafficServer(TrafficServer):
         # parameter, specified as one of the starting command line
         # arguments, has been modified since the last launch.
         # Hence we add some extra fields to the config file
-        # (nb_cores, use_vlan, mbuf_factor, i40e_mixed, hdrh)
+        # (nb_cores, use_vlan, mbuf_factor, i40e_mixed, hdrh, astf)
         # which will serve as a memory between runs -
         # while being actually ignored by the T-Rex server.
 
         result = """# Config generated by NFVbench
-        - port_limit   : 2
+        - port_limit   : {port_limit}
           version      : 2
           zmq_pub_port : {zmq_pub_port}
           zmq_rpc_port : {zmq_rpc_port}
@@ -120,7 +130,9 @@ class TRexTrafficServer(TrafficServer):
             nb_cores   : {nb_cores}
             use_vlan   : {use_vlan}
             i40e_mixed : {i40e_mixed}
+            astf       : {astf}
           interfaces   : [{ifs}]""".format(
+            port_limit=len(generator_config.pcis),
             zmq_pub_port=generator_config.zmq_pub_port,
             zmq_rpc_port=generator_config.zmq_rpc_port,
             prefix=generator_config.name,
@@ -132,6 +144,7 @@ class TRexTrafficServer(TrafficServer):
             use_vlan=generator_config.gen_config.get('vtep_vlan') or
             generator_config.vlan_tagging,
             i40e_mixed=generator_config.config.i40e_mixed,
+            astf=generator_config.config.stateful.enabled,
             ifs=ifs)
 
         if hasattr(generator_config, 'mbuf_64') and generator_config.mbuf_64:
@@ -180,3 +193,239 @@ class TRexTrafficServer(TrafficServer):
         if existing_config == new_config:
             return False
         return True
+
+
+class TRexLogMonitor(object):
+    """Incremental parser of the TRex server log file.
+
+    Each call only reads the lines appended since the previous call, the diagnostic
+    accumulated so far is kept between calls.
+    """
+
+    def __init__(self, log_path=TREX_LOG_PATH):
+        self.log_path = log_path
+        self.reset()
+
+    def reset(self):
+        """Forget all the lines read so far (e.g. before the server is started again)."""
+        self.offset = 0
+        self.done = False
+        self.message = None
+        self.failure = None
+        self.exited = None
+        self.cause = None
+        self.error = None
+        self.before = None
+        self.after = None
+        self.last = None
+
+    def read(self):
+        """Parse the complete lines appended to the log file since the last call."""
+        try:
+            with open(self.log_path, 'r', encoding="utf-8") as trex_log:
+                if os.fstat(trex_log.fileno()).st_size < self.offset:
+                    # the log file was recreated by a new server
+                    self.reset()
+                trex_log.seek(self.offset)
+                while not self.done:
+                    _line = trex_log.readline()
+                    if not _line.endswith('\n'):
+                        # incomplete line, will be read again next time
+                        break
+                    self.offset = trex_log.tell()
+                    self.__parse_line(_line.strip())
+        except FileNotFoundError:
+            pass
+
+    def __parse_line(self, line):
+        if line.startswith('Usage:'):
+            self.done = True
+        elif 'ports are bound' in line or 'please wait' in line:
+            pass
+        else:
+            if 'exit' in line.lower():
+                self.exited = line
+            elif 'cause' in line.lower():
+                self.cause = line
+            elif 'fail' in line.lower():
+                self.failure = line
+            elif 'msg' in line.lower():
+                self.message = line
+            elif (self.error is not None) and line:
+                self.after = line
+            elif line.startswith('Error:') or line.startswith('ERROR'):
+                self.error = line
+                self.before = self.last
+            self.last = line
+
+    def get_status(self):
+        """Read the new log lines and check if the TRex server failed initializing.
+
+        The TRex server may have started but failed initializing... and stopped.
+        This is especially designed to address the case when a fatal failure occurs
+        on a DPDK init call.
+        status returned:
+          0: no error detected
+          1: fatal error detected - should lead to exiting the run
+          2: error detected that could be solved by starting again
+        """
+        self.read()
+        status = 0
+        if self.exited is not None:
+            status = 1
+            LOG.info("\x1b[1m%s\x1b[0m %s", 'TRex failed initializing:', self.exited)
+            if self.cause is not None:
+                LOG.info("TRex [cont'd] %s", self.cause)
+            if self.failure is not None:
+                LOG.info("TRex [cont'd] %s", self.failure)
+            if self.message is not None:
+                LOG.info("TRex [cont'd] %s", self.message)
+                if 'not supported yet' in self.message.lower():
+                    LOG.info("TRex [cont'd] Try starting again!")
+                    status = 2
+        elif self.error is not None:
+            status = 1
+            LOG.info("\x1b[1m%s\x1b[0m %s", 'TRex failed initializing:', self.error)
+            if self.after is not None:
+                LOG.info("TRex [cont'd] %s", self.after)
+            elif self.before is not None:
+                LOG.info("TRex [cont'd] %s", self.before)
+        return status
+
+
+class TRexServerManager(object):
+    """Manage the life cycle of a local TRex server.
+
+    The server readiness is probed with short timeouts and an exponential backoff
+    instead of fixed sleeps, and the duration of each start-up phase is recorded.
+    A connected client can be parked between runs to keep the server warm.
+    """
+
+    # first and max delay between 2 readiness probes
+    MIN_POLL_SEC = 0.05
+    MAX_POLL_SEC = 1.0
+    # timeout of the RPC port probe
+    PROBE_TIMEOUT_SEC = 0.2
+
+    def __init__(self, generator_config, log_path=TREX_LOG_PATH):
+        self.generator_config = generator_config
+        self.log_monitor = TRexLogMonitor(log_path)
+        self.timings = {}
+        self.start_time = None
+        # clients kept connected between runs, indexed by traffic generator class
+        self.warm_clients = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Launch the TRex server process (does not wait for the server to be ready)."""
+        start_time = time.time()
+        self.timings = {}
+        self.log_monitor.reset()
+        TRexTrafficServer().run_server(self.generator_config)
+        self.timings['launch_sec'] = round(time.time() - start_time, 3)
+        self.start_time = start_time
+
+    def probe_rpc(self):
+        """Check if the RPC port of the server accepts connections."""
+        try:
+            with socket.create_connection((self.generator_config.ip,
+                                           self.generator_config.zmq_rpc_port),
+                                          timeout=self.PROBE_TIMEOUT_SEC):
+                return True
+        except (OSError, socket.timeout):
+            return False
+
+    def wait_ready(self, connect, timeout_sec):
+        """Wait for the server to be ready and connect to it.
+
+        connect: function that connects the client to the server
+        timeout_sec: max time to wait for the server to be ready
+        return: the status of the server (see TRexLogMonitor.get_status)
+        raise: the last connection error or TimeoutError if the server is not ready in time
+        """
+        start_time = self.start_time or time.time()
+        deadline = time.time() + timeout_sec
+        delay = self.MIN_POLL_SEC
+        probes = 0
+        last_error = None
+        while True:
+            probes += 1
+            if self.probe_rpc():
+                if 'rpc_sec' not in self.timings:
+                    self.timings['rpc_sec'] = round(time.time() - start_time, 3)
+                try:
+                    connect()
+                    self.timings['ready_sec'] = round(time.time() - start_time, 3)
+                    self.timings['probes'] = probes
+                    LOG.info('TRex server ready in %.3f sec (%s)', self.timings['ready_sec'],
+                             ', '.join('%s=%s' % item for item in sorted(self.timings.items())))
+                    return 0
+                except Exception as ex:
+                    last_error = ex
+                    LOG.info("Retrying connection to TRex (%s)...", getattr(ex, 'msg', ex))
+            status = self.log_monitor.get_status()
+            if status > 0:
+                # No need to wait anymore, something went wrong and TRex exited
+                return status
+            if time.time() + delay > deadline:
+                if last_error:
+                    raise last_error
+                raise TimeoutError('TRex server RPC port %d not ready after %d sec'
+                                   % (self.generator_config.zmq_rpc_port, timeout_sec))
+            time.sleep(delay)
+            delay = min(delay * 2, self.MAX_POLL_SEC)
+
+    def wait_stopped(self, is_connected, timeout_sec):
+        """Wait for the server to stop after a shutdown request.
+
+        is_connected: function that returns True while the client is still connected
+        return: True if the server stopped in time
+        """
+        deadline = time.time() + timeout_sec
+        delay = self.MIN_POLL_SEC
+        while is_connected() or self.probe_rpc():
+            if time.time() + delay > deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, self.MAX_POLL_SEC)
+        return True
+
+    def park_client(self, key, client):
+        """Keep a connected client for the next run."""
+        with self.lock:
+            self.warm_clients[key] = client
+
+    def take_client(self, key):
+        """Get the client kept by a previous run if still connected.
+
+        return: a connected client or None
+        """
+        with self.lock:
+            client = self.warm_clients.pop(key, None)
+        if client is not None and not client.is_connected():
+            client = None
+        return client
+
+    def drop_clients(self):
+        """Remove all the clients kept by previous runs."""
+        with self.lock:
+            clients = list(self.warm_clients.values())
+            self.warm_clients.clear()
+        return clients
+
+SERVER_MANAGERS = {}
+SERVER_MANAGERS_LOCK = threading.Lock()
+
+def get_server_manager(generator_config):
+    """Get the manager of the local TRex server used by a generator config.
+
+    There is 1 manager per RPC port, shared by all the runs of a process.
+    """
+    with SERVER_MANAGERS_LOCK:
+        manager = SERVER_MANAGERS.get(generator_config.zmq_rpc_port)
+        if manager is None:
+            manager = TRexServerManager(generator_config)
+            SERVER_MANAGERS[generator_config.zmq_rpc_port] = manager
+        # the config of the current run
+        manager.generator_config = generator_config
+        return manager
@@ -13,6 +13,9 @@
 #    under the License.
 
 import glob
+import hashlib
+import importlib.util
+import mmap
 import time
 from math import gcd
 from math import isnan
@@ -20,6 +23,7 @@ import os
 import re
 import signal
 import subprocess
+import sys
 
 import errno
 import fcntl
@@ -27,12 +31,29 @@ from functools import wraps
 import json
 from .log import LOG
 from nfvbench.traffic_gen.traffic_utils import multiplier_map
-from novaclient.exceptions import NotFound
 
 class TimeoutError(Exception):
     pass
 
 
+def lazy_import(name):
+    """Get a module that is only loaded when one of its attributes is first accessed.
+
+    This is used for the modules that are slow to import (openstack clients, TRex client...)
+    and are not needed by all the commands.
+    name: absolute name of the module (its parent package is imported)
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
 def timeout(seconds=10, error_message=os.strerror(errno.ETIME)):
     def decorator(func):
         def _handle_timeout(_signum, _frame):
@@ -240,17 +261,78 @@ def find_tuples_equal_to_lcm_value(a, b, lcm_value):
                 yield (x, y)
 
 
-def find_max_size(max_size, tuples, flow):
-    if tuples:
-        if max_size > tuples[-1][0]:
-            max_size = tuples[-1][0]
+def factorize(n):
+    """Get the prime factorization of a positive integer as a dict of exponents by prime."""
+    factors = {}
+    p = 2
+    while p * p <= n:
+        while n % p == 0:
+            factors[p] = factors.get(p, 0) + 1
+            n //= p
+        p += 1 if p == 2 else 2
+    if n > 1:
+        factors[n] = factors.get(n, 0) + 1
+    return factors
+
+
+def get_sorted_divisors(factors):
+    """Get the sorted list of all the divisors of a number from its prime factorization."""
+    divisors = [1]
+    for p, exp in factors.items():
+        divisors = [d * p ** e for d in divisors for e in range(exp + 1)]
+    return sorted(divisors)
+
+
+class DivisorSet(object):
+    """Set of the divisors of a positive integer, without enumerating them."""
+
+    def __init__(self, n):
+        self.n = n
+
+    def __contains__(self, x):
+        return 0 < x <= self.n and self.n % x == 0
+
+
+def find_max_lcm_tuple(a, b, lcm_value):
+    """Find the last tuple yielded by find_tuples_equal_to_lcm_value(a, b, lcm_value).
+
+    a, b: ascending sequences of positive integers that support a fast membership test
+          (e.g. range or DivisorSet)
+    return: the tuple (x, y) with lcm(x, y) == lcm_value with the largest x
+            and then the largest y, None if there is no such tuple
+
+    Any such x and y divide lcm_value, and y must contain the full power of each prime of
+    lcm_value that x does not, so only the divisors of lcm_value are checked
+    instead of all the (x, y) pairs.
+    """
+    factors = factorize(lcm_value)
+    for x in reversed(get_sorted_divisors(factors)):
+        if x not in a:
+            continue
+        # the primes of lcm_value that x contains with the full power can have
+        # any power in y, the others must be in y with the full power
+        full_factors = {p: exp for p, exp in factors.items() if x % p ** exp == 0}
+        required = lcm_value
+        for p, exp in full_factors.items():
+            required //= p ** exp
+        for d in reversed(get_sorted_divisors(full_factors)):
+            if required * d in b:
+                return (x, required * d)
+    return None
+
+
+def find_max_size(max_size, lcm_tuple, flow):
+    if lcm_tuple:
+        if max_size > lcm_tuple[0]:
+            max_size = lcm_tuple[0]
             return int(max_size)
-        if max_size > tuples[-1][1]:
-            max_size = tuples[-1][1]
+        if max_size > lcm_tuple[1]:
+            max_size = lcm_tuple[1]
             return int(max_size)
 
-    for i in range(max_size, 1, -1):
-        if flow % i == 0:
+    # largest divisor of flow not greater than max_size
+    for i in reversed(get_sorted_divisors(factorize(flow))):
+        if i <= max_size:
             return int(i)
     return 1
 
@@ -264,6 +346,7 @@ def delete_server(nova_client, server):
 
 
 def instance_exists(nova_client, server):
+    from novaclient.exceptions import NotFound
     try:
         nova_client.servers.get(server.id)
     except NotFound:
@@ -276,7 +359,12 @@ def waiting_servers_deletion(nova_client, servers):
     retry_count = 15 + len(servers) * 5
     while True:
         retry_count -= 1
-        servers = [server for server in servers if instance_exists(nova_client, server)]
+        if len(servers) > 1:
+            # a single request to check all instances
+            existing_ids = {server.id for server in nova_client.servers.list(detailed=False)}
+            servers = [server for server in servers if server.id in existing_ids]
+        else:
+            servers = [server for server in servers if instance_exists(nova_client, server)]
         if not servers:
             break
 
@@ -289,3 +377,83 @@ def waiting_servers_deletion(nova_client, servers):
                 '    instance deletion verification time-out: %d still not deleted',
                 len(servers))
             break
+
+
+# chunk size used to hash and upload image files
+FILE_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def get_file_checksums(pathname):
+    """Get the md5 and sha512 checksums of a file.
+
+    Both checksums are computed in a single pass over the memory-mapped file and are
+    cached in a '<pathname>.checksum' json file so that they are only computed again
+    when the file size or modification time changes.
+    These are the checksums used by glance (checksum and os_hash_value).
+
+    return: a dict with the md5 and sha512 keys
+    """
+    stat = os.stat(pathname)
+    cache_pathname = pathname + '.checksum'
+    try:
+        with open(cache_pathname, 'r', encoding="utf-8") as cache_file:
+            cache = json.load(cache_file)
+        if cache['size'] == stat.st_size and cache['mtime'] == stat.st_mtime:
+            return {'md5': cache['md5'], 'sha512': cache['sha512']}
+    except (IOError, ValueError, KeyError):
+        pass
+    md5 = hashlib.md5()
+    sha512 = hashlib.sha512()
+    if stat.st_size:
+        with open(pathname, 'rb') as image_file, \
+                mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as image_map:
+            for offset in range(0, stat.st_size, FILE_CHUNK_SIZE):
+                chunk = image_map[offset:offset + FILE_CHUNK_SIZE]
+                md5.update(chunk)
+                sha512.update(chunk)
+    checksums = {'md5': md5.hexdigest(), 'sha512': sha512.hexdigest()}
+    try:
+        with open(cache_pathname, 'w', encoding="utf-8") as cache_file:
+            json.dump(dict(checksums, size=stat.st_size, mtime=stat.st_mtime), cache_file)
+    except IOError:
+        LOG.debug('Cannot cache the checksums of %s in %s', pathname, cache_pathname)
+    return checksums
+
+
+class FileProgressReader(object):
+    """A file reader that reports the progress of a sequential read (e.g. an upload)."""
+
+    def __init__(self, file_obj, size, name, step_percent=10):
+        """Create a reader on an open file.
+
+        file_obj: the file to read
+        size: the size of the file in bytes
+        name: the name of the file to report
+        step_percent: progress increment to report
+        """
+        self.file_obj = file_obj
+        self.size = size
+        self.name = name
+        self.step_percent = step_percent
+        self.read_bytes = 0
+        self.next_report = step_percent
+
+    def read(self, size=FILE_CHUNK_SIZE):
+        """Read the next chunk of the file."""
+        chunk = self.file_obj.read(size)
+        self.read_bytes += len(chunk)
+        if self.size:
+            percent = self.read_bytes * 100 // self.size
+            if percent >= self.next_report:
+                LOG.info('%s: %d%% (%d/%d MB)', self.name, percent,
+                         self.read_bytes // 1048576, self.size // 1048576)
+                self.next_report = (percent // self.step_percent + 1) * self.step_percent
+        return chunk
+
+    def __iter__(self):
+        """Iterate over the file chunks."""
+        while True:
+            chunk = self.read()
+            if not chunk:
+                break
+            yield chunk
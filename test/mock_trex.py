@@ -54,12 +54,14 @@ except ImportError:
     api_mod.STLStream = STLDummy
     api_mod.STLTXCont = STLDummy
     api_mod.STLTXMultiBurst = STLDummy
+    api_mod.STLTXSingleBurst = STLDummy
     api_mod.STLVmFixChecksumHw = STLDummy
     api_mod.STLVmFixIpv4 = STLDummy
     api_mod.STLVmFlowVar = STLDummy
     api_mod.STLVmFlowVarRepeatableRandom = STLDummy
     api_mod.STLVmTupleGen = STLDummy
     api_mod.STLVmWrFlowVar = STLDummy
+    api_mod.TCP = STLDummy
     api_mod.UDP = STLDummy
     api_mod.bind_layers = STLDummy
     api_mod.FlagsField = STLDummy
@@ -78,5 +80,39 @@ except ImportError:
     sys.modules['trex.common.services.trex_service_arp'] = arp_mod
     arp_mod.ServiceARP = STLDummy
 
+    class ServiceDummy(object):
+        """Dummy class for the TRex service base classes."""
+
+        ERROR = 0x1
+
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def log(self, msg, level=ERROR):
+            pass
+
+    service_mod = ModuleType('trex.common.services.trex_service')
+    services_mod.trex_service = service_mod
+    sys.modules['trex.common.services.trex_service'] = service_mod
+    service_mod.Service = ServiceDummy
+    service_mod.ServiceFilter = ServiceDummy
+
+    astf_mod = ModuleType('trex.astf')
+    trex_lib_mod.astf = astf_mod
+    sys.modules['trex.astf'] = astf_mod
+    astf_api_mod = ModuleType('trex.astf.api')
+    astf_mod.api = astf_api_mod
+    sys.modules['trex.astf.api'] = astf_api_mod
+    astf_api_mod.ASTFAssociationRule = STLDummy
+    astf_api_mod.ASTFClient = STLDummy
+    astf_api_mod.ASTFIPGen = STLDummy
+    astf_api_mod.ASTFIPGenDist = STLDummy
+    astf_api_mod.ASTFIPGenGlobal = STLDummy
+    astf_api_mod.ASTFProfile = STLDummy
+    astf_api_mod.ASTFProgram = STLDummy
+    astf_api_mod.ASTFTCPClientTemplate = STLDummy
+    astf_api_mod.ASTFTCPServerTemplate = STLDummy
+    astf_api_mod.ASTFTemplate = STLDummy
+
 def no_op():
     """Empty function."""
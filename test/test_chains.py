@@ -15,19 +15,32 @@
 #
 """Test Chaining functions."""
 
+from functools import partial
+import hashlib
+import threading
+import time
+
+from attrdict import AttrDict
 from mock import MagicMock
 from mock import patch
+from novaclient.exceptions import NotFound
 import pytest
 
 from .mock_trex import no_op
 
 from nfvbench.chain_runner import ChainRunner
+from nfvbench.chaining import CHAIN_POOL
+from nfvbench.chaining import ChainPool
 from nfvbench.chaining import ChainException
+from nfvbench.chaining import ChainManager
 from nfvbench.chaining import ChainVnfPort
 from nfvbench.chaining import InstancePlacer
+from nfvbench.cleanup import CleanupEngine
+from nfvbench.cleanup import RouterCleaner
 from nfvbench.compute import Compute
 import nfvbench.credentials
 from nfvbench.factory import BasicFactory
+from nfvbench.inventory import ResourceInventory
 import nfvbench.log
 from nfvbench.nfvbench import load_default_config
 from nfvbench.nfvbench import NFVBench
@@ -36,6 +49,7 @@ from nfvbench.specs import ChainType
 from nfvbench.specs import OpenStackSpec
 from nfvbench.specs import Specs
 from nfvbench.summarizer import _annotate_chain_stats
+from nfvbench.summarizer import NFVBenchSummarizer
 from nfvbench.traffic_client import TrafficClient
 from nfvbench.traffic_gen.traffic_base import Latency
 from nfvbench.traffic_gen.trex_gen import TRex
@@ -74,6 +88,8 @@ def _get_chain_config(sc=ChainType.PVP, scc=1, shared_net=True, rate='1Mpps'):
     config.no_latency_stats = False
     config.no_latency_streams = False
     config.loop_vm_arp = True
+    # chains are not kept between runs in CLI mode
+    config.chain_pool_idle_sec = 0
     return config
 
 def test_chain_runner_ext_no_openstack():
@@ -143,6 +159,433 @@ def test_pvp_chain_runner():
                 _test_pvp_chain(config, cred)
 
 
+class _FakeNovaServers(object):
+    """A thread safe stand-in for the nova servers API that records the staging activity."""
+
+    def __init__(self, fail_name=None, build_polls=0):
+        self.fail_name = fail_name
+        # number of status polls before new servers become active
+        self.build_polls = build_polls
+        self.list_calls = []
+        self.get_calls = 0
+        self.lock = threading.Lock()
+        self.servers = {}
+        self.zones = {}
+        self.deleted = []
+        self.active = 0
+        self.max_active = 0
+
+    def create(self, name, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            # leave time for other staging threads to overlap
+            time.sleep(0.05)
+            if name == self.fail_name:
+                raise ChainException('Failed to create %s' % name)
+            server = MagicMock()
+            server.id = name
+            server.name = name
+            server.status = 'BUILD' if self.build_polls else 'ACTIVE'
+            setattr(server, 'OS-EXT-AZ:availability_zone', 'nova')
+            setattr(server, 'OS-EXT-SRV-ATTR:hypervisor_hostname', 'comp1')
+            with self.lock:
+                self.servers[name] = server
+                self.zones[name] = kwargs.get('availability_zone')
+            return server
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def get(self, server_id):
+        self.get_calls += 1
+        if server_id in self.deleted:
+            raise NotFound(404)
+        return self.servers[server_id]
+
+    def delete(self, server_id):
+        with self.lock:
+            self.deleted.append(server_id)
+
+    def list(self, search_opts=None, detailed=True):
+        if not detailed:
+            return [server for server in self.servers.values() if server.id not in self.deleted]
+        if search_opts is None:
+            return []
+        self.list_calls.append(search_opts)
+        self.build_polls -= 1
+        if self.build_polls <= 0:
+            for server in self.servers.values():
+                server.status = 'ACTIVE'
+        return list(self.servers.values())
+
+@patch.object(Compute, 'find_image', _mock_find_image)
+@patch.object(utils, 'waiting_servers_deletion', _mock_waiting_servers_deletion)
+@patch('nfvbench.chaining.Client')
+@patch('nfvbench.chaining.neutronclient')
+@patch('nfvbench.chaining.glanceclient')
+def _test_chain_staging(config, servers, mock_glance, mock_neutron, mock_client):
+    mock_client.return_value.servers = servers
+    netw = {'id': 0, 'provider:network_type': 'vlan', 'provider:segmentation_id': 1000}
+    mock_neutron.Client.return_value.create_network.return_value = {'network': netw}
+    mock_neutron.Client.return_value.list_networks.return_value = {'networks': None}
+    specs = Specs()
+    specs.set_openstack_spec(OpenStackSpec())
+    cred = MagicMock(spec=nfvbench.credentials.Credentials)
+    cred.is_admin = True
+    runner = ChainRunner(config, cred, specs, BasicFactory())
+    chain_manager = runner.chain_manager
+    runner.close()
+    return chain_manager
+
+def test_chain_staging():
+    """Test the concurrent staging of PVVP chains and its rollback on failure."""
+    config = _get_chain_config(ChainType.PVVP, 4, shared_net=False)
+    config.chain_staging_workers = 4
+    servers = _FakeNovaServers()
+    chain_manager = _test_chain_staging(config, servers)
+    assert [chain.chain_id for chain in chain_manager.chains] == [0, 1, 2, 3]
+    assert len(servers.servers) == 8
+    assert servers.max_active > 1
+    # the first instance resolves the placement of all other instances
+    assert servers.zones['nfvbench-loop-vm0-0'] == ''
+    assert set(servers.zones.values()) == {'', 'nova:comp1'}
+    assert list(servers.zones.values()).count('') == 1
+    staging = chain_manager.get_staging_times()
+    assert staging['workers'] == 4
+    for key in ['setup_sec', 'chains_sec', 'active_wait_sec']:
+        assert staging[key] >= 0
+    assert len(staging['chains']) == 4
+    assert list(staging['chains'][0].keys()) == ['networks_sec', 'ports_sec', 'instances_sec']
+
+    # a failure in one chain must roll back all the instances of the other chains
+    servers = _FakeNovaServers(fail_name='nfvbench-loop-vm2-1')
+    with pytest.raises(ChainException):
+        _test_chain_staging(config, servers)
+    assert 'nfvbench-loop-vm2-0' in servers.servers
+    assert sorted(servers.deleted) == sorted(servers.servers.keys())
+
+    # serial staging
+    config.chain_staging_workers = 1
+    servers = _FakeNovaServers()
+    chain_manager = _test_chain_staging(config, servers)
+    assert [chain.chain_id for chain in chain_manager.chains] == [0, 1, 2, 3]
+    assert servers.max_active == 1
+    assert chain_manager.get_staging_times()['workers'] == 1
+
+
+def test_chain_pool():
+    """Test that chains are kept and resized between runs in server mode."""
+    config = _get_chain_config(ChainType.PVP, 2, shared_net=False)
+    config.chain_pool_idle_sec = 600
+    servers = _FakeNovaServers()
+    try:
+        chain_manager = _test_chain_staging(config, servers)
+        assert CHAIN_POOL.chain_manager is chain_manager
+        assert not servers.deleted
+        # same chain setup with more chains: only the missing chain is staged
+        config.service_chain_count = 3
+        assert _test_chain_staging(config, servers) is chain_manager
+        assert len(servers.servers) == 3
+        assert not servers.deleted
+        assert [chain.chain_id for chain in chain_manager.chains] == [0, 1, 2]
+        staging = chain_manager.get_staging_times()
+        assert 'setup_sec' not in staging
+        assert len(staging['chains']) == 1
+        # less chains: the extra chains are deleted
+        config.service_chain_count = 1
+        assert _test_chain_staging(config, servers) is chain_manager
+        assert sorted(servers.deleted) == ['nfvbench-loop-vm1', 'nfvbench-loop-vm2']
+        # different chain setup: the kept chains are deleted and new chains are staged
+        config.flavor_type = 'nfvbench.large'
+        new_chain_manager = _test_chain_staging(config, servers)
+        assert new_chain_manager is not chain_manager
+        assert len(servers.deleted) == 3
+        assert CHAIN_POOL.chain_manager is new_chain_manager
+    finally:
+        CHAIN_POOL.evict()
+    assert CHAIN_POOL.chain_manager is None
+    assert len(servers.deleted) == 4
+
+    # idle chains are deleted after the timeout
+    config.chain_pool_idle_sec = 0.05
+    servers = _FakeNovaServers()
+    _test_chain_staging(config, servers)
+    for _ in range(100):
+        if CHAIN_POOL.chain_manager is None and servers.deleted:
+            break
+        time.sleep(0.05)
+    assert CHAIN_POOL.chain_manager is None
+    assert servers.deleted == ['nfvbench-loop-vm0']
+
+
+def test_chain_pool_eviction():
+    """A run waits for the deletion of evicted chains and stale idle timers are ignored."""
+    pool = ChainPool()
+    config = _get_chain_config(ChainType.PVP, 1)
+    config.chain_pool_idle_sec = 600
+    deleting = threading.Event()
+    deleted = threading.Event()
+
+    def delete():
+        deleting.set()
+        time.sleep(0.1)
+        deleted.set()
+
+    chain_manager = MagicMock(config=config, openstack=True, chain_count=1)
+    chain_manager.delete.side_effect = delete
+    assert pool.park(chain_manager)
+    evict_thread = threading.Thread(target=pool.evict)
+    evict_thread.start()
+    assert deleting.wait(5)
+    # the new run must not stage chains before the kept chains are deleted
+    assert pool.take(MagicMock(config=config)) is None
+    assert deleted.is_set()
+    evict_thread.join()
+
+    # the expiry of the timer of a previous park does not evict chains parked again
+    assert pool.park(chain_manager)
+    generation = pool.generation
+    assert pool.take(MagicMock(config=config, cred=MagicMock())) is chain_manager
+    assert pool.park(chain_manager)
+    pool.evict(generation)
+    assert pool.chain_manager is chain_manager
+    pool.evict(pool.generation)
+    assert pool.chain_manager is None
+    assert chain_manager.delete.call_count == 2
+
+
+class _GlanceImage(dict):
+    """A glance image (a dict which keys can also be accessed as attributes)."""
+
+    def __getattr__(self, name):
+        return self.get(name)
+
+def test_setup_image_checksum(tmp_path):
+    """An image with the same content is reused whatever its name."""
+    image_path = tmp_path / 'nfvbenchvm-1.2.qcow2'
+    content = b'qcow2' * 1000
+    image_path.write_bytes(content)
+    config = AttrDict({'vm_image_file': str(image_path), 'vif_multiqueue_size': 1,
+                       'generic_poll_sec': 0})
+    glance_client = MagicMock()
+    image = _GlanceImage(id='img1', name='renamed', status='active',
+                         checksum=hashlib.md5(content).hexdigest(), os_hash_algo='sha512',
+                         os_hash_value=hashlib.sha512(content).hexdigest())
+    images = [image]
+
+    def list_images(filters):
+        return iter([img for img in images
+                     if all(img.get(key) == value for key, value in filters.items())])
+    glance_client.images.list.side_effect = list_images
+    manager = ChainManager.__new__(ChainManager)
+    manager.config = config
+    manager.image_name = None
+    manager.image_instance = None
+    manager.comp = Compute(MagicMock(), glance_client, config)
+    manager._setup_image()
+    assert manager.image_instance is image
+    assert manager.image_name == 'renamed'
+    assert not glance_client.images.upload.called
+
+    # different content: the image must be uploaded with a streamed reader
+    image_path.write_bytes(content + b'new')
+    new_image = _GlanceImage(id='img2', name='nfvbenchvm-1.2', status='active')
+    glance_client.images.create.return_value = new_image
+    uploaded = []
+
+    def upload_image(image_id, image_data, image_size):
+        uploaded.append(b''.join(image_data))
+        images.append(new_image)
+    glance_client.images.upload.side_effect = upload_image
+    manager.image_name = None
+    manager.image_instance = None
+    manager._setup_image()
+    assert manager.image_name == 'nfvbenchvm-1.2'
+    assert manager.image_instance is new_image
+    assert uploaded == [content + b'new']
+
+
+def test_ensure_instances_active_batched():
+    """Check that all instances are polled with 1 nova request per cycle."""
+    config = _get_chain_config(ChainType.PVVP, 16, shared_net=False)
+    config.availability_zone = 'nova'
+    config.compute_nodes = 'comp1'
+    config.generic_poll_sec = 0.02
+    servers = _FakeNovaServers(build_polls=3)
+    chain_manager = _test_chain_staging(config, servers)
+    assert len(servers.servers) == 32
+    # 32 instances checked in 3 poll cycles
+    assert len(servers.list_calls) == 3
+    assert servers.list_calls[0] == {'name': '^nfvbench\\-loop\\-vm'}
+    assert servers.get_calls == 0
+    assert all(vnf.get_status() == 'ACTIVE' for chain in chain_manager.chains
+               for vnf in chain.instances)
+
+
+def test_resource_inventory():
+    """Test the indexed inventory of neutron and nova resources."""
+    neutron = MagicMock()
+    ports = [{'id': 'port%d' % index,
+              'name': 'nfvbench-loop-vm%d-0' % index,
+              'network_id': 'net%d' % (index % 100),
+              'device_id': 'vm%d' % (index // 2),
+              'mac_address': 'fa:16:3e:00:%02x:%02x' % (index // 256, index % 256)}
+             for index in range(5000)]
+    neutron.list_ports.return_value = {'ports': ports}
+    neutron.list_networks.return_value = {'networks': [{'id': 'net0', 'name': 'lnet'},
+                                                       {'id': 'net1', 'name': 'lnet'},
+                                                       {'id': 'net2', 'name': 'rnet'}]}
+    neutron.list_routers.return_value = {'routers': []}
+    comp = MagicMock()
+    server = MagicMock()
+    server.id = 'vm0'
+    server.name = 'nfvbench-loop-vm0'
+    comp.get_server_list.return_value = [server]
+    inventory = ResourceInventory(neutron, comp)
+
+    # nothing is loaded until first used and each kind of resource is loaded once
+    assert neutron.list_ports.call_count == 0
+    for index in range(0, 5000, 7):
+        assert inventory.get_port_by_mac(ports[index]['mac_address']) is ports[index]
+    assert len(inventory.get_network_ports('net3')) == 50
+    assert inventory.get_device_ports('vm10') == [ports[20], ports[21]]
+    assert neutron.list_ports.call_count == 1
+    assert inventory.get_network('lnet')['id'] == 'net0'
+    assert inventory.get_network('mnet') is None
+    assert inventory.get_server('nfvbench-loop-vm0') is server
+    assert inventory.get_server('nfvbench-loop-vm1') is None
+    assert neutron.list_networks.call_count == 1
+    assert comp.get_server_list.call_count == 1
+
+    # created and deleted resources are tracked without reloading
+    inventory.remove_network('net0')
+    assert inventory.get_network('lnet')['id'] == 'net1'
+    inventory.add_network({'id': 'net3', 'name': 'mnet'})
+    assert inventory.get_network('mnet')['id'] == 'net3'
+    inventory.remove_port('port20')
+    assert inventory.get_device_ports('vm10') == [ports[21]]
+    assert inventory.get_port_by_mac(ports[20]['mac_address']) is None
+    new_port = {'id': 'port5000', 'name': 'new', 'network_id': 'net3', 'device_id': 'vm10',
+                'mac_address': 'fa:16:3e:01:00:00'}
+    inventory.add_port(new_port)
+    assert inventory.get_port_by_mac('fa:16:3e:01:00:00') is new_port
+    assert len(inventory.get_network_ports('net3')) == 51
+    inventory.remove_server(server)
+    assert inventory.get_server('nfvbench-loop-vm0') is None
+    assert inventory.get_router('router') is None
+    inventory.add_router({'id': 'router0', 'name': 'router'})
+    neutron.list_ports.return_value = {'ports': [{'id': 'itf0', 'network_id': 'net0',
+                                                  'device_id': 'router0',
+                                                  'mac_address': 'fa:16:3e:02:00:00'}]}
+    assert len(inventory.refresh_device_ports('router0')) == 1
+    assert inventory.get_router('router')['id'] == 'router0'
+    assert len(inventory.get_device_ports('router0')) == 1
+    inventory.remove_router('router0')
+    assert inventory.get_router('router') is None
+    assert inventory.get_device_ports('router0') == []
+    assert neutron.list_ports.call_count == 2
+    assert neutron.list_networks.call_count == 1
+
+    # the ports created by nfvbench are reloaded once bound to their instance
+    inventory.add_port({'id': 'port5001', 'network_id': 'net4', 'device_id': '',
+                        'mac_address': 'fa:16:3e:01:00:01'})
+    bound_port = {'id': 'port5001', 'network_id': 'net4', 'device_id': 'vm2500',
+                  'binding:host_id': 'comp1', 'mac_address': 'fa:16:3e:01:00:01'}
+    neutron.list_ports.return_value = {'ports': [bound_port]}
+    assert inventory.refresh_ports(['port5001']) == [bound_port]
+    neutron.list_ports.assert_called_with(id=['port5001'])
+    assert inventory.get_port_by_mac('fa:16:3e:01:00:01') is bound_port
+    assert inventory.get_device_ports('vm2500') == [bound_port]
+    assert neutron.list_ports.call_count == 3
+
+    # a cleared inventory is reloaded by the next lookup
+    inventory.clear()
+    assert inventory.get_network('lnet')['id'] == 'net0'
+    assert inventory.get_port_by_mac('fa:16:3e:01:00:01') is bound_port
+    assert neutron.list_networks.call_count == 2
+    assert neutron.list_ports.call_count == 4
+
+
+def test_refresh_instance_ports():
+    """The ports created for the instances are updated once the instances are active."""
+    def get_vnf_port(port_id, device_id=''):
+        return MagicMock(port={'id': port_id, 'device_id': device_id})
+
+    created = [get_vnf_port('p0'), get_vnf_port('p1')]
+    instance = MagicMock(ports=created, management_port=get_vnf_port('p2'))
+    reused = MagicMock(ports=[get_vnf_port('p3', 'vm1')], management_port=None)
+    manager = MagicMock(chains=[MagicMock(**{'get_instances.return_value': [instance,
+                                                                              reused]})])
+    manager.inventory.refresh_ports.side_effect = lambda port_ids: [
+        {'id': port_id, 'device_id': 'vm0', 'binding:host_id': 'comp1'} for port_id in port_ids]
+    ChainManager._refresh_ports(manager)
+    manager.inventory.refresh_ports.assert_called_once_with(['p0', 'p1', 'p2'])
+    assert [vnf_port.port['binding:host_id']
+            for vnf_port in created + [instance.management_port]] == ['comp1'] * 3
+    assert reused.ports[0].port == {'id': 'p3', 'device_id': 'vm1'}
+
+
+def test_cleanup_engine():
+    """Test the dependency ordered and concurrent deletion of resources."""
+    lock = threading.Lock()
+    events = []
+
+    def delete(level, fail=False):
+        with lock:
+            events.append(('start', level, time.time()))
+        time.sleep(0.02)
+        with lock:
+            events.append(('end', level, time.time()))
+        if fail:
+            raise ChainException('cannot delete')
+
+    nova_client = MagicMock()
+    nova_client.servers.list.return_value = []
+    engine = CleanupEngine(4, nova_client)
+    assert engine.is_empty()
+    for level in reversed(CleanupEngine.LEVELS):
+        for index in range(4):
+            server = MagicMock() if level == 'instances' else None
+            engine.add(level, '%s%d' % (level, index),
+                       partial(delete, level, fail=level == 'ports' and index == 1),
+                       server=server)
+    timings = engine.run()
+    assert engine.is_empty()
+    assert len(timings) == 4 * len(CleanupEngine.LEVELS)
+    assert [timing['name'] for timing in timings if timing['status'] == 'failed'] == ['ports1']
+    # all resources of a level are deleted concurrently and before the next level starts
+    for prev_level, level in zip(CleanupEngine.LEVELS, CleanupEngine.LEVELS[1:]):
+        prev_end = max(event[2] for event in events if event[:2] == ('end', prev_level))
+        start = min(event[2] for event in events if event[:2] == ('start', level))
+        assert prev_end <= start
+    assert [event[1] for event in events[:4]] == ['instances'] * 4
+    assert events[3][0] == 'start'
+    # all instances are verified deleted with a single request
+    assert nova_client.servers.list.call_count == 1
+    assert nova_client.servers.get.call_count == 0
+
+def test_router_cleaner():
+    """Test that router interfaces are removed from their own router."""
+    neutron_client = MagicMock()
+    neutron_client.list_routers.return_value = {'routers': [
+        {'id': 'r0', 'name': 'router_left', 'routes': []},
+        {'id': 'r1', 'name': 'router_right', 'routes': []},
+        {'id': 'r2', 'name': 'other', 'routes': []}]}
+    neutron_client.list_ports.side_effect = lambda device_id: {'ports': [{'id': device_id + 'p'}]}
+    cleaner = RouterCleaner(neutron_client, ['router_left', 'router_right'])
+    engine = CleanupEngine(2)
+    cleaner.clean(None, engine)
+    engine.run()
+    calls = [call for call in neutron_client.method_calls if call[0] != 'list_ports']
+    assert sorted(call[1] for call in calls if call[0] == 'remove_interface_router') == \
+        [('r0', {'port_id': 'r0p'}), ('r1', {'port_id': 'r1p'})]
+    # routes, then interfaces and then routers are deleted
+    assert [call[0] for call in calls[1:]] == ['update_router'] * 2 + \
+        ['remove_interface_router'] * 2 + ['delete_router'] * 2
+
+
 # Test not admin exception with empty value is raised
 @patch.object(Compute, 'find_image', _mock_find_image)
 @patch.object(utils, 'waiting_servers_deletion', _mock_waiting_servers_deletion)
@@ -378,6 +821,8 @@ TREX_STATS = {
 def test_trex_streams_stats():
     """Test TRex stats for chains 0 and 1."""
     traffic_client = MagicMock()
+    # single port pair: chain traffic always uses ports 0 and 1
+    traffic_client.generator_config.get_chain_port = lambda port, chain_idx: port
     trex = TRex(traffic_client)
     if_stats = [InterfaceStats("p0", "dev0"), InterfaceStats("p1", "dev1")]
     latencies = [Latency()] * 2
@@ -503,3 +948,70 @@ def test_fixed_rate_no_openstack():
     assert results
     # pprint.pprint(results['EXT']['result']['result']['64'])
     runner.close()
+
+@patch.object(TrafficClient, 'skip_sleep', lambda x: True)
+def test_stateful_no_openstack():
+    """Test stateful run - no openstack."""
+    config = _get_chain_config(ChainType.EXT, 1, True)
+    specs = Specs()
+    config.vlans = [100, 200]
+    config['traffic_generator']['mac_addrs_left'] = ['00:00:00:00:00:00']
+    config['traffic_generator']['mac_addrs_right'] = ['00:00:00:00:01:00']
+    config.no_arp = True
+    config.single_run = False
+    config['stateful']['enabled'] = True
+    config['stateful']['max_cps'] = 10000
+
+    runner = ChainRunner(config, None, specs, BasicFactory())
+    tg = runner.traffic_client.gen
+    tg.set_stateful_response(max_cps=5000)
+    results = runner.run()
+    stateful = results['EXT']['result']['result']['stateful']
+    assert 4950 <= stateful['max_cps'] <= 5000
+    assert stateful['run_config']['duration_sec'] == 2
+    runner.close()
+
+    summary = str(NFVBenchSummarizer({'date': '2020-01-01 00:00:00',
+                                      'nfvbench_version': '0.0',
+                                      'config': config,
+                                      'benchmarks': {'network': {'service_chain': results,
+                                                                 'versions': {}}}},
+                                     None))
+    assert 'Max Concurrent Flows' in summary
+    assert 'Stateful search duration' in summary
+
+@patch.object(TrafficClient, 'skip_sleep', lambda x: True)
+@patch.object(TrafficClient, 'is_udp', lambda x, y: True)
+def test_burst_search_no_openstack():
+    """Test max burst size search at a fixed rate - no openstack."""
+    config = _get_chain_config(ChainType.EXT, 1, True, rate='50%')
+    specs = Specs()
+    config.vlans = [100, 200]
+    config['traffic_generator']['mac_addrs_left'] = ['00:00:00:00:00:00']
+    config['traffic_generator']['mac_addrs_right'] = ['00:00:00:00:01:00']
+    config.no_arp = True
+    config['traffic_pattern']['type'] = 'burst'
+    config['traffic_pattern']['burst_search'] = True
+    config['traffic_pattern']['max_burst_size'] = 100
+    # the dummy traffic generator has no latency histogram
+    config.disable_hdrh = True
+
+    runner = ChainRunner(config, None, specs, BasicFactory())
+    tg = runner.traffic_client.gen
+    tg.set_burst_response(max_burst_size=37)
+    results = runner.run()
+    result = results['EXT']['result']['result']['64']
+    assert result['max_burst_size'] == 37
+    assert len(result['burst_iterations']) == 8
+    assert result['run_config']['traffic_pattern'] == {'type': 'burst',
+                                                       'burst_size': 37,
+                                                       'inter_burst_gap_usec': None}
+    runner.close()
+
+    summary = str(NFVBenchSummarizer({'date': '2020-01-01 00:00:00',
+                                      'nfvbench_version': '0.0',
+                                      'config': config,
+                                      'benchmarks': {'network': {'service_chain': results,
+                                                                 'versions': {}}}},
+                                     None))
+    assert 'Max burst size with no drop' in summary
@@ -15,26 +15,77 @@
 #
 import openstack
 from keystoneauth1.exceptions import HTTPClientError
+from mock import MagicMock
 from mock import patch
 import pytest
+from scapy.contrib.mpls import MPLS
+from scapy.layers.inet6 import ICMPv6ND_NA
+from scapy.layers.inet6 import ICMPv6ND_NS
+from scapy.layers.inet6 import ICMPv6NDOptDstLLAddr
+from scapy.layers.inet import IP
+from scapy.layers.inet import TCP
+from scapy.layers.inet import UDP
+from scapy.layers.inet6 import IPv6
+from scapy.layers.l2 import ARP
+from scapy.layers.l2 import Dot1Q
+from scapy.layers.l2 import Ether
+from scapy.utils import wrpcap
 
 from .mock_trex import no_op
 
+import copy
+from datetime import datetime
+import hashlib
+import itertools
 import json
 import logging
+import os
+import socket
+import sqlite3
+import subprocess
 import sys
+import threading
+import time
 from attrdict import AttrDict
+import msgpack
+from hdrh.histogram import HdrHistogram
+from nfvbench.chaining import ChainPool
 from nfvbench.config import config_loads
+from nfvbench.config import ConfigException
+from nfvbench.config import ConfigSchema
 from nfvbench.credentials import Credentials
 from nfvbench.fluentd import FluentLogHandler
+from nfvbench.fluentd import FluentShipper
 import nfvbench.log
+from nfvbench.events import EventBus
+from nfvbench.events import format_sse
+from nfvbench.events import RunNotifier
 import nfvbench.nfvbench
+from nfvbench.nfvbenchd import Job
+from nfvbench.nfvbenchd import JobQueue
+from nfvbench.nfvbenchd import JobQueueException
+from nfvbench.nfvbenchd import setup_flask
+from nfvbench.nfvbenchd import WebServer
 from nfvbench.traffic_client import Device
 from nfvbench.traffic_client import GeneratorConfig
 from nfvbench.traffic_client import IpBlock
 from nfvbench.traffic_client import TrafficClient
 from nfvbench.traffic_client import TrafficClientException
+from nfvbench.packet_stats import InterfaceStats
+from nfvbench.regression import RegressionAnalyzer
+from nfvbench.result_store import ResultStore
+from nfvbench.result_store import ResultStoreException
 from nfvbench.traffic_gen import traffic_utils
+from nfvbench.traffic_gen.traffic_base import Latency
+from nfvbench.traffic_gen.traffic_base import TrafficGeneratorException
+from nfvbench.traffic_gen.traffic_base import TrafficPattern
+from nfvbench.traffic_gen.trex_astf import TRexASTF
+from nfvbench.traffic_gen.trex_gen import ARP_CACHE as arp_cache
+from nfvbench.traffic_gen.trex_gen import TRex
+from nfvbench.traffic_gen.trex_service_nd import ServiceFilterND
+from nfvbench.traffic_gen.trex_service_nd import ServiceND
+from nfvbench.traffic_server import TRexLogMonitor
+from nfvbench.traffic_server import TRexServerManager
 from nfvbench import utils
 
 # just to get rid of the unused function warning
@@ -233,6 +284,65 @@ def test_lcm():
         utils.lcm(0, 0)
 
 
+def test_find_max_lcm_tuple():
+    """The solver must return the last tuple found by the brute force search."""
+    for lcm_value in [1, 2, 12, 30, 64, 97, 360, 1000]:
+        for size_a in [1, 6, 16, 60, 97, 128]:
+            for size_b in [1, 4, 25, 36, 100]:
+                expected = list(utils.find_tuples_equal_to_lcm_value(
+                    list(utils.get_divisors(size_a)), list(utils.get_divisors(size_b)),
+                    lcm_value))
+                assert utils.find_max_lcm_tuple(utils.DivisorSet(size_a),
+                                                utils.DivisorSet(size_b),
+                                                lcm_value) == (expected[-1] if expected else None)
+                udp_range = range(size_b, size_b * 3)
+                for ip_sizes in [list(utils.get_divisors(size_a)), range(1, size_a)]:
+                    expected = list(utils.find_tuples_equal_to_lcm_value(ip_sizes, udp_range,
+                                                                         lcm_value))
+                    ip_set = ip_sizes if isinstance(ip_sizes, range) \
+                        else utils.DivisorSet(size_a)
+                    assert utils.find_max_lcm_tuple(ip_set, udp_range, lcm_value) == \
+                        (expected[-1] if expected else None)
+    assert utils.find_max_size(1000, None, 360) == 360
+    assert utils.find_max_size(100, None, 360) == 90
+    assert utils.find_max_size(100, (60, 12), 360) == 60
+    assert utils.find_max_size(7, None, 97) == 1
+
+
+def test_flow_range_solver_benchmark():
+    """Solve the flow ranges of up to 10M flows over 256 chains without enumerating them.
+
+    The cost is checked structurally rather than with a wall clock bound: the brute force
+    helpers must not be used and the number of membership tests must stay far below
+    the flow count.
+    """
+    contains = utils.DivisorSet.__contains__
+    membership_tests = []
+
+    def counting_contains(divisor_set, x):
+        membership_tests.append(x)
+        return contains(divisor_set, x)
+
+    for scc, fc in [(1, 10000000), (256, 10000000), (256, 9999872), (128, 2000006)]:
+        config = _get_dummy_tg_config('PVP', '1Mpps', scc=scc, fc=fc,
+                                      src_udp=[1024, 65000], dst_udp=[1024, 65000])
+        del membership_tests[:]
+        with patch.object(utils, 'find_tuples_equal_to_lcm_value',
+                          side_effect=AssertionError('brute force search used')), \
+                patch.object(utils, 'get_divisors',
+                             side_effect=AssertionError('divisors enumerated')), \
+                patch.object(utils.DivisorSet, '__contains__', counting_contains):
+            gen_config = GeneratorConfig(config)
+            for device in gen_config.devices:
+                stream_configs = device.get_stream_configs()
+        assert len(membership_tests) < fc // 100
+        for stream_cfg in stream_configs:
+            udp_src_size = int(stream_cfg['udp_src_port_max']) - int(stream_cfg['udp_src_port']) + 1
+            udp_dst_size = int(stream_cfg['udp_dst_port_max']) - int(stream_cfg['udp_dst_port']) + 1
+            assert utils.lcm(utils.lcm(stream_cfg['ip_src_count'], stream_cfg['ip_dst_count']),
+                             utils.lcm(udp_src_size, udp_dst_size)) >= stream_cfg['count']
+
+
 def test_flow_count_limit():
     # lcm ip src and dst /32
     lcm_ip = utils.lcm(1, 1) == 1
@@ -310,6 +420,35 @@ def test_device_flow_config():
     _check_device_flow_config('0.0.0.2')
 
 
+def test_device_flow_plan():
+    """The flow plan is computed once and the stream configs are rebuilt only when needed."""
+    config = _get_dummy_tg_config('PVP', '1Mpps', scc=4, fc=1000, ip0='10.0.0.0/24',
+                                  ip1='20.0.0.0/24', src_udp=[1024, 1031], dst_udp=[53, 55])
+    gen_config = GeneratorConfig(config)
+    device = gen_config.devices[0]
+    with patch.object(Device, 'limit_ip_udp_ranges', autospec=True,
+                      side_effect=Device.limit_ip_udp_ranges) as mock_limit:
+        stream_configs = device.get_stream_configs()
+        assert mock_limit.call_count == 4
+        assert device.get_stream_configs() is stream_configs
+        gen_config.set_vlans(0, [100, 101, 102, 103])
+        new_stream_configs = device.get_stream_configs()
+        assert mock_limit.call_count == 4
+    assert new_stream_configs is not stream_configs
+    assert [cfg['vlan_tag'] for cfg in new_stream_configs] == [100, 101, 102, 103]
+    for cfg, new_cfg in zip(stream_configs, new_stream_configs):
+        assert dict(cfg, vlan_tag=None) == dict(new_cfg, vlan_tag=None)
+    # the dest MACs of the peer device in l2-loopback mode are the local MACs
+    gen_config.devices[1].get_stream_configs()
+    device.set_mac('00:00:00:00:01:01')
+    assert gen_config.devices[1].get_stream_configs()[0]['mac_dst'] == '00:00:00:00:01:01'
+
+    plans = gen_config.get_flow_plans()
+    assert [plan['port'] for plan in plans] == [0, 1]
+    assert [chain['count'] for chain in plans[0]['chains']] == [125, 125, 125, 125]
+    assert plans[0]['chains'][1]['ip_dst_addr'] == stream_configs[1]['ip_dst_addr']
+
+
 def check_udp_stream_configs(gen_config, expected_cfg):
     """Verify that the range for each chain have adjacent UDP ports without holes between chains."""
     config = gen_config.config
@@ -964,6 +1103,920 @@ def test_device_udp_flow_config_no_random_steps_overridden(caplog):
     assert "Current values of ip_addrs_step and/or udp_port_step properties" not in caplog.text
 
 
+def _get_ipv6_config(scc, fc, step_ip='::1'):
+    config = _get_dummy_tg_config('PVP', '1Mpps', scc=scc, fc=fc, step_ip=step_ip,
+                                  ip0='2001:db8:10::/64', ip1='2001:db8:20::/64')
+    tgc = config['traffic_generator']
+    tgc['tg_gateway_ip_addrs'] = ['2001:db8:1::100', '2001:db8:2::100']
+    tgc['gateway_ip_addrs'] = ['2001:db8:1::2', '2001:db8:2::2']
+    config['vxlan'] = False
+    config['mpls'] = False
+    return config
+
+def test_ipv6_ip_conversion():
+    for addr in ['::', '2001:db8::1', '2001:db8:10::ffff:ffff', 'ffff::1:0']:
+        assert Device.int_to_ip(Device.ip_to_int(addr), 6) == addr
+    assert Device.ip_to_int('::1') == Device.ip_to_int('0.0.0.1') == 1
+    assert Device.ip_to_int('2001:db8::1:0') == (0x20010db8 << 96) + 0x10000
+    ipb = IpBlock('2001:db8::ffff:fffe', '::1', 4)
+    assert ipb.get_ip(0) == '2001:db8::ffff:fffe'
+    assert ipb.get_ip(3) == '2001:db8::1:0:1'
+    assert ipb.reserve_ip_range(2) == ('2001:db8::ffff:fffe', '2001:db8::ffff:ffff')
+
+def test_ipv6_device_flow_config():
+    config = _get_ipv6_config(3, 20000)
+    gen_config = GeneratorConfig(config)
+    assert gen_config.ip_version == 6
+    device = gen_config.devices[0]
+    # the /64 range is limited to what the flows of all chains can use
+    assert device.ip_size == 10000 + 3
+    stream_configs = device.get_stream_configs()
+    dip = Device.ip_to_int('2001:db8:20::')
+    total_count = 0
+    for index, stream_cfg in enumerate(stream_configs):
+        assert stream_cfg['ip_version'] == 6
+        # ip_src_static == True
+        assert stream_cfg['ip_src_addr'] == stream_cfg['ip_src_addr_max'] == \
+            Device.int_to_ip(Device.ip_to_int('2001:db8:10::') + index, 6)
+        assert stream_cfg['ip_dst_count'] == (3332 if index == 0 else 3334)
+        assert Device.ip_to_int(stream_cfg['ip_dst_addr']) == dip
+        assert Device.ip_to_int(stream_cfg['ip_dst_addr_max']) == \
+            dip + stream_cfg['ip_dst_count'] - 1
+        assert stream_cfg['mac_discovery_gw'] == '2001:db8:1::%x' % (2 + index)
+        assert stream_cfg['ip_src_tg_gw'] == '2001:db8:1::%x' % (0x100 + index)
+        dip += stream_cfg['ip_dst_count']
+        total_count += stream_cfg['count']
+    assert total_count == 10000
+
+def test_ipv6_invalid_config():
+    config = _get_ipv6_config(1, 10)
+    config['traffic_generator']['gateway_ip_addrs'] = ['1.1.0.2', '2.2.0.2']
+    with pytest.raises(TrafficClientException):
+        GeneratorConfig(config)
+    config = _get_ipv6_config(1, 10)
+    config['vxlan'] = True
+    with pytest.raises(TrafficClientException):
+        GeneratorConfig(config)
+    config = _get_ipv6_config(1, 10, step_ip='::1:0:0')
+    with pytest.raises(TrafficClientException):
+        GeneratorConfig(config)
+    config = _get_ipv6_config(1, 10)
+    config['single_run'] = True
+    traffic_client = TrafficClient(config)
+    # 64-byte frames cannot carry IPv6 UDP packets
+    with pytest.raises(TrafficClientException):
+        traffic_client.set_traffic('64', True)
+
+def test_ipv6_neighbor_discovery():
+    src_mac = '00:00:00:00:00:01'
+    nd = ServiceND(None, src_ip='2001:db8:1::100', dst_ip='2001:db8:1::2')
+    nd_filter = ServiceFilterND()
+    nd_filter.add(nd)
+
+    class Pipe(object):
+        def __init__(self):
+            self.pkts = []
+
+        def get_src_mac(self):
+            return src_mac
+
+        def async_tx_pkt(self, pkt):
+            self.pkts.append(pkt)
+
+        def async_wait_for_pkt(self, time_sec):
+            return time_sec
+
+    pipe = Pipe()
+    run = nd.run(pipe)
+    next(run)
+    # neighbor solicitation sent to the solicited-node multicast address of the target
+    ns = pipe.pkts[0]
+    assert ns.dst == '33:33:ff:00:00:02'
+    assert ns[IPv6].dst == 'ff02::1:ff00:2'
+    assert ns[ICMPv6ND_NS].tgt == '2001:db8:1::2'
+
+    na = bytes(Ether(src='fa:16:3e:00:00:02', dst=src_mac) /
+               IPv6(src='2001:db8:1::2', dst='2001:db8:1::100') /
+               ICMPv6ND_NA(tgt='2001:db8:1:0::2') /
+               ICMPv6NDOptDstLLAddr(lladdr='fa:16:3e:00:00:02'))
+    assert nd_filter.lookup(bytes(ns)) == []
+    assert nd_filter.lookup(na) == [nd]
+    with pytest.raises(StopIteration):
+        run.send([{'pkt': na}])
+    record = nd.get_record()
+    assert record.dst_mac == 'fa:16:3e:00:00:02'
+    assert record.dst_ip == '2001:db8:1::2'
+
+    # no response
+    run = nd.run(pipe)
+    next(run)
+    with pytest.raises(StopIteration):
+        run.send([])
+    assert nd.get_record().dst_mac is None
+
+def _get_port_pairs_config(scc):
+    config = _get_dummy_tg_config('PVP', '1Mpps', scc=scc, fc=scc * 100)
+    config['traffic_generator']['generator_profile'][0]['interfaces'] = \
+        [{'port': port, 'pci': '0.%d' % port} for port in range(4)]
+    return config
+
+def test_port_pairs_config():
+    config = _get_port_pairs_config(3)
+    gen_config = GeneratorConfig(config)
+    assert gen_config.port_pair_count == 2
+    assert gen_config.ports == [0, 1]
+    assert gen_config.all_ports == [0, 1, 2, 3]
+    # aggregate line rate of the 2 ports on each side
+    assert gen_config.intf_speed == 20000000000
+    # chains are distributed in round robin across port pairs
+    assert gen_config.get_pair_chains(0) == [0, 2]
+    assert gen_config.get_pair_chains(1) == [1]
+    assert [gen_config.get_chain_port(0, chain) for chain in range(3)] == [0, 2, 0]
+    assert [gen_config.get_chain_port(1, chain) for chain in range(3)] == [1, 3, 1]
+
+    gen_config.devices[0].set_macs(['00:00:00:00:00:01', '00:00:00:00:00:03'])
+    gen_config.devices[1].set_macs(['00:00:00:00:00:02', '00:00:00:00:00:04'])
+    # no dest mac set: l2 loopback to the peer port of the same port pair
+    stream_configs = gen_config.devices[0].get_stream_configs()
+    assert [cfg['mac_src'] for cfg in stream_configs] == \
+        ['00:00:00:00:00:01', '00:00:00:00:00:03', '00:00:00:00:00:01']
+    assert [cfg['mac_dst'] for cfg in stream_configs] == \
+        ['00:00:00:00:00:02', '00:00:00:00:00:04', '00:00:00:00:00:02']
+
+def test_port_pairs_invalid_config():
+    config = _get_port_pairs_config(1)
+    # not enough chains for 2 port pairs
+    with pytest.raises(TrafficClientException):
+        GeneratorConfig(config)
+    config = _get_port_pairs_config(2)
+    config['traffic_generator']['generator_profile'][0]['interfaces'].pop()
+    with pytest.raises(TrafficClientException):
+        GeneratorConfig(config)
+
+def test_port_pairs_trex_rates_and_stats():
+    config = _get_port_pairs_config(3)
+    config['single_run'] = True
+    traffic_client = TrafficClient(config)
+    trex = TRex(traffic_client)
+    # 2 chains on pair 0 and 1 chain on pair 1
+    assert trex.get_pair_rate('3000pps', 0) == '2000.0pps'
+    assert trex.get_pair_rate('3000pps', 1) == '1000.0pps'
+    # loads are relative to the line rate of each port
+    assert trex.get_pair_rate('60%', 0) == '80.0%'
+    assert trex.get_pair_rate('60%', 1) == '40.0%'
+
+    # chain 1 stream counters are reported on ports 2 and 3
+    trex_stats = {'flow_stats': {1: {'rx_pkts': {3: 90, 'total': 90},
+                                     'tx_pkts': {2: 100, 'total': 100}},
+                                 129: {'rx_pkts': {2: 190, 'total': 190},
+                                       'tx_pkts': {3: 200, 'total': 200}}},
+                  'latency': {}}
+    if_stats = [InterfaceStats("p0", "dev0"), InterfaceStats("p1", "dev1")]
+    trex.get_stream_stats(trex_stats, if_stats, [Latency(), Latency()], 1)
+    assert (if_stats[0].tx, if_stats[0].rx) == (100, 190)
+    assert (if_stats[1].tx, if_stats[1].rx) == (200, 90)
+
+class _FakeArpService(object):
+    """ARP service resolving the dst IP after a given number of runs."""
+
+    runs = {}
+    run_count_to_resolve = {}
+
+    def __init__(self, ctx, src_ip, dst_ip, vlan):
+        self.src_ip = src_ip
+        self.dst_ip = dst_ip
+
+    def get_record(self):
+        resolved = self.runs.get(self.dst_ip, 0) >= self.run_count_to_resolve.get(self.dst_ip, 1)
+        return AttrDict({'src_ip': self.src_ip, 'dst_ip': self.dst_ip,
+                         'dst_mac': '00:00:00:00:99:%02x' % int(self.dst_ip.split('.')[-1])
+                                    if resolved else None})
+
+def _run_fake_arp_services(services):
+    for service in services:
+        _FakeArpService.runs[service.dst_ip] = _FakeArpService.runs.get(service.dst_ip, 0) + 1
+
+@patch('nfvbench.traffic_gen.trex_gen.ServiceARP', _FakeArpService)
+@patch('nfvbench.traffic_gen.trex_gen.time.sleep')
+def test_trex_resolve_arp(mock_sleep):
+    config = _get_dummy_tg_config('EXT', '1Mpps', scc=2, ip0='10.0.0.0/24', ip1='20.0.0.0/24')
+    config['single_run'] = True
+    config['vxlan'] = False
+    config['mpls'] = False
+    config['generic_retry_count'] = 10
+    trex = TRex(TrafficClient(config))
+    trex.client = MagicMock()
+    trex.client.create_service_ctx.return_value.run.side_effect = _run_fake_arp_services
+    trex.port_handle = [0, 1]
+    _FakeArpService.runs = {}
+    # the gateway of chain 1 on port 1 answers at the third attempt
+    _FakeArpService.run_count_to_resolve = {'2.2.0.3': 3}
+    arp_cache.clear()
+
+    macs = trex.resolve_arp()
+    assert macs == {0: ['00:00:00:00:99:02', '00:00:00:00:99:03'],
+                    1: ['00:00:00:00:99:02', '00:00:00:00:99:03']}
+    # only the unresolved chain is retried, with an exponential backoff
+    assert _FakeArpService.runs == {'1.1.0.2': 1, '1.1.0.3': 1, '2.2.0.2': 1, '2.2.0.3': 3}
+    assert [call[0][0] for call in mock_sleep.call_args_list] == [0.25, 0.5]
+    assert not trex.arp_cached
+
+    # the next run reuses the cached MAC addresses unless a refresh is forced
+    assert trex.resolve_arp() == macs
+    assert trex.arp_cached
+    assert sum(_FakeArpService.runs.values()) == 6
+    assert trex.resolve_arp(refresh=True) == macs
+    assert not trex.arp_cached
+    assert sum(_FakeArpService.runs.values()) == 10
+
+    # unresolved addresses are not cached
+    _FakeArpService.run_count_to_resolve = {'2.2.0.3': 100}
+    assert trex.resolve_arp(refresh=True) is None
+    assert trex.resolve_arp() is None
+    arp_cache.clear()
+
+def test_file_checksums(tmp_path):
+    """File checksums are computed once and cached alongside the file."""
+    image_path = tmp_path / 'nfvbenchvm-1.0.qcow2'
+    content = bytes(range(256)) * 40000
+    image_path.write_bytes(content)
+    checksums = utils.get_file_checksums(str(image_path))
+    assert checksums == {'md5': hashlib.md5(content).hexdigest(),
+                         'sha512': hashlib.sha512(content).hexdigest()}
+    cache_path = tmp_path / 'nfvbenchvm-1.0.qcow2.checksum'
+    cache = json.loads(cache_path.read_text())
+    # the cached checksums are used as long as the file is not modified
+    cache['md5'] = 'cached'
+    cache_path.write_text(json.dumps(cache))
+    assert utils.get_file_checksums(str(image_path))['md5'] == 'cached'
+    image_path.write_bytes(content[:1000])
+    assert utils.get_file_checksums(str(image_path))['md5'] == \
+        hashlib.md5(content[:1000]).hexdigest()
+    image_path.write_bytes(b'')
+    assert utils.get_file_checksums(str(image_path))['md5'] == hashlib.md5(b'').hexdigest()
+
+    # the progress reader returns the whole content in chunks
+    image_path.write_bytes(content)
+    with open(str(image_path), 'rb') as image_file:
+        reader = utils.FileProgressReader(image_file, len(content), 'test')
+        assert b''.join(reader) == content
+    assert reader.next_report == 110
+
+def test_job_queue(tmp_path):
+    """Jobs are run by priority, grouping the jobs with the same chain setup."""
+    pathname = str(tmp_path / 'jobs.json')
+    jobs = JobQueue(max_queued=4, retention=2, pathname=pathname)
+    pvp = jobs.submit({'service_chain': 'PVP'})
+    pvvp = jobs.submit({'service_chain': 'PVVP'})
+    pvp2 = jobs.submit({'service_chain': 'PVP', 'rate': '10%'})
+    urgent = jobs.submit({'service_chain': 'PVVP'}, priority=1)
+    with pytest.raises(JobQueueException):
+        jobs.submit({})
+    assert [job['request_id'] for job in jobs.get_jobs()] == [urgent.id, pvvp.id, pvp.id, pvp2.id]
+
+    # jobs are saved and reloaded, a running job is queued again
+    assert jobs.get() is urgent
+    jobs = JobQueue(max_queued=4, retention=2, pathname=pathname)
+    job = jobs.get()
+    assert job.id == urgent.id
+    cancelled = []
+    jobs.cancel_running = cancelled.append
+    jobs.cancel(job.id)
+    assert cancelled == [job]
+    jobs.complete(job, {'status': 'ERROR', 'error_message': 'Run cancelled'})
+    assert job.state == Job.CANCELLED
+    with pytest.raises(JobQueueException):
+        jobs.cancel(job.id)
+
+    # the PVVP job is run next since it has the same chain setup
+    assert jobs.get().id == pvvp.id
+    assert jobs.cancel(pvp.id).state == Job.CANCELLED
+    assert jobs.get_job(pvvp.id).state == Job.RUNNING
+    jobs.complete(jobs.get_job(pvvp.id), {'status': 'OK', 'result': {}})
+    # only the 2 most recent completed jobs are kept
+    assert jobs.get_job(urgent.id) is None
+    assert jobs.fetch_result()['request_id'] == pvvp.id
+    assert jobs.fetch_result() is None
+    assert jobs.fetch_result(pvp.id)['error_message'] == 'run cancelled'
+    assert [(job['request_id'], job['state']) for job in jobs.get_jobs()] == \
+        [(pvp2.id, Job.QUEUED), (pvvp.id, Job.DONE), (pvp.id, Job.CANCELLED)]
+
+
+def test_job_queue_staging_key():
+    """The chain setup of a job is determined from the config the run will use."""
+    config, _ = nfvbench.nfvbench.load_default_config()
+    runner = MagicMock(base_config=config, result_store=None,
+                       config_schema=ConfigSchema(config, nfvbench.nfvbench.WHITELIST_KEYS))
+    jobs = WebServer(runner, None).jobs
+    default = jobs.submit({})
+    explicit = jobs.submit({'service_chain': config.service_chain,
+                            'traffic_generator': {'default_profile':
+                                                  config.traffic_generator.default_profile}})
+    other = jobs.submit({'flavor': {'vcpus': config.flavor.vcpus + 1}})
+    invalid = jobs.submit({'flavor': 'large'})
+    assert explicit.staging_key == default.staging_key
+    assert other.staging_key != default.staging_key
+    assert invalid.staging_key not in [default.staging_key, other.staging_key]
+    # with the raw overrides, jobs with the same chain setup would not be grouped
+    assert ChainPool.get_key(explicit.config) != ChainPool.get_key(default.config)
+
+
+def test_rest_jobs():
+    """Run requests are queued and can be cancelled with the REST API."""
+    jobs = JobQueue(max_queued=1, retention=5)
+    client = setup_flask(jobs).test_client()
+    res = client.post('/start_run?priority=2', json={'rate': '10%'}).get_json()
+    assert res['status'] == 'PENDING'
+    request_id = res['request_id']
+    assert client.post('/start_run', json={}).get_json()['status'] == 'ERROR'
+    assert client.get('/status/' + request_id).get_json()['status'] == 'PENDING'
+    assert client.get('/jobs').get_json()[0]['priority'] == 2
+    assert client.delete('/jobs/' + request_id).get_json()['state'] == Job.CANCELLED
+    assert client.delete('/jobs/' + request_id).get_json()['status'] == 'ERROR'
+    assert client.delete('/jobs/unknown').get_json()['status'] == 'NOT_FOUND'
+    assert client.get('/status/' + request_id).get_json()['status'] == 'ERROR'
+    assert client.get('/status').get_json()['error_message'] == 'no pending NFVbench run'
+
+def test_event_bus():
+    """Subscribers get all the events of a run, including the ones published before."""
+    bus = EventBus(max_channels=1, max_events=3)
+    notifier = RunNotifier(bus, 'run1')
+    notifier.send('state', state='running')
+    notifier.send('interval', tx_pps=100)
+    notifier.send('trial', load_percent=100.0)
+    notifier.send('trial', load_percent=50.0)
+    events = bus.subscribe('run1', timeout=0)
+    # the interval stats are dropped first when the channel is full
+    assert [event['event'] for event in itertools.islice(events, 3)] == \
+        ['state', 'trial', 'trial']
+    assert next(events) is None
+    bus.close('run1')
+    assert next(events, 'end') == 'end'
+    assert [event['data'] for event in bus.subscribe('run1', last_id=3)] == \
+        [{'load_percent': 50.0}]
+    assert format_sse(bus.channels['run1'].events[-1]) == \
+        'id: 4\nevent: trial\ndata: {"load_percent": 50.0}\n\n'
+    # closed channels are removed when there are too many channels
+    bus.open('run2')
+    assert not bus.has_channel('run1')
+    assert list(bus.subscribe('run1')) == []
+
+
+def test_rest_events():
+    """The events of a job are streamed as server-sent events until the job completes."""
+    jobs = JobQueue(max_queued=2, retention=2, events=EventBus())
+    client = setup_flask(jobs, keep_alive_sec=0).test_client()
+    request_id = client.post('/start_run', json={}).get_json()['request_id']
+    job = jobs.get()
+    RunNotifier(jobs.events, job.id).send('trial', load_percent=100.0)
+    jobs.complete(job, {'status': 'OK', 'result': {}})
+    res = client.get('/runs/%s/events' % request_id)
+    assert res.mimetype == 'text/event-stream'
+    events = [event.split('\n') for event in res.get_data(as_text=True).split('\n\n') if event]
+    assert [event[1] for event in events] == \
+        ['event: state', 'event: state', 'event: trial', 'event: state']
+    assert json.loads(events[-1][2][len('data: '):])['state'] == Job.DONE
+    res = client.get('/runs/%s/events' % request_id, headers={'Last-Event-ID': '3'})
+    assert res.get_data(as_text=True).count('event:') == 1
+    assert client.get('/runs/unknown/events').get_json()['status'] == 'NOT_FOUND'
+
+def _get_store_result(date, chain_count, ndr_pps, user_label=None):
+    def get_measurement(rate_pps, drop_percentage):
+        return {'rate_pps': rate_pps, 'rate_bps': rate_pps * 672,
+                'stats': {'overall': {'drop_percentage': drop_percentage, 'avg_delay_usec': 20,
+                                      'min_delay_usec': 10, 'max_delay_usec': 90,
+                                      'lat_percentile': {99.9: 80}}}}
+    return {'date': date, 'nfvbench_version': '5.0.1', 'config': {'user_label': user_label},
+            'benchmarks': {'network': {
+                'versions': {'TRex': 'v2.89'},
+                'service_chain': {'PVP': {'result': {
+                    'flow_count': 10000, 'service_chain_count': chain_count,
+                    'result': {'64': {'ndr': get_measurement(ndr_pps, 0.0),
+                                      'pdr': get_measurement(ndr_pps * 1.1, 0.05)},
+                               'warning': None}}}}}}}
+
+
+def test_result_store():
+    """Stored results can be queried by run dimensions or aggregated."""
+    store = ResultStore(':memory:')
+    for index in range(10000):
+        store.add(_get_store_result('2024-01-%02d 10:%02d:%02d' % (1 + index % 28, index % 60,
+                                                                    index // 60 % 60),
+                                    1 + index % 4, 1000000 + index))
+    store.add(_get_store_result('2024-02-01 10:00:00', 2, 500000, 'baseline'), 'req1')
+    measurements = store.query({'service_chain_count': '2', 'type': 'ndr', 'limit': '5'})
+    assert len(measurements) == 5
+    assert measurements[0]['request_id'] == 'req1'
+    assert measurements[0]['user_label'] == 'baseline'
+    assert measurements[0]['rate_pps'] == 500000
+    assert measurements[0]['lat_percentile'] == {'99.9': 80}
+    series = store.query({'frame_size': '64', 'type': 'ndr', 'since': '2024-01-01',
+                          'until': '2024-02-01', 'group_by': 'service_chain_count'})
+    assert [point['service_chain_count'] for point in series] == [1, 2, 3, 4]
+    assert [point['count'] for point in series] == [2500] * 4
+    assert series[0]['min'] == 1000000
+    assert len(store.query({'group_by': 'day', 'metric': 'drop_percentage'})) == 29
+    # the rate, latency percentile and component version filters use an index
+    for params, index in [({'type': 'ndr', 'min_rate_pps': '1009990'}, 'measurements_rate'),
+                          ({'percentile': '99.9', 'max_lat_percentile_usec': '50'},
+                           'percentiles_value'),
+                          ({'component': 'TRex', 'component_version': 'v2.90'},
+                           'run_versions_component')]:
+        sql, values, _ = store._get_sql(params)
+        plan = store.conn.execute('EXPLAIN QUERY PLAN ' + sql, values).fetchall()
+        assert index in ' '.join(row[-1] for row in plan)
+    result = store.query({'user_label': 'baseline', 'include_result': '1'})
+    assert [measurement['type'] for measurement in result] == ['ndr', 'pdr']
+    assert result[0]['result']['date'] == '2024-02-01 10:00:00'
+    for params in [{'limit': 'all'}, {'chain': 'PVP'}, {'group_by': 'frame_size', 'metric': 'x'},
+                   {'flow_count': 'ten'}, {'min_rate': '1'}, {'max_lat_percentile_usec': '1'},
+                   {'group_by': 'day', 'metric': 'lat_percentile_usec'},
+                   {'group_by': 'component_version'}]:
+        with pytest.raises(ResultStoreException):
+            store.query(params)
+
+    # latency percentiles and component versions can be filtered and aggregated
+    result = _get_store_result('2024-02-02 10:00:00', 2, 600000, 'new')
+    result['benchmarks']['network']['versions'] = {'TRex': 'v2.90', 'VPP': {'build': 1}}
+    latency = result['benchmarks']['network']['service_chain']['PVP']['result']['result'][
+        '64']['ndr']['stats']['overall']
+    latency['lat_percentile'] = {50: 'n/a', 99.9: 40, 99.99: 60}
+    store.add(result)
+    measurements = store.query({'type': 'ndr', 'percentile': '99.9',
+                                'max_lat_percentile_usec': '50'})
+    assert [measurement['user_label'] for measurement in measurements] == ['new']
+    assert measurements[0]['lat_percentile'] == {'99.9': 40, '99.99': 60}
+    assert store.query({'component': 'TRex', 'component_version': 'v2.90',
+                        'type': 'ndr'}) == measurements
+    assert len(store.query({'component': 'VPP', 'component_version': '{"build": 1}'})) == 2
+    assert store.query({'type': 'ndr', 'min_rate_pps': '1009998'})[0]['rate_pps'] == 1009999
+    series = store.query({'type': 'ndr', 'group_by': 'percentile',
+                          'metric': 'lat_percentile_usec', 'since': '2024-02-01'})
+    assert [(point['percentile'], point['count'], point['min'], point['max'])
+            for point in series] == [(99.9, 2, 40, 80), (99.99, 1, 60, 60)]
+    series = store.query({'component': 'TRex', 'group_by': 'component_version',
+                          'type': 'ndr', 'since': '2024-02-01'})
+    assert [(point['component_version'], point['avg']) for point in series] == \
+        [('v2.89', 500000), ('v2.90', 600000)]
+
+    client = setup_flask(JobQueue(1, 1), result_store=store).test_client()
+    res = client.get('/results?user_label=baseline&group_by=frame_size').get_json()
+    assert res == [{'frame_size': '64', 'metric': 'rate_pps', 'count': 2, 'avg': 525000.0,
+                    'min': 500000.0, 'max': 550000.0}]
+    assert client.get('/results?version=x&group=day').get_json()['status'] == 'ERROR'
+
+
+def test_result_store_upgrade(tmp_path):
+    """The versions and latency percentiles of older stores are moved to their tables."""
+    pathname = str(tmp_path / 'results.db')
+    conn = sqlite3.connect(pathname)
+    with conn:
+        conn.execute('CREATE TABLE runs (id INTEGER PRIMARY KEY, request_id TEXT, '
+                     'date TEXT NOT NULL, service_chain TEXT, service_chain_count INTEGER, '
+                     'flow_count INTEGER, user_label TEXT, version TEXT, versions TEXT, '
+                     'result TEXT NOT NULL)')
+        conn.execute('CREATE TABLE measurements (run_id INTEGER NOT NULL, '
+                     'frame_size TEXT NOT NULL, type TEXT NOT NULL, rate_pps REAL, '
+                     'rate_bps REAL, drop_percentage REAL, avg_delay_usec REAL, '
+                     'min_delay_usec REAL, max_delay_usec REAL, lat_percentile TEXT)')
+        conn.execute("INSERT INTO runs VALUES (1, NULL, '2024-01-01 00:00:00', 'PVP', 1, 10000, "
+                     "NULL, '5.0.1', '{\"TRex\": \"v2.89\"}', '{}')")
+        conn.execute("INSERT INTO measurements VALUES (1, '64', 'ndr', 1000000, 672000000, 0, "
+                     "20, 10, 90, '{\"99.9\": 80, \"50\": \"n/a\"}')")
+    conn.close()
+    store = ResultStore(pathname)
+    measurements = store.query({'component': 'TRex', 'component_version': 'v2.89'})
+    assert len(measurements) == 1
+    assert measurements[0]['lat_percentile'] == {'99.9': 80}
+    assert measurements[0]['fingerprint'] is None
+    store.add(_get_store_result('2024-01-02 00:00:00', 1, 1100000))
+    store.close()
+    # the upgrade is only done once
+    store = ResultStore(pathname)
+    series = store.query({'percentile': '99.9', 'group_by': 'type',
+                          'metric': 'lat_percentile_usec'})
+    assert [(point['type'], point['count']) for point in series] == [('ndr', 2), ('pdr', 1)]
+
+def test_regression_analyzer(tmp_path):
+    """Regressions are detected against the median of the previous comparable runs."""
+    regression_config = AttrDict({'history': 20, 'min_runs': 5, 'max_deviation': 3,
+                                  'min_change_percent': 5, 'history_dir': str(tmp_path)})
+    store = ResultStore(':memory:')
+    analyzer = RegressionAnalyzer(regression_config, store)
+    # a different config is not comparable
+    other_result = _get_store_result('2024-01-01 00:00:00', 1, 1000000)
+    other_result['config']['flow_count'] = 2
+    store.add(other_result)
+    for day in range(1, 5):
+        result = _get_store_result('2024-01-%02d 00:00:00' % day, 1, 1000000 + day * 1000)
+        store.add(result)
+        with open(str(tmp_path / ('result%d.json' % day)), 'w', encoding="utf-8") as json_file:
+            json.dump(result, json_file)
+    report = analyzer.analyze(_get_store_result('2024-02-01 00:00:00', 1, 500000))
+    assert report['run_count'] == 4
+    assert report['checks'] == []
+
+    # an outlier does not change the baseline
+    store.add(_get_store_result('2024-01-05 00:00:00', 1, 2000000))
+    report = analyzer.analyze(_get_store_result('2024-02-01 00:00:00', 1, 1001000))
+    assert report['run_count'] == 5
+    assert len(report['checks']) == 6
+    assert report['regressions'] == []
+    report = analyzer.analyze(_get_store_result('2024-02-01 00:00:00', 1, 900000))
+    assert [(check['type'], check['metric']) for check in report['regressions']] == \
+        [('ndr', 'rate_pps'), ('pdr', 'rate_pps')]
+    regression = report['regressions'][0]
+    assert regression['baseline'] == 1003000
+    assert regression['change_percent'] == -10.27
+    assert regression['deviation'] < -3
+
+    # the same results saved as JSON files in a directory
+    with open(str(tmp_path / 'result5.json'), 'w', encoding="utf-8") as json_file:
+        json.dump(_get_store_result('2024-01-05 00:00:00', 1, 1005000), json_file)
+    (tmp_path / 'other.json').write_text('{"not": "a result"}')
+    analyzer = RegressionAnalyzer(regression_config)
+    report = analyzer.analyze(_get_store_result('2024-01-05 00:00:00', 1, 900000))
+    assert report['run_count'] == 4
+    report = analyzer.analyze(_get_store_result('2024-02-01 00:00:00', 1, 900000))
+    assert len(report['regressions']) == 2
+
+def test_trex_log_monitor(tmp_path):
+    """Only the new complete lines of the TRex log must be parsed."""
+    log_path = tmp_path / 'trex.log'
+    monitor = TRexLogMonitor(str(log_path))
+    assert monitor.get_status() == 0
+    log_path.write_text('Starting Scapy server.... please wait\nEAL: Probing\nERROR: no')
+    assert monitor.get_status() == 0
+    with open(str(log_path), 'a', encoding='utf-8') as trex_log:
+        trex_log.write(' free port\ncheck the PCI addresses\n')
+    assert monitor.get_status() == 1
+    assert monitor.error == 'ERROR: no free port'
+    assert monitor.after == 'check the PCI addresses'
+    # the log file is recreated when the server is started again
+    log_path.write_text('msg: not supported yet\nexit\n')
+    assert monitor.get_status() == 2
+
+class _FakeClock(object):
+    """Fake time module where sleep advances the time."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def test_trex_server_manager(tmp_path):
+    """The readiness of the TRex server is probed with an exponential backoff."""
+    manager = TRexServerManager(AttrDict({'ip': '127.0.0.1', 'zmq_rpc_port': 4501}),
+                                str(tmp_path / 'trex.log'))
+    clock = _FakeClock()
+    probes = [False, False, False, True, True]
+    connect = MagicMock(side_effect=[Exception('not ready'), None])
+    with patch('nfvbench.traffic_server.time', clock):
+        with patch.object(manager, 'probe_rpc', lambda: probes.pop(0)):
+            assert manager.wait_ready(connect, 10) == 0
+        assert not probes
+        assert connect.call_count == 2
+        assert clock.sleeps == [0.05, 0.1, 0.2, 0.4]
+        assert manager.timings['probes'] == 5
+
+        with patch.object(manager, 'probe_rpc', lambda: False):
+            clock.sleeps = []
+            with pytest.raises(utils.TimeoutError):
+                manager.wait_ready(connect, 2)
+            assert sum(clock.sleeps) <= 2
+            # a fatal error in the log file stops the wait immediately
+            (tmp_path / 'trex.log').write_text('EAL: Error - exiting with code: 1\n')
+            clock.sleeps = []
+            assert manager.wait_ready(connect, 10) == 1
+            assert not clock.sleeps
+
+    # a client left connected is reused only once and only if still connected
+    client = MagicMock()
+    manager.park_client(TRex, client)
+    assert manager.take_client(TRex) is client
+    assert manager.take_client(TRex) is None
+    client.is_connected.return_value = False
+    manager.park_client(TRex, client)
+    assert manager.take_client(TRex) is None
+
+def _get_latency_stats(lat_min, lat_max, average, values):
+    hdrh = HdrHistogram(1, 3600000000, 2)
+    for value in values:
+        hdrh.record_value(value)
+    return {'latency': {'total_min': lat_min, 'total_max': lat_max, 'average': average,
+                        'hdrh': HdrHistogram.encode(hdrh).decode('utf-8')}}
+
+def test_trex_latency_streams():
+    config = _get_dummy_tg_config('PVP', '1Mpps', scc=2, fc=200)
+    config['single_run'] = True
+    config['latency_stream_count'] = 2
+    trex = TRex(TrafficClient(config))
+    assert trex.get_latency_pg_ids(1, 1) == [0x181, 0x381]
+
+    # counters and latencies of both latency streams of chain 0 are merged
+    trex_stats = {'flow_stats': {0: {'rx_pkts': {1: 1000}, 'tx_pkts': {0: 1000}},
+                                 0x100: {'rx_pkts': {1: 10}, 'tx_pkts': {0: 10}},
+                                 0x300: {'rx_pkts': {1: 20}, 'tx_pkts': {0: 20}}},
+                  'latency': {0x100: _get_latency_stats(10, 50, 20, [10, 20, 50]),
+                              0x300: _get_latency_stats(5, 80, 30, [5, 80])}}
+    if_stats = [InterfaceStats("p0", "dev0"), InterfaceStats("p1", "dev1")]
+    latencies = [Latency(), Latency()]
+    trex.get_stream_stats(trex_stats, if_stats, latencies, 0)
+    assert (if_stats[0].tx, if_stats[1].rx) == (1030, 1030)
+    assert (latencies[0].min_usec, latencies[0].max_usec, latencies[0].avg_usec) == (5, 80, 25)
+    assert HdrHistogram.decode(latencies[0].hdrh).get_total_count() == 5
+    assert not latencies[1].available()
+
+@patch.object(TrafficClient, 'skip_sleep', lambda x: True)
+def test_port_pairs_ndr_pdr():
+    config = _get_port_pairs_config(2)
+    config['vxlan'] = False
+    config['mpls'] = False
+    config['ndr_run'] = True
+    config['pdr_run'] = True
+    config['rate'] = 'ndr_pdr'
+    config['generator_profile'] = 'dummy'
+    config['single_run'] = False
+    traffic_client = TrafficClient(config)
+    traffic_client.start_traffic_generator()
+    assert traffic_client.intf_speed == 20000000000
+    assert traffic_client.generator_config.devices[1].macs == \
+        ['00:00:00:00:00:02', '00:00:00:00:00:04']
+    traffic_client.set_traffic('64', True)
+    traffic_client.gen.set_response_curve(lr_dr=0, ndr=100, max_actual_tx=100, max_11_tx=100)
+    results = traffic_client.get_ndr_and_pdr()
+    assert_ndr_pdr(results, 200.0, 0.0, 200.0, 0.0)
+
+
+def _get_distributed_tg_config(scc):
+    config = _get_dummy_tg_config('PVP', 'ndr_pdr', scc=scc, fc=scc * 100)
+    profiles = config['traffic_generator']['generator_profile']
+    for host in ['a', 'b']:
+        profiles.append({'name': 'dummy-' + host,
+                         'tool': 'dummy',
+                         'ip': '127.0.0.1',
+                         'intf_speed': '10Gbps',
+                         'interfaces': [{'port': 0, 'pci': '0.0'},
+                                        {'port': 1, 'pci': '0.1'}]})
+    profiles.append({'name': 'east-west',
+                     'tool': 'distributed',
+                     'ip': None,
+                     'intf_speed': '10Gbps',
+                     'generators': ['dummy-a', 'dummy-b']})
+    config['traffic_generator']['default_profile'] = 'east-west'
+    config['vxlan'] = False
+    config['mpls'] = False
+    config['ndr_run'] = True
+    config['pdr_run'] = True
+    config['single_run'] = False
+    return config
+
+@patch.object(TrafficClient, 'skip_sleep', lambda x: True)
+def test_distributed_tg():
+    """Test NDR/PDR with 2 dummy traffic generator hosts driven as one."""
+    traffic_client = TrafficClient(_get_distributed_tg_config(4))
+    gen_config = traffic_client.generator_config
+    assert gen_config.port_pair_count == 2
+    assert gen_config.intf_speed == 20000000000
+    tg = traffic_client.gen
+    hosts = [gen.generator_config for gen in tg.generators]
+    assert [host.get_chains() for host in hosts] == [[0, 2], [1, 3]]
+    assert [host.intf_speed for host in hosts] == [10000000000, 10000000000]
+    assert [host.get_chain_port(1, 3) for host in hosts[1:]] == [1]
+    traffic_client.start_traffic_generator()
+    assert gen_config.devices[0].macs == ['00:00:00:00:00:01', '00:00:00:00:00:01']
+
+    # ARP results of both hosts are merged
+    traffic_client.ensure_arp_successful()
+    assert gen_config.get_dest_macs()[1] == ['00:00:00:00:01:%02x' % chain for chain in range(4)]
+
+    # the traffic is started on both hosts with their share of the rate
+    traffic_client.set_traffic('64', True)
+    tg.rates = ['4000pps', '2000pps']
+    start_times = []
+    for gen in tg.generators:
+        gen.start_traffic = lambda: start_times.append(time.time())
+    tg.start_traffic()
+    assert [gen.rates for gen in tg.generators] == [['2000.0pps', '1000.0pps']] * 2
+    assert len(start_times) == 2
+    assert max(start_times) - min(start_times) < 0.05
+
+    # a perfect sut on both hosts: counters of both hosts are added up
+    for gen in tg.generators:
+        gen.set_response_curve(lr_dr=0, ndr=100, max_actual_tx=100, max_11_tx=100)
+    tg.rates = ['100%', '100%']
+    tg.start_traffic()
+    stats = tg.get_stats()
+    assert stats[0]['tx']['total_pkts'] == 2 * LR_64B_PPS
+    assert stats['total_tx_rate'] == 4 * LR_64B_PPS
+    results = traffic_client.get_ndr_and_pdr()
+    assert_ndr_pdr(results, 200.0, 0.0, 200.0, 0.0)
+
+
+def _get_stateful_config(scc=1):
+    config = _get_dummy_tg_config('PVP', 'ndr_pdr', scc=scc)
+    config['vxlan'] = False
+    config['mpls'] = False
+    config['ndr_run'] = False
+    config['pdr_run'] = False
+    config['single_run'] = False
+    config['generator_profile'] = 'dummy'
+    config['stateful'] = {'enabled': True,
+                          'request_size': 100,
+                          'response_size': 1000,
+                          'hold_sec': 0,
+                          'server_port': 80,
+                          'client_ip_count': 255,
+                          'server_ip_count': 1,
+                          'max_failed_percentage': 0.1,
+                          'max_latency_usec': 0,
+                          'min_cps': 100,
+                          'max_cps': 100000,
+                          'precision_percentage': 1,
+                          'latency_pps': 1000}
+    return config
+
+@patch.object(TrafficClient, 'skip_sleep', lambda x: True)
+def test_stateful_max():
+    """Test the search of the max connections per second."""
+    config = _get_stateful_config()
+    traffic_client = TrafficClient(config)
+    traffic_client.start_traffic_generator()
+    tg = traffic_client.gen
+    tg.set_stateful_response(max_cps=20000, avg_delay_usec=50)
+    results = traffic_client.get_stateful_max()
+    assert 'warning' not in results
+    # max_cps fails, min_cps passes then the search converges within 1%
+    assert [it['passed'] for it in results['iteration_stats'][:2]] == [False, True]
+    assert 19800 <= results['max_cps'] <= 20000
+    assert results['max_concurrent_flows'] == int(results['max_cps'] * 0.001)
+    assert results['stats']['failed_percentage'] <= 0.1
+    assert results['run_config']['duration_sec'] == 1
+
+    # latency target that no rate can meet
+    config['stateful']['max_latency_usec'] = 40
+    results = traffic_client.get_stateful_max()
+    assert results['max_cps'] == 0
+    assert len(results['iteration_stats']) == 2
+    assert 'warning' in results
+
+def test_stateful_trex_astf():
+    """Test the TRex ASTF driver config checks and stats."""
+    # a port pair cannot carry more than 1 chain
+    with pytest.raises(TrafficGeneratorException):
+        TRexASTF(TrafficClient(_get_stateful_config(scc=2)))
+    trex = TRexASTF(TrafficClient(_get_stateful_config()))
+    in_stats = {'traffic': {'client': {'tcps_connattempt': 1000, 'tcps_connects': 990}},
+                'total': {'opackets': 10000, 'ipackets': 9000,
+                          'obytes': 1000000, 'ibytes': 900000},
+                'latency': {0: {'hist': {'cnt': 100, 's_avg': 10.0, 's_max': 40,
+                                         'min_usec': 5}},
+                            1: {'hist': {'cnt': 300, 's_avg': 30.0, 's_max': 80,
+                                         'min_usec': 8}},
+                            'global': {'old_flow': 0}}}
+    stats = trex.extract_stateful_stats(in_stats, 12)
+    assert stats == {'connections_attempted': 1000,
+                     'connections_established': 990,
+                     'max_active_flows': 12,
+                     'tx_pps': 10000,
+                     'rx_pps': 9000,
+                     'tx_bps': 8000000,
+                     'rx_bps': 7200000,
+                     'avg_delay_usec': 25,
+                     'min_delay_usec': 5,
+                     'max_delay_usec': 80}
+
+
+def _write_pcap(pcap_file):
+    """Write a pcap with 2 IPv4 frames (100 and 200 bytes without FCS) and 1 ARP frame."""
+    frames = [Ether() / IP() / UDP() / ('x' * 58),
+              Ether() / Dot1Q(vlan=10) / IP() / TCP() / ('x' * 142),
+              Ether() / ARP()]
+    wrpcap(str(pcap_file), frames)
+    return str(pcap_file)
+
+def test_pcap_frames(tmp_path):
+    """Test the parsing and caching of a pcap file."""
+    pcap_file = _write_pcap(tmp_path / 'mix.pcap')
+    pcap = traffic_utils.load_pcap(pcap_file)
+    assert pcap.skipped_count == 1
+    assert pcap.ip_versions == [4]
+    assert [version for version, _ in pcap.frames] == [4, 4]
+    # the VLAN tag of the captured frame is removed
+    assert [len(l3_frame) for _, l3_frame in pcap.frames] == [86, 182]
+    assert pcap.avg_l2_frame_size == 152.0
+    assert traffic_utils.get_average_packet_size('PCAP', pcap_file) == 152.0
+    rates = traffic_utils.convert_rates('PCAP', {'rate_percent': 100}, 10000000000, pcap_file)
+    assert rates['rate_pps'] == int(10000000000 / (152.0 + 20) / 8)
+    # the file is only parsed once
+    assert traffic_utils.load_pcap(pcap_file) is pcap
+    with pytest.raises(Exception):
+        traffic_utils.load_pcap(None)
+    not_pcap = tmp_path / 'not.pcap'
+    not_pcap.write_bytes(b'\x00' * 64)
+    with pytest.raises(Exception):
+        traffic_utils.load_pcap(str(not_pcap))
+
+@patch.object(TrafficClient, 'skip_sleep', lambda x: True)
+def test_pcap_ndr_pdr(tmp_path):
+    """Test NDR/PDR with a pcap traffic profile."""
+    traffic_client = _get_traffic_client()
+    traffic_client.config['pcap_file'] = _write_pcap(tmp_path / 'mix.pcap')
+    traffic_client.set_traffic('PCAP', True)
+    tg = traffic_client.gen
+    tg.set_response_curve(lr_dr=0, ndr=100, max_actual_tx=100, max_11_tx=100)
+    # line rate in pps for the average frame size of the pcap
+    assert tg.get_tx_pps_dropped_pps(100) == (int(10000000000 / (152.0 + 20) / 8), 0)
+    results = traffic_client.get_ndr_and_pdr()
+    assert_ndr_pdr(results, 200.0, 0.0, 200.0, 0.0)
+
+    # the pcap frames must match the IP version of the traffic
+    ipv6_pcap = str(tmp_path / 'ipv6.pcap')
+    wrpcap(ipv6_pcap, [Ether() / IPv6() / UDP()])
+    traffic_client.config['pcap_file'] = ipv6_pcap
+    with pytest.raises(TrafficClientException):
+        traffic_client.set_traffic('PCAP', True)
+
+def _get_traffic_pattern(**kwargs):
+    pattern_config = _get_dummy_tg_config('PVP', '1Mpps').traffic_pattern
+    pattern_config.update(kwargs)
+    return TrafficPattern(AttrDict(pattern_config))
+
+def test_traffic_pattern():
+    """Test the TX parameters of the traffic patterns at a given average rate."""
+    # bursts at line rate, the gap is derived from the average rate
+    burst = _get_traffic_pattern(type='burst', burst_size=10).get_multi_burst(1000, 10000, 60)
+    assert burst == {'pps': 10000, 'pkts_per_burst': 10, 'ibg': pytest.approx(9000),
+                     'count': 6000}
+    # fixed gap, the rate inside a burst is derived from the average rate
+    pattern = _get_traffic_pattern(type='burst', burst_size=10, inter_burst_gap_usec=5000)
+    burst = pattern.get_multi_burst(1000, 10000, 60)
+    assert burst['pps'] == pytest.approx(2000)
+    assert burst['ibg'] == 5000
+    with pytest.raises(TrafficGeneratorException):
+        pattern.get_multi_burst(2000, 10000, 60)
+    burst = _get_traffic_pattern(type='on_off', on_sec=1, off_sec=3).get_multi_burst(1000, 10000,
+                                                                                    60)
+    assert burst == {'pps': 4000, 'pkts_per_burst': 4000, 'ibg': 3000000.0, 'count': 15}
+
+    # the rate of the schedule steps averages to the requested rate
+    for schedule in ['sine', [1, 2, 5]]:
+        pattern = _get_traffic_pattern(type='schedule', schedule=schedule)
+        steps = pattern.get_schedule_steps(1000)
+        assert sum(step['pps'] for step in steps) / len(steps) == pytest.approx(1000)
+    assert [step['total_pkts'] for step in steps] == [1250, 2500, 6250]
+    assert pattern.get_params()['relative_rates'] == [0.375, 0.75, 1.875]
+    assert _get_traffic_pattern().get_params() == {'type': 'cont'}
+
+    for kwargs in [{'type': 'poisson'},
+                   {'type': 'schedule', 'schedule': [1, 0]},
+                   {'type': 'schedule', 'sine_amplitude_percent': 100},
+                   {'burst_size': 0}]:
+        with pytest.raises(TrafficGeneratorException):
+            _get_traffic_pattern(**kwargs)
+
+
+def test_e2e_packet_parsing():
+    """Check the captured return packets by fixed offsets."""
+    def get_packet(pkt):
+        return {'binary': bytes(pkt)}
+    traffic_client = _get_traffic_client()
+    udp_packets = [Ether() / IP() / UDP(),
+                   Ether() / Dot1Q(vlan=100) / IP() / UDP(),
+                   Ether() / Dot1Q(vlan=100) / Dot1Q(vlan=200) / IPv6() / UDP()]
+    for pkt in udp_packets:
+        assert traffic_client.is_udp(get_packet(pkt))
+        assert not traffic_client.is_mpls(get_packet(pkt))
+    for pkt in [Ether() / IP() / TCP(), Ether() / IPv6() / TCP(), Ether() / ARP(),
+                Ether() / Dot1Q(vlan=100)]:
+        assert not traffic_client.is_udp(get_packet(pkt))
+    mpls_pkt = Ether() / MPLS(label=16, s=1) / Ether() / IP() / UDP()
+    assert traffic_client.is_mpls(get_packet(mpls_pkt))
+    assert not traffic_client.is_udp(get_packet(mpls_pkt))
+
+def test_ensure_end_to_end_early_exit():
+    """The end to end check must stop as soon as all the chains have replied."""
+    traffic_client = _get_traffic_client()
+    tg = traffic_client.gen
+    macs = [mac for dest_macs in traffic_client.generator_config.get_dest_macs()
+            for mac in dest_macs]
+    captures = [[Ether(src=macs[0]) / IP() / UDP(), Ether(src=macs[1]) / IP() / TCP()],
+                [Ether(src=macs[1]) / Dot1Q(vlan=10) / IP() / UDP()]]
+
+    def fetch_capture_packets():
+        tg.packet_list = [{'binary': bytes(pkt)} for pkt in captures.pop(0)]
+    tg.fetch_capture_packets = fetch_capture_packets
+    with patch('nfvbench.traffic_client.time.sleep'):
+        traffic_client.ensure_end_to_end()
+    assert not captures
+
+
 def test_config():
     refcfg = {1: 100, 2: {21: 100, 22: 200}, 3: None}
     res1 = {1: 10, 2: {21: 100, 22: 200}, 3: None}
@@ -1000,6 +2053,176 @@ def test_config():
                         whitelist_keys=['alpha', 'extra_specs']) == new_flavor
 
 
+def test_config_schema():
+    refcfg = {'rate': 'ndr', 'flow_count': 10000, 'vlans': [], 'user_info': None,
+              'traffic_generator': {'ip': '127.0.0.1', 'intf_speed': None,
+                                    'mac_addrs': ['00:00:00:00:00:00']},
+              'flavor': {'vcpus': 2, 'extra_specs': {'hw:cpu_policy': 'dedicated'}}}
+    schema = ConfigSchema(refcfg, whitelist_keys=['extra_specs'])
+    cfg = schema.merge(refcfg, {'traffic_generator': {'intf_speed': '10Gbps'},
+                                'flavor': {'extra_specs': {'hw:numa_nodes': 2}},
+                                'user_info': {'status': 'explore'}})
+    assert cfg.traffic_generator == {'ip': '127.0.0.1', 'intf_speed': '10Gbps',
+                                     'mac_addrs': ['00:00:00:00:00:00']}
+    assert cfg.flavor.extra_specs == {'hw:cpu_policy': 'dedicated', 'hw:numa_nodes': 2}
+    assert cfg.user_info == {'status': 'explore'}
+    # the merged config can be modified without changing the base config
+    cfg['traffic_generator']['mac_addrs'].append('00:00:00:00:01:00')
+    cfg['flavor']['extra_specs']['hw:mem_page_size'] = 'large'
+    assert refcfg['traffic_generator']['mac_addrs'] == ['00:00:00:00:00:00']
+    assert refcfg['flavor']['extra_specs'] == {'hw:cpu_policy': 'dedicated'}
+
+    # all the errors are reported with their path
+    with pytest.raises(ConfigException) as exc_info:
+        schema.validate({'flow_count': '100k', 'traffic_generatr': {},
+                         'traffic_generator': {'ip': 1, 'port': 2},
+                         'flavor': {'extra_specs': 'none'}})
+    for error in ["flow_count: invalid type str (expected int)",
+                  "traffic_generatr: unknown option",
+                  "traffic_generator.ip: invalid type int (expected str)",
+                  "traffic_generator.port: unknown option",
+                  "'traffic_generator': {'ip': 1, 'port': 2}"]:
+        assert error in str(exc_info.value)
+    # whitelisted options accept any value
+    schema.validate({'flavor': {'extra_specs': 'none'}})
+    # whitelisted options are accepted even if they are not in the reference config
+    cfg = schema.merge(refcfg, {'traffic_generator': {'extra_specs': {'hw:numa_nodes': 2}}})
+    assert cfg.traffic_generator.extra_specs == {'hw:numa_nodes': 2}
+    assert config_loads("{alpha: 1}", refcfg, ['alpha']).alpha == 1
+
+    # run options and values converted later are accepted in lenient mode
+    cfg = schema.merge(refcfg, {'flow_count': '100k', 'frame_sizes': ['64']}, lenient=True)
+    assert cfg.flow_count == '100k'
+    assert cfg.frame_sizes == ('64',)
+    for invalid_cfg, error in [({'traffic_generator': 'trex'}, 'traffic_generator: invalid type'),
+                               ({'rate': {'ndr': 1}}, 'rate: invalid type dict'),
+                               ({'traffic_generator': {'port': 2}},
+                                'traffic_generator.port: unknown option')]:
+        with pytest.raises(ConfigException) as exc_info:
+            schema.validate(invalid_cfg, lenient=True)
+        assert error in str(exc_info.value)
+
+    # invalid run configs are rejected by the REST server before being queued
+    jobs = JobQueue(max_queued=1, retention=5)
+    client = setup_flask(jobs, config_schema=schema).test_client()
+    res = client.post('/start_run', json={'traffic_generator': {'port': 2}}).get_json()
+    assert res['status'] == 'ERROR'
+    assert 'traffic_generator.port: unknown option' in res['error_message']
+    assert client.post('/start_run', json={'flow_count': '10k'}).get_json()['status'] == 'PENDING'
+
+
+def test_config_prepare_benchmark():
+    """Benchmark of the preparation of the run config of a REST request in server mode."""
+    config, _ = nfvbench.nfvbench.load_default_config()
+    schema = ConfigSchema(config, nfvbench.nfvbench.WHITELIST_KEYS)
+    request = {'rate': 'ndr_pdr', 'duration_sec': 10, 'flow_count': '100k',
+               'frame_sizes': ['64', 'IMIX'], 'user_label': 'benchmark',
+               'traffic_generator': {'default_profile': 'trex-local'},
+               'measurement': {'NDR': 0.001, 'PDR': 0.1}}
+
+    def prepare():
+        schema.validate(request, lenient=True)
+        return schema.merge(config, request, lenient=True)
+
+    def prepare_baseline():
+        # isolated run config without schema: deep copy of the base config then update
+        cfg = AttrDict(copy.deepcopy(config))
+        cfg.update(request)
+        return cfg
+
+    def get_per_request(function, count=200, repeat=5):
+        # the best of several measurements is the least affected by the host load
+        times = []
+        for _ in range(repeat):
+            start = time.time()
+            for _ in range(count):
+                function()
+            times.append((time.time() - start) / count)
+        return min(times)
+
+    cfg = prepare()
+    assert cfg.traffic_generator.default_profile == 'trex-local'
+    assert cfg.traffic_generator.ip_addrs == config.traffic_generator.ip_addrs
+    per_request = get_per_request(prepare)
+    baseline = get_per_request(prepare_baseline)
+    # relative to a baseline measured in the same conditions so as not to depend on the host
+    assert per_request < baseline, 'config preparation took %.3f msec (deepcopy %.3f msec)' % (
+        per_request * 1000, baseline * 1000)
+
+
+# modules that must not be loaded by the fast-path commands
+HEAVY_MODULES = ['flask', 'glanceclient', 'keystoneauth1', 'neutronclient', 'novaclient',
+                 'openstack', 'scapy', 'trex', 'trex_stl_lib']
+# nfvbench modules imported lazily that must not be loaded by the fast-path commands
+DEFERRED_MODULES = ['nfvbench.chain_runner', 'nfvbench.chaining', 'nfvbench.credentials',
+                    'nfvbench.nfvbenchd', 'nfvbench.traffic_client']
+
+# run the nfvbench CLI and report the time taken, the top level modules loaded, the nfvbench
+# modules not loaded yet and the time then taken to load the openstack subsystems
+FAST_PATH_SCRIPT = """
+import json
+import sys
+import time
+import types
+start = time.time()
+import nfvbench.nfvbench
+report_path = sys.argv[1]
+sys.argv = ['nfvbench'] + sys.argv[2:]
+try:
+    nfvbench.nfvbench.main()
+except SystemExit:
+    pass
+elapsed = time.time() - start
+modules = sorted({name.split('.')[0] for name in sys.modules})
+# lazy modules are not of the module type until one of their attributes is accessed
+unloaded = sorted(name for name, module in list(sys.modules.items())
+                  if name.startswith('nfvbench.') and type(module) is not types.ModuleType)
+start = time.time()
+nfvbench.nfvbench.credentials.Credentials
+nfvbench.nfvbench.chaining.ChainManager
+with open(report_path, 'w') as report:
+    json.dump({'elapsed': elapsed, 'modules': modules, 'unloaded': unloaded,
+               'deferred_elapsed': time.time() - start}, report)
+"""
+
+
+def _run_fast_path(tmp_path, *args):
+    report = str(tmp_path / 'report.json')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    output = subprocess.run([sys.executable, '-c', FAST_PATH_SCRIPT, report] + list(args),
+                            cwd=root, env=env, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, check=True).stdout.decode()
+    with open(report, encoding="utf-8") as report_file:
+        return output, json.load(report_file)
+
+
+def test_fast_path_import_time(tmp_path):
+    config, _ = nfvbench.nfvbench.load_default_config()
+    config.update({'tg-name': 'trex-local', 'tg-tool': 'TRex', 'ndr_run': True, 'pdr_run': True})
+    result_file = str(tmp_path / 'result.json')
+    with open(result_file, 'w', encoding="utf-8") as result_fp:
+        json.dump({'date': '2020-01-01 00:00:00', 'nfvbench_version': '0.0', 'config': config,
+                   'benchmarks': {'network': {'service_chain': {}, 'versions': {}}}}, result_fp)
+    for args, expected in [(['--version'], ''),
+                           (['--show-default-config'], 'traffic_generator:'),
+                           (['--show-trex-log'], ''),
+                           (['--show-summary', result_file], 'Service chain:')]:
+        output, report = _run_fast_path(tmp_path, *args)
+        assert expected in output
+        assert 'ERROR' not in output
+        loaded = set(report['modules']) & set(HEAVY_MODULES)
+        assert not loaded, '%s loads %s' % (args[0], loaded)
+        loaded = set(DEFERRED_MODULES) - set(report['unloaded'])
+        assert not loaded, '%s loads %s' % (args[0], loaded)
+        # the time budget is relative to the time of loading the subsystems that are
+        # deferred, measured in the same process, so that it does not depend on the host load
+        assert report['elapsed'] < report['deferred_elapsed'], \
+            '%s took %.3f sec (deferred subsystems load in %.3f sec)' % (
+                args[0], report['elapsed'], report['deferred_elapsed'])
+
+
 def test_fluentd():
     logger = logging.getLogger('fluent-logger')
 
@@ -1045,6 +2268,171 @@ def test_fluentd():
     except Exception:
         logger.exception("got exception")
 
+
+class _SlowFluentd(object):
+    """A local TCP stand-in for a fluentd server that is slow to read its socket."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.messages = []
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        conn, _ = self.server.accept()
+        unpacker = msgpack.Unpacker(raw=False)
+        with conn:
+            while True:
+                time.sleep(self.delay)
+                data = conn.recv(65536)
+                if not data:
+                    break
+                unpacker.feed(data)
+                self.messages.extend(unpacker)
+
+    def get_records(self, tag):
+        return [record for msg_tag, entries in self.messages if msg_tag == tag
+                for _, record in entries]
+
+    def close(self):
+        self.server.close()
+
+
+def _get_free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_fluentd_shipper():
+    fluentd = _SlowFluentd(0.05)
+    config = AttrDict({'logging_tag': 'nfvbench', 'result_tag': 'resultnfvbench',
+                       'ip': '127.0.0.1', 'port': fluentd.port})
+    handler = FluentLogHandler([config], AttrDict({'queue_size': 1000, 'batch_size': 50,
+                                                   'overflow': 'drop',
+                                                   'flush_timeout_sec': 10}))
+    logger = logging.getLogger('fluent-shipper')
+    logger.propagate = False
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        handler.start_new_run()
+        start = time.time()
+        for index in range(200):
+            logger.info('message %d', index)
+        handler.record_send({'type': 'result', 'rate_pps': 100})
+        # logging must not wait for the slow server
+        assert time.time() - start < 0.5
+        assert handler.get_stats()['pending'] > 0
+        handler.send_run_summary(True)
+        assert handler.get_stats() == {'sent': 203, 'dropped': 0, 'errors': 0, 'pending': 0}
+        # wait for the server to read everything
+        handler.close()
+        fluentd.thread.join(5)
+        logs = fluentd.get_records('nfvbench')
+        assert [log['message'] for log in logs[1:-1]] == ['message %d' % index
+                                                         for index in range(200)]
+        assert logs[0]['loglevel'] == 'START'
+        assert logs[-1]['loglevel'] == 'RUN_SUMMARY'
+        assert logs[-1]['numdropped'] == 0
+        assert fluentd.get_records('resultnfvbench') == [{'type': 'result', 'rate_pps': 100}]
+        # records are sent in batches
+        assert len(fluentd.messages) < 20
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+        fluentd.close()
+
+
+def test_fluentd_shipper_pack_errors():
+    # a record that cannot be packed must not stop the background thread
+    fluentd = _SlowFluentd(0)
+    shipper = FluentShipper('127.0.0.1', fluentd.port)
+    try:
+        assert shipper.put('nfvbench', {'index': 0, 'date': datetime(2024, 1, 1)})
+        loop = []
+        loop.append(loop)
+        assert shipper.put('nfvbench', {'index': 1, 'loop': loop})
+        assert shipper.put('nfvbench', {'index': 2})
+        assert shipper.flush(5)
+        assert shipper.get_stats() == {'sent': 3, 'dropped': 0, 'errors': 1, 'pending': 0}
+        assert shipper.put('nfvbench', {'index': 3})
+        shipper.close(5)
+        fluentd.thread.join(5)
+        records = fluentd.get_records('nfvbench')
+        assert records[0] == {'index': 0, 'date': '2024-01-01 00:00:00'}
+        assert records[1]['message'] == "Can't output to log"
+        assert [record.get('index') for record in records] == [0, None, 2, 3]
+    finally:
+        shipper.close(0)
+        fluentd.close()
+
+
+def test_fluentd_run_summary_dropped():
+    # nothing listens on that port: the records of the first run overflow the queue
+    config = AttrDict({'logging_tag': 'nfvbench', 'result_tag': None,
+                       'ip': '127.0.0.1', 'port': _get_free_port()})
+    handler = FluentLogHandler([config], AttrDict({'queue_size': 5, 'flush_timeout_sec': 0}))
+    try:
+        handler.start_new_run()
+        for index in range(20):
+            handler.emit(logging.makeLogRecord({'msg': 'message %d' % index}))
+        handler.send_run_summary(True)
+        assert handler.get_stats()['dropped'] > 0
+
+        # the summary of the next run only counts the records dropped during that run
+        records = []
+        shipper = MagicMock()
+        shipper.put.side_effect = lambda tag, record: records.append(record)
+        handler.log_senders = [(shipper, 'nfvbench')]
+        handler.start_new_run()
+        handler.send_run_summary(True)
+        assert records[-1]['loglevel'] == 'RUN_SUMMARY'
+        assert records[-1]['numdropped'] == 0
+    finally:
+        handler.close()
+
+
+def test_fluentd_shipper_overflow():
+    # nothing listens on that port: records stay queued and new records overflow
+    shipper = FluentShipper('127.0.0.1', _get_free_port(), queue_size=10, batch_size=5,
+                            retry_interval_sec=10)
+    start = time.time()
+    results = [shipper.put('nfvbench', {'index': index}) for index in range(50)]
+    assert time.time() - start < 0.5
+    assert not shipper.flush(0.1)
+    stats = shipper.get_stats()
+    assert stats['sent'] == 0
+    assert stats['errors'] >= 1
+    assert stats['dropped'] == results.count(False)
+    assert stats['dropped'] + stats['pending'] == 50
+    assert 10 <= stats['pending'] <= 15
+    # closing drops the records that cannot be sent without waiting for the retry
+    start = time.time()
+    shipper.close(0)
+    assert time.time() - start < 5
+    assert shipper.get_stats() == {'sent': 0, 'dropped': 50, 'errors': stats['errors'],
+                                   'pending': 0}
+    assert not shipper.put('nfvbench', {})
+
+    # with backpressure, callers wait for room in the queue before dropping
+    shipper = FluentShipper('127.0.0.1', _get_free_port(), queue_size=2, batch_size=1,
+                            overflow='block', block_timeout_sec=0.2, retry_interval_sec=10)
+    for index in range(4):
+        shipper.put('nfvbench', {'index': index})
+    start = time.time()
+    assert not shipper.put('nfvbench', {'index': 4})
+    assert time.time() - start >= 0.2
+    shipper.close(0)
+    assert shipper.get_stats()['dropped'] == 5
+
 def assert_ndr_pdr(stats, ndr, ndr_dr, pdr, pdr_dr):
     assert stats['ndr']['rate_percent'] == ndr
     assert stats['ndr']['stats']['overall']['drop_percentage'] == ndr_dr
@@ -1084,6 +2472,7 @@ def _get_dummy_tg_config(chain_type, rate, scc=1, fc=10, step_ip='0.0.0.1',
         'flow_count': fc,
         'vlan_tagging': True,
         'no_arp': False,
+        'arp_cache_ttl_sec': 300,
         'duration_sec': 1,
         'interval_sec': 1,
         'pause_sec': 1,
@@ -1100,9 +2489,23 @@ def _get_dummy_tg_config(chain_type, rate, scc=1, fc=10, step_ip='0.0.0.1',
         'no_flow_stats': False,
         'no_latency_stats': False,
         'no_latency_streams': False,
+        'latency_pps': 1000,
+        'latency_stream_count': 1,
         'intf_speed': '10Gbps',
         'periodic_gratuitous_arp': False,
-        'gratuitous_arp_pps': 1
+        'gratuitous_arp_pps': 1,
+        'pcap_file': None,
+        'traffic_pattern': {'type': 'cont',
+                            'burst_size': 32,
+                            'inter_burst_gap_usec': None,
+                            'on_sec': 1,
+                            'off_sec': 1,
+                            'schedule': 'sine',
+                            'schedule_period_sec': 10,
+                            'schedule_steps': 20,
+                            'sine_amplitude_percent': 50,
+                            'burst_search': False,
+                            'max_burst_size': 4096}
     })
 
 def _get_traffic_client(user_info=None):
@@ -1134,6 +2537,30 @@ def test_ndr_at_lr():
     results = traffic_client.get_ndr_and_pdr()
     assert_ndr_pdr(results, 200.0, 0.0, 200.0, 0.0)
 
+@patch.object(TrafficClient, 'skip_sleep', lambda x: True)
+def test_cancel_traffic():
+    """A cancel request stops the traffic and aborts the NDR/PDR search."""
+    traffic_client = _get_traffic_client()
+    traffic_client.gen.set_response_curve(lr_dr=0, ndr=100, max_actual_tx=100, max_11_tx=100)
+    traffic_client.request_cancel()
+    with pytest.raises(TrafficClientException, match='Run cancelled'):
+        traffic_client.get_ndr_and_pdr()
+    assert not traffic_client.runner.is_running()
+
+@patch.object(TrafficClient, 'skip_sleep', lambda x: True)
+def test_traffic_events():
+    """Each NDR/PDR search trial is published to the notifier of the run."""
+    traffic_client = _get_traffic_client()
+    traffic_client.gen.set_response_curve(lr_dr=0, ndr=100, max_actual_tx=100, max_11_tx=100)
+    traffic_client.notifier = MagicMock()
+    traffic_client.get_ndr_and_pdr()
+    trials = [call[1] for call in traffic_client.notifier.send.call_args_list
+              if call[0] == ('trial',)]
+    assert trials
+    assert trials[0]['load_percent'] == 100.0
+    assert trials[0]['drop_rate_percent'] == 0
+    assert trials[0]['l2frame_size'] == '64'
+
 @patch.object(TrafficClient, 'skip_sleep', lambda x: True)
 def test_ndr_at_50():
     """Test NDR at 50% line rate.